@@ -50,10 +50,36 @@ def create_app(config_name=None):
     jwt.init_app(app)
     mail.init_app(app)
     
+    # Shared cache for model finders and other hot reads
+    from app.services.cache_service import cache
+    cache.init_app(app)
+    
+    # Request rate limiting (login, uploads, reviews, votes)
+    from app.services.rate_limit_service import rate_limiter
+    rate_limiter.init_app(app)
+    
+    # AI model provider (OpenAI, or the offline stub for development and load tests) and request scheduler
+    from app.services.ai_provider_service import ai_provider
+    ai_provider.init_app(app)
+    from app.services.ai_service import ai_scheduler
+    ai_scheduler.init_app(app)
+    
+    # Background job queue (task handlers are registered here)
+    from app.services.job_service import job_queue
+    job_queue.init_app(app)
+    
     # Initialize security headers
     from app.security import SecurityHeaders
     SecurityHeaders.init_app(app)
     
+    # Register CLI maintenance commands
+    from app.commands import register_commands
+    register_commands(app)
+    
+    # Create missing MongoDB indexes (opt-in via MONGO_ENSURE_INDEXES)
+    from app import indexes
+    indexes.init_app(app)
+    
     # Add CSRF token to all templates
     @app.context_processor
     def inject_csrf_token():
@@ -76,35 +102,10 @@ def create_app(config_name=None):
             return ''
         return markdown.markdown(text, extensions=['nl2br', 'fenced_code', 'tables'])
 
-    def normalize_media_url(url):
-        """Normalize media URLs stored in the database."""
-        if not url:
-            return ''
-        normalized = url.strip()
-        if normalized.startswith('//'):
-            return f"https:{normalized}"
-        if normalized.startswith('http://'):
-            return f"https://{normalized[len('http://'):]}"
-        if normalized.startswith('https://'):
-            return normalized
-        if normalized.startswith('/'):
-            return normalized
-        if normalized.startswith('static/'):
-            return f"/{normalized}"
-        if normalized.startswith('uploads/'):
-            return f"/{normalized}"
-        if normalized.startswith('res.cloudinary.com/') or normalized.startswith('cloudinary.com/'):
-            return f"https://{normalized}"
-
-        bucket = app.config.get('AWS_S3_BUCKET_NAME')
-        if bucket:
-            region = app.config.get('AWS_REGION', 'us-east-1')
-            return f"https://{bucket}.s3.{region}.amazonaws.com/{normalized}"
-
-        return f"/{normalized}"
-
-    app.add_template_filter(normalize_media_url, 'media_url')
-    app.jinja_env.globals['media_url'] = normalize_media_url
+    # Image URLs, optionally at a variant size: {{ book.cover_image_url|media_url('card') }}
+    from app.services.image_service import media_url
+    app.add_template_filter(media_url, 'media_url')
+    app.jinja_env.globals['media_url'] = media_url
     
     # Register blueprints
     from app.routes import auth, books, reviews, users, admin, articles, tools, competitions, services
@@ -116,6 +117,7 @@ def create_app(config_name=None):
     from app.routes.brand_kit import brand_kit_bp
     from app.routes.epub_validator import epub_validator_bp
     from app.routes.metadata_editor import metadata_editor_bp
+    from app.routes import api
     
     app.register_blueprint(auth.bp)
     app.register_blueprint(books.bp)
@@ -138,6 +140,7 @@ def create_app(config_name=None):
     app.register_blueprint(brand_kit_bp)
     app.register_blueprint(epub_validator_bp)
     app.register_blueprint(metadata_editor_bp)
+    app.register_blueprint(api.bp)
     app.register_blueprint(analytics_bp)
     
     # Register main routes
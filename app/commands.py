@@ -0,0 +1,253 @@
+"""Flask CLI maintenance commands."""
+import click
+from app.services.rollup_service import METRICS
+
+
+def register_commands(app):
+    """Register maintenance commands on the Flask CLI."""
+    
+    @app.cli.command('ratings-rebuild')
+    def ratings_rebuild():
+        """Rebuild book rating aggregates from the reviews collection."""
+        from app.models import Review
+        
+        rebuilt = Review.rebuild_rating_aggregates()
+        click.echo(f'Rebuilt rating aggregates ({rebuilt} books with approved reviews).')
+    
+    @app.cli.command('db-indexes')
+    @click.option('--dry-run', is_flag=True, help='Report differences without changing anything.')
+    @click.option('--drop-extra', is_flag=True, help='Drop indexes that no model declares.')
+    @click.option('--rebuild-drifted', is_flag=True, help='Drop and recreate indexes whose definition changed.')
+    def db_indexes(dry_run, drop_extra, rebuild_drifted):
+        """Create declared MongoDB indexes and report drift."""
+        from app.indexes import sync_indexes
+        
+        report = sync_indexes(apply=not dry_run, drop_extra=drop_extra, rebuild_drifted=rebuild_drifted)
+        
+        verb = 'missing' if dry_run else 'created'
+        for label in report['created']:
+            click.echo(f'+ {label} ({verb})')
+        for label in report['drifted']:
+            suffix = ' (rebuilt)' if rebuild_drifted and not dry_run else ''
+            click.echo(f'~ {label} differs from its declaration{suffix}')
+        for label in report['extra']:
+            suffix = ' (dropped)' if drop_extra and not dry_run else ''
+            click.echo(f'? {label} is not declared by any model{suffix}')
+        for failure in report['failed']:
+            click.echo(f'! {failure}')
+        click.echo(f"{len(report['unchanged'])} indexes up to date, {len(report['created'])} {verb}, "
+                   f"{len(report['drifted'])} drifted, {len(report['extra'])} undeclared.")
+        if report['failed']:
+            raise click.ClickException(f"{len(report['failed'])} indexes could not be synced.")
+    
+    @app.cli.command('search-reindex')
+    def search_reindex():
+        """Rebuild the search keywords stored on books and users."""
+        from app.models import Book, User
+        from app.services.search_service import search_service
+        
+        for model in (Book, User):
+            updated = search_service.reindex(model)
+            click.echo(f'Reindexed {updated} {model.collection}.')
+    
+    @app.cli.command('rollups-rebuild')
+    @click.option('--metric', type=click.Choice(sorted(METRICS)), help='Rebuild only this metric.')
+    def rollups_rebuild(metric):
+        """Recompute analytics rollups from the source collections."""
+        from app.services.rollup_service import rollup_service
+        
+        for name, counted in rollup_service.rebuild(metric).items():
+            click.echo(f'Rebuilt {name} rollups from {counted} documents.')
+    
+    @app.cli.command('audit-replay-spill')
+    @click.option('--path', help='Spill file to load (defaults to AUDIT_SPILL_FILE).')
+    def audit_replay_spill(path):
+        """Load audit entries spilled by the background writer into the database."""
+        from app.services.audit_writer_service import audit_writer
+        
+        loaded = audit_writer.replay_spill(path)
+        click.echo(f'Loaded {loaded} spilled audit entries.')
+    
+    @app.cli.command('audit-archive')
+    @click.option('--retention-months', type=int, help='Keep this many whole months (defaults to AUDIT_RETENTION_MONTHS).')
+    @click.option('--keep', is_flag=True, help='Write archives without dropping the partitions.')
+    @click.option('--dry-run', is_flag=True, help='List expired partitions without archiving them.')
+    def audit_archive(retention_months, keep, dry_run):
+        """Export expired monthly audit partitions to compressed JSONL and drop them."""
+        from flask import current_app
+        from app.services.audit_storage_service import audit_storage
+        
+        if retention_months is None:
+            retention_months = current_app.config['AUDIT_RETENTION_MONTHS']
+        directory = current_app.config['AUDIT_ARCHIVE_DIR']
+        
+        expired = audit_storage.expired_partitions(retention_months)
+        if not expired:
+            click.echo('No audit partitions past retention.')
+        for name in expired:
+            if dry_run:
+                click.echo(f'{name} would be archived')
+                continue
+            path, archived = audit_storage.archive(name, directory, drop=not keep)
+            click.echo(f"Archived {archived} entries from {name} to {path}{'' if keep else ' and dropped it'}.")
+    
+    @app.cli.command('audit-partition-legacy')
+    def audit_partition_legacy():
+        """Move entries from the unpartitioned audit_logs collection into monthly partitions."""
+        from app.services.audit_storage_service import audit_storage
+        
+        moved = audit_storage.split_legacy()
+        click.echo(f'Moved {moved} audit entries into monthly partitions.')
+    
+    @app.cli.command('worker')
+    @click.option('--concurrency', type=int, help='Jobs run at once (defaults to WORKER_CONCURRENCY).')
+    @click.option('--burst', is_flag=True, help='Exit when no job is due instead of waiting for more.')
+    def worker(concurrency, burst):
+        """Run background jobs from the queue until stopped."""
+        from flask import current_app
+        from app.services.job_service import job_queue, Worker
+        
+        app_object = current_app._get_current_object()
+        runner = Worker(job_queue, app_object,
+                        concurrency=concurrency or app_object.config['WORKER_CONCURRENCY'],
+                        poll_interval=app_object.config['WORKER_POLL_SECONDS'])
+        click.echo(f'Worker {runner.name} running {runner.concurrency} jobs at a time '
+                   f"({', '.join(sorted(job_queue.tasks))}).")
+        processed = runner.run(burst=burst)
+        click.echo(f'Worker {runner.name} stopped after {processed} jobs.')
+    
+    @app.cli.command('jobs-enqueue')
+    @click.argument('name')
+    @click.option('--payload', default='{}', help='Handler arguments as a JSON object.')
+    def jobs_enqueue(name, payload):
+        """Queue a background job by task name."""
+        import json
+        from app.services.job_service import job_queue
+        
+        if name not in job_queue.tasks:
+            raise click.BadParameter(f"choose from {', '.join(sorted(job_queue.tasks))}", param_hint='NAME')
+        job = job_queue.enqueue(name, json.loads(payload))
+        click.echo(f"Queued {name} as job {job['_id']} ({job['status']}).")
+    
+    @app.cli.command('covers-generate')
+    @click.option('--workers', type=int, help='Drawing processes (defaults to COVER_WORKERS; 0 draws inline).')
+    @click.option('--force', is_flag=True, help='Redraw covers whose title and author have not changed.')
+    @click.option('--limit', type=int, help='Stop after this many books.')
+    def covers_generate(workers, force, limit):
+        """Draw covers for books without one and queue them for upload."""
+        from app.services.cover_service import cover_engine
+        
+        def report(counts):
+            click.echo(f"  {counts['scanned']} books checked, {counts['generated']} drawn, "
+                       f"{counts['skipped']} unchanged, {counts['failed']} failed")
+        
+        counts = cover_engine.generate(workers=workers, force=force, limit=limit, progress=report)
+        rate = counts['generated'] / counts['seconds'] if counts['seconds'] else 0
+        click.echo(f"Drew {counts['generated']} covers in {counts['seconds']}s ({rate:.1f}/s); "
+                   f"{counts['skipped']} unchanged, {counts['failed']} failed.")
+    
+    @app.cli.command('media-migrate')
+    @click.option('--to', 'target', type=click.Choice(['cloudinary', 's3']),
+                  help='Storage to move images to (defaults to the configured one).')
+    @click.option('--source', type=click.Choice(['local', 'external']), default='local', show_default=True,
+                  help='Migrate files in UPLOAD_FOLDER, or images linked from other sites.')
+    @click.option('--workers', type=int, help='Upload threads (defaults to MEDIA_MIGRATE_WORKERS).')
+    @click.option('--batch-size', type=int, help='URLs per database batch (defaults to MEDIA_MIGRATE_BATCH).')
+    @click.option('--limit', type=int, help='Migrate at most this many images.')
+    @click.option('--dry-run', is_flag=True, help='Report what would be migrated without uploading.')
+    def media_migrate(target, source, workers, batch_size, limit, dry_run):
+        """Move images to Cloudinary or S3; rerun to resume an interrupted migration."""
+        from app.services.media_migration_service import media_migration
+        
+        def report(counts):
+            done = counts['uploaded'] + counts['deduplicated'] + counts['missing'] + counts['failed']
+            click.echo(f"  {done + counts['resumed']}/{counts['urls']} images, {counts['updated']} documents updated")
+        
+        try:
+            counts = media_migration.run(target=target, source=source, workers=workers, batch_size=batch_size,
+                                         dry_run=dry_run, limit=limit, progress=report)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+        megabytes = counts['bytes'] / (1024 * 1024)
+        if dry_run:
+            click.echo(f"Would migrate {counts['urls']} images shown on {counts['documents']} documents "
+                       f"({counts['resumed']} already uploaded, {counts['missing']} files missing, "
+                       f"{megabytes:.1f} MB to upload).")
+            return
+        seconds = counts['seconds'] or 1
+        click.echo(f"Migrated {counts['urls']} images in {counts['seconds']}s: {counts['uploaded']} uploaded, "
+                   f"{counts['deduplicated']} deduplicated, {counts['resumed']} resumed, {counts['missing']} missing, "
+                   f"{counts['failed']} failed; {counts['updated']} documents updated.")
+        click.echo(f"Throughput {counts['uploaded'] / seconds:.1f} uploads/s, {megabytes / seconds:.2f} MB/s.")
+        if counts['failed']:
+            click.echo('Run the command again to retry the failed images.')
+    
+    @app.cli.command('evaluation-benchmark')
+    @click.option('--submissions', default=100, show_default=True, help='Synthetic submissions to evaluate.')
+    @click.option('--concurrency', type=int, help='Evaluation threads (defaults to EVALUATION_CONCURRENCY).')
+    @click.option('--latency', default=0.5, show_default=True, help='Simulated seconds per AI call.')
+    @click.option('--jitter', default=0.5, show_default=True, help='Extra random seconds per AI call, up to this.')
+    @click.option('--failure-rate', default=0.0, show_default=True, help='Share of AI calls that fail.')
+    def evaluation_benchmark(submissions, concurrency, latency, jitter, failure_rate):
+        """
+        Measure evaluation engine throughput against the offline AI stub.
+        
+        Creates a throwaway competition with synthetic submissions, evaluates
+        it and removes everything again; run it against a development database.
+        """
+        import time
+        from datetime import datetime, timedelta
+        from bson import ObjectId
+        from flask import current_app
+        from app import mongo
+        from app.models import Competition, CompetitionSubmission, AIEvaluation
+        from app.services.ai_provider_service import ai_provider, StubProvider
+        from app.services.ai_service import ai_scheduler
+        from app.services.counts_service import counts_service
+        from app.services.evaluation_service import evaluation_engine, EVALUATION_JOBS_COLLECTION
+        from app.services.job_service import JOBS_COLLECTION
+        from app.services.rollup_service import rollup_service
+        
+        config = current_app.config
+        saved = ai_provider.provider, dict(config)
+        ai_provider.provider = StubProvider(latency=latency, jitter=jitter, failure_rate=failure_rate, seed=1)
+        config.update(JOBS_ASYNC=False, AI_CACHE_ENABLED=False, EVALUATION_RETRY_BACKOFF=0.1)
+        if concurrency:
+            config['EVALUATION_CONCURRENCY'] = concurrency
+        
+        now = datetime.utcnow()
+        competition_id = Competition.create(
+            '[benchmark] Evaluation throughput', 'Synthetic competition created by flask evaluation-benchmark',
+            ['Literary Fiction'], now - timedelta(days=30), now - timedelta(days=1),
+            {'prose_quality': 40, 'plot': 30, 'originality': 30}, 1, 0, {}, str(ObjectId())
+        )
+        try:
+            for number in range(submissions):
+                CompetitionSubmission.create(competition_id, str(ObjectId()), f'Benchmark manuscript {number}',
+                                             '', 60000 + number, 'Literary Fiction',
+                                             f'Synthetic synopsis number {number} for throughput testing.')
+            
+            started = time.monotonic()
+            evaluation_engine.start(competition_id)
+            elapsed = time.monotonic() - started
+            job = evaluation_engine.status(competition_id)
+            click.echo(f"Evaluated {job['done']} of {job['total']} submissions ({job['failed']} failed) "
+                       f"in {elapsed:.1f}s with {config['EVALUATION_CONCURRENCY']} threads: "
+                       f"{job['done'] / elapsed:.2f} submissions/s, {ai_provider.provider.calls} AI calls.")
+            lane = ai_scheduler.metrics()['lanes']['batch']
+            if lane['latency_p50'] is not None:
+                click.echo(f"AI call latency p50 {lane['latency_p50']:.2f}s, p95 {lane['latency_p95']:.2f}s; "
+                           f"queue wait p95 {lane['wait_p95']:.2f}s.")
+        finally:
+            mongo.db[AIEvaluation.collection].delete_many({'competition_id': competition_id})
+            mongo.db[CompetitionSubmission.collection].delete_many({'competition_id': competition_id})
+            mongo.db[EVALUATION_JOBS_COLLECTION].delete_one({'_id': str(competition_id)})
+            mongo.db[Competition.collection].delete_one({'_id': competition_id})
+            mongo.db[JOBS_COLLECTION].delete_many({'unique_key': f'evaluate:{competition_id}'})
+            for collection in (Competition.collection, CompetitionSubmission.collection, AIEvaluation.collection):
+                counts_service.invalidate(collection)
+            for metric in ('submissions', 'evaluations'):
+                rollup_service.rebuild(metric)
+            ai_provider.provider = saved[0]
+            config.clear()
+            config.update(saved[1])
@@ -0,0 +1,134 @@
+"""Declarative index registry for MongoDB collections.
+
+Each model class declares an ``indexes`` list of ``pymongo.IndexModel``
+next to its ``collection`` name. ``sync_indexes`` compares those
+declarations with what the cluster has, creates anything missing and
+reports drift; it is idempotent and safe to run on every deploy. An
+index that cannot be built (say, a unique index over duplicate values)
+is reported and the remaining indexes are still synced.
+"""
+import logging
+from pymongo.errors import PyMongoError
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+# Index options that change index behaviour and so count as drift
+COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+
+def registered_models():
+    """Return every model class that declares indexes."""
+    from app import models, models_audit, security
+    
+    found = []
+    for module in (models, models_audit, security):
+        for value in vars(module).values():
+            if (isinstance(value, type) and value.__module__ == module.__name__
+                    and getattr(value, 'collection', None) and getattr(value, 'indexes', None)):
+                found.append(value)
+    return found
+
+
+def _normalize(spec):
+    """Reduce an index spec to the parts that matter for comparison."""
+    items = spec['key'].items() if hasattr(spec['key'], 'items') else spec['key']
+    # Indexes created by other tools may report directions as floats
+    key = [(field, direction if isinstance(direction, str) else int(direction))
+           for field, direction in items]
+    options = {}
+    for option in COMPARED_OPTIONS:
+        if option in spec:
+            value = spec[option]
+            options[option] = dict(value) if hasattr(value, 'items') else value
+    return key, options
+
+
+def sync_indexes(db=None, apply=True, drop_extra=False, rebuild_drifted=False):
+    """
+    Bring cluster indexes in line with the model declarations.
+    
+    Args:
+        db: Database to use (defaults to mongo.db)
+        apply: Create missing indexes; False only reports
+        drop_extra: Drop indexes on the cluster that no model declares
+        rebuild_drifted: Drop and recreate indexes whose key or options changed
+    
+    Returns:
+        dict: Lists of 'created', 'unchanged', 'drifted' and 'extra' entries,
+        each formatted as 'collection.index_name', and 'failed' entries
+        formatted as 'collection.index_name: error'
+    """
+    db = db if db is not None else mongo.db
+    report = {'created': [], 'unchanged': [], 'drifted': [], 'extra': [], 'failed': []}
+    
+    declared = {}
+    for model in registered_models():
+        # Partitioned models (AuditLog) declare the same indexes on every partition
+        names = [model.collection] + (model.partitions(db=db) if hasattr(model, 'partitions') else [])
+        for name in dict.fromkeys(names):
+            declared.setdefault(name, []).extend(model.indexes)
+    
+    for collection_name, indexes in sorted(declared.items()):
+        collection = db[collection_name]
+        try:
+            existing = collection.index_information()
+        except PyMongoError as e:
+            report['failed'].append(f'{collection_name}.*: {e}')
+            logger.error(f'Could not read indexes of {collection_name}: {e}')
+            continue
+        wanted = {}
+        
+        for index in indexes:
+            spec = index.document
+            name = spec['name']
+            wanted[name] = spec
+            label = f'{collection_name}.{name}'
+            
+            try:
+                if name not in existing:
+                    if apply:
+                        collection.create_indexes([index])
+                    report['created'].append(label)
+                elif _normalize(existing[name]) != _normalize(spec):
+                    if apply and rebuild_drifted:
+                        collection.drop_index(name)
+                        collection.create_indexes([index])
+                    report['drifted'].append(label)
+                else:
+                    report['unchanged'].append(label)
+            except PyMongoError as e:
+                report['failed'].append(f'{label}: {e}')
+                logger.error(f'Could not build index {label}: {e}')
+        
+        for name in existing:
+            if name == '_id_' or name in wanted:
+                continue
+            label = f'{collection_name}.{name}'
+            try:
+                if apply and drop_extra:
+                    collection.drop_index(name)
+                report['extra'].append(label)
+            except PyMongoError as e:
+                report['failed'].append(f'{label}: {e}')
+                logger.error(f'Could not drop index {label}: {e}')
+    
+    return report
+
+
+def init_app(app):
+    """Create missing indexes at startup when MONGO_ENSURE_INDEXES is enabled."""
+    if not app.config.get('MONGO_ENSURE_INDEXES'):
+        return
+    
+    try:
+        with app.app_context():
+            report = sync_indexes()
+        if report['created']:
+            app.logger.info(f"Created indexes: {', '.join(report['created'])}")
+        if report['drifted']:
+            app.logger.warning(f"Index drift detected: {', '.join(report['drifted'])}. Run 'flask db-indexes --rebuild-drifted'.")
+        if report['failed']:
+            app.logger.error(f"Failed to build indexes: {'; '.join(report['failed'])}")
+    except Exception as e:
+        app.logger.error(f"Failed to ensure MongoDB indexes: {e}")
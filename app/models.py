@@ -1,13 +1,195 @@
 """Database models using PyMongo."""
+import base64
+import binascii
+import json
 from datetime import datetime
-from bson import ObjectId
+from bson import ObjectId, json_util
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT, ReturnDocument
 from app import mongo, bcrypt
+from app.services.search_service import search_service, document_keywords
+from app.services.autocomplete_service import autocomplete_service
+from app.services.counts_service import counts_service, filter_key
+from app.services.rollup_service import rollup_service, ROLLUP_COLLECTION
+from app.services.page_cache_service import page_cache_service, PAGE_CACHE_COLLECTION
+from app.services.cache_service import cache
+from app.services.evaluation_service import EVALUATION_JOBS_COLLECTION
+from app.services.job_service import JOBS_COLLECTION, JOB_INPUTS_COLLECTION
+from app.services.ai_cache_service import AI_CACHE_COLLECTION
+from app.services.ai_service import AI_USAGE_COLLECTION
+from app.services.media_service import MEDIA_COLLECTION, MEDIA_STAGING_COLLECTION
+from app.services.media_migration_service import MIGRATION_COLLECTION
+from app.services.direct_upload_service import UPLOAD_TICKETS_COLLECTION
+
+
+def update_searchable(model, doc_id, data):
+    """Apply a $set update and keep the document's search keywords current.
+    
+    Returns the updated document when a searchable field changed, else None.
+    """
+    if not any(field in data for field in model.search_weights):
+        mongo.db[model.collection].update_one({'_id': ObjectId(doc_id)}, {'$set': data})
+        return None
+    
+    doc = mongo.db[model.collection].find_one_and_update(
+        {'_id': ObjectId(doc_id)},
+        {'$set': data},
+        return_document=ReturnDocument.AFTER
+    )
+    if doc:
+        keywords = document_keywords(model, doc)
+        if keywords != doc.get('search_keywords'):
+            mongo.db[model.collection].update_one({'_id': doc['_id']}, {'$set': {'search_keywords': keywords}})
+        search_service.index_document(model, doc)
+    return doc
+
+
+def encode_cursor(state):
+    """Encode pagination state as an opaque URL-safe token."""
+    return base64.urlsafe_b64encode(json_util.dumps(state).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token from encode_cursor; raises ValueError if it is malformed."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        state = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(state, dict):
+        raise ValueError('Invalid cursor')
+    return state
+
+
+def keyset_sort(sort):
+    """Return the sort with _id appended as a tiebreaker, so every key is unique."""
+    sort = [(field, direction) for field, direction in sort]
+    if not any(field == '_id' for field, _ in sort):
+        sort.append(('_id', sort[-1][1] if sort else -1))
+    return sort
+
+
+def _field_value(doc, field):
+    """Read a possibly dotted field from a document."""
+    for part in field.split('.'):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc
+
+
+def keyset_filter(filters, sort, after):
+    """
+    Restrict filters to documents that sort after the given key values.
+    
+    Missing and null values sort lowest in MongoDB, so they come last in
+    descending order and first in ascending order.
+    """
+    clauses = []
+    for position, (field, direction) in enumerate(sort):
+        clause = {name: after[index] for index, (name, _) in enumerate(sort[:position])}
+        value = after[position]
+        if value is None:
+            if direction < 0:
+                continue  # Nothing sorts below null
+            clause[field] = {'$ne': None}
+        elif direction > 0:
+            clause[field] = {'$gt': value}
+        else:
+            clause['$or'] = [{field: {'$lt': value}}, {field: None}]
+        clauses.append(clause)
+    
+    keyset = {'$or': clauses} if clauses else {'_id': {'$exists': False}}
+    return {'$and': [filters, keyset]} if filters else keyset
+
+
+def keyset_page(find, filters=None, sort=None, cursor=None, limit=20, skip=0):
+    """
+    Fetch one page of results after an opaque cursor.
+    
+    With a sort, pages are keyed on the sort fields plus _id, so page depth
+    costs nothing and inserts never shift later pages. Without one (search
+    relevance ranking, which has no stable key) the cursor carries an offset.
+    skip is only honoured for the first page, for numbered-page links.
+    
+    Args:
+        find: callable(filters, sort, skip, limit) returning a list of documents
+    
+    Returns:
+        tuple: (documents, next cursor or None)
+    
+    Raises:
+        ValueError: if the cursor is malformed or belongs to another sort
+    """
+    state = decode_cursor(cursor) if cursor else {}
+    
+    if not sort:
+        offset = state.get('offset', skip)
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError('Invalid cursor')
+        docs = find(filters, None, offset, limit + 1)
+        next_cursor = encode_cursor({'offset': offset + limit}) if len(docs) > limit else None
+        return docs[:limit], next_cursor
+    
+    sort = keyset_sort(sort)
+    if cursor:
+        after = state.get('after')
+        if state.get('sort') != [[field, direction] for field, direction in sort]:
+            raise ValueError('Cursor does not match the requested sort')
+        if (not isinstance(after, list) or len(after) != len(sort)
+                or any(isinstance(value, (dict, list)) for value in after)):
+            raise ValueError('Invalid cursor')
+        filters = keyset_filter(filters, sort, after)
+        skip = 0
+    
+    docs = find(filters, sort, skip, limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        last = docs[limit - 1]
+        next_cursor = encode_cursor({
+            'sort': [[field, direction] for field, direction in sort],
+            'after': [_field_value(last, field) for field, _ in sort]
+        })
+    return docs[:limit], next_cursor
+
+
+def collection_finder(collection):
+    """Return a keyset_page find callable over a plain collection query."""
+    def find(filters, sort, skip, limit):
+        cursor = mongo.db[collection].find(filters or {})
+        if sort:
+            cursor = cursor.sort(sort)
+        return list(cursor.skip(skip).limit(limit))
+    return find
+
+
+def estimated_search_count(model, query='', filters=None, prefix=False):
+    """Return a listing total from the counts cache instead of counting on every request."""
+    if not query:
+        return counts_service.count(model.collection, filters)
+    return counts_service.cached(
+        (model.collection, query, prefix, filter_key(filters)),
+        lambda: model.count_search(query, filters, prefix=prefix)
+    )
 
 
 class User:
     """User model."""
     
     collection = 'users'
+    indexes = [
+        IndexModel([('email', ASCENDING)], unique=True),
+        # Sparse: users imported without a username do not collide
+        IndexModel([('username', ASCENDING)], unique=True, sparse=True),
+        # Not unique: IDs are derived from the user count and can repeat after deletions
+        IndexModel([('user_id', ASCENDING)]),
+        IndexModel([('created_at', DESCENDING)]),
+        IndexModel([('full_name', TEXT), ('username', TEXT), ('user_id', TEXT), ('email', TEXT), ('bio', TEXT)],
+                   weights={'full_name': 10, 'username': 8, 'user_id': 8, 'email': 5, 'bio': 1},
+                   name='search_text'),
+        IndexModel([('search_keywords', ASCENDING)])
+    ]
+    
+    # Searchable fields and their relevance weights (see app/services/search_service.py)
+    search_weights = {'full_name': 10, 'username': 8, 'user_id': 8, 'email': 5, 'bio': 1}
+    default_sort = [('created_at', -1)]
     
     @staticmethod
     def create(email, password, full_name, bio='', role='user'):
@@ -70,8 +252,13 @@ class User:
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
+        user_data['search_keywords'] = document_keywords(User, user_data)
         
         result = mongo.db[User.collection].insert_one(user_data)
+        counts_service.record_insert(User.collection, user_data)
+        rollup_service.record('registrations', user_data)
+        search_service.index_document(User, user_data)
+        autocomplete_service.user_changed(user_data)
         return result.inserted_id
     
     @staticmethod
@@ -80,32 +267,41 @@ class User:
         return mongo.db[User.collection].find_one({'email': email.lower()})
     
     @staticmethod
+    @cache.memoize(ttl=300, tags=lambda user_id: [f'users:{user_id}'])
     def find_by_id(user_id):
-        """Find user by ID."""
+        """Find user by ID (cached; writes through User methods invalidate it)."""
         try:
             return mongo.db[User.collection].find_one({'_id': ObjectId(user_id)})
         except:
             return None
     
+    @staticmethod
+    def find_by_ids(user_ids):
+        """Find several users with a single query, keyed by string ID."""
+        object_ids = []
+        for user_id in set(str(uid) for uid in user_ids if uid):
+            try:
+                object_ids.append(ObjectId(user_id))
+            except:
+                continue
+        if not object_ids:
+            return {}
+        users = mongo.db[User.collection].find({'_id': {'$in': object_ids}})
+        return {str(user['_id']): user for user in users}
+    
     @staticmethod
     def find_by_username(username):
         """Find user by username."""
         return mongo.db[User.collection].find_one({'username': username})
     
     @staticmethod
-    def search(query='', filters=None, skip=0, limit=20, sort=None):
-        """Search users with filters."""
-        search_filters = filters if filters else {}
+    def search(query='', filters=None, skip=0, limit=20, sort=None, prefix=False):
+        """Search users with filters, ranked by relevance unless sort is given."""
+        search_filters = dict(filters) if filters else {}
         
-        # Add text search if query provided
         if query:
-            search_filters['$or'] = [
-                {'full_name': {'$regex': query, '$options': 'i'}},
-                {'email': {'$regex': query, '$options': 'i'}},
-                {'bio': {'$regex': query, '$options': 'i'}},
-                {'username': {'$regex': query, '$options': 'i'}},
-                {'user_id': {'$regex': query, '$options': 'i'}}
-            ]
+            return search_service.search(User, query, search_filters, skip=skip, limit=limit,
+                                         sort=sort, prefix=prefix)
         
         cursor = mongo.db[User.collection].find(search_filters)
         
@@ -115,21 +311,26 @@ class User:
         return list(cursor.skip(skip).limit(limit))
     
     @staticmethod
-    def count_search(query='', filters=None):
+    def count_search(query='', filters=None, prefix=False):
         """Count users matching search."""
-        search_filters = filters if filters else {}
+        search_filters = dict(filters) if filters else {}
         
         if query:
-            search_filters['$or'] = [
-                {'full_name': {'$regex': query, '$options': 'i'}},
-                {'email': {'$regex': query, '$options': 'i'}},
-                {'bio': {'$regex': query, '$options': 'i'}},
-                {'username': {'$regex': query, '$options': 'i'}},
-                {'user_id': {'$regex': query, '$options': 'i'}}
-            ]
+            return search_service.count(User, query, search_filters, prefix=prefix)
         
         return mongo.db[User.collection].count_documents(search_filters)
     
+    @staticmethod
+    def search_page(query='', filters=None, sort=None, cursor=None, limit=20, skip=0, prefix=False):
+        """Return (results, next_cursor) for one keyset page of search results."""
+        def find(page_filters, page_sort, page_skip, page_limit):
+            return User.search(query, page_filters, skip=page_skip, limit=page_limit,
+                               sort=page_sort, prefix=prefix)
+        
+        if not sort and not query:
+            sort = User.default_sort
+        return keyset_page(find, filters, sort, cursor=cursor, limit=limit, skip=skip)
+    
     @staticmethod
     def verify_password(user, password):
         """Verify user password."""
@@ -139,10 +340,21 @@ class User:
     def update(user_id, data):
         """Update user."""
         data['updated_at'] = datetime.utcnow()
-        mongo.db[User.collection].update_one(
-            {'_id': ObjectId(user_id)},
-            {'$set': data}
-        )
+        user = update_searchable(User, user_id, data)
+        if user:
+            autocomplete_service.user_changed(user)
+        counts_service.invalidate(User.collection, keep_total=True)
+        cache.invalidate_tag(f'users:{user_id}')
+    
+    @staticmethod
+    def delete(user_id):
+        """Delete a user document (callers remove the user's books and reviews)."""
+        user = mongo.db[User.collection].find_one_and_delete({'_id': ObjectId(user_id)})
+        if user:
+            search_service.remove_document(User, user['_id'])
+            autocomplete_service.user_removed(user['_id'])
+            counts_service.record_delete(User.collection, user)
+        cache.invalidate_tag(f'users:{user_id}')
     
     @staticmethod
     def is_admin(user):
@@ -150,15 +362,20 @@ class User:
         return user and user.get('role') == 'admin'
     
     @staticmethod
-    def award_badge(user_id, badge_type, badge_name, badge_icon, competition_id=None):
-        """Award a badge to a user."""
-        badge = {
+    def _badge(badge_type, badge_name, badge_icon, competition_id=None):
+        """Build a badge entry."""
+        return {
             'type': badge_type,  # 'competition_winner', 'competition_finalist', 'achievement'
             'name': badge_name,
             'icon': badge_icon,
             'earned_date': datetime.utcnow(),
             'competition_id': competition_id
         }
+    
+    @staticmethod
+    def award_badge(user_id, badge_type, badge_name, badge_icon, competition_id=None):
+        """Award a badge to a user."""
+        badge = User._badge(badge_type, badge_name, badge_icon, competition_id)
         
         mongo.db[User.collection].update_one(
             {'_id': ObjectId(user_id)},
@@ -167,6 +384,37 @@ class User:
                 '$set': {'updated_at': datetime.utcnow()}
             }
         )
+        cache.invalidate_tag(f'users:{user_id}')
+    
+    @staticmethod
+    def record_competition_win(user_id, submission_id, rank, badge=None):
+        """
+        Count a winning submission in the user's stats and award its badge.
+        
+        Applied once per submission in a single update, so repeating it
+        (a retried announcement) changes nothing.
+        
+        Args:
+            badge: Optional dict of award_badge's badge_type, badge_name,
+                badge_icon and competition_id
+        
+        Returns:
+            bool: True if the win was recorded now, False if it already was
+        """
+        update = {
+            '$inc': {'competition_stats.total_wins': 1, 'competition_stats.total_finalist': 1},
+            '$addToSet': {'won_submissions': ObjectId(submission_id)},
+            '$set': {'updated_at': datetime.utcnow()}
+        }
+        if badge:
+            update['$push'] = {'badges': User._badge(**badge)}
+        result = mongo.db[User.collection].update_one(
+            {'_id': ObjectId(user_id), 'won_submissions': {'$ne': ObjectId(submission_id)}},
+            update
+        )
+        # Only ever lowers, so it is safe to repeat
+        User.update_competition_stats(user_id, {'best_rank': rank})
+        return result.modified_count > 0
     
     @staticmethod
     def update_competition_stats(user_id, stat_updates):
@@ -187,6 +435,7 @@ class User:
             {'_id': ObjectId(user_id)},
             {'$set': update_fields}
         )
+        cache.invalidate_tag(f'users:{user_id}')
     
     @staticmethod
     def get_competition_stats(user_id):
@@ -207,6 +456,19 @@ class Book:
     """Book model."""
     
     collection = 'books'
+    indexes = [
+        IndexModel([('user_id', ASCENDING)]),
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING)]),
+        IndexModel([('genre', ASCENDING)]),
+        IndexModel([('title', TEXT), ('subtitle', TEXT), ('genre', TEXT), ('description', TEXT), ('isbn', TEXT)],
+                   weights={'title': 10, 'subtitle': 5, 'genre': 3, 'description': 1, 'isbn': 1},
+                   name='search_text'),
+        IndexModel([('search_keywords', ASCENDING)])
+    ]
+    
+    # Searchable fields and their relevance weights (see app/services/search_service.py)
+    search_weights = {'title': 10, 'subtitle': 5, 'genre': 3, 'description': 1, 'isbn': 1}
+    default_sort = [('created_at', -1)]
     
     @staticmethod
     def create(user_id, data):
@@ -262,16 +524,27 @@ class Book:
             'favorites_count': 0,
             'shares_count': 0,
             'sample_reads': 0,
+            # Denormalized rating aggregates, maintained by Review status changes
+            'rating_sum': 0,
+            'rating_count': 0,
+            'rating_histogram': Book.empty_rating_histogram(),
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
+        book_data['search_keywords'] = document_keywords(Book, book_data)
         
         result = mongo.db[Book.collection].insert_one(book_data)
+        counts_service.record_insert(Book.collection, book_data)
+        rollup_service.record('books_added', book_data)
+        search_service.index_document(Book, book_data)
+        autocomplete_service.book_changed(book_data)
+        page_cache_service.invalidate('home')
         return result.inserted_id
     
     @staticmethod
+    @cache.memoize(ttl=300, tags=lambda book_id: [f'books:{book_id}', 'books'])
     def find_by_id(book_id):
-        """Find book by ID."""
+        """Find book by ID (cached; writes through Book methods invalidate it)."""
         try:
             return mongo.db[Book.collection].find_one({'_id': ObjectId(book_id)})
         except:
@@ -300,58 +573,151 @@ class Book:
         return list(mongo.db[Book.collection].find({'user_id': ObjectId(user_id)}))
     
     @staticmethod
-    def search(query='', filters=None, skip=0, limit=20, sort=None):
-        """Search books with filters."""
-        search_filters = filters if filters else {}
+    def search(query='', filters=None, skip=0, limit=20, sort=None, prefix=False):
+        """Search books with filters, ranked by relevance unless sort is given."""
+        search_filters = dict(filters) if filters else {}
         
-        # Add text search if query provided
         if query:
-            search_filters['$or'] = [
-                {'title': {'$regex': query, '$options': 'i'}},
-                {'subtitle': {'$regex': query, '$options': 'i'}},
-                {'description': {'$regex': query, '$options': 'i'}},
-                {'genre': {'$regex': query, '$options': 'i'}},
-                {'isbn': {'$regex': query, '$options': 'i'}}
-            ]
+            return search_service.search(Book, query, search_filters, skip=skip, limit=limit,
+                                         sort=sort, prefix=prefix)
         
         cursor = mongo.db[Book.collection].find(search_filters)
-        
-        if sort:
-            cursor = cursor.sort(sort)
-        else:
-            cursor = cursor.sort([('created_at', -1)])
+        cursor = cursor.sort(sort or Book.default_sort)
         
         return list(cursor.skip(skip).limit(limit))
     
     @staticmethod
-    def count_search(query='', filters=None):
+    def count_search(query='', filters=None, prefix=False):
         """Count books matching search."""
-        search_filters = filters if filters else {}
+        search_filters = dict(filters) if filters else {}
         
         if query:
-            search_filters['$or'] = [
-                {'title': {'$regex': query, '$options': 'i'}},
-                {'subtitle': {'$regex': query, '$options': 'i'}},
-                {'description': {'$regex': query, '$options': 'i'}},
-                {'genre': {'$regex': query, '$options': 'i'}},
-                {'isbn': {'$regex': query, '$options': 'i'}}
-            ]
+            return search_service.count(Book, query, search_filters, prefix=prefix)
         
         return mongo.db[Book.collection].count_documents(search_filters)
     
+    @staticmethod
+    def search_page(query='', filters=None, sort=None, cursor=None, limit=20, skip=0, prefix=False):
+        """Return (results, next_cursor) for one keyset page of search results."""
+        def find(page_filters, page_sort, page_skip, page_limit):
+            return Book.search(query, page_filters, skip=page_skip, limit=page_limit,
+                               sort=page_sort, prefix=prefix)
+        
+        if not sort and not query:
+            sort = Book.default_sort
+        return keyset_page(find, filters, sort, cursor=cursor, limit=limit, skip=skip)
+    
     @staticmethod
     def update(book_id, data):
         """Update book."""
         data['updated_at'] = datetime.utcnow()
-        mongo.db[Book.collection].update_one(
-            {'_id': ObjectId(book_id)},
-            {'$set': data}
-        )
+        book = update_searchable(Book, book_id, data)
+        if book is None and 'status' in data:
+            book = Book.find_by_id(book_id)
+        if book:
+            autocomplete_service.book_changed(book)
+        counts_service.invalidate(Book.collection, keep_total=True)
+        page_cache_service.invalidate('home')
+        cache.invalidate_tag(f'books:{book_id}')
     
     @staticmethod
     def delete(book_id):
         """Delete book."""
-        mongo.db[Book.collection].delete_one({'_id': ObjectId(book_id)})
+        book = mongo.db[Book.collection].find_one_and_delete({'_id': ObjectId(book_id)})
+        search_service.remove_document(Book, ObjectId(book_id))
+        autocomplete_service.book_removed(book_id, book['user_id'] if book else None)
+        if book:
+            counts_service.record_delete(Book.collection, book)
+            page_cache_service.invalidate('home')
+        cache.invalidate_tag(f'books:{book_id}')
+    
+    @staticmethod
+    def delete_by_user(user_id):
+        """Delete every book of a user."""
+        book_ids = [book['_id'] for book in mongo.db[Book.collection].find({'user_id': ObjectId(user_id)}, {'_id': 1})]
+        mongo.db[Book.collection].delete_many({'_id': {'$in': book_ids}})
+        for book_id in book_ids:
+            search_service.remove_document(Book, book_id)
+            autocomplete_service.book_removed(book_id, user_id)
+            cache.invalidate_tag(f'books:{book_id}')
+        counts_service.invalidate(Book.collection)
+        page_cache_service.invalidate('home')
+    
+    @staticmethod
+    def enrich_many(books):
+        """Attach author and rating info to a list of books.
+        
+        Loads every author with one $in query; ratings come from the
+        aggregates stored on each book document.
+        """
+        if not books:
+            return books
+        
+        authors = User.find_by_ids(book.get('user_id') for book in books)
+        Book.backfill_ratings(books)
+        
+        for book in books:
+            book['author'] = authors.get(str(book.get('user_id')))
+            book['rating_info'] = Book.get_rating_info(book)
+        
+        return books
+    
+    @staticmethod
+    def empty_rating_histogram():
+        """Return a zeroed rating histogram keyed by star value."""
+        return {str(stars): 0 for stars in range(1, 6)}
+    
+    @staticmethod
+    def get_rating_info(book):
+        """Get average rating and review count from a book's stored aggregates."""
+        count = book.get('rating_count', 0) if book else 0
+        if count <= 0:
+            return {'average': 0, 'count': 0}
+        return {'average': round(book.get('rating_sum', 0) / count, 1), 'count': count}
+    
+    @staticmethod
+    def backfill_ratings(books):
+        """Store rating aggregates on books created before they were maintained.
+        
+        Books missing 'rating_count' get theirs computed from approved
+        reviews with one aggregation; the given dicts are updated in place.
+        """
+        missing = {book['_id']: book for book in books if book and 'rating_count' not in book}
+        if not missing:
+            return
+        
+        aggregates = Review.rating_aggregates(list(missing))
+        for book_id, book in missing.items():
+            entry = aggregates.get(book_id) or Book.empty_rating_aggregates()
+            # Only the first backfill wins; $inc keeps later changes exact
+            mongo.db[Book.collection].update_one(
+                {'_id': book_id, 'rating_count': {'$exists': False}},
+                {'$set': entry}
+            )
+            book.update(entry)
+            cache.invalidate_tag(f'books:{book_id}')
+    
+    @staticmethod
+    def empty_rating_aggregates():
+        """Return the rating aggregates of a book without approved reviews."""
+        return {'rating_sum': 0, 'rating_count': 0, 'rating_histogram': Book.empty_rating_histogram()}
+    
+    @staticmethod
+    def apply_rating(book_id, rating, delta):
+        """Atomically add (delta=1) or remove (delta=-1) a rating from a book's aggregates."""
+        result = mongo.db[Book.collection].update_one(
+            {'_id': ObjectId(book_id), 'rating_count': {'$exists': True}},
+            {'$inc': {
+                'rating_sum': rating * delta,
+                'rating_count': delta,
+                f'rating_histogram.{int(rating)}': delta
+            }}
+        )
+        if not result.matched_count:
+            # A book from before aggregates: count it from its reviews, which
+            # already include this change
+            Book.backfill_ratings([{'_id': ObjectId(book_id)}])
+        cache.invalidate_tag(f'books:{book_id}')
     
     @staticmethod
     def increment_views(book_id):
@@ -366,6 +732,11 @@ class Review:
     """Review model."""
     
     collection = 'reviews'
+    indexes = [
+        IndexModel([('book_id', ASCENDING), ('status', ASCENDING), ('created_at', DESCENDING)]),
+        IndexModel([('reviewer_id', ASCENDING)]),
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING)])
+    ]
     
     @staticmethod
     def create(book_id, reviewer_id, rating, review_text):
@@ -383,6 +754,8 @@ class Review:
         }
         
         result = mongo.db[Review.collection].insert_one(review_data)
+        counts_service.record_insert(Review.collection, review_data)
+        rollup_service.record('reviews', review_data)
         return result.inserted_id
     
     @staticmethod
@@ -408,16 +781,48 @@ class Review:
     
     @staticmethod
     def update_status(review_id, status):
-        """Update review status."""
-        mongo.db[Review.collection].update_one(
+        """Update review status and keep the book's rating aggregates in step."""
+        previous = mongo.db[Review.collection].find_one_and_update(
             {'_id': ObjectId(review_id)},
             {'$set': {'status': status, 'updated_at': datetime.utcnow()}}
         )
+        if not previous:
+            return
+        
+        was_approved = previous.get('status') == 'approved'
+        is_approved = status == 'approved'
+        if was_approved != is_approved:
+            Book.apply_rating(previous['book_id'], previous['rating'], 1 if is_approved else -1)
+            page_cache_service.invalidate('home')
+        counts_service.record_update(Review.collection, previous, dict(previous, status=status))
     
     @staticmethod
     def delete(review_id):
-        """Delete review."""
-        mongo.db[Review.collection].delete_one({'_id': ObjectId(review_id)})
+        """Delete review, removing its rating from the book if it was approved."""
+        review = mongo.db[Review.collection].find_one_and_delete({'_id': ObjectId(review_id)})
+        if review and review.get('status') == 'approved':
+            Book.apply_rating(review['book_id'], review['rating'], -1)
+            page_cache_service.invalidate('home')
+        if review:
+            counts_service.record_delete(Review.collection, review)
+    
+    @staticmethod
+    def delete_by_reviewer(reviewer_id):
+        """Delete all reviews by a reviewer, removing approved ratings from their books."""
+        approved = mongo.db[Review.collection].find(
+            {'reviewer_id': ObjectId(reviewer_id), 'status': 'approved'},
+            {'book_id': 1, 'rating': 1}
+        )
+        for review in approved:
+            Book.apply_rating(review['book_id'], review['rating'], -1)
+        mongo.db[Review.collection].delete_many({'reviewer_id': ObjectId(reviewer_id)})
+        counts_service.invalidate(Review.collection)
+    
+    @staticmethod
+    def delete_by_book(book_id):
+        """Delete all reviews of a book that is being deleted."""
+        mongo.db[Review.collection].delete_many({'book_id': ObjectId(book_id)})
+        counts_service.invalidate(Review.collection)
     
     @staticmethod
     def get_average_rating(book_id):
@@ -430,12 +835,77 @@ class Review:
         if result:
             return {'average': round(result[0]['avg_rating'], 1), 'count': result[0]['count']}
         return {'average': 0, 'count': 0}
+    
+    @staticmethod
+    def get_average_ratings(book_ids):
+        """Get average ratings for several books with one aggregation, keyed by string ID."""
+        object_ids = [ObjectId(book_id) for book_id in set(str(bid) for bid in book_ids)]
+        if not object_ids:
+            return {}
+        pipeline = [
+            {'$match': {'book_id': {'$in': object_ids}, 'status': 'approved'}},
+            {'$group': {'_id': '$book_id', 'avg_rating': {'$avg': '$rating'}, 'count': {'$sum': 1}}}
+        ]
+        return {
+            str(row['_id']): {'average': round(row['avg_rating'], 1), 'count': row['count']}
+            for row in mongo.db[Review.collection].aggregate(pipeline)
+        }
+    
+    @staticmethod
+    def rating_aggregates(book_ids=None):
+        """Compute rating sum, count and histogram from approved reviews.
+        
+        Returns a dict keyed by book ObjectId, for the given books or all books.
+        """
+        match = {'status': 'approved'}
+        if book_ids is not None:
+            match['book_id'] = {'$in': [ObjectId(book_id) for book_id in book_ids]}
+        pipeline = [
+            {'$match': match},
+            {'$group': {'_id': {'book_id': '$book_id', 'rating': '$rating'}, 'count': {'$sum': 1}}}
+        ]
+        aggregates = {}
+        for row in mongo.db[Review.collection].aggregate(pipeline, allowDiskUse=True):
+            rating = int(row['_id']['rating'])
+            entry = aggregates.setdefault(row['_id']['book_id'], Book.empty_rating_aggregates())
+            entry['rating_sum'] += rating * row['count']
+            entry['rating_count'] += row['count']
+            entry['rating_histogram'][str(rating)] += row['count']
+        return aggregates
+    
+    @staticmethod
+    def rebuild_rating_aggregates():
+        """Recompute every book's rating aggregates from approved reviews.
+        
+        Returns the number of books that have at least one approved review.
+        """
+        from pymongo import UpdateOne
+        
+        aggregates = Review.rating_aggregates()
+        rebuilt_at = datetime.utcnow()
+        operations = [
+            UpdateOne({'_id': book_id}, {'$set': dict(entry, rating_rebuilt_at=rebuilt_at)})
+            for book_id, entry in aggregates.items()
+        ]
+        for start in range(0, len(operations), 1000):
+            mongo.db[Book.collection].bulk_write(operations[start:start + 1000], ordered=False)
+        
+        # Books with no approved reviews were not touched above
+        mongo.db[Book.collection].update_many(
+            {'rating_rebuilt_at': {'$ne': rebuilt_at}},
+            {'$set': dict(Book.empty_rating_aggregates(), rating_rebuilt_at=rebuilt_at)}
+        )
+        cache.invalidate_tag('books')
+        return len(aggregates)
 
 
 class ReviewRequest:
     """Review request model."""
     
     collection = 'review_requests'
+    indexes = [
+        IndexModel([('requested_user_id', ASCENDING), ('status', ASCENDING)])
+    ]
     
     @staticmethod
     def create(book_id, requester_id, requested_user_id, message=''):
@@ -473,6 +943,11 @@ class Article:
     """Article model."""
     
     collection = 'articles'
+    indexes = [
+        IndexModel([('slug', ASCENDING)]),
+        IndexModel([('status', ASCENDING), ('published_at', DESCENDING)]),
+        IndexModel([('status', ASCENDING), ('category', ASCENDING), ('published_at', DESCENDING)])
+    ]
     
     @staticmethod
     def create(author_id, title, content, category, excerpt='', status='draft'):
@@ -497,6 +972,7 @@ class Article:
         }
         
         result = mongo.db[Article.collection].insert_one(article_data)
+        cache.invalidate_tag(f'articles:{slug}')
         return result.inserted_id
     
     @staticmethod
@@ -514,8 +990,18 @@ class Article:
         ).sort('published_at', -1).skip(skip).limit(limit))
     
     @staticmethod
+    def published_page(category=None, cursor=None, limit=20, skip=0):
+        """Return (articles, next_cursor) for one keyset page of published articles."""
+        filters = {'status': 'published'}
+        if category:
+            filters['category'] = category
+        return keyset_page(collection_finder(Article.collection), filters, [('published_at', -1)],
+                           cursor=cursor, limit=limit, skip=skip)
+    
+    @staticmethod
+    @cache.memoize(ttl=60, tags=lambda slug: [f'articles:{slug}'])
     def find_by_slug(slug):
-        """Find article by slug."""
+        """Find article by slug (cached briefly; scripts edit articles outside the app)."""
         return mongo.db[Article.collection].find_one({'slug': slug})
 
 
@@ -523,6 +1009,9 @@ class CompetitionPeriod:
     """Competition period model."""
     
     collection = 'competition_periods'
+    indexes = [
+        IndexModel([('status', ASCENDING)])
+    ]
     
     @staticmethod
     def create(month, year, start_date, end_date, nomination_deadline):
@@ -543,6 +1032,7 @@ class CompetitionPeriod:
         }
         
         result = mongo.db[CompetitionPeriod.collection].insert_one(period_data)
+        counts_service.record_insert(CompetitionPeriod.collection, period_data)
         return result.inserted_id
     
     @staticmethod
@@ -563,6 +1053,10 @@ class Nomination:
     """Nomination model."""
     
     collection = 'competition_nominations'
+    indexes = [
+        IndexModel([('period_id', ASCENDING)]),
+        IndexModel([('user_id', ASCENDING), ('period_id', ASCENDING)])
+    ]
     
     @staticmethod
     def create(period_id, book_id, user_id, nomination_statement):
@@ -580,6 +1074,7 @@ class Nomination:
         }
         
         result = mongo.db[Nomination.collection].insert_one(nomination_data)
+        counts_service.record_insert(Nomination.collection, nomination_data)
         return result.inserted_id
     
     @staticmethod
@@ -600,6 +1095,9 @@ class AIBookReview:
     """AI book review model."""
     
     collection = 'ai_book_reviews'
+    indexes = [
+        IndexModel([('nomination_id', ASCENDING)])
+    ]
     
     @staticmethod
     def create(nomination_id, book_id, review_data):
@@ -626,6 +1124,8 @@ class AIBookReview:
             'sentiment_analysis': review_data.get('sentiment_analysis'),
             'processing_time_seconds': review_data.get('processing_time_seconds', 0),
             'tokens_used': review_data.get('tokens_used', 0),
+            'cache_hit': review_data.get('cache_hit', False),
+            'parse_confidence': review_data.get('parse_confidence'),
             'review_date': datetime.utcnow()
         }
         
@@ -642,6 +1142,10 @@ class Competition:
     """Competition model."""
     
     collection = 'competitions'
+    indexes = [
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING)]),
+        IndexModel([('status', ASCENDING), ('submission_end_date', ASCENDING)])
+    ]
     
     @staticmethod
     def create(title, description, genre_categories, submission_start_date, submission_end_date,
@@ -671,6 +1175,8 @@ class Competition:
         }
         
         result = mongo.db[Competition.collection].insert_one(competition_data)
+        counts_service.record_insert(Competition.collection, competition_data)
+        cache.invalidate_tag('competitions')
         return result.inserted_id
     
     @staticmethod
@@ -696,8 +1202,9 @@ class Competition:
         return competitions
     
     @staticmethod
+    @cache.memoize(ttl=60, tags=['competitions'])
     def find_active():
-        """Find all active competitions (accepting submissions)."""
+        """Find all active competitions (accepting submissions); cached for a minute."""
         now = datetime.utcnow()
         query = {
             'status': 'accepting_submissions',
@@ -728,6 +1235,7 @@ class Competition:
                 }
             }
         )
+        cache.invalidate_tag('competitions')
     
     @staticmethod
     def update(competition_id, update_data):
@@ -737,6 +1245,7 @@ class Competition:
             {'_id': ObjectId(competition_id)},
             {'$set': update_data}
         )
+        cache.invalidate_tag('competitions')
     
     @staticmethod
     def count_submissions(competition_id):
@@ -750,6 +1259,11 @@ class CompetitionSubmission:
     """Competition submission model."""
     
     collection = 'competition_submissions'
+    indexes = [
+        IndexModel([('competition_id', ASCENDING), ('submission_timestamp', DESCENDING)]),
+        IndexModel([('author_id', ASCENDING), ('submission_timestamp', DESCENDING)]),
+        IndexModel([('author_id', ASCENDING), ('competition_id', ASCENDING)])
+    ]
     
     @staticmethod
     def create(competition_id, author_id, manuscript_title, manuscript_file_url,
@@ -773,6 +1287,8 @@ class CompetitionSubmission:
         }
         
         result = mongo.db[CompetitionSubmission.collection].insert_one(submission_data)
+        counts_service.record_insert(CompetitionSubmission.collection, submission_data)
+        rollup_service.record('submissions', submission_data)
         return result.inserted_id
     
     @staticmethod
@@ -830,12 +1346,17 @@ class AIEvaluation:
     """AI evaluation model for competition submissions."""
     
     collection = 'ai_evaluations'
+    indexes = [
+        IndexModel([('submission_id', ASCENDING)]),
+        IndexModel([('competition_id', ASCENDING), ('overall_score', DESCENDING)])
+    ]
     
     @staticmethod
     def create(submission_id, competition_id, ai_model_version, criteria_scores,
                overall_score, strengths_identified, weaknesses_identified,
-               detailed_feedback, confidence_score, processing_time_seconds):
-        """Create a new AI evaluation."""
+               detailed_feedback, confidence_score, processing_time_seconds,
+               tokens_used=0, cache_hit=False, parse_confidence=None):
+        """Create a new AI evaluation; cache_hit marks a response reused from the AI cache."""
         evaluation_data = {
             'submission_id': ObjectId(submission_id),
             'competition_id': ObjectId(competition_id),
@@ -847,10 +1368,15 @@ class AIEvaluation:
             'weaknesses_identified': weaknesses_identified,  # Array
             'detailed_feedback': detailed_feedback,
             'confidence_score': confidence_score,
-            'processing_time_seconds': processing_time_seconds
+            'processing_time_seconds': processing_time_seconds,
+            'tokens_used': tokens_used,
+            'cache_hit': cache_hit,
+            'parse_confidence': parse_confidence  # Share of the expected fields read from the reply
         }
         
         result = mongo.db[AIEvaluation.collection].insert_one(evaluation_data)
+        counts_service.record_insert(AIEvaluation.collection, evaluation_data)
+        rollup_service.record('evaluations', evaluation_data)
         return result.inserted_id
     
     @staticmethod
@@ -871,11 +1397,16 @@ class CompetitionWinner:
     """Competition winner model."""
     
     collection = 'competition_winners'
+    indexes = [
+        IndexModel([('competition_id', ASCENDING), ('rank_position', ASCENDING)]),
+        IndexModel([('author_id', ASCENDING), ('announced_at', DESCENDING)]),
+        IndexModel([('submission_id', ASCENDING)], unique=True)
+    ]
     
     @staticmethod
     def create(competition_id, submission_id, author_id, rank_position,
                final_score, prize_awarded, winner_feedback):
-        """Create a new competition winner."""
+        """Create a competition winner, or return the existing one for the submission."""
         winner_data = {
             'competition_id': ObjectId(competition_id),
             'submission_id': ObjectId(submission_id),
@@ -888,8 +1419,16 @@ class CompetitionWinner:
             'notification_sent': False
         }
         
-        result = mongo.db[CompetitionWinner.collection].insert_one(winner_data)
-        return result.inserted_id
+        result = mongo.db[CompetitionWinner.collection].update_one(
+            {'submission_id': winner_data['submission_id']},
+            {'$setOnInsert': winner_data},
+            upsert=True
+        )
+        if result.upserted_id is None:
+            return mongo.db[CompetitionWinner.collection].find_one(
+                {'submission_id': winner_data['submission_id']}, {'_id': 1})['_id']
+        counts_service.record_insert(CompetitionWinner.collection, winner_data)
+        return result.upserted_id
     
     @staticmethod
     def find_by_competition(competition_id):
@@ -920,6 +1459,9 @@ class PressKit:
     """Press kit model for authors."""
     
     collection = 'press_kits'
+    indexes = [
+        IndexModel([('author_id', ASCENDING)])
+    ]
     
     @staticmethod
     def create(author_id, bio, headshot_url, book_covers, 
@@ -968,6 +1510,9 @@ class NewsletterSubscriber:
     """Newsletter subscriber model."""
     
     collection = 'newsletter_subscribers'
+    indexes = [
+        IndexModel([('author_id', ASCENDING), ('is_active', ASCENDING)])
+    ]
     
     @staticmethod
     def create(author_id, email, subscriber_name=''):
@@ -1004,6 +1549,10 @@ class BookGiveaway:
     """Book giveaway model."""
     
     collection = 'book_giveaways'
+    indexes = [
+        IndexModel([('status', ASCENDING), ('end_date', ASCENDING)]),
+        IndexModel([('author_id', ASCENDING), ('created_at', DESCENDING)])
+    ]
     
     @staticmethod
     def create(author_id, book_id, title, description, 
@@ -1044,6 +1593,13 @@ class BookGiveaway:
                    .skip(skip).limit(limit)
                    .sort('created_at', -1))
     
+    @staticmethod
+    def active_giveaways_page(cursor=None, limit=20, skip=0):
+        """Return (giveaways, next_cursor) for one keyset page of active giveaways."""
+        filters = {'status': 'active', 'end_date': {'$gt': datetime.utcnow()}}
+        return keyset_page(collection_finder(BookGiveaway.collection), filters, [('created_at', -1)],
+                           cursor=cursor, limit=limit, skip=skip)
+    
     @staticmethod
     def find_by_author(author_id):
         """Find giveaways by author."""
@@ -1056,6 +1612,9 @@ class GiveawayEntry:
     """Giveaway entry model."""
     
     collection = 'giveaway_entries'
+    indexes = [
+        IndexModel([('giveaway_id', ASCENDING), ('user_id', ASCENDING)])
+    ]
     
     @staticmethod
     def create(giveaway_id, user_id, entry_data=None):
@@ -1089,6 +1648,9 @@ class TitleTest:
     """Title testing/polling model."""
     
     collection = 'title_tests'
+    indexes = [
+        IndexModel([('status', ASCENDING), ('expires_at', ASCENDING)])
+    ]
     
     @staticmethod
     def create(author_id, book_genre, title_options, description=''):
@@ -1207,6 +1769,10 @@ class WordCountTracker:
     """Word count tracking model."""
     
     collection = 'word_count_tracker'
+    indexes = [
+        IndexModel([('author_id', ASCENDING), ('updated_at', DESCENDING)]),
+        IndexModel([('is_public', ASCENDING), ('updated_at', DESCENDING)])
+    ]
     
     @staticmethod
     def create(author_id, book_title, target_word_count, is_public=True):
@@ -1304,6 +1870,9 @@ class SocialShare:
     """Social media share tracking model."""
     
     collection = 'social_shares'
+    indexes = [
+        IndexModel([('book_id', ASCENDING), ('platform', ASCENDING)])
+    ]
     
     @staticmethod
     def create(book_id, author_id, platform, share_url):
@@ -1335,3 +1904,114 @@ class SocialShare:
             }}
         ]
         return list(mongo.db[SocialShare.collection].aggregate(pipeline))
+
+
+class MetricRollup:
+    """Hourly, daily and all-time metric buckets maintained by rollup_service."""
+    
+    collection = ROLLUP_COLLECTION
+    indexes = [
+        IndexModel([('metric', ASCENDING), ('granularity', ASCENDING), ('bucket', ASCENDING)]),
+        IndexModel([('metric', ASCENDING), ('granularity', ASCENDING), ('dimension', ASCENDING),
+                    ('count', DESCENDING)])
+    ]
+
+
+class PageCacheEntry:
+    """Shared rendered fragments stored by page_cache_service."""
+    
+    collection = PAGE_CACHE_COLLECTION
+    indexes = [
+        IndexModel([('tag', ASCENDING)]),
+        IndexModel([('stale_until', ASCENDING)], expireAfterSeconds=0)
+    ]
+
+
+class EvaluationJob:
+    """Competition evaluation progress documents maintained by evaluation_service."""
+    
+    collection = EVALUATION_JOBS_COLLECTION
+    indexes = [
+        IndexModel([('status', ASCENDING), ('heartbeat_at', ASCENDING)])
+    ]
+
+
+class Job:
+    """Background job documents queued and claimed by job_service."""
+    
+    collection = JOBS_COLLECTION
+    indexes = [
+        # Claim order: due queued jobs by priority, and expired leases
+        IndexModel([('status', ASCENDING), ('priority', DESCENDING), ('run_at', ASCENDING)]),
+        IndexModel([('status', ASCENDING), ('lease_expires_at', ASCENDING)]),
+        IndexModel([('unique_key', ASCENDING), ('status', ASCENDING)], sparse=True),
+        IndexModel([('created_at', DESCENDING)]),
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0)
+    ]
+
+
+class JobInput:
+    """Secret or bulky job arguments, deleted by job_service when their job finishes."""
+    
+    collection = JOB_INPUTS_COLLECTION
+    indexes = [
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0)
+    ]
+
+
+class AIResponse:
+    """Cached AI completions keyed by request fingerprint (ai_cache_service)."""
+    
+    collection = AI_CACHE_COLLECTION
+    indexes = [
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0)
+    ]
+
+
+class AIUsage:
+    """Per-second AI request and token counts shared by the mongo scheduler backend (ai_service)."""
+    
+    collection = AI_USAGE_COLLECTION
+    indexes = [
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0)
+    ]
+
+
+class MediaAsset:
+    """Uploaded images keyed by content hash, staged and pushed by media_service, with their sized variants."""
+    
+    collection = MEDIA_COLLECTION
+    indexes = [
+        IndexModel([('url', ASCENDING)], sparse=True),
+        IndexModel([('placeholder', ASCENDING)]),
+        IndexModel([('aliases', ASCENDING)], sparse=True),
+        IndexModel([('status', ASCENDING), ('stored_at', ASCENDING)]),
+        IndexModel([('status', ASCENDING), ('created_at', ASCENDING)])
+    ]
+
+
+class MediaStaging:
+    """Bytes of staged uploads waiting for media.push, readable by every web and worker process."""
+    
+    collection = MEDIA_STAGING_COLLECTION
+    indexes = [
+        IndexModel([('staged_file', ASCENDING)])
+    ]
+
+
+class MediaMigration:
+    """Manifest of images moved by ``flask media-migrate``, one entry per URL and target."""
+    
+    collection = MIGRATION_COLLECTION
+    indexes = [
+        IndexModel([('target', ASCENDING), ('status', ASCENDING)])
+    ]
+
+
+class UploadTicket:
+    """Signed direct-upload tickets issued by direct_upload_service."""
+    
+    collection = UPLOAD_TICKETS_COLLECTION
+    indexes = [
+        IndexModel([('status', ASCENDING), ('expires_at', ASCENDING)])
+    ]
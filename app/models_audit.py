@@ -1,13 +1,28 @@
 """Audit logging models for tracking all system activities."""
-from datetime import datetime
+from datetime import datetime, timedelta
 from app import mongo
-from bson import ObjectId
+from bson import ObjectId, json_util
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from app.services.cache_service import cache
+from app.services.audit_writer_service import audit_writer
+from app.services.audit_storage_service import audit_storage, AUDIT_COLLECTION, AUDIT_INDEXES
 
 
 class AuditLog:
-    """Base audit log model."""
+    """Base audit log model.
     
-    collection = 'audit_logs'
+    Entries live in monthly partitions (see audit_storage_service);
+    ``collection`` names the unpartitioned collection that predates them.
+    """
+    
+    collection = AUDIT_COLLECTION
+    
+    indexes = AUDIT_INDEXES
+    
+    @staticmethod
+    def partitions(since=None, until=None, db=None):
+        """Return the audit collections overlapping a time window, newest first."""
+        return audit_storage.partitions(since, until, db=db)
     
     # Log categories
     CATEGORY_AUTH = 'authentication'
@@ -40,6 +55,9 @@ class AuditLog:
         """
         Create an audit log entry.
         
+        The entry is queued for the background audit writer, so it may reach
+        the database shortly after this returns.
+        
         Args:
             category: Log category (AUTH, USER, BOOK, etc.)
             action: Action performed (LOGIN, CREATE, UPDATE, etc.)
@@ -53,6 +71,7 @@ class AuditLog:
             error_message: Error message if failed
         """
         log_entry = {
+            '_id': ObjectId(),
             'category': category,
             'action': action,
             'user_id': ObjectId(user_id) if user_id else None,
@@ -66,87 +85,108 @@ class AuditLog:
             'timestamp': datetime.utcnow()
         }
         
-        result = mongo.db[AuditLog.collection].insert_one(log_entry)
-        return result.inserted_id
+        audit_writer.enqueue(log_entry)
+        return log_entry['_id']
+    
+    @staticmethod
+    def _find(query, limit, since=None, until=None):
+        """Find entries newest first, reading only the partitions that overlap the window."""
+        if since is not None or until is not None:
+            query = dict(query, timestamp={
+                key: value for key, value in (('$gte', since), ('$lte', until)) if value is not None
+            })
+        
+        logs = []
+        for name in audit_storage.partitions(since, until):
+            logs.extend(mongo.db[name].find(query).sort('timestamp', -1).limit(limit - len(logs)))
+            if len(logs) >= limit:
+                break
+        return logs
+    
+    @staticmethod
+    def _aggregate(match, group, since=None, until=None):
+        """Run a $group over the overlapping partitions and merge the per-partition results."""
+        merged = {}
+        for name in audit_storage.partitions(since, until):
+            for row in mongo.db[name].aggregate([{'$match': match}, {'$group': group}]):
+                key = json_util.dumps(row['_id'])
+                if key not in merged:
+                    merged[key] = row
+                    continue
+                for field, value in row.items():
+                    if field == '_id':
+                        continue
+                    if isinstance(value, datetime):
+                        merged[key][field] = max(merged[key][field], value)
+                    else:
+                        merged[key][field] += value
+        return list(merged.values())
     
     @staticmethod
-    def find_by_user(user_id, limit=50):
+    def find_by_user(user_id, limit=50, since=None, until=None):
         """Find audit logs for a specific user."""
-        return list(mongo.db[AuditLog.collection].find(
-            {'user_id': ObjectId(user_id)}
-        ).sort('timestamp', -1).limit(limit))
+        return AuditLog._find({'user_id': ObjectId(user_id)}, limit, since, until)
     
     @staticmethod
-    def find_by_category(category, limit=100):
+    def find_by_category(category, limit=100, since=None, until=None):
         """Find audit logs by category."""
-        return list(mongo.db[AuditLog.collection].find(
-            {'category': category}
-        ).sort('timestamp', -1).limit(limit))
+        return AuditLog._find({'category': category}, limit, since, until)
     
     @staticmethod
-    def find_by_target(target_type, target_id, limit=50):
+    def find_by_target(target_type, target_id, limit=50, since=None, until=None):
         """Find audit logs for a specific target entity."""
         query = {'target_type': target_type}
         if target_id:
             query['target_id'] = ObjectId(target_id) if target_id != 'unknown' else target_id
-        return list(mongo.db[AuditLog.collection].find(query).sort('timestamp', -1).limit(limit))
+        return AuditLog._find(query, limit, since, until)
     
     @staticmethod
     def find_failed_logins(hours=24, limit=100):
         """Find failed login attempts in last N hours."""
-        from datetime import timedelta
         since = datetime.utcnow() - timedelta(hours=hours)
-        return list(mongo.db[AuditLog.collection].find({
+        return AuditLog._find({
             'category': AuditLog.CATEGORY_AUTH,
-            'action': AuditLog.ACTION_LOGIN_FAILED,
-            'timestamp': {'$gte': since}
-        }).sort('timestamp', -1).limit(limit))
+            'action': AuditLog.ACTION_LOGIN_FAILED
+        }, limit, since=since)
     
     @staticmethod
-    def find_recent(limit=100, category=None):
+    def find_recent(limit=100, category=None, since=None, until=None):
         """Find recent audit logs."""
         query = {}
         if category:
             query['category'] = category
-        return list(mongo.db[AuditLog.collection].find(query).sort('timestamp', -1).limit(limit))
+        return AuditLog._find(query, limit, since, until)
     
     @staticmethod
-    def get_user_stats(user_id):
+    def get_user_stats(user_id, since=None):
         """Get activity statistics for a user."""
-        pipeline = [
-            {'$match': {'user_id': ObjectId(user_id)}},
-            {'$group': {
-                '_id': '$category',
-                'count': {'$sum': 1},
-                'last_activity': {'$max': '$timestamp'}
-            }}
-        ]
-        return list(mongo.db[AuditLog.collection].aggregate(pipeline))
+        match = {'user_id': ObjectId(user_id)}
+        if since is not None:
+            match['timestamp'] = {'$gte': since}
+        return AuditLog._aggregate(match, {
+            '_id': '$category',
+            'count': {'$sum': 1},
+            'last_activity': {'$max': '$timestamp'}
+        }, since=since)
     
     @staticmethod
     def get_system_stats(days=7):
         """Get system-wide activity statistics."""
-        from datetime import timedelta
         since = datetime.utcnow() - timedelta(days=days)
-        
-        pipeline = [
-            {'$match': {'timestamp': {'$gte': since}}},
-            {'$group': {
-                '_id': {
-                    'category': '$category',
-                    'action': '$action'
-                },
-                'count': {'$sum': 1},
-                'success_count': {
-                    '$sum': {'$cond': ['$success', 1, 0]}
-                },
-                'failure_count': {
-                    '$sum': {'$cond': ['$success', 0, 1]}
-                }
-            }},
-            {'$sort': {'count': -1}}
-        ]
-        return list(mongo.db[AuditLog.collection].aggregate(pipeline))
+        stats = AuditLog._aggregate({'timestamp': {'$gte': since}}, {
+            '_id': {
+                'category': '$category',
+                'action': '$action'
+            },
+            'count': {'$sum': 1},
+            'success_count': {
+                '$sum': {'$cond': ['$success', 1, 0]}
+            },
+            'failure_count': {
+                '$sum': {'$cond': ['$success', 0, 1]}
+            }
+        }, since=since)
+        return sorted(stats, key=lambda row: row['count'], reverse=True)
 
 
 class UserSession:
@@ -154,6 +194,10 @@ class UserSession:
     
     collection = 'user_sessions'
     
+    indexes = [
+        IndexModel([('user_id', ASCENDING), ('login_time', DESCENDING)])
+    ]
+    
     @staticmethod
     def create_session(user_id, ip_address=None, user_agent=None):
         """Create a new session record."""
@@ -177,6 +221,7 @@ class UserSession:
                 }
             }
         )
+        cache.invalidate_tag(f'users:{user_id}')
         
         return result.inserted_id
     
@@ -1,18 +1,29 @@
 """Admin routes."""
 from flask import Blueprint, request, jsonify, render_template, redirect, url_for, session, flash, send_file, abort
-from app.models import User, Book, Review, CompetitionPeriod, Nomination
+from app.models import User, Book, Review, CompetitionPeriod, Nomination, keyset_page, collection_finder
 from app.models_audit import AuditLog
+from app.services.counts_service import counts_service
+from app.services.cache_service import cache
+from app.services.ai_cache_service import ai_response_cache
+from app.services.ai_service import ai_scheduler
+from app.services.job_service import job_queue, serialize_job
 from app.security import require_admin as require_admin_decorator, validate_object_id
 from app import mongo, bcrypt
-from bson import ObjectId
 from bson.errors import InvalidId
 from datetime import datetime
-import csv
-import io
 from werkzeug.utils import secure_filename
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+ADMIN_PAGE_SIZE = 50
+
+# Maintenance tasks admins may start from the jobs page
+ADMIN_TASKS = {
+    'users.initialize_badges': 'Initialize user badges',
+    'media.migrate_uploads': 'Migrate local uploads to Cloudinary',
+    'media.cleanup': 'Delete unreferenced and abandoned images'
+}
+
 
 def require_admin():
     """Check if user is admin."""
@@ -38,10 +49,10 @@ def dashboard():
         return redirect(url_for('main.index'))
     
     # Get statistics
-    total_users = mongo.db.users.count_documents({})
-    total_books = mongo.db.books.count_documents({})
-    total_reviews = mongo.db.reviews.count_documents({})
-    pending_reviews = mongo.db.reviews.count_documents({'status': 'pending'})
+    total_users = counts_service.total(User.collection)
+    total_books = counts_service.total(Book.collection)
+    total_reviews = counts_service.total(Review.collection)
+    pending_reviews = counts_service.count(Review.collection, {'status': 'pending'})
     
     stats = {
         'total_users': total_users,
@@ -63,9 +74,13 @@ def list_users():
         flash('Admin access required', 'error')
         return redirect(url_for('main.index'))
     
-    users = list(mongo.db.users.find().sort('created_at', -1))
+    try:
+        users, next_cursor = keyset_page(collection_finder(User.collection), {}, [('created_at', -1)],
+                                         cursor=request.args.get('cursor') or None, limit=ADMIN_PAGE_SIZE)
+    except ValueError:
+        return redirect(url_for('admin.list_users'))
     
-    return render_template('admin/users.html', users=users)
+    return render_template('admin/users.html', users=users, next_cursor=next_cursor)
 
 
 @bp.route('/reviews/pending')
@@ -150,13 +165,13 @@ def delete_user(user_id):
         return redirect(url_for('admin.list_users'))
     
     # Delete user's books
-    mongo.db.books.delete_many({'user_id': ObjectId(user_id)})
+    Book.delete_by_user(user_id)
     
-    # Delete user's reviews
-    mongo.db.reviews.delete_many({'reviewer_id': ObjectId(user_id)})
+    # Delete user's reviews (and their ratings from the books they reviewed)
+    Review.delete_by_reviewer(user_id)
     
     # Delete the user
-    mongo.db.users.delete_one({'_id': ObjectId(user_id)})
+    User.delete(user_id)
     
     if request.is_json:
         return jsonify({'message': 'User deleted successfully'}), 200
@@ -239,14 +254,18 @@ def list_books():
         flash('Admin access required', 'error')
         return redirect(url_for('main.index'))
     
-    books = list(mongo.db.books.find().sort('created_at', -1))
+    try:
+        books, next_cursor = keyset_page(collection_finder(Book.collection), {}, [('created_at', -1)],
+                                         cursor=request.args.get('cursor') or None, limit=ADMIN_PAGE_SIZE)
+    except ValueError:
+        return redirect(url_for('admin.list_books'))
     
     # Enrich with author info
+    authors = User.find_by_ids([book['user_id'] for book in books])
     for book in books:
-        author = User.find_by_id(str(book['user_id']))
-        book['author'] = author
+        book['author'] = authors.get(str(book['user_id']))
     
-    return render_template('admin/books.html', books=books)
+    return render_template('admin/books.html', books=books, next_cursor=next_cursor)
 
 
 @bp.route('/books/<book_id>/delete', methods=['POST'])
@@ -272,10 +291,10 @@ def delete_book(book_id):
         return redirect(url_for('admin.list_books'))
     
     # Delete book's reviews
-    mongo.db.reviews.delete_many({'book_id': ObjectId(book_id)})
+    Review.delete_by_book(book_id)
     
     # Delete the book
-    mongo.db.books.delete_one({'_id': ObjectId(book_id)})
+    Book.delete(book_id)
     
     if request.is_json:
         return jsonify({'message': 'Book deleted successfully'}), 200
@@ -296,11 +315,11 @@ def system_stats():
     
     # Collection stats
     collections_stats = {
-        'users': mongo.db.users.count_documents({}),
-        'books': mongo.db.books.count_documents({}),
-        'reviews': mongo.db.reviews.count_documents({}),
-        'competitions': mongo.db.competition_periods.count_documents({}),
-        'nominations': mongo.db.nominations.count_documents({})
+        'users': counts_service.total('users'),
+        'books': counts_service.total('books'),
+        'reviews': counts_service.total('reviews'),
+        'competitions': counts_service.total('competition_periods'),
+        'nominations': counts_service.total('nominations')
     }
     
     # Recent activity
@@ -325,12 +344,29 @@ def system_stats():
         'collections': collections_stats,
         'recent_users': recent_users,
         'recent_books': recent_books,
-        'recent_reviews': recent_reviews
+        'recent_reviews': recent_reviews,
+        'cache': cache.stats()
     }
     
     return render_template('admin/system_stats.html', stats=stats)
 
 
+@bp.route('/system/cache')
+def cache_stats():
+    """Cache hit/miss/eviction counters and AI response cache savings as JSON."""
+    if not require_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    return jsonify(dict(cache.stats(), ai_responses=ai_response_cache.stats())), 200
+
+
+@bp.route('/system/ai')
+def ai_scheduler_stats():
+    """AI request queue depth, in-flight requests, usage per minute and latency percentiles as JSON."""
+    if not require_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    return jsonify(ai_scheduler.metrics()), 200
+
+
 @bp.route('/users/bulk-import', methods=['GET', 'POST'])
 def bulk_import_users():
     """Bulk import users from CSV."""
@@ -355,78 +391,16 @@ def bulk_import_users():
             return redirect(request.url)
         
         try:
-            # Read CSV file
-            stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-            csv_reader = csv.DictReader(stream)
-            
-            success_count = 0
-            error_count = 0
-            errors = []
-            
-            for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 to account for header
-                try:
-                    # Validate required fields
-                    required_fields = ['user_id', 'email', 'Full_name', 'password']
-                    missing_fields = [field for field in required_fields if not row.get(field)]
-                    
-                    if missing_fields:
-                        errors.append(f"Row {row_num}: Missing required fields: {', '.join(missing_fields)}")
-                        error_count += 1
-                        continue
-                    
-                    # Check if user already exists
-                    existing_user = User.find_by_username(row['user_id'])
-                    if existing_user:
-                        errors.append(f"Row {row_num}: Username '{row['user_id']}' already exists")
-                        error_count += 1
-                        continue
-                    
-                    existing_email = User.find_by_email(row['email'])
-                    if existing_email:
-                        errors.append(f"Row {row_num}: Email '{row['email']}' already exists")
-                        error_count += 1
-                        continue
-                    
-                    # Create user
-                    user_data = {
-                        'username': row['user_id'],
-                        'email': row['email'],
-                        'full_name': row['Full_name'],
-                        'password_hash': bcrypt.generate_password_hash(row['password']).decode('utf-8'),
-                        'role': row.get('role', 'user').lower(),
-                        'status': row.get('status', 'active').lower(),
-                        'bio': row.get('BIO', ''),
-                        'created_at': datetime.utcnow(),
-                        'updated_at': datetime.utcnow(),
-                        'profile_image': None,
-                        'social_links': {},
-                        'preferences': {},
-                        'badges': []
-                    }
-                    
-                    mongo.db.users.insert_one(user_data)
-                    success_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"Row {row_num}: {str(e)}")
-                    error_count += 1
-            
-            # Show results
-            if success_count > 0:
-                flash(f'Successfully imported {success_count} users', 'success')
-            
-            if error_count > 0:
-                flash(f'Failed to import {error_count} users', 'warning')
-                for error in errors[:10]:  # Show first 10 errors
-                    flash(error, 'error')
-                if len(errors) > 10:
-                    flash(f'... and {len(errors) - 10} more errors', 'error')
-            
-            return redirect(url_for('admin.list_users'))
-            
-        except Exception as e:
-            flash(f'Error processing CSV file: {str(e)}', 'error')
+            csv_text = file.stream.read().decode('UTF8')
+        except UnicodeDecodeError:
+            flash('Error processing CSV file: it must be UTF-8 encoded', 'error')
             return redirect(request.url)
+        
+        # Password hashing makes large imports slow, so the worker creates the users; the CSV
+        # holds plaintext passwords, so it goes in the job's inputs, deleted when the job ends
+        job = job_queue.enqueue('users.bulk_import', inputs={'csv_text': csv_text}, created_by=session.get('user_id'))
+        flash('User import started. This page updates as rows are imported.', 'info')
+        return redirect(url_for('admin.view_job', job_id=job['_id']))
     
     # GET request - show upload form
     return render_template('admin/bulk_import_users.html')
@@ -453,3 +427,85 @@ def download_sample_csv():
     except Exception as e:
         flash(f'Error downloading sample file: {str(e)}', 'error')
         return redirect(url_for('admin.list_users'))
+
+
+def wants_json():
+    """Check whether the client asked for JSON rather than a page."""
+    return request.is_json or request.accept_mimetypes.best == 'application/json'
+
+
+@bp.route('/jobs')
+def list_jobs():
+    """Recent background jobs, optionally filtered by status or task name."""
+    if not require_admin():
+        flash('Admin access required', 'error')
+        return redirect(url_for('main.index'))
+    
+    jobs = job_queue.find_recent(status=request.args.get('status'), name=request.args.get('name'))
+    if wants_json():
+        return jsonify({'counts': job_queue.counts(), 'jobs': [serialize_job(job) for job in jobs]}), 200
+    return render_template('admin/jobs.html', jobs=jobs, counts=job_queue.counts(), admin_tasks=ADMIN_TASKS)
+
+
+@bp.route('/jobs/<job_id>')
+def view_job(job_id):
+    """Status of one background job; the page polls this route for JSON."""
+    if not require_admin():
+        flash('Admin access required', 'error')
+        return redirect(url_for('main.index'))
+    
+    job = job_queue.status(job_id)
+    if not job:
+        if wants_json():
+            return jsonify({'error': 'Job not found'}), 404
+        flash('Job not found', 'error')
+        return redirect(url_for('admin.list_jobs'))
+    
+    if wants_json():
+        return jsonify(serialize_job(job)), 200
+    return render_template('admin/job.html', job=serialize_job(job))
+
+
+@bp.route('/jobs/run', methods=['POST'])
+def run_job():
+    """Queue one of the maintenance tasks admins may start."""
+    if not require_admin():
+        flash('Admin access required', 'error')
+        return redirect(url_for('main.index'))
+    
+    name = request.form.get('name')
+    if name not in ADMIN_TASKS:
+        flash('Unknown task', 'error')
+        return redirect(url_for('admin.list_jobs'))
+    
+    job = job_queue.enqueue(name, created_by=session.get('user_id'), unique_key=name)
+    flash(f'{ADMIN_TASKS[name]} queued.', 'info')
+    return redirect(url_for('admin.view_job', job_id=job['_id']))
+
+
+@bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job."""
+    if not require_admin():
+        flash('Admin access required', 'error')
+        return redirect(url_for('main.index'))
+    
+    if job_queue.cancel(job_id):
+        flash('Job cancelled', 'success')
+    else:
+        flash('Only queued or running jobs can be cancelled', 'warning')
+    return redirect(url_for('admin.view_job', job_id=job_id))
+
+
+@bp.route('/jobs/<job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    """Requeue a failed or cancelled job."""
+    if not require_admin():
+        flash('Admin access required', 'error')
+        return redirect(url_for('main.index'))
+    
+    if job_queue.retry(job_id):
+        flash('Job requeued', 'success')
+    else:
+        flash('Only failed or cancelled jobs can be retried; imports must be uploaded again', 'warning')
+    return redirect(url_for('admin.view_job', job_id=job_id))
@@ -0,0 +1,67 @@
+"""JSON API routes."""
+from flask import Blueprint, request, jsonify, session
+from app.security import rate_limit
+from app.services.autocomplete_service import autocomplete_service
+from app.services.direct_upload_service import direct_uploads, UploadRejected
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+
+@bp.route('/autocomplete')
+def autocomplete():
+    """Suggest book titles, authors and genres for a partial query."""
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 5, type=int), 1), 20)
+    
+    suggestions = autocomplete_service.suggest(query, limit=limit) if query else {}
+    
+    return jsonify({
+        'query': query,
+        'books': suggestions.get('book', []),
+        'authors': suggestions.get('author', []),
+        'genres': suggestions.get('genre', [])
+    })
+
+
+@bp.route('/uploads/tickets', methods=['POST'])
+@rate_limit('UPLOAD_RATE_LIMIT', 'UPLOAD_RATE_WINDOW', scope='user', action='upload')
+def create_upload_ticket():
+    """Return signed parameters for uploading a manuscript or cover straight to storage."""
+    from app.models import Book
+    
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    book_id = data.get('book_id')
+    if book_id:
+        book = Book.find_by_id(book_id)
+        if not book or str(book['user_id']) != str(user_id):
+            return jsonify({'error': 'Book not found'}), 404
+    
+    try:
+        size = int(data.get('size') or 0)
+        ticket = direct_uploads.issue(data.get('kind'), data.get('filename'), size, user_id,
+                                      target_id=book_id if data.get('kind') == 'cover' else None)
+    except (UploadRejected, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    if ticket is None:
+        # The form upload still works; clients fall back to it
+        return jsonify({'error': 'Direct uploads are not available'}), 503
+    return jsonify(ticket), 201
+
+
+@bp.route('/uploads/<ticket_id>/complete', methods=['POST'])
+def complete_upload(ticket_id):
+    """Validate a finished direct upload and attach it to its book, or hold it for the submission form."""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    try:
+        ticket = direct_uploads.complete(ticket_id, user_id)
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'ticket': ticket['_id'], 'status': ticket['status'],
+                    'url': ticket['url'] if ticket['kind'] == 'cover' else None})
@@ -13,13 +13,19 @@ def list_articles():
         category = request.args.get('category', None)
         per_page = 20
         
+        cursor = request.args.get('cursor', '')
         skip = (page - 1) * per_page
         
         # Filter by category if provided
-        if category:
-            articles = Article.find_by_category(category, skip=skip, limit=per_page)
-        else:
-            articles = Article.find_published(skip=skip, limit=per_page)
+        try:
+            articles, next_cursor = Article.published_page(category=category, cursor=cursor or None,
+                                                           limit=per_page, skip=skip)
+        except ValueError as e:
+            if request.is_json:
+                return jsonify({'error': str(e)}), 400
+            flash('Invalid page link.', 'warning')
+            args = {key: value for key, value in request.args.items() if key not in ('cursor', 'page')}
+            return redirect(url_for('articles.list_articles', **args))
         
         # Enrich with author info
         for article in articles:
@@ -39,7 +45,8 @@ def list_articles():
                     'category': a.get('category'),
                     'author': a['author']['full_name'] if a.get('author') else 'Unknown',
                     'published_at': a['published_at'].isoformat() if a.get('published_at') and hasattr(a['published_at'], 'isoformat') else str(a.get('published_at', ''))
-                } for a in articles]
+                } for a in articles],
+                'next_cursor': next_cursor
             }), 200
         
         return render_template('articles/list.html', articles=articles, current_category=category)
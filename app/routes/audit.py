@@ -18,8 +18,9 @@ def index():
     category = request.args.get('category', '')
     days = int(request.args.get('days', 7))
     
-    # Get recent logs
-    logs = AuditLog.find_recent(limit=100, category=category if category else None)
+    # Get recent logs (only the partitions inside the selected window are read)
+    since = datetime.utcnow() - timedelta(days=days)
+    logs = AuditLog.find_recent(limit=100, category=category if category else None, since=since)
     
     # Enrich logs with user info
     for log in logs:
@@ -114,18 +114,18 @@ def login():
         flash('Email and password are required', 'error')
         return redirect(url_for('auth.login'))
     
-    # Rate limiting for failed login attempts
-    from app.security import check_rate_limit
+    # Rate limiting for login attempts
+    from app.services.rate_limit_service import rate_limiter
     from flask import current_app
     
     if current_app.config.get('RATELIMIT_ENABLED', True):
         rate_limit_key = f"login:{request.remote_addr}"
-        if not check_rate_limit(
-            rate_limit_key, 
-            'login_attempt',
+        attempt = rate_limiter.hit(
+            rate_limit_key,
             limit=current_app.config.get('LOGIN_ATTEMPTS_LIMIT', 5),
             window=current_app.config.get('LOGIN_ATTEMPTS_WINDOW', 900)
-        ):
+        )
+        if not attempt.allowed:
             # Log security event
             AuditLog.log(
                 category=AuditLog.CATEGORY_SECURITY,
@@ -137,7 +137,9 @@ def login():
                 error_message='Too many login attempts'
             )
             if request.is_json:
-                return jsonify({'error': 'Too many login attempts. Please try again later.'}), 429
+                return jsonify({'error': 'Too many login attempts. Please try again later.'}), 429, {
+                    'Retry-After': str(attempt.retry_after)
+                }
             flash('Too many login attempts. Please try again later.', 'error')
             return redirect(url_for('auth.login'))
     
@@ -1,13 +1,12 @@
 """Book routes."""
 from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash, session, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Book, User, Review
+from app.models import Book, User, Review, estimated_search_count
 from app.models_audit import AuditLog
-from app.services.s3_service import s3_service
-from app.services.cloudinary_service import cloudinary_service
-from werkzeug.utils import secure_filename
+from app.services.direct_upload_service import direct_uploads
+from app.services.media_service import media_service
+from app.security import rate_limit, has_file_upload
 from bson import ObjectId
-import os
 from datetime import datetime
 
 bp = Blueprint('books', __name__, url_prefix='/books')
@@ -30,7 +29,7 @@ def list_books():
     query = request.args.get('q', '').strip()
     genre = request.args.get('genre', '')
     status = request.args.get('status', 'active')
-    sort_by = request.args.get('sort', 'recent')
+    sort_by = request.args.get('sort', 'relevance' if query else 'recent')
     
     # Build filters
     filters = {}
@@ -41,6 +40,7 @@ def list_books():
     
     # Set sort order
     sort_mapping = {
+        'relevance': None,  # Search backend ranks by relevance
         'recent': [('created_at', -1)],
         'title': [('title', 1)],
         'views': [('views_count', -1)],
@@ -48,15 +48,26 @@ def list_books():
     }
     sort_order = sort_mapping.get(sort_by, [('created_at', -1)])
     
+    cursor = request.args.get('cursor', '')
     skip = (page - 1) * per_page
-    books = Book.search(query=query, filters=filters, skip=skip, limit=per_page, sort=sort_order)
-    total = Book.count_search(query=query, filters=filters)
+    try:
+        books, next_cursor = Book.search_page(query=query, filters=filters, sort=sort_order,
+                                              cursor=cursor or None, limit=per_page, skip=skip)
+    except ValueError as e:
+        if request.is_json:
+            return jsonify({'error': str(e)}), 400
+        flash('Invalid page link.', 'warning')
+        args = {key: value for key, value in request.args.items() if key not in ('cursor', 'page')}
+        return redirect(url_for('books.list_books', **args))
+    
+    # Totals are estimates unless exact ones are asked for
+    if request.args.get('total') == 'exact':
+        total = Book.count_search(query=query, filters=filters)
+    else:
+        total = estimated_search_count(Book, query, filters)
     
     # Enrich with author info and ratings
-    for book in books:
-        author = User.find_by_id(str(book['user_id']))
-        book['author'] = author
-        book['rating_info'] = Review.get_average_rating(str(book['_id']))
+    Book.enrich_many(books)
     
     total_pages = (total + per_page - 1) // per_page
     
@@ -79,7 +90,8 @@ def list_books():
             'total': total,
             'page': page,
             'per_page': per_page,
-            'total_pages': total_pages
+            'total_pages': total_pages,
+            'next_cursor': next_cursor
         }), 200
     
     return render_template('books/list.html', 
@@ -120,7 +132,8 @@ def get_book(book_id):
         review['reviewer'] = reviewer
     
     # Get rating info
-    rating_info = Review.get_average_rating(book_id)
+    Book.backfill_ratings([book])
+    rating_info = Book.get_rating_info(book)
     
     if request.is_json:
         return jsonify({
@@ -146,6 +159,7 @@ def get_book(book_id):
 
 
 @bp.route('/create', methods=['GET', 'POST'])
+@rate_limit('UPLOAD_RATE_LIMIT', 'UPLOAD_RATE_WINDOW', scope='user', action='upload', when=has_file_upload)
 def create_book():
     """Create a new book."""
     user_id = session.get('user_id')
@@ -160,65 +174,58 @@ def create_book():
         genres = ['Fiction', 'Non-Fiction', 'IT & Technology', 'Corporate Satire', 
                   'Psychological Fiction', 'Mystery', 'Romance', 'Science Fiction', 
                   'Fantasy', 'Biography', 'Self-Help', 'Business']
-        return render_template('books/create.html', genres=genres)
+        return render_template('books/create.html', genres=genres,
+                               direct_upload=direct_uploads.enabled('cover'))
+    
+    data = request.form if not request.is_json else request.get_json()
+    
+    # Validation
+    title = data.get('title', '').strip()
+    description = data.get('description', '').strip()
+    genre = data.get('genre', '').strip()
+    
+    if not title or not description or not genre:
+        if request.is_json:
+            return jsonify({'error': 'Title, description, and genre are required'}), 400
+        flash('Title, description, and genre are required', 'error')
+        return redirect(url_for('books.create_book'))
+    
+    if len(description) < 100:
+        if request.is_json:
+            return jsonify({'error': 'Description must be at least 100 characters'}), 400
+        flash('Description must be at least 100 characters', 'error')
+        return redirect(url_for('books.create_book'))
     
     # Handle file upload or URL
     cover_image_url = ''
+    staged = None
     
     # Check if user provided a URL instead
     if 'cover_image_url' in request.form and request.form['cover_image_url'].strip():
         cover_image_url = request.form['cover_image_url'].strip()
+    # Or uploaded the cover straight to storage with an upload ticket
+    elif data.get('cover_upload_ticket'):
+        ticket = direct_uploads.claim(data['cover_upload_ticket'], user_id, 'cover')
+        if ticket:
+            cover_image_url = ticket['url']
+        else:
+            flash('Warning: Cover image upload could not be found.', 'warning')
     # Otherwise check for file upload
     elif 'cover_image' in request.files:
         file = request.files['cover_image']
         if file and file.filename and allowed_file(file.filename):
             try:
-                # Try Cloudinary first (recommended for production)
-                if cloudinary_service._ensure_config():
-                    current_app.logger.info(f"Attempting Cloudinary upload for: {file.filename}")
-                    cover_image_url = cloudinary_service.upload_file(file, folder='book-covers')
-                    if cover_image_url:
-                        current_app.logger.info(f"Cloudinary upload successful: {cover_image_url}")
-                        AuditLog.log(
-                            category=AuditLog.CATEGORY_BOOK,
-                            action=AuditLog.ACTION_UPLOAD,
-                            user_id=user_id,
-                            details={'filename': file.filename, 'url': cover_image_url, 'service': 'cloudinary'},
-                            ip_address=request.remote_addr
-                        )
-                    else:
-                        raise Exception("Cloudinary upload returned None")
-                # Try S3 as fallback
-                elif s3_service.is_s3_configured():
-                    current_app.logger.info(f"Attempting S3 upload for: {file.filename}")
-                    cover_image_url = s3_service.upload_file(file, folder='book-covers')
-                    if cover_image_url:
-                        current_app.logger.info(f"S3 upload successful: {cover_image_url}")
-                        AuditLog.log(
-                            category=AuditLog.CATEGORY_BOOK,
-                            action=AuditLog.ACTION_UPLOAD,
-                            user_id=user_id,
-                            details={'filename': file.filename, 'url': cover_image_url, 'service': 's3'},
-                            ip_address=request.remote_addr
-                        )
-                    else:
-                        raise Exception("S3 upload returned None")
-                else:
-                    # Fallback to local storage (for development only - not for production)
-                    current_app.logger.warning(f"Using local storage for: {file.filename} - images will not persist on Render!")
-                    filename = secure_filename(file.filename)
-                    filename = f"{datetime.utcnow().timestamp()}_{filename}"
-                    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                    os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-                    file.save(filepath)
-                    cover_image_url = f"/uploads/{filename}"
-                    AuditLog.log(
-                        category=AuditLog.CATEGORY_BOOK,
-                        action=AuditLog.ACTION_UPLOAD,
-                        user_id=user_id,
-                        details={'filename': file.filename, 'url': cover_image_url, 'service': 'local', 'warning': 'ephemeral'},
-                        ip_address=request.remote_addr
-                    )
+                # Staged locally; a background job pushes it to Cloudinary/S3 and swaps the URL
+                staged = media_service.stage(file, folder='book-covers')
+                cover_image_url = staged.url
+                AuditLog.log(
+                    category=AuditLog.CATEGORY_BOOK,
+                    action=AuditLog.ACTION_UPLOAD,
+                    user_id=user_id,
+                    details={'filename': file.filename, 'url': cover_image_url, 'content_hash': staged.asset_id,
+                             'pending': staged.pending},
+                    ip_address=request.remote_addr
+                )
             except Exception as e:
                 # Log error but continue - cover image is optional
                 error_msg = str(e)
@@ -234,25 +241,6 @@ def create_book():
                 )
                 flash(f'Warning: Cover image upload failed: {error_msg}', 'warning')
     
-    data = request.form if not request.is_json else request.get_json()
-    
-    # Validation
-    title = data.get('title', '').strip()
-    description = data.get('description', '').strip()
-    genre = data.get('genre', '').strip()
-    
-    if not title or not description or not genre:
-        if request.is_json:
-            return jsonify({'error': 'Title, description, and genre are required'}), 400
-        flash('Title, description, and genre are required', 'error')
-        return redirect(url_for('books.create_book'))
-    
-    if len(description) < 100:
-        if request.is_json:
-            return jsonify({'error': 'Description must be at least 100 characters'}), 400
-        flash('Description must be at least 100 characters', 'error')
-        return redirect(url_for('books.create_book'))
-    
     # Create book
     book_data = {
         'title': title,
@@ -271,6 +259,8 @@ def create_book():
     }
     
     book_id = Book.create(user_id, book_data)
+    if staged:
+        media_service.attach(staged, Book.collection, book_id, 'cover_image_url', created_by=user_id)
     
     # Log book creation
     AuditLog.log(
@@ -294,6 +284,7 @@ def create_book():
 
 
 @bp.route('/<book_id>/edit', methods=['GET', 'POST'])
+@rate_limit('UPLOAD_RATE_LIMIT', 'UPLOAD_RATE_WINDOW', scope='user', action='upload', when=has_file_upload)
 def edit_book(book_id):
     """Edit a book."""
     user_id = session.get('user_id')
@@ -324,7 +315,8 @@ def edit_book(book_id):
         genres = ['Fiction', 'Non-Fiction', 'IT & Technology', 'Corporate Satire', 
                   'Psychological Fiction', 'Mystery', 'Romance', 'Science Fiction', 
                   'Fantasy', 'Biography', 'Self-Help', 'Business']
-        return render_template('books/edit.html', book=book, genres=genres)
+        return render_template('books/edit.html', book=book, genres=genres,
+                               direct_upload=direct_uploads.enabled('cover'))
     
     # Handle updates
     data = request.form if not request.is_json else request.get_json()
@@ -350,6 +342,7 @@ def edit_book(book_id):
         update_data['goodreads_link'] = data['goodreads_link'].strip()
     
     # Handle new cover image (URL or file upload)
+    staged = None
     if 'cover_image_url' in request.form and request.form['cover_image_url'].strip():
         # User provided a URL
         update_data['cover_image_url'] = request.form['cover_image_url'].strip()
@@ -357,33 +350,9 @@ def edit_book(book_id):
         file = request.files['cover_image']
         if file and file.filename and allowed_file(file.filename):
             try:
-                # Try Cloudinary first (recommended for production)
-                if cloudinary_service._ensure_config():
-                    cover_image_url = cloudinary_service.upload_file(file, folder='book-covers')
-                    if cover_image_url:
-                        update_data['cover_image_url'] = cover_image_url
-                        # Optionally delete old image from Cloudinary if it exists
-                        old_url = book.get('cover_image_url')
-                        if old_url and 'cloudinary.com' in old_url:
-                            cloudinary_service.delete_file(old_url)
-                # Try S3 as fallback
-                elif s3_service.is_s3_configured():
-                    cover_image_url = s3_service.upload_file(file, folder='book-covers')
-                    if cover_image_url:
-                        update_data['cover_image_url'] = cover_image_url
-                        # Optionally delete old image from S3 if it exists
-                        old_url = book.get('cover_image_url')
-                        if old_url and 's3.amazonaws.com' in old_url:
-                            s3_service.delete_file(old_url)
-                else:
-                    # Fallback to local storage (for development only - not for production)
-                    current_app.logger.warning("Using local storage - images will not persist on Render!")
-                    filename = secure_filename(file.filename)
-                    filename = f"{datetime.utcnow().timestamp()}_{filename}"
-                    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                    os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-                    file.save(filepath)
-                    update_data['cover_image_url'] = f"/uploads/{filename}"
+                # Staged locally; a background job pushes it to Cloudinary/S3 and swaps the URL
+                staged = media_service.stage(file, folder='book-covers')
+                update_data['cover_image_url'] = staged.url
             except Exception as e:
                 error_msg = str(e)
                 current_app.logger.error(f"Failed to save cover image: {error_msg}")
@@ -400,7 +369,16 @@ def edit_book(book_id):
                     error_message=error_msg
                 )
     
+    if 'cover_image_url' in update_data:
+        # An author's own cover is never redrawn by the cover generator
+        update_data['generated_cover'] = None
     Book.update(book_id, update_data)
+    if staged:
+        media_service.attach(staged, Book.collection, book_id, 'cover_image_url', created_by=user_id)
+    # The replaced cover is deleted later, once nothing refers to it
+    old_url = book.get('cover_image_url')
+    if 'cover_image_url' in update_data and old_url and old_url != update_data['cover_image_url']:
+        media_service.release(old_url, created_by=user_id)
     
     # Log book update
     AuditLog.log(
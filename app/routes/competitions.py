@@ -158,7 +158,7 @@ def trigger_ai_review(nomination_id):
     # Call AI service
     try:
         ai_service = AIService()
-        review_data = ai_service.review_book(book, nomination, user)
+        review_data = ai_service.review_book(book, nomination, user, use_cache=not request.args.get('fresh'))
         
         # Store AI review
         AIBookReview.create(nomination_id, str(book['_id']), review_data)
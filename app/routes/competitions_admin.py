@@ -4,7 +4,10 @@ from functools import wraps
 from datetime import datetime, timedelta
 from bson import ObjectId
 from app.models import Competition, CompetitionSubmission, AIEvaluation, CompetitionWinner, User, Book, Review
-from app.services.ai_service import evaluate_manuscript
+from app.services.evaluation_service import evaluation_engine
+from app.services.job_service import job_queue
+from app.services.counts_service import counts_service
+from app.services.rollup_service import rollup_service
 import os
 
 bp = Blueprint('competitions_admin', __name__, url_prefix='/admin/competitions')
@@ -60,50 +63,47 @@ def analytics_dashboard():
     from datetime import timedelta
     
     # === COMPETITION METRICS ===
-    total_competitions = mongo.db['competitions'].count_documents({})
-    total_submissions = mongo.db['competition_submissions'].count_documents({})
-    total_evaluations = mongo.db['ai_evaluations'].count_documents({})
-    total_winners = mongo.db['competition_winners'].count_documents({})
+    total_competitions = counts_service.total('competitions')
+    total_submissions = counts_service.total('competition_submissions')
+    total_evaluations = counts_service.total('ai_evaluations')
+    total_winners = counts_service.total('competition_winners')
     
     # === USER METRICS ===
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    total_users = mongo.db['users'].count_documents({})
-    active_users_30d = mongo.db['users'].count_documents({
+    # Activity figures come from precomputed rollups (see rollup_service)
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    thirty_days_ago = now - timedelta(days=30)
+    seven_days_ago = now - timedelta(days=7)
+    fourteen_days_ago = now - timedelta(days=14)
+    today_start = now.replace(hour=0, minute=0)
+    
+    total_users = counts_service.total('users')
+    active_users_30d = counts_service.count('users', {
         '$or': [
             {'last_login': {'$gte': thirty_days_ago}},
             {'created_at': {'$gte': thirty_days_ago}}
         ]
     })
-    new_users_today = mongo.db['users'].count_documents({'created_at': {'$gte': today_start}})
+    new_users_today = rollup_service.count_between('registrations', today_start)
     
-    users_this_week = mongo.db['users'].count_documents({'created_at': {'$gte': seven_days_ago}})
-    users_last_week = mongo.db['users'].count_documents({
-        'created_at': {'$gte': seven_days_ago - timedelta(days=7), '$lt': seven_days_ago}
-    })
+    users_this_week = rollup_service.count_between('registrations', seven_days_ago)
+    users_last_week = rollup_service.count_between('registrations', fourteen_days_ago, seven_days_ago)
     user_growth_rate = ((users_this_week - users_last_week) / users_last_week * 100) if users_last_week > 0 else 0
     
     # === CONTENT METRICS ===
-    total_books = mongo.db['books'].count_documents({})
-    books_added_today = mongo.db['books'].count_documents({'created_at': {'$gte': today_start}})
-    books_this_week = mongo.db['books'].count_documents({'created_at': {'$gte': seven_days_ago}})
-    books_last_week = mongo.db['books'].count_documents({
-        'created_at': {'$gte': seven_days_ago - timedelta(days=7), '$lt': seven_days_ago}
-    })
+    total_books = counts_service.total('books')
+    books_added_today = rollup_service.count_between('books_added', today_start)
+    books_this_week = rollup_service.count_between('books_added', seven_days_ago)
+    books_last_week = rollup_service.count_between('books_added', fourteen_days_ago, seven_days_ago)
     book_growth_rate = ((books_this_week - books_last_week) / books_last_week * 100) if books_last_week > 0 else 0
     avg_books_per_author = total_books / total_users if total_users > 0 else 0
     
     # === ENGAGEMENT METRICS ===
-    total_reviews = mongo.db['reviews'].count_documents({})
-    reviews_today = mongo.db['reviews'].count_documents({'created_at': {'$gte': today_start}})
+    total_reviews = counts_service.total('reviews')
+    reviews_today = rollup_service.count_between('reviews', today_start)
     avg_reviews_per_book = total_reviews / total_books if total_books > 0 else 0
     
-    avg_rating_result = list(mongo.db['reviews'].aggregate([
-        {'$group': {'_id': None, 'avg_rating': {'$avg': '$rating'}}}
-    ]))
-    avg_rating = avg_rating_result[0].get('avg_rating', 0) if avg_rating_result else 0
+    review_totals = rollup_service.totals('reviews')
+    avg_rating = review_totals['sums'].get('rating', 0) / review_totals['count'] if review_totals['count'] else 0
     
     users_in_competitions = mongo.db['competition_submissions'].distinct('author_id')
     competition_participation_rate = (len(users_in_competitions) / total_users * 100) if total_users > 0 else 0
@@ -113,35 +113,19 @@ def analytics_dashboard():
         {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
     ]))
     
-    submissions_by_comp = list(mongo.db['competition_submissions'].aggregate([
-        {'$group': {'_id': '$competition_id', 'count': {'$sum': 1}, 'avg_word_count': {'$avg': '$word_count'}}},
-        {'$sort': {'count': -1}},
-        {'$limit': 10}
-    ]))
-    for item in submissions_by_comp:
-        comp = mongo.db['competitions'].find_one({'_id': item['_id']})
-        item['competition'] = comp
-    
-    genre_stats = list(mongo.db['competition_submissions'].aggregate([
-        {'$group': {'_id': '$genre', 'count': {'$sum': 1}}},
-        {'$sort': {'count': -1}}
-    ]))
+    submissions_by_comp = rollup_service.breakdown('submissions', 'competition_id', limit=10)
+    genre_stats = rollup_service.breakdown('submissions', 'genre')
     
-    score_stats = list(mongo.db['ai_evaluations'].aggregate([
-        {'$group': {
-            '_id': '$competition_id',
-            'avg_overall_score': {'$avg': '$overall_score'},
-            'avg_plot': {'$avg': '$scores.plot_story_structure'},
-            'avg_character': {'$avg': '$scores.character_development'},
-            'avg_writing': {'$avg': '$scores.writing_quality_style'},
-            'avg_originality': {'$avg': '$scores.originality_creativity'},
-            'evaluations_count': {'$sum': 1}
-        }},
-        {'$sort': {'avg_overall_score': -1}}
-    ]))
+    score_stats = rollup_service.breakdown('evaluations', 'competition_id')
     for item in score_stats:
-        comp = mongo.db['competitions'].find_one({'_id': item['_id']})
-        item['competition'] = comp
+        item['evaluations_count'] = item['count']
+    score_stats.sort(key=lambda item: item.get('avg_overall_score', 0), reverse=True)
+    
+    # Attach competitions with one query instead of one per row
+    competition_ids = {item['_id'] for item in submissions_by_comp + score_stats}
+    competitions = {comp['_id']: comp for comp in mongo.db['competitions'].find({'_id': {'$in': list(competition_ids)}})}
+    for item in submissions_by_comp + score_stats:
+        item['competition'] = competitions.get(item['_id'])
     
     top_authors = list(mongo.db['users'].aggregate([
         {'$match': {'competition_stats.total_wins': {'$gt': 0}}},
@@ -150,49 +134,19 @@ def analytics_dashboard():
         {'$project': {'full_name': 1, 'email': 1, 'competition_stats': 1}}
     ]))
     
-    recent_submissions = list(mongo.db['competition_submissions'].aggregate([
-        {'$match': {'submitted_at': {'$gte': thirty_days_ago}}},
-        {'$group': {
-            '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$submitted_at'}},
-            'count': {'$sum': 1}
-        }},
-        {'$sort': {'_id': 1}}
-    ]))
+    recent_submissions = rollup_service.series('submissions', thirty_days_ago)
     
     # === TRENDS (Last 30 Days) ===
-    user_registration_trend = list(mongo.db['users'].aggregate([
-        {'$match': {'created_at': {'$gte': thirty_days_ago}}},
-        {'$group': {
-            '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}},
-            'count': {'$sum': 1}
-        }},
-        {'$sort': {'_id': 1}}
-    ]))
-    
-    book_addition_trend = list(mongo.db['books'].aggregate([
-        {'$match': {'created_at': {'$gte': thirty_days_ago}}},
-        {'$group': {
-            '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}},
-            'count': {'$sum': 1}
-        }},
-        {'$sort': {'_id': 1}}
-    ]))
-    
-    review_activity_trend = list(mongo.db['reviews'].aggregate([
-        {'$match': {'created_at': {'$gte': thirty_days_ago}}},
-        {'$group': {
-            '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}},
-            'count': {'$sum': 1}
-        }},
-        {'$sort': {'_id': 1}}
-    ]))
+    user_registration_trend = rollup_service.series('registrations', thirty_days_ago)
+    book_addition_trend = rollup_service.series('books_added', thirty_days_ago)
+    review_activity_trend = rollup_service.series('reviews', thirty_days_ago)
     
     active_competitions = Competition.find_active()
     upcoming_competitions = Competition.find_upcoming()
     
     for comp in active_competitions + upcoming_competitions:
         comp['submission_count'] = Competition.count_submissions(str(comp['_id']))
-        comp['evaluation_count'] = mongo.db['ai_evaluations'].count_documents({
+        comp['evaluation_count'] = counts_service.count('ai_evaluations', {
             'competition_id': comp['_id']
         })
     
@@ -349,7 +303,8 @@ def view_competition(competition_id):
     return render_template('admin/competitions/view.html',
                          competition=competition,
                          submissions=submissions,
-                         winners=winners)
+                         winners=winners,
+                         evaluation_job=evaluation_engine.status(competition_id))
 
 
 @bp.route('/<competition_id>/publish', methods=['POST'])
@@ -396,7 +351,7 @@ def close_competition(competition_id):
 @login_required
 @admin_required
 def start_evaluation(competition_id):
-    """Start AI evaluation of all submissions."""
+    """Start (or resume) AI evaluation of all submissions in the background."""
     competition = Competition.find_by_id(competition_id)
     if not competition:
         flash('Competition not found.', 'danger')
@@ -409,53 +364,43 @@ def start_evaluation(competition_id):
     # Update status to evaluating
     Competition.update_status(competition_id, 'evaluating')
     
-    # Get all submissions
-    submissions = CompetitionSubmission.find_by_competition(competition_id)
-    
-    evaluated_count = 0
-    for submission in submissions:
-        # Check if already evaluated
-        existing_eval = AIEvaluation.find_by_submission(str(submission['_id']))
-        if existing_eval:
-            continue
-        
-        # Evaluate submission
-        try:
-            result = evaluate_manuscript(
-                manuscript_title=submission['manuscript_title'],
-                synopsis=submission['synopsis'],
-                word_count=submission['word_count'],
-                genre=submission['genre'],
-                criteria=competition['evaluation_criteria']
-            )
-            
-            AIEvaluation.create(
-                submission_id=str(submission['_id']),
-                competition_id=competition_id,
-                ai_model_version=result['model_version'],
-                criteria_scores=result['criteria_scores'],
-                overall_score=result['overall_score'],
-                strengths_identified=result['strengths'],
-                weaknesses_identified=result['weaknesses'],
-                detailed_feedback=result['detailed_feedback'],
-                confidence_score=result['confidence_score'],
-                processing_time_seconds=result['processing_time']
-            )
-            
-            # Update submission status
-            CompetitionSubmission.update_status(str(submission['_id']), 'under_review')
-            evaluated_count += 1
-            
-        except Exception as e:
-            flash(f'Error evaluating submission {submission["manuscript_title"]}: {str(e)}', 'warning')
-    
-    # Update competition status to admin_review
-    Competition.update_status(competition_id, 'admin_review')
-    
-    flash(f'Evaluation completed! {evaluated_count} submissions evaluated.', 'success')
+    # Submissions are evaluated off the request; the competition page polls the job
+    job, started = evaluation_engine.start(competition_id, started_by=session.get('user_id'),
+                                           use_cache=not request.form.get('fresh'))
+    if started:
+        flash('AI evaluation started. Progress is shown below.', 'success')
+    else:
+        flash('AI evaluation is already running for this competition.', 'info')
     return redirect(url_for('competitions_admin.view_competition', competition_id=competition_id))
 
 
+@bp.route('/<competition_id>/evaluate/status')
+@login_required
+@admin_required
+def evaluation_status(competition_id):
+    """Progress of the competition's evaluation job as JSON."""
+    job = evaluation_engine.status(competition_id)
+    if not job:
+        return jsonify({'status': 'not_started'}), 200
+    
+    return jsonify({
+        'status': job['status'],
+        'active': evaluation_engine.is_active(job),
+        'total': job.get('total', 0),
+        'done': job.get('done', 0),
+        'failed': job.get('failed', 0),
+        'skipped': job.get('skipped', 0),
+        'cache_hits': job.get('cache_hits', 0),
+        'tokens_used': job.get('tokens_used', 0),
+        'errors': [{
+            'manuscript_title': error.get('manuscript_title'),
+            'error': error.get('error')
+        } for error in job.get('errors', [])],
+        'started_at': job['started_at'].isoformat() if job.get('started_at') else None,
+        'finished_at': job['finished_at'].isoformat() if job.get('finished_at') else None
+    }), 200
+
+
 @bp.route('/<competition_id>/select-winners', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -478,71 +423,11 @@ def select_winners(competition_id):
             flash('Please select at least one winner.', 'warning')
             return redirect(url_for('competitions_admin.select_winners', competition_id=competition_id))
         
-        # Create winner records
-        prize_keys = ['first_place', 'second_place', 'third_place']
-        for idx, submission_id in enumerate(winner_ids[:3]):  # Top 3 winners
-            submission = CompetitionSubmission.find_by_id(submission_id)
-            evaluation = AIEvaluation.find_by_submission(submission_id)
-            
-            if not submission or not evaluation:
-                continue
-            
-            rank = idx + 1
-            prize = competition['prize_structure'].get(prize_keys[idx], 'Recognition')
-            
-            CompetitionWinner.create(
-                competition_id=competition_id,
-                submission_id=submission_id,
-                author_id=str(submission['author_id']),
-                rank_position=rank,
-                final_score=evaluation['overall_score'],
-                prize_awarded=prize,
-                winner_feedback=evaluation['detailed_feedback']
-            )
-            
-            # Award badges to winners
-            badge_details = {
-                1: {'name': 'Gold Winner 🥇', 'icon': '🏆', 'type': 'competition_winner'},
-                2: {'name': 'Silver Winner 🥈', 'icon': '🥈', 'type': 'competition_winner'},
-                3: {'name': 'Bronze Winner 🥉', 'icon': '🥉', 'type': 'competition_winner'}
-            }
-            
-            badge_info = badge_details.get(rank)
-            if badge_info:
-                User.award_badge(
-                    user_id=str(submission['author_id']),
-                    badge_type=badge_info['type'],
-                    badge_name=f"{badge_info['name']} - {competition['title']}",
-                    badge_icon=badge_info['icon'],
-                    competition_id=competition_id
-                )
-            
-            # Update competition stats
-            user = User.find_by_id(str(submission['author_id']))
-            current_stats = user.get('competition_stats', {})
-            
-            User.update_competition_stats(
-                user_id=str(submission['author_id']),
-                stat_updates={
-                    'total_wins': current_stats.get('total_wins', 0) + 1,
-                    'total_finalist': current_stats.get('total_finalist', 0) + 1,
-                    'best_rank': rank
-                }
-            )
-            
-            # Update submission status
-            CompetitionSubmission.update_status(submission_id, 'winner')
-        
-        # Update all non-winner submissions to participant status
-        all_submissions = CompetitionSubmission.find_by_competition(competition_id)
-        for sub in all_submissions:
-            if str(sub['_id']) not in winner_ids and sub['submission_status'] != 'winner':
-                CompetitionSubmission.update_status(str(sub['_id']), 'participant')
-        
-        # Update competition status to completed
-        Competition.update_status(competition_id, 'completed')
-        
-        flash('Winners announced successfully!', 'success')
+        # Badges, stats and submission updates run in the background
+        job_queue.enqueue('competitions.announce_winners',
+                          {'competition_id': competition_id, 'winner_ids': winner_ids},
+                          created_by=session.get('user_id'), unique_key=f'announce:{competition_id}')
+        flash('Winners are being announced. The competition is completed once every winner is recorded.', 'success')
         return redirect(url_for('competitions_admin.view_competition', competition_id=competition_id))
     
     # GET: Show evaluation results for winner selection
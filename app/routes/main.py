@@ -1,70 +1,78 @@
 """Main routes."""
-from flask import Blueprint, render_template, session, redirect, url_for, send_from_directory, current_app
+import io
+import os
+from flask import Blueprint, render_template, session, redirect, url_for, send_from_directory, current_app, send_file, abort
 from app.models import Book, User
+from app.services.counts_service import counts_service
+from app.services.page_cache_service import page_cache_service
 from app import mongo
 from bson import ObjectId
+from markupsafe import Markup
 
 bp = Blueprint('main', __name__)
 
 
+def _home_context():
+    """Load the data shown on the homepage."""
+    # Get recent books
+    books = Book.find_all(
+        filters={'status': 'active'},
+        sort=[('created_at', -1)],
+        limit=12
+    )
+    
+    # Enrich books with author info and stored ratings
+    Book.enrich_many(books)
+    
+    # Get stats for homepage
+    stats = {
+        'total_users': counts_service.total(User.collection),
+        'total_books': counts_service.total(Book.collection),
+        'total_reviews': counts_service.total('reviews')
+    }
+    top_reviewers = list(mongo.db.reviews.aggregate([
+        {'$match': {'status': 'approved'}},
+        {'$group': {'_id': '$reviewer_id', 'review_count': {'$sum': 1}}},
+        {'$sort': {'review_count': -1}},
+        {'$limit': 6}
+    ]))
+    
+    reviewers = User.find_by_ids([item['_id'] for item in top_reviewers])
+    enriched_reviewers = []
+    for item in top_reviewers:
+        reviewer = reviewers.get(str(item['_id']))
+        if not reviewer:
+            continue
+        enriched_reviewers.append({
+            'reviewer': reviewer,
+            'review_count': item['review_count']
+        })
+    
+    return {'books': books, 'stats': stats, 'top_reviewers': enriched_reviewers}
+
+
 @bp.route('/')
 def index():
     """Homepage."""
+    # The body only varies by whether the visitor is logged in
+    audience = 'member' if session.get('user_id') else 'guest'
     try:
-        # Get recent books
-        books = Book.find_all(
-            filters={'status': 'active'},
-            sort=[('created_at', -1)],
-            limit=12
+        content = page_cache_service.get_or_render(
+            f'home:{audience}',
+            lambda: render_template('index_content.html', **_home_context()),
+            tag='home',
+            ttl=current_app.config.get('HOMEPAGE_CACHE_SECONDS')
         )
-        
-        # Enrich books with author info
-        for book in books:
-            author = User.find_by_id(str(book['user_id']))
-            book['author'] = author
-        
-        # Get stats for homepage
-        if mongo.db is not None:
-            stats = {
-                'total_users': mongo.db.users.count_documents({}),
-                'total_books': mongo.db.books.count_documents({}),
-                'total_reviews': mongo.db.reviews.count_documents({})
-            }
-            top_reviewers = list(mongo.db.reviews.aggregate([
-                {'$match': {'status': 'approved'}},
-                {'$group': {'_id': '$reviewer_id', 'review_count': {'$sum': 1}}},
-                {'$sort': {'review_count': -1}},
-                {'$limit': 6}
-            ]))
-        else:
-            stats = {
-                'total_users': 0,
-                'total_books': 0,
-                'total_reviews': 0
-            }
-            top_reviewers = []
     except Exception as e:
         # If database is not available, show empty page
         current_app.logger.error(f"Database connection error: {e}")
-        books = []
-        stats = {
+        content = render_template('index_content.html', books=[], top_reviewers=[], stats={
             'total_users': 0,
             'total_books': 0,
             'total_reviews': 0
-        }
-        top_reviewers = []
-    
-    enriched_reviewers = []
-    for item in top_reviewers:
-        reviewer = User.find_by_id(str(item['_id']))
-        if not reviewer:
-            continue
-        enriched_reviewers.append({
-            'reviewer': reviewer,
-            'review_count': item['review_count']
         })
-
-    return render_template('index.html', books=books, stats=stats, top_reviewers=enriched_reviewers)
+    
+    return render_template('index.html', home_content=Markup(content))
 
 
 @bp.route('/dashboard')
@@ -85,6 +93,15 @@ def dashboard():
 def uploaded_file(filename):
     """Serve uploaded files. This is a fallback for local development.
     In production, images should be served directly from S3."""
+    from app.services.media_service import MEDIA_STAGING_COLLECTION
+    
+    if filename.startswith('staged_') and not os.path.exists(
+            os.path.join(os.path.abspath(current_app.config['UPLOAD_FOLDER']), filename)):
+        # Staged on another instance: serve the copy kept for the worker
+        staged = mongo.db[MEDIA_STAGING_COLLECTION].find_one({'staged_file': filename}, {'data': 1})
+        if not staged:
+            abort(404)
+        return send_file(io.BytesIO(staged['data']), download_name=filename)
     return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
 
 
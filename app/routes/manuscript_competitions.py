@@ -5,6 +5,7 @@ from datetime import datetime
 from werkzeug.utils import secure_filename
 import os
 from app.models import Competition, CompetitionSubmission, CompetitionWinner, User, Book
+from app.services.direct_upload_service import direct_uploads
 from app import mongo
 
 bp = Blueprint('manuscript_competitions', __name__, url_prefix='/manuscript-competitions')
@@ -193,29 +194,37 @@ def submit_entry(competition_id):
             synopsis = request.form.get('synopsis')
             author_statement = request.form.get('author_statement', '')
             
+            upload_ticket = request.form.get('upload_ticket')
+            if upload_ticket:
+                # Uploaded straight to storage; the completion callback already validated it
+                ticket = direct_uploads.claim(upload_ticket, session['user_id'], 'manuscript')
+                if not ticket:
+                    flash('Your manuscript upload could not be found. Please upload it again.', 'danger')
+                    return redirect(request.url)
+                manuscript_file_url = ticket['url']
             # Handle file upload
-            if 'manuscript_file' not in request.files:
+            elif 'manuscript_file' not in request.files:
                 flash('No manuscript file uploaded.', 'danger')
                 return redirect(request.url)
-            
-            file = request.files['manuscript_file']
-            if file.filename == '':
-                flash('No manuscript file selected.', 'danger')
-                return redirect(request.url)
-            
-            if not allowed_file(file.filename):
-                flash('Invalid file type. Please upload PDF, DOCX, or TXT file.', 'danger')
-                return redirect(request.url)
-            
-            # Save file
-            filename = secure_filename(f"{session['user_id']}_{competition_id}_{datetime.utcnow().timestamp()}_{file.filename}")
-            
-            # Ensure upload directory exists
-            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-            
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(file_path)
-            manuscript_file_url = file_path
+            else:
+                file = request.files['manuscript_file']
+                if file.filename == '':
+                    flash('No manuscript file selected.', 'danger')
+                    return redirect(request.url)
+                
+                if not allowed_file(file.filename):
+                    flash('Invalid file type. Please upload PDF, DOCX, or TXT file.', 'danger')
+                    return redirect(request.url)
+                
+                # Save file
+                filename = secure_filename(f"{session['user_id']}_{competition_id}_{datetime.utcnow().timestamp()}_{file.filename}")
+                
+                # Ensure upload directory exists
+                os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+                
+                file_path = os.path.join(UPLOAD_FOLDER, filename)
+                file.save(file_path)
+                manuscript_file_url = file_path
             
             # Get word count (simplified - in production, parse the file)
             word_count = int(request.form.get('word_count', 0))
@@ -259,7 +268,8 @@ def submit_entry(competition_id):
     
     return render_template('manuscript_competitions/submit.html',
                          competition=competition,
-                         user_books=user_books)
+                         user_books=user_books,
+                         direct_upload=direct_uploads.enabled('manuscript'))
 
 
 @bp.route('/my-submissions')
@@ -2,8 +2,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
 from app.models import (Book, User, PressKit, NewsletterSubscriber, BookGiveaway, 
                         GiveawayEntry, SocialShare)
+from app.services.image_service import media_url
 from bson import ObjectId
 from datetime import datetime, timedelta
+from urllib.parse import urljoin
 import os
 
 marketing_bp = Blueprint('marketing', __name__, url_prefix='/marketing')
@@ -141,8 +143,14 @@ def list_giveaways():
     page = int(request.args.get('page', 1))
     per_page = 20
     skip = (page - 1) * per_page
+    cursor = request.args.get('cursor', '')
     
-    giveaways = BookGiveaway.find_active_giveaways(skip=skip, limit=per_page)
+    try:
+        giveaways, next_cursor = BookGiveaway.active_giveaways_page(cursor=cursor or None,
+                                                                    limit=per_page, skip=skip)
+    except ValueError:
+        flash('Invalid page link.', 'warning')
+        return redirect(url_for('marketing.list_giveaways'))
     
     # Enrich with book and author data
     for giveaway in giveaways:
@@ -151,7 +159,8 @@ def list_giveaways():
     
     return render_template('marketing/giveaways.html', 
                          giveaways=giveaways,
-                         page=page)
+                         page=page,
+                         next_cursor=next_cursor)
 
 
 @marketing_bp.route('/giveaways/create', methods=['GET', 'POST'])
@@ -280,12 +289,14 @@ def book_widget(book_id):
     
     author = User.find_by_id(str(book['author_id']))
     book_url = url_for('books.book_detail', book_id=book_id, _external=True)
+    # Embedded on other sites: an absolute URL of the card-sized cover
+    cover_url = urljoin(request.host_url, media_url(book.get('cover_image_url'), 'card')) if book.get('cover_image_url') else ''
     
     # Generate HTML widget code
     widget_code = f'''
 <!-- InkLaunch Book Widget -->
 <div style="border: 1px solid #ddd; padding: 20px; max-width: 400px; border-radius: 8px; font-family: Arial, sans-serif;">
-    <img src="{book.get('cover_image_url', '')}" alt="{book['title']}" style="width: 100%; height: auto; margin-bottom: 15px;">
+    <img src="{cover_url}" alt="{book['title']}" style="width: 100%; height: auto; margin-bottom: 15px;">
     <h3 style="margin: 0 0 10px 0; font-size: 18px;">{book['title']}</h3>
     <p style="margin: 0 0 10px 0; color: #666; font-size: 14px;">by {author['full_name']}</p>
     <p style="margin: 0 0 15px 0; font-size: 14px;">{book.get('description', '')[:150]}...</p>
@@ -1,8 +1,8 @@
 """Review routes."""
 from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash, session, current_app
 from app.models import Review, Book, User
+from app.security import rate_limit
 from app import mongo
-from bson import ObjectId
 
 bp = Blueprint('reviews', __name__, url_prefix='/reviews')
 
@@ -30,6 +30,7 @@ def list_reviews():
 
 
 @bp.route('/create', methods=['POST'])
+@rate_limit('REVIEW_RATE_LIMIT', 'REVIEW_RATE_WINDOW', scope='user')
 def create_review():
     """Create a review."""
     user_id = session.get('user_id')
@@ -112,24 +113,9 @@ def approve_review(review_id):
             flash('Review not found', 'error')
             return redirect(url_for('reviews.list_reviews'))
         
-        # Update review status
+        # Update review status (also updates the book's rating aggregates)
         Review.update_status(review_id, 'approved')
         
-        # Update book rating statistics
-        book_id = str(review['book_id'])
-        rating_stats = Review.get_average_rating(book_id)
-        
-        mongo.db.books.update_one(
-            {'_id': ObjectId(book_id)},
-            {
-                '$set': {
-                    'average_rating': rating_stats['average'],
-                    'number_of_reviews': rating_stats['count'],
-                    'total_rating': rating_stats['average'] * rating_stats['count']
-                }
-            }
-        )
-        
         if request.is_json:
             return jsonify({'message': 'Review approved successfully'}), 200
         
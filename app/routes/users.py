@@ -1,12 +1,11 @@
 """User routes."""
 from flask import Blueprint, request, jsonify, render_template, redirect, url_for, session, flash, current_app
-from app.models import User, Book, Review, CompetitionSubmission
-from app.services.s3_service import s3_service
+from app.models import User, Book, Review, CompetitionSubmission, estimated_search_count
+from app.services.media_service import media_service
+from app.security import rate_limit, has_file_upload
 from app import bcrypt, mongo
 from bson import ObjectId
 from datetime import datetime
-from werkzeug.utils import secure_filename
-import os
 
 bp = Blueprint('users', __name__, url_prefix='/users')
 
@@ -28,7 +27,7 @@ def list_users():
     query = request.args.get('q', '').strip()
     role_filter = request.args.get('role', '')
     status_filter = request.args.get('status', '')
-    sort_by = request.args.get('sort', 'created_at')
+    sort_by = request.args.get('sort', 'relevance' if query else 'created_at')
     
     # Build filters
     filters = {}
@@ -41,6 +40,7 @@ def list_users():
     
     # Set sort order
     sort_mapping = {
+        'relevance': None,  # Search backend ranks by relevance
         'created_at': [('created_at', -1)],
         'name': [('full_name', 1)],
         'books': [('total_nominations', -1)],
@@ -49,9 +49,23 @@ def list_users():
     sort_order = sort_mapping.get(sort_by, [('created_at', -1)])
     
     # Search users
+    cursor = request.args.get('cursor', '')
     skip = (page - 1) * per_page
-    users = User.search(query=query, filters=filters, skip=skip, limit=per_page, sort=sort_order)
-    total = User.count_search(query=query, filters=filters)
+    try:
+        users, next_cursor = User.search_page(query=query, filters=filters, sort=sort_order,
+                                              cursor=cursor or None, limit=per_page, skip=skip)
+    except ValueError as e:
+        if request.is_json:
+            return jsonify({'error': str(e)}), 400
+        flash('Invalid page link.', 'warning')
+        args = {key: value for key, value in request.args.items() if key not in ('cursor', 'page')}
+        return redirect(url_for('users.list_users', **args))
+    
+    # Totals are estimates unless exact ones are asked for
+    if request.args.get('total') == 'exact':
+        total = User.count_search(query=query, filters=filters)
+    else:
+        total = estimated_search_count(User, query, filters)
     
     # Enrich with book counts
     for user in users:
@@ -74,7 +88,8 @@ def list_users():
             'total': total,
             'page': page,
             'per_page': per_page,
-            'total_pages': total_pages
+            'total_pages': total_pages,
+            'next_cursor': next_cursor
         }), 200
     
     return render_template('users/list.html', 
@@ -101,7 +116,6 @@ def get_user(user_id):
         return redirect(url_for('main.index'))
     
     # Increment profile views
-    from app import mongo
     mongo.db['users'].update_one(
         {'_id': user['_id']},
         {'$inc': {'profile_views': 1}}
@@ -201,6 +215,7 @@ def get_user_by_username(username):
 
 
 @bp.route('/me/edit', methods=['GET', 'POST'])
+@rate_limit('UPLOAD_RATE_LIMIT', 'UPLOAD_RATE_WINDOW', scope='user', action='upload', when=has_file_upload)
 def edit_profile():
     """Edit current user profile."""
     user_id = session.get('user_id')
@@ -238,78 +253,28 @@ def edit_profile():
     if social_links:
         update_data['social_links'] = social_links
     
-    # Handle profile image upload
-    if 'profile_image' in request.files:
-        file = request.files['profile_image']
-        if file and file.filename and allowed_file(file.filename):
-            try:
-                # Delete old profile image if exists
-                old_image = user.get('profile_image_url', '')
-                if old_image:
-                    if 's3.amazonaws.com' in old_image:
-                        s3_service.delete_file(old_image)
-                    elif old_image.startswith('/uploads/'):
-                        old_path = os.path.join(current_app.config['UPLOAD_FOLDER'], os.path.basename(old_image))
-                        if os.path.exists(old_path):
-                            try:
-                                os.remove(old_path)
-                            except:
-                                pass
-                
-                # Upload new image
-                if s3_service.is_s3_configured():
-                    profile_url = s3_service.upload_file(file, folder='profiles')
-                    if profile_url:
-                        update_data['profile_image_url'] = profile_url
-                else:
-                    # Fallback to local storage
-                    filename = secure_filename(file.filename)
-                    timestamp = datetime.utcnow().timestamp()
-                    unique_filename = f"{timestamp}_{filename}"
-                    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
-                    os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-                    file.save(filepath)
-                    update_data['profile_image_url'] = f"/uploads/{unique_filename}"
-            except Exception as e:
-                current_app.logger.error(f"Failed to upload profile image: {str(e)}")
-    
-    # Handle banner image upload
-    if 'banner_image' in request.files:
-        file = request.files['banner_image']
+    # Handle profile and banner image uploads; staged locally, pushed to S3/Cloudinary by a background job
+    staged_images = {}
+    for upload_field, url_field, folder in (('profile_image', 'profile_image_url', 'profiles'),
+                                            ('banner_image', 'banner_image_url', 'banners')):
+        if upload_field not in request.files:
+            continue
+        file = request.files[upload_field]
         if file and file.filename and allowed_file(file.filename):
             try:
-                # Delete old banner image if exists
-                old_banner = user.get('banner_image_url', '')
-                if old_banner:
-                    if 's3.amazonaws.com' in old_banner:
-                        s3_service.delete_file(old_banner)
-                    elif old_banner.startswith('/uploads/'):
-                        old_path = os.path.join(current_app.config['UPLOAD_FOLDER'], os.path.basename(old_banner))
-                        if os.path.exists(old_path):
-                            try:
-                                os.remove(old_path)
-                            except:
-                                pass
-                
-                # Upload new banner
-                if s3_service.is_s3_configured():
-                    banner_url = s3_service.upload_file(file, folder='banners')
-                    if banner_url:
-                        update_data['banner_image_url'] = banner_url
-                else:
-                    # Fallback to local storage
-                    filename = secure_filename(file.filename)
-                    timestamp = datetime.utcnow().timestamp()
-                    unique_filename = f"banner_{timestamp}_{filename}"
-                    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
-                    os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-                    file.save(filepath)
-                    update_data['banner_image_url'] = f"/uploads/{unique_filename}"
+                staged_images[url_field] = media_service.stage(file, folder=folder)
+                update_data[url_field] = staged_images[url_field].url
             except Exception as e:
-                current_app.logger.error(f"Failed to upload banner image: {str(e)}")
+                current_app.logger.error(f"Failed to upload {upload_field.replace('_', ' ')}: {str(e)}")
     
     update_data['updated_at'] = datetime.utcnow()
     User.update(user_id, update_data)
+    for url_field, staged in staged_images.items():
+        media_service.attach(staged, User.collection, user_id, url_field, created_by=user_id)
+        # The replaced image is deleted later, once nothing refers to it
+        old_url = user.get(url_field, '')
+        if old_url and old_url != staged.url:
+            media_service.release(old_url, created_by=user_id)
     
     if request.is_json:
         return jsonify({'message': 'Profile updated successfully'}), 200
@@ -383,21 +348,9 @@ def delete_profile_photo():
     
     user = User.find_by_id(user_id)
     
-    # Delete old profile image if exists
-    old_image = user.get('profile_image_url', '')
-    if old_image:
-        if 's3.amazonaws.com' in old_image:
-            s3_service.delete_file(old_image)
-        elif old_image.startswith('/uploads/'):
-            old_path = os.path.join(current_app.config['UPLOAD_FOLDER'], os.path.basename(old_image))
-            if os.path.exists(old_path):
-                try:
-                    os.remove(old_path)
-                except:
-                    pass
-    
-    # Remove from database
+    # Remove from database; the image itself is deleted once nothing refers to it
     User.update(user_id, {'profile_image_url': ''})
+    media_service.release(user.get('profile_image_url', ''), created_by=user_id)
     
     if request.is_json:
         return jsonify({'message': 'Profile photo deleted successfully'}), 200
@@ -2,6 +2,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
 from app.models import (Book, User, TitleTest, CoverFeedback, WordCountTracker, 
                         WritingPrompt)
+from app.security import rate_limit
 from bson import ObjectId
 from datetime import datetime
 import random
@@ -89,6 +90,7 @@ def view_title_test(test_id):
 
 
 @writing_bp.route('/title-tester/<test_id>/vote/<int:title_index>', methods=['POST'])
+@rate_limit('VOTE_RATE_LIMIT', 'VOTE_RATE_WINDOW', scope='user')
 def vote_title(test_id, title_index):
     """Vote on a title option."""
     if 'user_id' not in session:
@@ -2,6 +2,8 @@
 from functools import wraps
 from flask import session, redirect, url_for, flash, request, abort
 from datetime import datetime, timedelta
+from pymongo import IndexModel, ASCENDING
+from app.services.rate_limit_service import rate_limiter, RATE_LIMIT_COLLECTION
 
 
 def require_login(f):
@@ -57,12 +59,22 @@ def sanitize_filename(filename):
     return filename
 
 
+class RateLimitRecord:
+    """Shared window counters used by the mongo rate limit backend."""
+    
+    collection = RATE_LIMIT_COLLECTION
+    indexes = [
+        # Each counter carries the time after which no window reads it
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0)
+    ]
+
+
 def check_rate_limit(user_id, action, limit=10, window=60):
     """
-    Simple rate limiting check.
+    Sliding-window rate limiting check.
     
     Args:
-        user_id: User ID
+        user_id: User ID (or another client identifier such as an IP key)
         action: Action type (login, upload, etc.)
         limit: Max attempts per window
         window: Time window in seconds
@@ -70,34 +82,67 @@ def check_rate_limit(user_id, action, limit=10, window=60):
     Returns:
         bool: True if within limit, False if exceeded
     """
-    from app import mongo
-    from datetime import datetime, timedelta
-    
-    key = f"rate_limit:{user_id}:{action}"
-    now = datetime.utcnow()
-    cutoff = now - timedelta(seconds=window)
-    
-    # Count recent attempts
-    count = mongo.db.rate_limits.count_documents({
-        'key': key,
-        'timestamp': {'$gte': cutoff}
-    })
-    
-    if count >= limit:
-        return False
-    
-    # Record this attempt
-    mongo.db.rate_limits.insert_one({
-        'key': key,
-        'timestamp': now
-    })
+    return rate_limiter.hit(f"rate_limit:{user_id}:{action}", limit, window).allowed
+
+
+def _config_value(value):
+    """Resolve a limit given either as a number or as a config key."""
+    from flask import current_app
+    return current_app.config[value] if isinstance(value, str) else value
+
+
+def has_file_upload():
+    """Return whether the request carries at least one non-empty file."""
+    return any(file and file.filename for file in request.files.values())
+
+
+def rate_limit(limit, window, scope='ip', action=None, methods=('POST',), when=None):
+    """
+    Decorator to rate limit a route.
     
-    # Cleanup old records
-    mongo.db.rate_limits.delete_many({
-        'timestamp': {'$lt': cutoff}
-    })
+    Args:
+        limit: Requests per window, or the name of a config setting holding it
+        window: Window in seconds, or the name of a config setting holding it
+        scope: 'ip' limits per client address; 'user' per logged-in user
+            (falling back to the address for anonymous requests)
+        action: Name the limit is counted under (defaults to the endpoint)
+        methods: HTTP methods that are counted
+        when: Optional predicate; requests for which it returns False are
+            not counted (e.g. has_file_upload for forms with optional files)
     
-    return True
+    Exceeded requests get 429 with a Retry-After header (JSON clients) or
+    a flash message and a redirect back (browsers).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            from flask import current_app, jsonify, make_response
+            
+            if request.method not in methods or not current_app.config.get('RATELIMIT_ENABLED', True):
+                return f(*args, **kwargs)
+            if when is not None and not when():
+                return f(*args, **kwargs)
+            
+            client = request.remote_addr
+            if scope == 'user' and session.get('user_id'):
+                client = f"user:{session['user_id']}"
+            key = f"rate_limit:{client}:{action or request.endpoint}"
+            result = rate_limiter.hit(key, _config_value(limit), _config_value(window))
+            if result.allowed:
+                return f(*args, **kwargs)
+            
+            if request.is_json or request.accept_mimetypes.best == 'application/json':
+                response = make_response(jsonify({
+                    'error': 'Too many requests. Please try again later.',
+                    'retry_after': result.retry_after
+                }), 429)
+            else:
+                flash('Too many requests. Please try again later.', 'error')
+                response = redirect(request.referrer or url_for('main.index'))
+            response.headers['Retry-After'] = str(result.retry_after)
+            return response
+        return decorated_function
+    return decorator
 
 
 class SecurityHeaders:
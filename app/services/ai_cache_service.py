@@ -0,0 +1,108 @@
+"""Content-addressed cache of AI completions.
+
+A completion is stored under the SHA-256 fingerprint of everything that
+determines it: model, messages and sampling parameters. Re-running an
+evaluation, retrying after a partial failure or evaluating a duplicate
+submission then returns the stored response instead of paying for
+another API call.
+
+Entries live in the ``ai_responses`` collection for AI_CACHE_TTL_DAYS
+(a TTL index removes them). Each hit increments the entry's hit count
+and the tokens it saved, so the savings can be measured. The raw
+response text is cached rather than parsed results, so parser changes
+apply to cached responses too.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from flask import current_app
+from pymongo.errors import DuplicateKeyError
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+AI_CACHE_COLLECTION = 'ai_responses'
+
+
+def fingerprint(model, messages, params):
+    """Return the cache key for a completion request."""
+    canonical = json.dumps({'model': model, 'messages': messages, 'params': params},
+                           sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class AIResponseCache:
+    """Stores and looks up AI completions by request fingerprint."""
+    
+    @staticmethod
+    def enabled():
+        """Check whether the cache is switched on."""
+        return current_app.config.get('AI_CACHE_ENABLED', True)
+    
+    def get(self, key):
+        """
+        Return a cached completion and count the hit, or None on a miss.
+        
+        Returns:
+            dict: 'content', 'tokens_used' (of the original call) and 'model'
+        """
+        try:
+            entry = mongo.db[AI_CACHE_COLLECTION].find_one_and_update(
+                {'_id': key, 'expires_at': {'$gt': datetime.utcnow()}},
+                {'$inc': {'hits': 1}, '$set': {'last_hit_at': datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.warning(f'AI cache lookup failed: {e}')
+            return None
+        if entry:
+            mongo.db[AI_CACHE_COLLECTION].update_one({'_id': key}, {'$inc': {'tokens_saved': entry['tokens_used']}})
+        return entry
+    
+    def set(self, key, model, content, tokens_used, ttl_days=None):
+        """Store a completion; an entry written concurrently for the same key is kept."""
+        if ttl_days is None:
+            ttl_days = current_app.config.get('AI_CACHE_TTL_DAYS', 30)
+        now = datetime.utcnow()
+        try:
+            mongo.db[AI_CACHE_COLLECTION].replace_one(
+                {'_id': key},
+                {
+                    '_id': key,
+                    'model': model,
+                    'content': content,
+                    'tokens_used': tokens_used,
+                    'hits': 0,
+                    'tokens_saved': 0,
+                    'created_at': now,
+                    'expires_at': now + timedelta(days=ttl_days)
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass
+        except Exception as e:
+            logger.warning(f'AI cache store failed: {e}')
+    
+    def invalidate(self, key=None):
+        """Delete one cached completion, or all of them."""
+        query = {'_id': key} if key else {}
+        return mongo.db[AI_CACHE_COLLECTION].delete_many(query).deleted_count
+    
+    def stats(self):
+        """Return entry, hit and saved-token totals."""
+        pipeline = [{'$group': {
+            '_id': None,
+            'entries': {'$sum': 1},
+            'hits': {'$sum': '$hits'},
+            'tokens_saved': {'$sum': '$tokens_saved'}
+        }}]
+        rows = list(mongo.db[AI_CACHE_COLLECTION].aggregate(pipeline))
+        if not rows:
+            return {'entries': 0, 'hits': 0, 'tokens_saved': 0}
+        rows[0].pop('_id')
+        return rows[0]
+
+
+# Global service instance
+ai_response_cache = AIResponseCache()
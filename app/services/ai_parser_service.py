@@ -0,0 +1,287 @@
+"""Structured parsing of AI responses.
+
+Each response type is described once as a ``ResponseSchema``: the fields
+it must contain, their kind and the section heading the model uses when
+it answers in text. The schema renders the JSON shape that prompts ask
+for, and ``parse_response`` reads a reply in two passes:
+
+1. JSON: the first object in the reply (code fences allowed) is decoded
+   and every field is type-checked and range-checked.
+2. Sections: if no valid JSON is found, a compiled heading pattern
+   splits the text into sections ("STRENGTHS:", "**Overall Score:** 7")
+   and each field is read from its section.
+
+The result carries a confidence between 0 and 1: the weighted share of
+fields that were found and valid. Callers can reject a malformed reply
+without a second API call just to check it.
+"""
+import json
+import re
+from collections import namedtuple
+
+ParseResult = namedtuple('ParseResult', 'data confidence method missing errors')
+
+NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+BULLET_PATTERN = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s+(.*\S)')
+FENCE_PATTERN = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL | re.IGNORECASE)
+# "Prose Quality: 8 - vivid", "- **Plot**: [7]", "Pacing - 6/10"
+SCORE_LINE_PATTERN = re.compile(r'^\s*(?:[-*•]\s*)?\**\s*([A-Za-z][\w &/\'-]*?)\s*\**\s*[:\-–]\s*\**\s*\[?\s*(-?\d+(?:\.\d+)?)')
+
+
+def normalize_key(name):
+    """Turn a heading or criterion name into a snake_case key."""
+    return re.sub(r'[^a-z0-9]+', '_', name.strip().lower()).strip('_')
+
+
+class Field:
+    """One value expected in a response."""
+    
+    KINDS = ('number', 'text', 'list', 'scores')
+    
+    def __init__(self, key, heading, kind, required=True, minimum=None, maximum=None, keys=None, description=''):
+        """
+        Describe a field.
+        
+        Args:
+            key: JSON key and key in the parsed data
+            heading: Section heading in text replies, e.g. 'WEIGHTED OVERALL SCORE'
+            kind: 'number', 'text', 'list' (of strings) or 'scores' (name -> number)
+            required: Optional fields count half as much towards confidence
+            minimum, maximum: Accepted range for numbers and scores
+            keys: Expected names of a 'scores' field (normalized)
+            description: Shown to the model in the JSON schema
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f'Unknown field kind: {kind}')
+        self.key = key
+        self.heading = heading
+        self.kind = kind
+        self.required = required
+        self.minimum = minimum
+        self.maximum = maximum
+        self.keys = [normalize_key(name) for name in keys] if keys else None
+        self.description = description
+    
+    @property
+    def weight(self):
+        """Share of the confidence score this field carries."""
+        return 1.0 if self.required else 0.5
+    
+    def json_schema(self):
+        """Return the JSON schema of the field."""
+        number = {'type': 'number'}
+        if self.minimum is not None:
+            number['minimum'] = self.minimum
+        if self.maximum is not None:
+            number['maximum'] = self.maximum
+        if self.kind == 'number':
+            schema = number
+        elif self.kind == 'text':
+            schema = {'type': 'string'}
+        elif self.kind == 'list':
+            schema = {'type': 'array', 'items': {'type': 'string'}}
+        else:
+            schema = {'type': 'object', 'additionalProperties': number}
+            if self.keys:
+                schema['properties'] = {key: number for key in self.keys}
+                schema['required'] = list(self.keys)
+        if self.description:
+            schema['description'] = self.description
+        return schema
+    
+    def in_range(self, value):
+        """Check a number against the field's bounds."""
+        return ((self.minimum is None or value >= self.minimum)
+                and (self.maximum is None or value <= self.maximum))
+    
+    def coerce(self, value):
+        """
+        Validate a JSON value for this field.
+        
+        Returns:
+            tuple: (value or None, fraction of the field present, error or None)
+        """
+        if self.kind == 'number':
+            number = self._number(value)
+            if number is None:
+                return None, 0.0, f'{self.key}: expected a number, got {value!r}'
+            if not self.in_range(number):
+                return None, 0.0, f'{self.key}: {number} is outside {self.minimum}-{self.maximum}'
+            return number, 1.0, None
+        if self.kind == 'text':
+            if isinstance(value, list):
+                value = ' '.join(str(item) for item in value)
+            if not isinstance(value, str) or not value.strip():
+                return None, 0.0, f'{self.key}: expected text'
+            return value.strip(), 1.0, None
+        if self.kind == 'list':
+            if isinstance(value, str):
+                value = [line for line in value.splitlines()]
+            if not isinstance(value, list):
+                return None, 0.0, f'{self.key}: expected a list'
+            items = [str(item).strip() for item in value if str(item).strip()]
+            return (items, 1.0, None) if items else (None, 0.0, f'{self.key}: empty list')
+        
+        if not isinstance(value, dict):
+            return None, 0.0, f'{self.key}: expected an object of scores'
+        scores = {}
+        for name, raw in value.items():
+            number = self._number(raw.get('score') if isinstance(raw, dict) else raw)
+            if number is not None and self.in_range(number):
+                scores[normalize_key(name)] = number
+        return self._scores_result(scores)
+    
+    def read_section(self, text):
+        """
+        Read the field from its section of a text reply.
+        
+        Returns:
+            tuple: (value or None, fraction of the field present, error or None)
+        """
+        if self.kind == 'number':
+            match = NUMBER_PATTERN.search(text)
+            if not match:
+                return None, 0.0, f'{self.heading}: no number found'
+            number = float(match.group())
+            if not self.in_range(number):
+                return None, 0.0, f'{self.heading}: {number} is outside {self.minimum}-{self.maximum}'
+            return number, 1.0, None
+        if self.kind == 'text':
+            text = ' '.join(line.strip() for line in text.splitlines() if line.strip())
+            return (text, 1.0, None) if text else (None, 0.0, f'{self.heading}: empty section')
+        if self.kind == 'list':
+            lines = [line for line in text.splitlines() if line.strip()]
+            bullets = [match.group(1).strip() for match in map(BULLET_PATTERN.match, lines) if match]
+            items = bullets or [line.strip() for line in lines]
+            return (items, 1.0, None) if items else (None, 0.0, f'{self.heading}: empty section')
+        
+        scores = {}
+        for line in text.splitlines():
+            match = SCORE_LINE_PATTERN.match(line)
+            if match:
+                number = float(match.group(2))
+                if self.in_range(number):
+                    scores[normalize_key(match.group(1))] = number
+        return self._scores_result(scores)
+    
+    def _scores_result(self, scores):
+        """Score a parsed name -> number mapping against the expected names."""
+        if not scores:
+            return None, 0.0, f'{self.key}: no scores found'
+        if not self.keys:
+            return scores, 1.0, None
+        found = [key for key in self.keys if key in scores]
+        missing = [key for key in self.keys if key not in scores]
+        error = f"{self.key}: missing {', '.join(missing)}" if missing else None
+        return scores, len(found) / len(self.keys), error
+    
+    @staticmethod
+    def _number(value):
+        """Read a number from a JSON value such as 7, '7.5' or '8/10'."""
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, str):
+            match = NUMBER_PATTERN.search(value)
+            return float(match.group()) if match else None
+        return None
+
+
+class ResponseSchema:
+    """The fields of one kind of AI response."""
+    
+    def __init__(self, name, fields):
+        """Compile the section heading pattern for the fields."""
+        self.name = name
+        self.fields = fields
+        headings = sorted((field.heading for field in fields), key=len, reverse=True)
+        alternatives = '|'.join(re.escape(heading) for heading in headings)
+        # A heading starts a line, may be bulleted, numbered or bold, and ends with a colon
+        self.heading_pattern = re.compile(
+            rf'^[ \t]*(?:#+[ \t]*)?(?:\d+[.)][ \t]*)?\**[ \t]*({alternatives})[ \t]*\**[ \t]*:[ \t]*\**',
+            re.IGNORECASE | re.MULTILINE
+        )
+        self.by_heading = {field.heading.lower(): field for field in fields}
+    
+    def json_schema(self):
+        """Return the JSON schema that prompts ask the model to follow."""
+        return {
+            'type': 'object',
+            'properties': {field.key: field.json_schema() for field in self.fields},
+            'required': [field.key for field in self.fields if field.required]
+        }
+    
+    def instructions(self):
+        """Return the prompt text requesting a JSON reply in this schema."""
+        return ('Respond with a single JSON object, and nothing else, that matches this JSON schema:\n'
+                + json.dumps(self.json_schema(), indent=2))
+    
+    def sections(self, content):
+        """Split a text reply into {field key: section text}; the first occurrence of a heading wins."""
+        matches = list(self.heading_pattern.finditer(content))
+        found = {}
+        for index, match in enumerate(matches):
+            end = matches[index + 1].start() if index + 1 < len(matches) else len(content)
+            field = self.by_heading[match.group(1).lower()]
+            found.setdefault(field.key, content[match.end():end])
+        return found
+
+
+def extract_json(content):
+    """Return the first JSON object in a reply, or None."""
+    candidates = FENCE_PATTERN.findall(content) + [content]
+    for candidate in candidates:
+        start = candidate.find('{')
+        end = candidate.rfind('}')
+        if start == -1 or end <= start:
+            continue
+        try:
+            value = json.loads(candidate[start:end + 1])
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+def parse_response(content, schema):
+    """
+    Parse an AI reply against a schema, preferring JSON over text sections.
+    
+    Returns:
+        ParseResult: data (field key -> value, only valid fields), confidence
+        (0-1), method ('json', 'sections' or 'none'), missing field keys and
+        validation errors
+    """
+    content = content or ''
+    total = sum(field.weight for field in schema.fields)
+    attempts = []
+    
+    payload = extract_json(content)
+    if payload is not None:
+        attempts.append(('json', lambda field: field.coerce(payload[field.key]) if field.key in payload
+                         else (None, 0.0, f'{field.key}: missing')))
+    sections = schema.sections(content)
+    if sections:
+        attempts.append(('sections', lambda field: field.read_section(sections[field.key]) if field.key in sections
+                         else (None, 0.0, f'{field.heading}: section missing')))
+    
+    best = ParseResult({}, 0.0, 'none', [field.key for field in schema.fields], ['No JSON object or known sections found'])
+    for method, read in attempts:
+        data, errors, missing, score = {}, [], [], 0.0
+        for field in schema.fields:
+            value, present, error = read(field)
+            if value is not None:
+                data[field.key] = value
+            else:
+                missing.append(field.key)
+            if error:
+                errors.append(error)
+            score += field.weight * present
+        confidence = round(score / total, 3) if total else 0.0
+        if confidence > best.confidence:
+            best = ParseResult(data, confidence, method, missing, errors)
+        if confidence == 1.0:
+            break
+    return best
@@ -0,0 +1,166 @@
+"""Model providers behind every AI call.
+
+``ai_provider.complete`` sends chat messages to the provider named by
+AI_PROVIDER:
+
+* ``openai``: the OpenAI chat completions API.
+* ``stub``: a local, deterministic stand-in for development and load
+  tests. Replies are derived from a hash of the request, so the same
+  prompt always gets the same answer. When the prompt embeds a JSON
+  schema (see ai_parser_service) the reply is a JSON object that
+  satisfies it; otherwise it is short plain text. AI_STUB_LATENCY and
+  AI_STUB_JITTER add a simulated delay per call, and AI_STUB_FAILURE_RATE
+  makes that share of calls raise, to exercise retries.
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+import openai
+
+logger = logging.getLogger(__name__)
+
+Completion = namedtuple('Completion', 'content tokens_used model')
+
+SCHEMA_PATTERN = re.compile(r'matches this JSON schema:\s*(\{.*\})', re.DOTALL)
+
+STUB_WORDS = ['vivid', 'layered', 'uneven', 'assured', 'restrained', 'ambitious', 'tender', 'taut',
+              'lyrical', 'familiar', 'sprawling', 'precise', 'warm', 'bleak', 'playful', 'earnest']
+
+
+class ProviderError(Exception):
+    """Raised when a provider call fails."""
+
+
+class OpenAIProvider:
+    """Chat completions through the OpenAI API."""
+    
+    name = 'openai'
+    
+    def __init__(self, api_key, timeout=None):
+        """Remember the credentials; the client is created on first use."""
+        self.api_key = api_key
+        self.timeout = timeout
+        self.client = None
+    
+    def complete(self, model, messages, **params):
+        """Return the completion for a chat request."""
+        if self.client is None:
+            self.client = openai.OpenAI(api_key=self.api_key, timeout=self.timeout)
+        response = self.client.chat.completions.create(model=model, messages=messages, **params)
+        return Completion(
+            content=response.choices[0].message.content,
+            tokens_used=response.usage.total_tokens if response.usage else 0,
+            model=response.model or model
+        )
+
+
+class StubProvider:
+    """Deterministic offline replies with simulated latency and failures."""
+    
+    name = 'stub'
+    
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        """Configure the simulated delay (seconds) and failure share (0-1)."""
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+    
+    def complete(self, model, messages, **params):
+        """Return a reply derived from the request, after the simulated delay."""
+        with self.lock:
+            self.calls += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            fail = self.random.random() < self.failure_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ProviderError('Injected stub failure')
+        
+        prompt = '\n'.join(message['content'] for message in messages)
+        seed = int(hashlib.sha256(f'{model}\n{prompt}'.encode('utf-8')).hexdigest(), 16)
+        rng = random.Random(seed)
+        match = SCHEMA_PATTERN.search(prompt)
+        if match:
+            try:
+                content = json.dumps(self._value(json.loads(match.group(1)), rng, 'reply'))
+            except ValueError:
+                content = self._text(rng)
+        else:
+            content = self._text(rng)
+        # Roughly four characters per token, as with English text
+        return Completion(content=content, tokens_used=(len(prompt) + len(content)) // 4, model=f'stub-{model}')
+    
+    def _value(self, schema, rng, name):
+        """Generate a value that satisfies a JSON schema fragment."""
+        kind = schema.get('type')
+        if kind == 'object':
+            properties = schema.get('properties', {})
+            return {key: self._value(value, rng, key) for key, value in properties.items()}
+        if kind == 'array':
+            return [self._value(schema.get('items', {'type': 'string'}), rng, name) for _ in range(3)]
+        if kind in ('number', 'integer'):
+            low = schema.get('minimum', 0)
+            high = schema.get('maximum', 100)
+            value = rng.uniform(low, high)
+            return int(value) if kind == 'integer' else round(value, 1)
+        if kind == 'boolean':
+            return rng.random() < 0.5
+        return self._text(rng, label=name.replace('_', ' '))
+    
+    @staticmethod
+    def _text(rng, label='response'):
+        """Generate a short deterministic sentence."""
+        words = ' '.join(rng.choice(STUB_WORDS) for _ in range(6))
+        return f'Stub {label}: {words}.'
+
+
+class AIProviderService:
+    """Routes completions to the configured provider."""
+    
+    def __init__(self):
+        """Initialize without a provider until init_app runs."""
+        self.provider = None
+    
+    def init_app(self, app):
+        """Create the provider named by AI_PROVIDER."""
+        self.provider = self.create(app.config)
+        app.extensions['ai_provider'] = self
+    
+    @staticmethod
+    def create(config):
+        """Build a provider from configuration values."""
+        name = config.get('AI_PROVIDER', 'openai')
+        if name == 'stub':
+            return StubProvider(
+                latency=config.get('AI_STUB_LATENCY', 0.0),
+                jitter=config.get('AI_STUB_JITTER', 0.0),
+                failure_rate=config.get('AI_STUB_FAILURE_RATE', 0.0),
+                seed=config.get('AI_STUB_SEED')
+            )
+        if name == 'openai':
+            return OpenAIProvider(config.get('OPENAI_API_KEY') or None, timeout=config.get('AI_REQUEST_TIMEOUT'))
+        raise ValueError(f'Unknown AI_PROVIDER: {name}')
+    
+    def complete(self, model, messages, **params):
+        """
+        Run a chat completion on the configured provider.
+        
+        Returns:
+            Completion: content, tokens_used and the model that answered
+        """
+        if self.provider is None:
+            self.provider = self.create(current_app.config)
+        return self.provider.complete(model, messages, **params)
+
+
+# Global service instance
+ai_provider = AIProviderService()
@@ -1,7 +1,495 @@
 """AI Service for book reviews using OpenAI GPT-4."""
-import openai
+import logging
+import math
+import threading
 import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
 from flask import current_app
+from pymongo.errors import DuplicateKeyError
+from app import mongo
+from app.services.ai_cache_service import ai_response_cache, fingerprint
+from app.services.ai_provider_service import ai_provider
+from app.services.ai_parser_service import ResponseSchema, Field, parse_response, normalize_key
+
+logger = logging.getLogger(__name__)
+
+BOOK_REVIEW_WEIGHTS = {
+    'content_quality': 0.25,
+    'writing_style': 0.25,
+    'originality': 0.20,
+    'market_potential': 0.15,
+    'technical_quality': 0.15
+}
+
+BOOK_REVIEW_SCHEMA = ResponseSchema('book_review', [
+    Field('scores', 'SCORES', 'scores', keys=list(BOOK_REVIEW_WEIGHTS), minimum=1, maximum=10,
+          description='Score from 1-10 (one decimal place) for each dimension'),
+    Field('overall_rating', 'OVERALL RATING', 'number', required=False, minimum=1, maximum=10,
+          description='Weighted average score'),
+    Field('summary', 'SUMMARY', 'text', description='200-300 word professional assessment'),
+    Field('strengths', 'STRENGTHS', 'list', description='Three strengths'),
+    Field('weaknesses', 'WEAKNESSES', 'list', description='Three weaknesses'),
+    Field('recommendations', 'RECOMMENDATIONS', 'text', required=False,
+          description='Constructive suggestions for improvement'),
+    Field('target_audience', 'TARGET AUDIENCE', 'text', required=False,
+          description='Demographic and psychographic profile'),
+    Field('comparable_titles', 'COMPARABLE TITLES', 'list', required=False, description='Three comparable titles'),
+    Field('key_themes', 'KEY THEMES', 'list', required=False, description='Primary topics and concepts'),
+    Field('genre_alignment', 'GENRE ALIGNMENT', 'text', required=False,
+          description='How well the book fits its declared genre'),
+    Field('readability', 'READABILITY', 'text', required=False, description='Accessibility assessment'),
+    Field('sentiment', 'SENTIMENT', 'text', required=False, description='Overall emotional tone')
+])
+
+
+@lru_cache(maxsize=64)
+def manuscript_schema(criteria_names):
+    """Return the evaluation schema for a competition's criteria (a tuple of names)."""
+    return ResponseSchema('manuscript_evaluation', [
+        Field('criteria_scores', 'CRITERION SCORES', 'scores', keys=criteria_names, minimum=1, maximum=10,
+              description='Score from 1-10 for each criterion, keyed by criterion'),
+        Field('overall_score', 'WEIGHTED OVERALL SCORE', 'number', required=False, minimum=1, maximum=10,
+              description='Weighted average of the criterion scores'),
+        Field('confidence', 'CONFIDENCE', 'number', required=False, minimum=1, maximum=10,
+              description='1-10 confidence in this evaluation'),
+        Field('strengths', 'STRENGTHS', 'list', description='Three strengths'),
+        Field('weaknesses', 'WEAKNESSES', 'list', description='Three weaknesses'),
+        Field('detailed_feedback', 'DETAILED FEEDBACK', 'text',
+              description='2-3 paragraphs explaining the evaluation: what works well and what could be '
+                          'improved. Be constructive and specific.')
+    ])
+
+
+class UnparseableResponse(Exception):
+    """Raised when too little of an AI reply could be parsed to use it."""
+
+
+def check_parsed(parsed, key):
+    """
+    Reject a reply parsed below AI_PARSE_MIN_CONFIDENCE.
+    
+    The reply is evicted from the response cache first, so a retry asks
+    the model again instead of re-reading the same malformed answer.
+    """
+    if parsed.confidence < current_app.config.get('AI_PARSE_MIN_CONFIDENCE', 0.5):
+        ai_response_cache.invalidate(key)
+        raise UnparseableResponse(f"Could not parse AI response (confidence {parsed.confidence}): "
+                                  f"{'; '.join(parsed.errors[:3])}")
+
+
+LANES = ('interactive', 'batch')
+AI_USAGE_COLLECTION = 'ai_usage'
+USAGE_WINDOW = 60  # Seconds; budgets are per minute
+LATENCY_SAMPLES = 500
+WAITING_SIGNAL_SECONDS = 2  # How long a process's "interactive requests waiting" signal lasts
+
+
+class SchedulerTimeout(Exception):
+    """Raised when a request waited in the AI queue longer than its lane allows."""
+
+
+class MemoryUsageBackend:
+    """Per-second request and token counts held in this process."""
+    
+    def __init__(self):
+        """Initialize empty counters."""
+        self.buckets = {}  # second -> [requests, tokens]
+        self.lock = threading.Lock()
+    
+    def usage(self, now):
+        """Return (requests, tokens) started in the last minute."""
+        start = int(now) - USAGE_WINDOW
+        with self.lock:
+            for second in [second for second in self.buckets if second <= start]:
+                del self.buckets[second]
+            return (sum(bucket[0] for bucket in self.buckets.values()),
+                    sum(bucket[1] for bucket in self.buckets.values()))
+    
+    def record(self, second, requests, tokens):
+        """Add to a second's counts; tokens may be negative to correct an estimate."""
+        with self.lock:
+            bucket = self.buckets.setdefault(second, [0, 0])
+            bucket[0] += requests
+            bucket[1] += tokens
+    
+    def signal_waiting(self, owner, until):
+        """Nothing to share: interactive precedence within one process needs no signal."""
+    
+    def waiting_elsewhere(self, owner, now):
+        """Return whether another process has interactive requests waiting; never, for one process."""
+        return False
+
+
+class MongoUsageBackend:
+    """Per-second request and token counts in MongoDB, shared by the web and worker processes."""
+    
+    def usage(self, now):
+        """Return (requests, tokens) started in the last minute."""
+        rows = list(mongo.db[AI_USAGE_COLLECTION].aggregate([
+            {'$match': {'_id': {'$gt': int(now) - USAGE_WINDOW}}},
+            {'$group': {'_id': None, 'requests': {'$sum': '$requests'}, 'tokens': {'$sum': '$tokens'}}}
+        ]))
+        return (rows[0]['requests'], rows[0]['tokens']) if rows else (0, 0)
+    
+    def record(self, second, requests, tokens):
+        """Add to a second's counts; tokens may be negative to correct an estimate."""
+        update = {
+            '$inc': {'requests': requests, 'tokens': tokens},
+            '$setOnInsert': {'expires_at': datetime.utcfromtimestamp(second + 2 * USAGE_WINDOW)}
+        }
+        try:
+            mongo.db[AI_USAGE_COLLECTION].update_one({'_id': second}, update, upsert=True)
+        except DuplicateKeyError:
+            # A concurrent first write created the bucket; the retry updates it
+            mongo.db[AI_USAGE_COLLECTION].update_one({'_id': second}, update, upsert=True)
+    
+    def signal_waiting(self, owner, until):
+        """Tell other processes this one has interactive requests waiting, until a time."""
+        mongo.db[AI_USAGE_COLLECTION].update_one(
+            {'_id': f'waiting:{owner}'},
+            {'$set': {'waiting_until': until,
+                      'expires_at': datetime.utcfromtimestamp(until + 2 * USAGE_WINDOW)}},
+            upsert=True
+        )
+    
+    def waiting_elsewhere(self, owner, now):
+        """Return whether another process has interactive requests waiting."""
+        return mongo.db[AI_USAGE_COLLECTION].find_one(
+            {'waiting_until': {'$gt': now}, '_id': {'$ne': f'waiting:{owner}'}}, {'_id': 1}) is not None
+
+
+class Ticket:
+    """One queued or running AI request."""
+    
+    def __init__(self, lane, tenant, estimated_tokens):
+        """Describe the request."""
+        self.lane = lane
+        self.tenant = tenant
+        self.estimated_tokens = estimated_tokens
+        self.tokens_used = None
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.second = None
+        self.admitted = False
+
+
+def percentile(samples, fraction):
+    """Return the nearest-rank percentile of a list of numbers, or None if it is empty."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class AIScheduler:
+    """
+    Admits AI requests within request and token budgets.
+    
+    Requests wait in one of two lanes. Interactive requests (a user is
+    waiting on the page) are always admitted before batch requests, and
+    batch requests may only use AI_BATCH_SHARE of each budget, so a
+    competition evaluation run cannot crowd out interactive reviews.
+    Within a lane, tenants (e.g. competitions) take turns, so one large
+    run does not delay a small one queued behind it.
+    
+    A request is admitted while, over the last minute, fewer than
+    AI_RPM_LIMIT requests started and the tokens used plus its estimate
+    stay within AI_TPM_LIMIT, and fewer than AI_MAX_CONCURRENCY requests
+    are in flight in this process. The estimate is replaced by the actual
+    usage once the call returns. A limit of 0 disables it.
+    
+    Usage counts live in the ``ai_usage`` collection (AI_SCHEDULER_BACKEND
+    =mongo, the default), where the web and worker processes share one
+    budget, so AI_BATCH_SHARE holds across them too. A process whose
+    interactive requests are waiting signals it there, and every process
+    holds back its batch requests until the signal lapses. The check and
+    increment are not atomic, so concurrent processes may briefly
+    overshoot by a request or two. ``memory`` keeps the counts in this
+    process: each process then has the whole budget to itself.
+    
+    Budgets are read and written outside the lock that guards the lanes;
+    ``dispatch_lock`` only keeps two threads of a process from admitting
+    against the same reading.
+    """
+    
+    def __init__(self):
+        """Initialize empty lanes; limits are read from the app config on each request."""
+        self.backend = None
+        self.owner = uuid.uuid4().hex  # Names this process's waiting signal
+        self.condition = threading.Condition()
+        self.dispatch_lock = threading.Lock()
+        self.signalled_until = 0
+        self.waiting = {lane: OrderedDict() for lane in LANES}  # tenant -> deque of tickets
+        self.in_flight = {lane: 0 for lane in LANES}
+        self.limits = {'rpm': 0, 'tpm': 0, 'concurrency': 0, 'batch_share': 1.0}
+        self.latencies = {lane: deque(maxlen=LATENCY_SAMPLES) for lane in LANES}
+        self.waits = {lane: deque(maxlen=LATENCY_SAMPLES) for lane in LANES}
+        self.counters = {lane: {'completed': 0, 'failed': 0, 'timed_out': 0} for lane in LANES}
+    
+    def init_app(self, app):
+        """Create the usage backend named by AI_SCHEDULER_BACKEND."""
+        if app.config.get('AI_SCHEDULER_BACKEND', 'mongo') == 'memory':
+            self.backend = MemoryUsageBackend()
+        else:
+            self.backend = MongoUsageBackend()
+        app.extensions['ai_scheduler'] = self
+    
+    @staticmethod
+    def enabled():
+        """Check whether requests are scheduled at all."""
+        return current_app.config.get('AI_SCHEDULER_ENABLED', True)
+    
+    @contextmanager
+    def slot(self, lane='interactive', tenant=None, estimated_tokens=0):
+        """
+        Wait for a turn, then run the block; set ``ticket.tokens_used`` inside it.
+        
+        A call that raises is charged its estimate, since the provider may
+        have processed it. With AI_SCHEDULER_ENABLED off the block runs at once.
+        """
+        if not self.enabled():
+            yield Ticket(lane, tenant, estimated_tokens)
+            return
+        ticket = self.acquire(lane, tenant, estimated_tokens)
+        failed = True
+        try:
+            yield ticket
+            failed = False
+        finally:
+            self.release(ticket, failed=failed)
+    
+    def acquire(self, lane, tenant, estimated_tokens, timeout=None):
+        """
+        Queue a request and block until it is admitted.
+        
+        Args:
+            lane: 'interactive' or 'batch'
+            tenant: Requests with different tenants take turns within the lane
+            estimated_tokens: Prompt plus completion tokens expected
+            timeout: Seconds to wait (defaults to the lane's AI_*_QUEUE_TIMEOUT)
+        
+        Returns:
+            Ticket: pass to release() when the call finishes
+        
+        Raises:
+            SchedulerTimeout: if the request was not admitted in time
+        """
+        if lane not in LANES:
+            raise ValueError(f'Unknown AI lane: {lane}')
+        config = current_app.config
+        if timeout is None:
+            timeout = config.get(f'AI_{lane.upper()}_QUEUE_TIMEOUT', 300)
+        if self.backend is None:
+            self.init_app(current_app)
+        ticket = Ticket(lane, tenant, estimated_tokens)
+        deadline = ticket.queued_at + timeout
+        
+        with self.condition:
+            self.limits = {
+                'rpm': config.get('AI_RPM_LIMIT', 0),
+                'tpm': config.get('AI_TPM_LIMIT', 0),
+                'concurrency': config.get('AI_MAX_CONCURRENCY', 0),
+                'batch_share': config.get('AI_BATCH_SHARE', 1.0)
+            }
+            self.waiting[lane].setdefault(tenant, deque()).append(ticket)
+        while True:
+            self._dispatch()
+            with self.condition:
+                if ticket.admitted:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove(ticket)
+                    self.counters[lane]['timed_out'] += 1
+                    self.condition.notify_all()
+                    raise SchedulerTimeout(f'AI request waited over {timeout:g}s in the {lane} queue')
+                # Budgets free up as the window slides, which nobody announces
+                self.condition.wait(min(remaining, 1.0))
+        
+        self.waits[lane].append(ticket.started_at - ticket.queued_at)
+        return ticket
+    
+    def release(self, ticket, failed=False):
+        """Record a finished request and admit whoever can go next."""
+        tokens = ticket.estimated_tokens if ticket.tokens_used is None else ticket.tokens_used
+        try:
+            if tokens != ticket.estimated_tokens:
+                self.backend.record(ticket.second, 0, tokens - ticket.estimated_tokens)
+        except Exception as e:
+            logger.warning(f'Could not record AI token usage: {e}')
+        with self.condition:
+            self.in_flight[ticket.lane] -= 1
+            self.latencies[ticket.lane].append(time.monotonic() - ticket.started_at)
+            self.counters[ticket.lane]['failed' if failed else 'completed'] += 1
+        self._dispatch()
+        with self.condition:
+            self.condition.notify_all()
+    
+    def _dispatch(self):
+        """
+        Admit queued requests in lane and round-robin order while budgets allow.
+        
+        Callers must not hold the condition: usage is read and recorded
+        without it, so threads waiting on or releasing a slot never queue
+        behind a MongoDB round trip.
+        """
+        with self.dispatch_lock:
+            with self.condition:
+                queued = {lane: bool(self.waiting[lane]) for lane in LANES}
+            if not any(queued.values()):
+                return
+            now = time.time()
+            try:
+                usage = list(self.backend.usage(now))
+                # Batch work also waits behind interactive requests queued in other processes
+                batch_held = queued['batch'] and self.backend.waiting_elsewhere(self.owner, now)
+            except Exception as e:
+                # Never stall AI features because usage storage is down
+                logger.error(f'AI usage lookup failed: {e}')
+                usage, batch_held = [0, 0], False
+            
+            started = []
+            with self.condition:
+                while True:
+                    # Interactive requests keep their precedence: batch work waits behind them
+                    lane = next((lane for lane in LANES if self.waiting[lane]), None)
+                    if lane is None or (lane == 'batch' and batch_held):
+                        break
+                    tenant, tickets = next(iter(self.waiting[lane].items()))
+                    ticket = tickets[0]
+                    if not self._fits(ticket, usage):
+                        break
+                    tickets.popleft()
+                    if tickets:
+                        self.waiting[lane].move_to_end(tenant)
+                    else:
+                        del self.waiting[lane][tenant]
+                    self._start(ticket, now)
+                    usage[0] += 1
+                    usage[1] += ticket.estimated_tokens
+                    started.append(ticket)
+                interactive_waiting = bool(self.waiting['interactive'])
+                if started:
+                    self.condition.notify_all()
+            
+            for ticket in started:
+                try:
+                    self.backend.record(ticket.second, 1, ticket.estimated_tokens)
+                except Exception as e:
+                    logger.warning(f'Could not record AI request: {e}')
+            if interactive_waiting and now + 1 > self.signalled_until:
+                try:
+                    self.signalled_until = now + WAITING_SIGNAL_SECONDS
+                    self.backend.signal_waiting(self.owner, self.signalled_until)
+                except Exception as e:
+                    logger.warning(f'Could not signal waiting AI requests: {e}')
+    
+    def _fits(self, ticket, usage):
+        """Check whether a request fits the budgets; callers hold the lock."""
+        share = self.limits['batch_share'] if ticket.lane == 'batch' else 1.0
+        requests, tokens = usage
+        rpm, tpm, concurrency = self.limits['rpm'], self.limits['tpm'], self.limits['concurrency']
+        if concurrency:
+            if sum(self.in_flight.values()) >= concurrency:
+                return False
+            if ticket.lane == 'batch' and self.in_flight['batch'] >= max(1, int(concurrency * share)):
+                return False
+        if rpm and requests >= max(1, rpm * share):
+            return False
+        # A request larger than the whole budget still runs once the window is empty
+        if tpm and tokens and tokens + ticket.estimated_tokens > tpm * share:
+            return False
+        return True
+    
+    def _start(self, ticket, now):
+        """Mark a ticket running; callers hold the lock and record its usage after releasing it."""
+        ticket.second = int(now)
+        ticket.started_at = time.monotonic()
+        ticket.admitted = True
+        self.in_flight[ticket.lane] += 1
+    
+    def _remove(self, ticket):
+        """Take a ticket that gave up out of its queue; callers hold the lock."""
+        tickets = self.waiting[ticket.lane].get(ticket.tenant)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del self.waiting[ticket.lane][ticket.tenant]
+    
+    def metrics(self):
+        """Return queue depth, in-flight requests, usage per minute and latency percentiles."""
+        if self.backend is None:
+            self.init_app(current_app)
+        try:
+            requests, tokens = self.backend.usage(time.time())
+        except Exception as e:
+            logger.error(f'AI usage lookup failed: {e}')
+            requests, tokens = None, None
+        with self.condition:
+            lanes = {}
+            for lane in LANES:
+                latencies = list(self.latencies[lane])
+                waits = list(self.waits[lane])
+                lanes[lane] = dict(
+                    self.counters[lane],
+                    queued=sum(len(tickets) for tickets in self.waiting[lane].values()),
+                    tenants=len(self.waiting[lane]),
+                    in_flight=self.in_flight[lane],
+                    latency_p50=percentile(latencies, 0.5),
+                    latency_p95=percentile(latencies, 0.95),
+                    wait_p50=percentile(waits, 0.5),
+                    wait_p95=percentile(waits, 0.95)
+                )
+            limits = dict(self.limits)
+        return {'requests_per_minute': requests, 'tokens_per_minute': tokens, 'limits': limits, 'lanes': lanes}
+
+
+def estimate_tokens(messages, max_tokens):
+    """Estimate a request's tokens: about four characters per prompt token, plus the completion limit."""
+    return sum(len(message['content']) for message in messages) // 4 + max_tokens
+
+
+def chat_completion(model, messages, temperature, max_tokens, use_cache=True, json_output=False,
+                    lane='interactive', tenant=None):
+    """
+    Run a chat completion, answering repeated requests from the response cache.
+    
+    Args:
+        model: Model name
+        messages: Chat messages
+        temperature: Sampling temperature
+        max_tokens: Completion token limit
+        use_cache: False bypasses the cache lookup (the fresh response is still stored)
+        json_output: Ask for a JSON object reply (when AI_JSON_MODE is on)
+        lane: Scheduler lane, 'interactive' or 'batch'
+        tenant: Requests of different tenants take turns within the lane
+    
+    Returns:
+        dict: 'content', 'tokens_used' (0 on a cache hit), 'tokens_saved',
+        'cache_hit' and 'cache_key'
+    """
+    params = {'temperature': temperature, 'max_tokens': max_tokens}
+    if json_output and current_app.config.get('AI_JSON_MODE', True):
+        params['response_format'] = {'type': 'json_object'}
+    key = fingerprint(model, messages, params)
+    caching = ai_response_cache.enabled()
+    if caching and use_cache:
+        cached = ai_response_cache.get(key)
+        if cached:
+            return {'content': cached['content'], 'tokens_used': 0,
+                    'tokens_saved': cached['tokens_used'], 'cache_hit': True, 'cache_key': key}
+    
+    with ai_scheduler.slot(lane, tenant, estimate_tokens(messages, max_tokens)) as ticket:
+        response = ai_provider.complete(model, messages, **params)
+        ticket.tokens_used = response.tokens_used
+    if caching:
+        ai_response_cache.set(key, model, response.content, response.tokens_used)
+    return {'content': response.content, 'tokens_used': response.tokens_used, 'tokens_saved': 0,
+            'cache_hit': False, 'cache_key': key}
 
 
 class AIService:
@@ -9,19 +497,18 @@ class AIService:
     
     def __init__(self):
         """Initialize AI service."""
-        openai.api_key = current_app.config['OPENAI_API_KEY']
         self.model = current_app.config['AI_MODEL']
     
-    def review_book(self, book, nomination, author):
-        """Generate AI review for a book."""
+    def review_book(self, book, nomination, author, use_cache=True):
+        """Generate AI review for a book; use_cache=False forces a fresh response."""
         start_time = time.time()
         
         # Prepare prompt
         prompt = self._prepare_prompt(book, nomination, author)
         
         try:
-            # Call OpenAI API
-            response = openai.chat.completions.create(
+            # Call OpenAI API (or reuse the response to an identical request)
+            completion = chat_completion(
                 model=self.model,
                 messages=[
                     {
@@ -34,18 +521,21 @@ class AIService:
                     }
                 ],
                 temperature=0.7,
-                max_tokens=1500
+                max_tokens=1500,
+                use_cache=use_cache,
+                json_output=True
             )
             
             processing_time = time.time() - start_time
             
-            # Parse response
-            content = response.choices[0].message.content
-            
             # Extract scores and analysis
-            review_data = self._parse_review(content)
+            parsed = parse_response(completion['content'], BOOK_REVIEW_SCHEMA)
+            check_parsed(parsed, completion['cache_key'])
+            review_data = self._review_fields(parsed)
             review_data['processing_time_seconds'] = round(processing_time, 2)
-            review_data['tokens_used'] = response.usage.total_tokens
+            review_data['tokens_used'] = completion['tokens_used']
+            review_data['tokens_saved'] = completion['tokens_saved']
+            review_data['cache_hit'] = completion['cache_hit']
             review_data['ai_model'] = self.model
             
             return review_data
@@ -83,195 +573,43 @@ Please evaluate this book across the following dimensions and provide scores fro
 4. **Market Potential** (15% weight): Target audience size, commercial viability, market demand
 5. **Technical Quality** (15% weight): Grammar, spelling, formatting, professional presentation
 
-Provide your analysis in the following format:
-
-SCORES:
-Content Quality: [score]
-Writing Style: [score]
-Originality: [score]
-Market Potential: [score]
-Technical Quality: [score]
-
-OVERALL RATING: [weighted average score]
-
-SUMMARY:
-[200-300 word professional assessment]
-
-STRENGTHS:
-- [strength 1]
-- [strength 2]
-- [strength 3]
-
-WEAKNESSES:
-- [weakness 1]
-- [weakness 2]
-- [weakness 3]
-
-RECOMMENDATIONS:
-[Constructive suggestions for improvement]
-
-TARGET AUDIENCE:
-[Demographic and psychographic profile]
-
-COMPARABLE TITLES:
-- [title 1]
-- [title 2]
-- [title 3]
-
-KEY THEMES:
-[Primary topics and concepts]
-
-GENRE ALIGNMENT:
-[How well the book fits its declared genre]
+{BOOK_REVIEW_SCHEMA.instructions()}
 
-READABILITY:
-[Accessibility assessment]
-
-SENTIMENT:
-[Overall emotional tone]
+Use these keys in "scores": {', '.join(BOOK_REVIEW_WEIGHTS)}.
 """
     
-    def _parse_review(self, content):
-        """Parse AI review response."""
-        lines = content.split('\n')
-        
-        review_data = {
-            'content_quality_score': 0.0,
-            'writing_style_score': 0.0,
-            'originality_score': 0.0,
-            'market_potential_score': 0.0,
-            'technical_quality_score': 0.0,
-            'overall_rating': 0.0,
-            'review_summary': '',
-            'strengths': [],
-            'weaknesses': [],
-            'recommendations': '',
-            'target_audience': '',
-            'comparable_titles': [],
-            'key_themes': [],
-            'genre_alignment': '',
-            'readability_score': '',
-            'sentiment_analysis': ''
-        }
-        
-        current_section = None
-        section_content = []
-        
-        for line in lines:
-            line = line.strip()
-            
-            if not line:
-                continue
-            
-            # Check for sections
-            if 'SCORES:' in line:
-                current_section = 'scores'
-            elif 'OVERALL RATING:' in line:
-                try:
-                    rating = float(line.split(':')[1].strip())
-                    review_data['overall_rating'] = rating
-                except:
-                    pass
-            elif 'SUMMARY:' in line:
-                current_section = 'summary'
-                section_content = []
-            elif 'STRENGTHS:' in line:
-                if section_content:
-                    review_data['review_summary'] = ' '.join(section_content)
-                current_section = 'strengths'
-                section_content = []
-            elif 'WEAKNESSES:' in line:
-                current_section = 'weaknesses'
-                section_content = []
-            elif 'RECOMMENDATIONS:' in line:
-                current_section = 'recommendations'
-                section_content = []
-            elif 'TARGET AUDIENCE:' in line:
-                if section_content:
-                    review_data['recommendations'] = ' '.join(section_content)
-                current_section = 'target_audience'
-                section_content = []
-            elif 'COMPARABLE TITLES:' in line:
-                if section_content:
-                    review_data['target_audience'] = ' '.join(section_content)
-                current_section = 'comparable_titles'
-                section_content = []
-            elif 'KEY THEMES:' in line:
-                current_section = 'key_themes'
-                section_content = []
-            elif 'GENRE ALIGNMENT:' in line:
-                if section_content:
-                    review_data['key_themes'] = section_content
-                current_section = 'genre_alignment'
-                section_content = []
-            elif 'READABILITY:' in line:
-                if section_content:
-                    review_data['genre_alignment'] = ' '.join(section_content)
-                current_section = 'readability'
-                section_content = []
-            elif 'SENTIMENT:' in line:
-                if section_content:
-                    review_data['readability_score'] = ' '.join(section_content)
-                current_section = 'sentiment'
-                section_content = []
-            elif current_section == 'scores':
-                # Parse individual scores
-                if 'Content Quality:' in line:
-                    try:
-                        review_data['content_quality_score'] = float(line.split(':')[1].strip())
-                    except:
-                        pass
-                elif 'Writing Style:' in line:
-                    try:
-                        review_data['writing_style_score'] = float(line.split(':')[1].strip())
-                    except:
-                        pass
-                elif 'Originality:' in line:
-                    try:
-                        review_data['originality_score'] = float(line.split(':')[1].strip())
-                    except:
-                        pass
-                elif 'Market Potential:' in line:
-                    try:
-                        review_data['market_potential_score'] = float(line.split(':')[1].strip())
-                    except:
-                        pass
-                elif 'Technical Quality:' in line:
-                    try:
-                        review_data['technical_quality_score'] = float(line.split(':')[1].strip())
-                    except:
-                        pass
-            elif current_section in ['summary', 'recommendations', 'target_audience', 'genre_alignment', 'readability', 'sentiment']:
-                section_content.append(line)
-            elif current_section == 'strengths' and line.startswith('-'):
-                review_data['strengths'].append(line[1:].strip())
-            elif current_section == 'weaknesses' and line.startswith('-'):
-                review_data['weaknesses'].append(line[1:].strip())
-            elif current_section == 'comparable_titles' and line.startswith('-'):
-                review_data['comparable_titles'].append(line[1:].strip())
-            elif current_section == 'key_themes':
-                section_content.append(line)
-        
-        # Handle last section
-        if current_section == 'sentiment' and section_content:
-            review_data['sentiment_analysis'] = ' '.join(section_content)
+    @staticmethod
+    def _review_fields(parsed):
+        """Map a parsed book review onto the fields stored on AIBookReview."""
+        data = parsed.data
+        scores = data.get('scores', {})
+        review_data = {f'{name}_score': scores.get(name, 0.0) for name in BOOK_REVIEW_WEIGHTS}
+        review_data.update({
+            'overall_rating': data.get('overall_rating', 0.0),
+            'review_summary': data.get('summary', ''),
+            'strengths': data.get('strengths', []),
+            'weaknesses': data.get('weaknesses', []),
+            'recommendations': data.get('recommendations', ''),
+            'target_audience': data.get('target_audience', ''),
+            'comparable_titles': data.get('comparable_titles', []),
+            'key_themes': data.get('key_themes', []),
+            'genre_alignment': data.get('genre_alignment', ''),
+            'readability_score': data.get('readability', ''),
+            'sentiment_analysis': data.get('sentiment', ''),
+            'parse_confidence': parsed.confidence,
+            'parse_method': parsed.method
+        })
         
         # Calculate overall rating if not provided
-        if review_data['overall_rating'] == 0.0:
-            weights = {
-                'content_quality_score': 0.25,
-                'writing_style_score': 0.25,
-                'originality_score': 0.20,
-                'market_potential_score': 0.15,
-                'technical_quality_score': 0.15
-            }
-            total = sum(review_data[key] * weight for key, weight in weights.items())
+        if not review_data['overall_rating']:
+            total = sum(scores.get(name, 0.0) * weight for name, weight in BOOK_REVIEW_WEIGHTS.items())
             review_data['overall_rating'] = round(total, 1)
         
         return review_data
 
 
-def evaluate_manuscript(manuscript_title, synopsis, word_count, genre, criteria):
+def evaluate_manuscript(manuscript_title, synopsis, word_count, genre, criteria, use_cache=True,
+                        lane='interactive', tenant=None):
     """
     Evaluate a manuscript submission for competition using AI.
     
@@ -281,13 +619,13 @@ def evaluate_manuscript(manuscript_title, synopsis, word_count, genre, criteria)
         word_count: Word count
         genre: Genre of the manuscript
         criteria: Dictionary of evaluation criteria with weights
+        use_cache: False forces a fresh response instead of a cached one
+        lane: Scheduler lane; competition runs use 'batch'
+        tenant: Scheduler tenant, e.g. the competition id
     
     Returns:
         Dictionary with evaluation results
     """
-    import openai
-    from flask import current_app
-    
     start_time = time.time()
     
     # Prepare prompt based on criteria
@@ -296,6 +634,7 @@ def evaluate_manuscript(manuscript_title, synopsis, word_count, genre, criteria)
         criteria_list.append(f"- {criterion.replace('_', ' ').title()}: {weight}% weight")
     
     criteria_text = '\n'.join(criteria_list)
+    schema = manuscript_schema(tuple(criteria))
     
     prompt = f"""You are an expert literary critic evaluating a {genre} manuscript for a writing competition.
 
@@ -312,34 +651,13 @@ def evaluate_manuscript(manuscript_title, synopsis, word_count, genre, criteria)
 
 Please evaluate this manuscript across each criterion and provide scores from 1-10 (where 1-2 is Poor, 3-4 is Below Average, 5-6 is Average, 7-8 is Good, 9-10 is Excellent).
 
-Provide your evaluation in the following format:
-
-CRITERION SCORES:
-{chr(10).join(f"{c.replace('_', ' ').title()}: [score] - [brief 1-sentence justification]" for c in criteria.keys())}
-
-WEIGHTED OVERALL SCORE: [calculated weighted average]
-
-CONFIDENCE: [1-10 score indicating your confidence in this evaluation]
-
-STRENGTHS:
-- [Strength 1]
-- [Strength 2]
-- [Strength 3]
-
-WEAKNESSES:
-- [Weakness 1]
-- [Weakness 2]
-- [Weakness 3]
-
-DETAILED FEEDBACK:
-[2-3 paragraph comprehensive feedback explaining your evaluation, highlighting what works well and what could be improved. Be constructive and specific.]
+{schema.instructions()}
 """
     
     try:
-        openai.api_key = current_app.config.get('OPENAI_API_KEY')
         model = current_app.config.get('AI_MODEL', 'gpt-4')
         
-        response = openai.chat.completions.create(
+        completion = chat_completion(
             model=model,
             messages=[
                 {
@@ -352,75 +670,24 @@ DETAILED FEEDBACK:
                 }
             ],
             temperature=0.7,
-            max_tokens=1500
+            max_tokens=1500,
+            use_cache=use_cache,
+            json_output=True,
+            lane=lane,
+            tenant=tenant
         )
         
         processing_time = time.time() - start_time
-        content = response.choices[0].message.content
-        
-        # Parse response
-        lines = content.split('\n')
-        criteria_scores = {}
-        overall_score = 0.0
-        confidence_score = 8.0
-        strengths = []
-        weaknesses = []
-        detailed_feedback = ""
-        
-        current_section = None
-        feedback_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            
-            if line.startswith('CRITERION SCORES:'):
-                current_section = 'criteria'
-                continue
-            elif line.startswith('WEIGHTED OVERALL SCORE:'):
-                try:
-                    overall_score = float(line.split(':')[1].strip().split()[0])
-                except:
-                    pass
-                continue
-            elif line.startswith('CONFIDENCE:'):
-                try:
-                    confidence_score = float(line.split(':')[1].strip().split()[0])
-                except:
-                    pass
-                continue
-            elif line.startswith('STRENGTHS:'):
-                current_section = 'strengths'
-                continue
-            elif line.startswith('WEAKNESSES:'):
-                current_section = 'weaknesses'
-                continue
-            elif line.startswith('DETAILED FEEDBACK:'):
-                current_section = 'feedback'
-                continue
-            
-            if current_section == 'criteria' and ':' in line:
-                parts = line.split(':', 1)
-                if len(parts) == 2:
-                    criterion_name = parts[0].strip().lower().replace(' ', '_')
-                    try:
-                        score = float(parts[1].strip().split()[0])
-                        criteria_scores[criterion_name] = score
-                    except:
-                        pass
-            elif current_section == 'strengths' and line.startswith('-'):
-                strengths.append(line[1:].strip())
-            elif current_section == 'weaknesses' and line.startswith('-'):
-                weaknesses.append(line[1:].strip())
-            elif current_section == 'feedback' and line:
-                feedback_lines.append(line)
-        
-        detailed_feedback = ' '.join(feedback_lines)
+        parsed = parse_response(completion['content'], schema)
+        check_parsed(parsed, completion['cache_key'])
+        criteria_scores = parsed.data.get('criteria_scores', {})
+        overall_score = parsed.data.get('overall_score', 0.0)
         
         # Calculate weighted score if not provided
         if overall_score == 0.0:
             total = 0.0
             for criterion, weight in criteria.items():
-                criterion_key = criterion.lower().replace(' ', '_')
+                criterion_key = normalize_key(criterion)
                 if criterion_key in criteria_scores:
                     total += criteria_scores[criterion_key] * (weight / 100.0)
             overall_score = round(total, 2)
@@ -429,13 +696,20 @@ DETAILED FEEDBACK:
             'model_version': model,
             'criteria_scores': criteria_scores,
             'overall_score': overall_score,
-            'strengths': strengths,
-            'weaknesses': weaknesses,
-            'detailed_feedback': detailed_feedback,
-            'confidence_score': confidence_score,
-            'processing_time': round(processing_time, 2)
+            'strengths': parsed.data.get('strengths', []),
+            'weaknesses': parsed.data.get('weaknesses', []),
+            'detailed_feedback': parsed.data.get('detailed_feedback', ''),
+            'confidence_score': parsed.data.get('confidence', 8.0),
+            'parse_confidence': parsed.confidence,
+            'processing_time': round(processing_time, 2),
+            'tokens_used': completion['tokens_used'],
+            'tokens_saved': completion['tokens_saved'],
+            'cache_hit': completion['cache_hit']
         }
         
     except Exception as e:
         raise Exception(f"Manuscript evaluation failed: {str(e)}")
 
+
+# Global scheduler instance
+ai_scheduler = AIScheduler()
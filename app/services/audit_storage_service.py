@@ -0,0 +1,192 @@
+"""Monthly partitioned storage for audit log entries.
+
+Entries are written to one collection per calendar month
+(``audit_logs_2025_03``), chosen by the entry timestamp. Readers ask for
+the partitions overlapping a time window, newest first, so queries over
+recent activity never touch old months. Entries written before
+partitioning stay in the original ``audit_logs`` collection, which is
+read last, until ``flask audit-partition-legacy`` moves them into their
+months.
+
+Retention is per partition: ``flask audit-archive`` streams every month
+older than AUDIT_RETENTION_MONTHS to a gzip-compressed JSONL file in
+AUDIT_ARCHIVE_DIR and then drops the collection, which is far cheaper
+than TTL-deleting documents one by one.
+"""
+import gzip
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from bson import json_util
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLLECTION = 'audit_logs'
+
+AUDIT_INDEXES = [
+    IndexModel([('timestamp', DESCENDING)]),
+    IndexModel([('user_id', ASCENDING), ('timestamp', DESCENDING)]),
+    IndexModel([('category', ASCENDING), ('timestamp', DESCENDING)]),
+    IndexModel([('target_type', ASCENDING), ('target_id', ASCENDING), ('timestamp', DESCENDING)])
+]
+
+PARTITION_PATTERN = re.compile(rf'^{AUDIT_COLLECTION}_(\d{{4}})_(\d{{2}})$')
+
+
+def partition_name(moment):
+    """Return the partition collection for a timestamp."""
+    return f'{AUDIT_COLLECTION}_{moment.year:04d}_{moment.month:02d}'
+
+
+def partition_start(name):
+    """Return the first instant of a partition's month, or None for other collections."""
+    match = PARTITION_PATTERN.match(name)
+    return datetime(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def add_months(moment, months):
+    """Return the first day of the month that is months away from moment's month."""
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+class AuditStorageService:
+    """Routes audit entries to monthly partitions and retires old months."""
+    
+    def __init__(self):
+        """Initialize with no partitions known to be indexed."""
+        self.indexed = set()
+        self.lock = threading.Lock()
+    
+    def ensure_partition(self, name):
+        """Create a partition's indexes the first time this process writes to it."""
+        if name in self.indexed:
+            return
+        mongo.db[name].create_indexes(AUDIT_INDEXES)
+        with self.lock:
+            self.indexed.add(name)
+    
+    def insert_many(self, entries):
+        """
+        Insert entries into their monthly partitions.
+        
+        Raises:
+            BulkWriteError: With 'writeErrors' indexes relative to entries
+        """
+        groups = {}
+        for position, entry in enumerate(entries):
+            name = partition_name(entry.get('timestamp') or datetime.utcnow())
+            groups.setdefault(name, []).append(position)
+        
+        errors = []
+        inserted = 0
+        for name, positions in groups.items():
+            self.ensure_partition(name)
+            try:
+                mongo.db[name].insert_many([entries[position] for position in positions], ordered=False)
+                inserted += len(positions)
+            except BulkWriteError as e:
+                inserted += e.details.get('nInserted', 0)
+                for error in e.details.get('writeErrors', []):
+                    errors.append(dict(error, index=positions[error['index']]))
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': inserted})
+        return inserted
+    
+    def partitions(self, since=None, until=None, db=None):
+        """
+        Return audit collections overlapping [since, until], newest first.
+        
+        The unpartitioned legacy collection, when present, comes last.
+        """
+        db = db if db is not None else mongo.db
+        names = db.list_collection_names()
+        months = []
+        for name in names:
+            start = partition_start(name)
+            if start is None:
+                continue
+            if since is not None and add_months(start, 1) <= since:
+                continue
+            if until is not None and start > until:
+                continue
+            months.append((start, name))
+        
+        found = [name for _, name in sorted(months, reverse=True)]
+        if AUDIT_COLLECTION in names:
+            found.append(AUDIT_COLLECTION)
+        return found
+    
+    def expired_partitions(self, retention_months, now=None):
+        """Return partitions whose whole month is older than the retention period."""
+        cutoff = add_months(now or datetime.utcnow(), -retention_months)
+        return [name for name in self.partitions()
+                if partition_start(name) and add_months(partition_start(name), 1) <= cutoff]
+    
+    def archive(self, name, directory, drop=True, batch_size=1000):
+        """
+        Stream a partition to <directory>/<name>.jsonl.gz, then drop it.
+        
+        The file is written under a temporary name and renamed once complete,
+        and the collection is only dropped when every document was written.
+        
+        Returns:
+            tuple: (archive path, number of documents archived)
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{name}.jsonl.gz')
+        partial = path + '.partial'
+        
+        archived = 0
+        with gzip.open(partial, 'wt', encoding='utf-8') as archive:
+            for doc in mongo.db[name].find({}, batch_size=batch_size).sort('_id', 1):
+                archive.write(json_util.dumps(doc) + '\n')
+                archived += 1
+        
+        expected = mongo.db[name].count_documents({})
+        if archived < expected:
+            os.remove(partial)
+            raise RuntimeError(f'{name} changed while archiving ({archived} of {expected} documents written)')
+        os.replace(partial, path)
+        
+        if drop:
+            mongo.db.drop_collection(name)
+            with self.lock:
+                self.indexed.discard(name)
+        return path, archived
+    
+    def split_legacy(self, batch_size=1000):
+        """
+        Move entries from the unpartitioned collection into monthly partitions.
+        
+        Returns:
+            int: Number of entries moved
+        """
+        legacy = mongo.db[AUDIT_COLLECTION]
+        moved = 0
+        while True:
+            batch = list(legacy.find({}).sort('_id', 1).limit(batch_size))
+            if not batch:
+                return moved
+            groups = {}
+            for entry in batch:
+                groups.setdefault(partition_name(entry.get('timestamp') or entry['_id'].generation_time), []).append(entry)
+            for name, entries in groups.items():
+                self.ensure_partition(name)
+                try:
+                    mongo.db[name].insert_many(entries, ordered=False)
+                except BulkWriteError as e:
+                    # Entries copied by an interrupted earlier run are already there
+                    if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                        raise
+            legacy.delete_many({'_id': {'$in': [entry['_id'] for entry in batch]}})
+            moved += len(batch)
+
+
+# Global service instance
+audit_storage = AuditStorageService()
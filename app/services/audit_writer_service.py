@@ -0,0 +1,205 @@
+"""Background, batched writer for audit log entries.
+
+AuditLog.log hands entries to ``audit_writer.enqueue``, which puts them on
+a bounded in-memory queue and returns immediately. A daemon thread drains
+the queue with unordered bulk inserts into the monthly audit partitions
+(see audit_storage_service) whenever AUDIT_BATCH_SIZE
+entries are waiting or AUDIT_FLUSH_SECONDS have passed, so audit logging
+costs a request no database round trip.
+
+When the queue is full (or a batch cannot be written) entries are either
+dropped or appended as JSON lines to AUDIT_SPILL_FILE, depending on
+AUDIT_OVERFLOW; ``flask audit-replay-spill`` loads a spill file back.
+The queue is drained at interpreter exit, which covers gunicorn worker
+shutdown. With AUDIT_ASYNC off (the testing config) entries are written
+synchronously.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from bson import json_util
+from flask import current_app
+from pymongo.errors import BulkWriteError
+from app.services.audit_storage_service import audit_storage
+
+logger = logging.getLogger(__name__)
+
+
+class AuditWriter:
+    """Queues audit entries and writes them in batches from a background thread."""
+    
+    def __init__(self):
+        """Initialize without settings until the first entry arrives."""
+        self.settings = None
+        self.queue = None
+        self.thread = None
+        self.pid = None
+        self.exit_hook = False
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.spill_lock = threading.Lock()
+        self.counters = {'enqueued': 0, 'written': 0, 'batches': 0, 'dropped': 0, 'spilled': 0, 'failed_batches': 0}
+    
+    def _ensure_settings(self):
+        """Read writer settings from the app config on first use."""
+        if self.settings is None:
+            config = current_app.config
+            self.settings = {
+                'async': config.get('AUDIT_ASYNC', True),
+                'batch_size': config.get('AUDIT_BATCH_SIZE', 100),
+                'flush_seconds': config.get('AUDIT_FLUSH_SECONDS', 1.0),
+                'queue_size': config.get('AUDIT_QUEUE_SIZE', 10000),
+                'overflow': config.get('AUDIT_OVERFLOW', 'spill'),
+                'spill_file': config.get('AUDIT_SPILL_FILE', 'audit_spill.jsonl')
+            }
+        return self.settings
+    
+    def _ensure_thread(self):
+        """Start the writer thread, again in a forked child whose parent started one."""
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=self.settings['queue_size'])
+            self.pid = os.getpid()
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self.thread.start()
+            if not self.exit_hook:
+                atexit.register(self.drain)
+                self.exit_hook = True
+    
+    def _count(self, counter, amount=1):
+        """Increment a metric counter."""
+        with self.lock:
+            self.counters[counter] += amount
+    
+    def enqueue(self, entry):
+        """Queue an entry for writing (or write it now when AUDIT_ASYNC is off)."""
+        try:
+            settings = self._ensure_settings()
+        except RuntimeError:
+            settings = {'async': False}  # Outside an app context (scripts): write directly
+        
+        if not settings['async']:
+            audit_storage.insert_many([entry])
+            return
+        
+        self._ensure_thread()
+        try:
+            self.queue.put_nowait(entry)
+            self._count('enqueued')
+        except queue.Full:
+            self._overflow([entry])
+    
+    def _overflow(self, entries):
+        """Spill or drop entries that could not be queued or written."""
+        if self.settings['overflow'] != 'spill':
+            self._count('dropped', len(entries))
+            return
+        try:
+            with self.spill_lock, open(self.settings['spill_file'], 'a', encoding='utf-8') as spill:
+                for entry in entries:
+                    spill.write(json_util.dumps(entry) + '\n')
+            self._count('spilled', len(entries))
+        except OSError as e:
+            self._count('dropped', len(entries))
+            logger.error(f'Failed to spill {len(entries)} audit entries: {e}')
+    
+    def _write(self, batch):
+        """Insert one batch, spilling entries the database did not accept."""
+        try:
+            audit_storage.insert_many(batch)
+            self._count('written', len(batch))
+            self._count('batches')
+            return
+        except BulkWriteError as e:
+            # Duplicate keys mean the entry is already stored; keep everything else
+            failed = {error['index'] for error in e.details.get('writeErrors', []) if error.get('code') != 11000}
+            self._count('written', e.details.get('nInserted', 0))
+            rejected = [entry for index, entry in enumerate(batch) if index in failed]
+            error = e
+        except Exception as e:
+            rejected = batch
+            error = e
+        self._count('failed_batches')
+        if rejected:
+            logger.error(f'Failed to write {len(rejected)} audit entries: {error}')
+            self._overflow(rejected)
+    
+    def _run(self):
+        """Collect entries into batches and write them until stopped."""
+        batch = []
+        deadline = None
+        while True:
+            timeout = self.settings['flush_seconds'] if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+                if deadline is None:
+                    deadline = time.monotonic() + self.settings['flush_seconds']
+            except queue.Empty:
+                pass
+            
+            if batch and (len(batch) >= self.settings['batch_size'] or time.monotonic() >= deadline
+                          or self.stopping.is_set()):
+                self._write(batch)
+                batch, deadline = [], None
+            if self.stopping.is_set() and self.queue.empty() and not batch:
+                return
+    
+    def drain(self, timeout=10):
+        """Write every queued entry and stop the writer thread."""
+        thread = self.thread
+        if thread is None or not thread.is_alive() or self.pid != os.getpid():
+            return
+        self.stopping.set()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f'Audit writer did not drain within {timeout}s; about {self.queue.qsize()} entries pending')
+    
+    def replay_spill(self, path=None, batch_size=1000):
+        """
+        Insert the entries of a spill file and remove it.
+        
+        Returns:
+            int: Number of entries loaded
+        """
+        path = path or self._ensure_settings()['spill_file']
+        if not os.path.exists(path):
+            return 0
+        
+        with self.spill_lock:
+            loaded = 0
+            batch = []
+            with open(path, encoding='utf-8') as spill:
+                for line in spill:
+                    if line.strip():
+                        batch.append(json_util.loads(line))
+                    if len(batch) >= batch_size:
+                        loaded += self._insert_ignoring_duplicates(batch)
+                        batch = []
+            if batch:
+                loaded += self._insert_ignoring_duplicates(batch)
+            os.remove(path)
+        return loaded
+    
+    @staticmethod
+    def _insert_ignoring_duplicates(batch):
+        """Insert a batch; entries already present (same _id) are skipped."""
+        try:
+            return audit_storage.insert_many(batch)
+        except BulkWriteError as e:
+            return e.details.get('nInserted', 0)
+    
+    def stats(self):
+        """Return writer counters and the current queue depth."""
+        with self.lock:
+            stats = dict(self.counters)
+        stats['queued'] = self.queue.qsize() if self.queue is not None else 0
+        return stats
+
+
+# Global service instance
+audit_writer = AuditWriter()
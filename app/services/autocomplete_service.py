@@ -0,0 +1,321 @@
+"""Type-ahead suggestions for book titles, authors and genres.
+
+Suggestions come from an in-process prefix index: per kind, sorted lists
+of edge keys (the full label, and every later word-start suffix of it)
+searched with bisect, so a lookup costs O(log n) plus the number of
+results. The index is built from MongoDB with one sort per list on first
+use, rebuilt in a background thread when stale (the old index keeps
+serving until the new one is swapped in) and updated incrementally by
+Book.create/update/delete and User.update.
+"""
+import bisect
+import logging
+import threading
+import time
+from bson import ObjectId
+from flask import current_app
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+KIND_BOOK = 'book'
+KIND_AUTHOR = 'author'
+KIND_GENRE = 'genre'
+
+# Seconds before a failed build is retried when there was no index to keep serving
+FAILED_BUILD_RETRY_SECONDS = 30
+
+
+def normalize(text):
+    """Lowercase text and collapse whitespace."""
+    return ' '.join(str(text or '').lower().split())
+
+
+def edge_keys(label):
+    """Return the keys a label is reachable by: the label and each word-start suffix."""
+    words = normalize(label).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class PrefixIndex:
+    """Sorted edge-key index mapping prefixes to suggestion items."""
+    
+    def __init__(self):
+        """Initialize an empty index."""
+        self.keys = {}  # (kind, leading) -> sorted [(key, ref)]; leading keys start a label
+        self.items = {}  # (kind, ref) -> payload
+        self.item_keys = {}  # (kind, ref) -> {(leading, key)} added for it
+    
+    @staticmethod
+    def _label_keys(labels):
+        """Return the (leading, key) pairs labels are reachable by."""
+        keys = set()
+        for label in labels:
+            for position, key in enumerate(edge_keys(label)):
+                keys.add((position == 0, key))
+        return keys
+    
+    @classmethod
+    def build(cls, entries):
+        """Build an index from (kind, ref, labels, payload) entries with one sort per key list."""
+        index = cls()
+        for kind, ref, labels, payload in entries:
+            if (kind, ref) in index.items:
+                continue
+            keys = cls._label_keys(labels)
+            for leading, key in keys:
+                index.keys.setdefault((kind, leading), []).append((key, ref))
+            index.items[(kind, ref)] = payload
+            index.item_keys[(kind, ref)] = keys
+        for keys in index.keys.values():
+            keys.sort()
+        return index
+    
+    def add(self, kind, ref, labels, payload):
+        """Add or replace an item reachable through any of its labels."""
+        self.remove(kind, ref)
+        keys = self._label_keys(labels)
+        for leading, key in keys:
+            bisect.insort(self.keys.setdefault((kind, leading), []), (key, ref))
+        self.items[(kind, ref)] = payload
+        self.item_keys[(kind, ref)] = keys
+    
+    def remove(self, kind, ref):
+        """Remove an item if present."""
+        for leading, key in self.item_keys.pop((kind, ref), ()):
+            keys = self.keys[(kind, leading)]
+            position = bisect.bisect_left(keys, (key, ref))
+            if position < len(keys) and keys[position] == (key, ref):
+                del keys[position]
+        self.items.pop((kind, ref), None)
+    
+    def __contains__(self, item):
+        """Check whether (kind, ref) is indexed."""
+        return item in self.items
+    
+    def lookup(self, prefix, limit=5):
+        """
+        Find items whose label (or a word in it) starts with prefix.
+        
+        Walks each key list from the first possible match and stops as soon
+        as a kind has `limit` items.
+        
+        Returns:
+            dict: kind -> list of payloads; whole-label matches first
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return {}
+        
+        results = {}
+        for kind in sorted({kind for kind, _ in self.keys}):
+            found, seen = [], set()
+            for leading in (True, False):
+                keys = self.keys.get((kind, leading), [])
+                position = bisect.bisect_left(keys, (prefix,))
+                while len(found) < limit and position < len(keys):
+                    key, ref = keys[position]
+                    if not key.startswith(prefix):
+                        break
+                    position += 1
+                    if ref not in seen:
+                        seen.add(ref)
+                        found.append(self.items[(kind, ref)])
+            if found:
+                results[kind] = found
+        return results
+
+
+class AutocompleteService:
+    """Maintains the prefix index for the autocomplete API."""
+    
+    def __init__(self):
+        """Initialize without loading anything until first use."""
+        self.index = None
+        self.built_at = 0
+        self.lock = threading.RLock()  # Guards the index and its incremental changes
+        self.build_lock = threading.Lock()  # One build at a time
+        self.rebuilding = False
+        self.pending = []  # Changes made while a build runs, replayed onto the new index
+        self.rebuild_thread = None
+    
+    def _refresh_seconds(self):
+        """Return the full rebuild interval."""
+        return current_app.config.get('AUTOCOMPLETE_REFRESH_SECONDS', 600)
+    
+    def _ensure_index(self):
+        """Return the index, building it on first use and refreshing it in the background when stale."""
+        with self.lock:
+            index = self.index
+            if (index is not None and not self.rebuilding
+                    and time.monotonic() - self.built_at >= self._refresh_seconds()):
+                self.rebuilding = True
+                self.rebuild_thread = threading.Thread(
+                    target=self._rebuild_in_app, args=(current_app._get_current_object(),),
+                    name='autocomplete-rebuild', daemon=True
+                )
+                self.rebuild_thread.start()
+        if index is not None:
+            return index
+        
+        # First use: every request needs an index, so build it here once
+        with self.build_lock:
+            if self.index is None:
+                with self.lock:
+                    self.rebuilding = True
+                self._rebuild()
+        return self.index
+    
+    def _rebuild_in_app(self, app):
+        """Rebuild on a background thread."""
+        with app.app_context():
+            with self.build_lock:
+                self._rebuild()
+    
+    def _rebuild(self):
+        """Build a new index outside the lock, then swap it in with the changes made meanwhile."""
+        try:
+            index = self._build()
+        except Exception as e:
+            logger.error(f'Failed to build the autocomplete index: {e}')
+            with self.lock:
+                self.rebuilding = False
+                self.pending = []
+                if self.index is None:
+                    # Answer with no suggestions rather than errors, and retry soon
+                    self.index = PrefixIndex()
+                    self.built_at = time.monotonic() - max(0, self._refresh_seconds() - FAILED_BUILD_RETRY_SECONDS)
+                else:
+                    self.built_at = time.monotonic()  # Keep the old index until the next refresh
+            return
+        
+        with self.lock:
+            for change in self.pending:
+                change(index)
+            self.index = index
+            self.built_at = time.monotonic()
+            self.rebuilding = False
+            self.pending = []
+    
+    def _build(self):
+        """Build an index of active books, their authors and every genre."""
+        entries = [self._book_entry(book) for book in mongo.db.books.find({'status': 'active'}, {'title': 1})]
+        author_ids = mongo.db.books.distinct('user_id', {'status': 'active'})
+        for start in range(0, len(author_ids), 1000):
+            users = mongo.db.users.find({'_id': {'$in': author_ids[start:start + 1000]}},
+                                        {'full_name': 1, 'username': 1})
+            entries.extend(self._author_entry(user) for user in users)
+        entries.extend(self._genre_entry(genre) for genre in mongo.db.books.distinct('genre'))
+        return PrefixIndex.build(entry for entry in entries if entry)
+    
+    @staticmethod
+    def _book_entry(book):
+        """Return the index entry of a book title, or None."""
+        if not book.get('title'):
+            return None
+        book_id = str(book['_id'])
+        return KIND_BOOK, book_id, [book['title']], {
+            'id': book_id,
+            'label': book['title']
+        }
+    
+    @staticmethod
+    def _author_entry(user):
+        """Return the index entry of an author's full name and username, or None."""
+        if not user.get('full_name') and not user.get('username'):
+            return None
+        user_id = str(user['_id'])
+        return KIND_AUTHOR, user_id, [user.get('full_name'), user.get('username')], {
+            'id': user_id,
+            'label': user.get('full_name') or user.get('username'),
+            'username': user.get('username')
+        }
+    
+    @staticmethod
+    def _genre_entry(genre):
+        """Return the index entry of a genre name, or None."""
+        if not genre:
+            return None
+        return KIND_GENRE, genre, [genre], {'label': genre}
+    
+    def _change(self, change):
+        """Apply an incremental change to the index, and to the one being built."""
+        with self.lock:
+            if self.index is not None:
+                change(self.index)
+            if self.rebuilding:
+                self.pending.append(change)
+    
+    def suggest(self, prefix, limit=5):
+        """Return suggestions grouped by kind."""
+        index = self._ensure_index()
+        with self.lock:
+            return index.lookup(prefix, limit=limit)
+    
+    def book_changed(self, book):
+        """Index a created or updated book (only active books are suggested)."""
+        if self.index is None and not self.rebuilding:
+            return
+        book_id = str(book['_id'])
+        entry = self._book_entry(book) if book.get('status', 'active') == 'active' else None
+        genre = self._genre_entry(book.get('genre'))
+        
+        def change(index):
+            if entry:
+                index.add(*entry)
+            else:
+                index.remove(KIND_BOOK, book_id)
+            if genre and (KIND_GENRE, genre[1]) not in index:
+                index.add(*genre)
+        
+        self._change(change)
+        if book.get('user_id'):
+            self._sync_author(book['user_id'])
+    
+    def book_removed(self, book_id, user_id=None):
+        """Drop a deleted book, and its author once they have no active books."""
+        self._change(lambda index: index.remove(KIND_BOOK, str(book_id)))
+        if user_id:
+            self._sync_author(user_id)
+    
+    def _sync_author(self, user_id):
+        """Index an author while they have an active book, and drop them otherwise."""
+        if self.index is None and not self.rebuilding:
+            return
+        user_id = ObjectId(str(user_id))
+        entry = None
+        if mongo.db.books.find_one({'user_id': user_id, 'status': 'active'}, {'_id': 1}):
+            if (KIND_AUTHOR, str(user_id)) in (self.index or ()):
+                return
+            user = mongo.db.users.find_one({'_id': user_id}, {'full_name': 1, 'username': 1})
+            entry = self._author_entry(user) if user else None
+        
+        def change(index):
+            if entry:
+                index.add(*entry)
+            else:
+                index.remove(KIND_AUTHOR, str(user_id))
+        
+        self._change(change)
+    
+    def user_removed(self, user_id):
+        """Drop a deleted author."""
+        self._change(lambda index: index.remove(KIND_AUTHOR, str(user_id)))
+    
+    def user_changed(self, user):
+        """Refresh an author's names; users without books are not suggested."""
+        entry = self._author_entry(user)
+        user_id = str(user['_id'])
+        
+        def change(index):
+            if (KIND_AUTHOR, user_id) in index:
+                if entry:
+                    index.add(*entry)
+                else:
+                    index.remove(KIND_AUTHOR, user_id)
+        
+        self._change(change)
+
+
+# Global service instance
+autocomplete_service = AutocompleteService()
@@ -0,0 +1,331 @@
+"""Application cache with pluggable backends.
+
+``cache`` offers get/set/delete, a ``memoize`` decorator for finders and
+tag-based invalidation. The backend is chosen by CACHE_BACKEND when
+``init_app`` runs in create_app:
+
+* ``memory``: a bounded per-process LRU with per-entry TTL. Invalidations
+  only reach the current process, so memoized results are kept for at
+  most CACHE_MEMORY_MEMOIZE_TTL seconds.
+* ``redis``: any server speaking the Redis protocol at CACHE_REDIS_URL
+  (Redis, Valkey, KeyDB or a local stand-in), shared by every worker.
+* ``null``: caching disabled; memoized functions always run.
+
+Values are pickled, so callers always get their own copy and may mutate
+it. Tags are versioned with random tokens: invalidating a tag replaces
+its token, which makes every entry stored under the old token a miss.
+``memoize`` reads the tokens before calling the function, so a result
+computed while its tag was invalidated is stored under the old token.
+Cache failures are logged and treated as misses; they never fail a
+request.
+"""
+import functools
+import logging
+import pickle
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+TAG_PREFIX = 'tag:'
+
+
+class MemoryBackend:
+    """Bounded in-process LRU cache with per-entry expiry."""
+    
+    def __init__(self, max_entries=2048):
+        """Initialize an empty cache holding at most max_entries keys."""
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (value, expires_at or None)
+        self.lock = threading.Lock()
+        self.evictions = 0
+    
+    def get(self, key):
+        """Return the stored bytes, or None when missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ttl=None):
+        """Store bytes, evicting the least recently used keys when full."""
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def delete(self, key):
+        """Remove a key if present."""
+        with self.lock:
+            self.entries.pop(key, None)
+    
+    def stats(self):
+        """Return backend-specific counters."""
+        with self.lock:
+            return {'size': len(self.entries), 'max_entries': self.max_entries, 'evictions': self.evictions}
+
+
+class RedisBackend:
+    """Minimal Redis protocol (RESP) client for GET/SET/DEL."""
+    
+    def __init__(self, url, timeout=0.5):
+        """Parse redis://[:password@]host[:port][/db] and connect lazily."""
+        parsed = urlparse(url)
+        self.address = (parsed.hostname or 'localhost', parsed.port or 6379)
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self.local = threading.local()
+    
+    def _connect(self):
+        """Open a connection for this thread."""
+        connection = socket.create_connection(self.address, timeout=self.timeout)
+        self.local.socket = connection
+        self.local.reader = connection.makefile('rb')
+        if self.password:
+            self._command('AUTH', self.password)
+        if self.db:
+            self._command('SELECT', self.db)
+    
+    def _close(self):
+        """Drop this thread's connection after an error."""
+        connection = getattr(self.local, 'socket', None)
+        self.local.socket = None
+        if connection is not None:
+            try:
+                connection.close()
+            except OSError:
+                pass
+    
+    def _read_reply(self):
+        """Read one RESP reply."""
+        line = self.local.reader.readline()
+        if not line:
+            raise ConnectionError('Connection closed by cache server')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload
+        if kind == b'-':
+            raise RuntimeError(payload.decode(errors='replace'))
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(payload)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f'Unexpected reply from cache server: {line!r}')
+    
+    def _command(self, *parts):
+        """Send one command and return its reply."""
+        if getattr(self.local, 'socket', None) is None:
+            self._connect()
+        encoded = []
+        for part in parts:
+            data = part if isinstance(part, bytes) else str(part).encode()
+            encoded.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        try:
+            self.local.socket.sendall(b'*%d\r\n' % len(parts) + b''.join(encoded))
+            return self._read_reply()
+        except (OSError, ConnectionError):
+            self._close()
+            raise
+    
+    def get(self, key):
+        """Return the stored bytes, or None when missing."""
+        return self._command('GET', key)
+    
+    def set(self, key, value, ttl=None):
+        """Store bytes with an optional TTL in seconds."""
+        if ttl:
+            self._command('SET', key, value, 'PX', int(ttl * 1000))
+        else:
+            self._command('SET', key, value)
+    
+    def delete(self, key):
+        """Remove a key."""
+        self._command('DEL', key)
+    
+    def stats(self):
+        """Return backend-specific counters (evictions are tracked by the server)."""
+        return {'address': f'{self.address[0]}:{self.address[1]}'}
+
+
+class CacheService:
+    """Facade over the configured cache backend."""
+    
+    def __init__(self):
+        """Initialize with caching disabled until init_app runs."""
+        self.backend = None
+        self.default_ttl = 300
+        self.memoize_ttl_cap = None  # Longest memoized TTL when invalidations stay in-process
+        self.counters = {'hits': 0, 'misses': 0, 'sets': 0, 'errors': 0}
+        self.lock = threading.Lock()
+    
+    def init_app(self, app):
+        """Create the backend named by CACHE_BACKEND."""
+        name = app.config.get('CACHE_BACKEND', 'memory')
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+        self.memoize_ttl_cap = None
+        if name == 'memory':
+            self.backend = MemoryBackend(max_entries=app.config.get('CACHE_MAX_ENTRIES', 2048))
+            self.memoize_ttl_cap = app.config.get('CACHE_MEMORY_MEMOIZE_TTL', 5)
+        elif name == 'redis':
+            self.backend = RedisBackend(app.config.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+                                        timeout=app.config.get('CACHE_SOCKET_TIMEOUT', 0.5))
+        else:
+            self.backend = None
+        app.extensions['cache'] = self
+    
+    def _count(self, counter):
+        """Increment a metric counter."""
+        with self.lock:
+            self.counters[counter] += 1
+    
+    def _tag_token(self, tag, create=False):
+        """Return the current token of a tag, creating one when asked."""
+        token = self.backend.get(TAG_PREFIX + tag)
+        if token is None and create:
+            token = uuid.uuid4().hex.encode()
+            self.backend.set(TAG_PREFIX + tag, token)
+        return token
+    
+    def _lookup(self, key):
+        """Return (found, value) for a key, checking its tags are still current."""
+        if self.backend is None:
+            return False, None
+        try:
+            data = self.backend.get(key)
+            if data is not None:
+                value, tags = pickle.loads(data)
+                if all(self._tag_token(tag) == token for tag, token in tags.items()):
+                    self._count('hits')
+                    return True, value
+        except Exception as e:
+            self._count('errors')
+            logger.error(f'Cache get failed for {key}: {e}')
+        self._count('misses')
+        return False, None
+    
+    def get(self, key, default=None):
+        """Return a cached value, or default on a miss."""
+        found, value = self._lookup(key)
+        return value if found else default
+    
+    def set(self, key, value, ttl=None, tags=()):
+        """Cache a value for ttl seconds (CACHE_DEFAULT_TTL by default) under optional tags."""
+        if self.backend is None:
+            return
+        tokens = self._tag_tokens(key, tags)
+        if tokens is not None:
+            self._store(key, value, ttl, tokens)
+    
+    def _tag_tokens(self, key, tags):
+        """Return the current tokens of tags, creating missing ones; None if the cache failed."""
+        try:
+            return {tag: self._tag_token(tag, create=True) for tag in tags}
+        except Exception as e:
+            self._count('errors')
+            logger.error(f'Cache set failed for {key}: {e}')
+            return None
+    
+    def _store(self, key, value, ttl, tokens):
+        """Store a value with the tag tokens it was computed under."""
+        try:
+            data = pickle.dumps((value, tokens), protocol=pickle.HIGHEST_PROTOCOL)
+            self.backend.set(key, data, self.default_ttl if ttl is None else ttl)
+            self._count('sets')
+        except Exception as e:
+            self._count('errors')
+            logger.error(f'Cache set failed for {key}: {e}')
+    
+    def delete(self, key):
+        """Remove a cached value."""
+        if self.backend is None:
+            return
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            self._count('errors')
+            logger.error(f'Cache delete failed for {key}: {e}')
+    
+    def invalidate_tag(self, *tags):
+        """Invalidate every entry stored under any of the tags."""
+        if self.backend is None:
+            return
+        for tag in tags:
+            try:
+                self.backend.set(TAG_PREFIX + tag, uuid.uuid4().hex.encode())
+            except Exception as e:
+                self._count('errors')
+                logger.error(f'Cache tag invalidation failed for {tag}: {e}')
+    
+    def memoize(self, ttl=None, tags=None):
+        """
+        Cache a function's results by its arguments.
+        
+        Args:
+            ttl: Seconds to keep results (CACHE_DEFAULT_TTL by default)
+            tags: List of tags, or a callable taking the function's arguments
+                and returning the tags to store each result under
+        """
+        def decorator(func):
+            prefix = f'memo:{func.__module__}.{func.__qualname__}:'
+            
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if self.backend is None:
+                    return func(*args, **kwargs)
+                key = prefix + repr((args, sorted(kwargs.items())))
+                found, value = self._lookup(key)
+                if found:
+                    return value
+                # Tokens first: an invalidation during func() must win over its result
+                entry_tags = tags(*args, **kwargs) if callable(tags) else (tags or ())
+                tokens = self._tag_tokens(key, entry_tags)
+                value = func(*args, **kwargs)
+                if tokens is not None:
+                    entry_ttl = self.default_ttl if ttl is None else ttl
+                    if self.memoize_ttl_cap is not None:
+                        entry_ttl = min(entry_ttl, self.memoize_ttl_cap)
+                    self._store(key, value, entry_ttl, tokens)
+                return value
+            
+            wrapper.uncached = func
+            return wrapper
+        return decorator
+    
+    def stats(self):
+        """Return hit/miss/set/error counters plus backend counters."""
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0
+        stats['backend'] = type(self.backend).__name__ if self.backend else None
+        if self.backend is not None:
+            try:
+                stats.update(self.backend.stats())
+            except Exception as e:
+                logger.error(f'Cache stats failed: {e}')
+        return stats
+
+
+# Global service instance
+cache = CacheService()
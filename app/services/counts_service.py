@@ -0,0 +1,159 @@
+"""Cached collection counts for listing totals and dashboard stats.
+
+Whole-collection totals use estimated_document_count, which reads
+collection metadata instead of scanning. Filtered counts are cached per
+(collection, filter) for COUNT_CACHE_SECONDS. Model create/update/delete
+methods report their writes here so cached values stay current between
+refreshes; the TTL bounds drift from writes in other worker processes.
+"""
+import logging
+import threading
+import time
+from flask import current_app
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = 1024
+
+COMPARISONS = {
+    '$gt': lambda value, bound: value > bound,
+    '$gte': lambda value, bound: value >= bound,
+    '$lt': lambda value, bound: value < bound,
+    '$lte': lambda value, bound: value <= bound,
+    '$ne': lambda value, bound: value != bound
+}
+
+
+def filter_key(filters):
+    """Return a hashable key for a simple MongoDB filter."""
+    if isinstance(filters, dict):
+        return tuple(sorted((key, filter_key(value)) for key, value in filters.items()))
+    if isinstance(filters, (list, tuple)):
+        return tuple(filter_key(value) for value in filters)
+    return filters
+
+
+def matches(filters, doc):
+    """
+    Evaluate a simple filter against a document.
+    
+    Returns:
+        bool or None: None when the filter uses something this does not model
+    """
+    for field, condition in filters.items():
+        if field.startswith('$') or '.' in field:
+            return None
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            for operator, bound in condition.items():
+                compare = COMPARISONS.get(operator)
+                if compare is None:
+                    return None
+                try:
+                    if not compare(value, bound):
+                        return False
+                except TypeError:
+                    return False  # MongoDB never matches across types (e.g. None < date)
+        elif value != condition:
+            return False
+    return True
+
+
+class CountsService:
+    """Serves collection counts from a TTL cache kept current by model writes."""
+    
+    def __init__(self):
+        """Initialize an empty cache."""
+        self.cache = {}  # (collection, filter key) -> [value, computed_at, filters]
+        self.lock = threading.Lock()
+    
+    def _ttl(self):
+        """Return the cache lifetime in seconds."""
+        return current_app.config.get('COUNT_CACHE_SECONDS', 60)
+    
+    def _cached(self, key, compute, filters=None):
+        """Return a fresh cached value or compute and store a new one."""
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry and time.monotonic() - entry[1] < self._ttl():
+                return entry[0]
+        
+        value = compute()
+        with self.lock:
+            if len(self.cache) >= MAX_ENTRIES:
+                self._prune()
+            self.cache[key] = [value, time.monotonic(), filters]
+        return value
+    
+    def _prune(self):
+        """Drop expired entries; callers hold the lock."""
+        cutoff = time.monotonic() - self._ttl()
+        for key in [key for key, entry in self.cache.items() if entry[1] < cutoff]:
+            del self.cache[key]
+    
+    def total(self, collection):
+        """Return the approximate number of documents in a collection."""
+        return self._cached(
+            (collection, None),
+            lambda: mongo.db[collection].estimated_document_count()
+        )
+    
+    def count(self, collection, filters=None):
+        """Return a cached count_documents for a filter (estimated when unfiltered)."""
+        if not filters:
+            return self.total(collection)
+        return self._cached(
+            (collection, filter_key(filters)),
+            lambda: mongo.db[collection].count_documents(filters),
+            filters=filters
+        )
+    
+    def cached(self, key, compute):
+        """Cache any count-like value under a caller-chosen key (not bumped by writes)."""
+        return self._cached(('custom', key), compute)
+    
+    def _adjust(self, collection, before=None, after=None):
+        """Shift cached counts of a collection for one document changing from before to after."""
+        with self.lock:
+            for key in list(self.cache):
+                if key[0] != collection:
+                    continue
+                entry = self.cache[key]
+                if key[1] is None:
+                    entry[0] += (after is not None) - (before is not None)
+                    continue
+                was = matches(entry[2], before) if before is not None else False
+                now = matches(entry[2], after) if after is not None else False
+                if was is None or now is None:
+                    del self.cache[key]
+                else:
+                    entry[0] += now - was
+    
+    def record_insert(self, collection, doc):
+        """Count a newly inserted document."""
+        self._adjust(collection, after=doc)
+    
+    def record_update(self, collection, before, after):
+        """Move an updated document between the cached filters it matches."""
+        self._adjust(collection, before=before, after=after)
+    
+    def record_delete(self, collection, doc):
+        """Uncount a deleted document."""
+        self._adjust(collection, before=doc)
+    
+    def invalidate(self, collection, keep_total=False):
+        """Forget cached counts of a collection, e.g. after a bulk write or an unseen update."""
+        with self.lock:
+            for key in [key for key in self.cache if key[0] == collection]:
+                if not (keep_total and key[1] is None):
+                    del self.cache[key]
+    
+    def clear(self):
+        """Forget every cached count."""
+        with self.lock:
+            self.cache.clear()
+
+
+# Global service instance
+counts_service = CountsService()
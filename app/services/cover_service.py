@@ -0,0 +1,291 @@
+"""Generated book covers for books without a cover image.
+
+``cover_engine.generate`` redraws covers for the whole catalog:
+
+* Books are streamed from Mongo in chunks; authors are looked up once
+  per chunk.
+* Each cover has a fingerprint of its design version, title, author
+  and colours, stored on the book as ``generated_cover.hash``. Books
+  whose fingerprint is unchanged are skipped, so a rerun only draws what
+  changed.
+* Drawing runs on a process pool. Fonts are loaded once per process and
+  word widths are cached, so wrapping a title does not re-measure the
+  growing line for every word.
+* Finished covers go through media_service like uploads: staged under
+  their content hash, pushed to Cloudinary/S3 by ``media.push`` and
+  swapped onto the book.
+
+Only books without a cover, with a placeholder cover, or still showing
+a generated cover are touched; editing a book's cover clears
+``generated_cover``, so uploaded covers are never replaced.
+"""
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from bson import ObjectId
+from flask import current_app
+from werkzeug.datastructures import FileStorage
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+# Bump when the design changes so every generated cover is redrawn
+COVER_VERSION = 1
+COVER_SIZE = (400, 600)
+TITLE_MAX_WIDTH = 340
+TITLE_LINE_HEIGHT = 60
+
+FONT_PATHS = {
+    'bold': '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+    'regular': '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+}
+
+# Color schemes for book covers
+COLOR_SCHEMES = [
+    {'bg': '#2C1810', 'text': '#D4AF37', 'name': 'Classic Gold'},  # Dark brown + Gold
+    {'bg': '#1A3A52', 'text': '#E8E8E8', 'name': 'Navy Blue'},     # Dark blue + Off-white
+    {'bg': '#1F1F1F', 'text': '#FF6B6B', 'name': 'Dark Red'},      # Black + Red
+    {'bg': '#0D3B2E', 'text': '#C7F0D8', 'name': 'Forest Green'},  # Dark green + Mint
+    {'bg': '#3D1F3A', 'text': '#FFD700', 'name': 'Royal Purple'},  # Purple + Gold
+    {'bg': '#4A2C2A', 'text': '#FFB366', 'name': 'Warm Earth'},    # Brown + Orange
+    {'bg': '#1A1A2E', 'text': '#00D9FF', 'name': 'Tech Blue'},     # Dark + Cyan
+    {'bg': '#2D1B1B', 'text': '#E8C4A0', 'name': 'Vintage Cream'}, # Dark brown + Cream
+]
+
+# Covers needing a (re)draw: none, a placeholder, or one we generated earlier
+CANDIDATE_QUERY = {'$or': [
+    {'cover_image_url': {'$in': ['', None]}},
+    {'cover_image_url': {'$regex': 'placeholder|placehold'}},
+    {'generated_cover': {'$ne': None}}
+]}
+
+CHUNK_SIZE = 200
+
+
+@lru_cache(maxsize=None)
+def load_font(style, size):
+    """Load a TrueType font once per process."""
+    from PIL import ImageFont
+    
+    try:
+        return ImageFont.truetype(FONT_PATHS[style], size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=16384)
+def text_width(style, size, text):
+    """Return the advance width of text in a font."""
+    return load_font(style, size).getlength(text)
+
+
+def wrap_text(text, style, size, max_width):
+    """Split text into lines no wider than max_width; a single longer word gets its own line."""
+    space = text_width(style, size, ' ')
+    lines, current, current_width = [], [], 0.0
+    for word in text.split():
+        width = text_width(style, size, word)
+        candidate = current_width + space + width if current else width
+        if current and candidate > max_width:
+            lines.append(' '.join(current))
+            current, current_width = [word], width
+        else:
+            current.append(word)
+            current_width = candidate
+    if current:
+        lines.append(' '.join(current))
+    return lines
+
+
+def scheme_for(book_id):
+    """Pick a color scheme from the book id, so it stays the same between runs."""
+    return COLOR_SCHEMES[int(hashlib.sha1(str(book_id).encode('utf-8')).hexdigest(), 16) % len(COLOR_SCHEMES)]
+
+
+def cover_fingerprint(title, author, scheme):
+    """Return the hash of everything a generated cover depends on."""
+    canonical = json.dumps([COVER_VERSION, title, author, scheme['bg'], scheme['text']], ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def render_cover(title, author, bg_color, text_color, quality=90):
+    """
+    Draw a book cover.
+    
+    Returns:
+        bytes: JPEG image
+    """
+    from PIL import Image, ImageDraw
+    
+    width, height = COVER_SIZE
+    image = Image.new('RGB', COVER_SIZE, color=bg_color)
+    draw = ImageDraw.Draw(image)
+    title_font = load_font('bold', 48)
+    author_font = load_font('regular', 28)
+    
+    # Draw decorative borders
+    draw.rectangle([(20, 20), (380, 25)], fill=text_color)
+    draw.rectangle([(20, 575), (380, 580)], fill=text_color)
+    draw.rectangle([(20, 20), (25, 580)], fill=text_color)
+    draw.rectangle([(375, 20), (380, 580)], fill=text_color)
+    
+    # Draw title, centered, with a shadow
+    lines = wrap_text(title, 'bold', 48, TITLE_MAX_WIDTH)
+    start_y = (height - len(lines) * TITLE_LINE_HEIGHT - 120) // 2
+    for i, line in enumerate(lines):
+        x = int((width - text_width('bold', 48, line)) // 2)
+        y = start_y + i * TITLE_LINE_HEIGHT
+        draw.text((x + 2, y + 2), line, fill='#000000', font=title_font)
+        draw.text((x, y), line, fill=text_color, font=title_font)
+    
+    # Draw author name
+    author_x = int((width - text_width('regular', 28, author)) // 2)
+    draw.text((author_x, height - 80), author, fill=text_color, font=author_font)
+    
+    # Add subtle decorative elements
+    for i in range(0, width, 40):
+        for j in range(50, height - 100, 40):
+            if (i + j) % 120 == 0:
+                draw.ellipse([i - 1, j - 1, i + 1, j + 1], fill=text_color, outline=text_color)
+    
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=quality)
+    return out.getvalue()
+
+
+def _render_task(task):
+    """Draw one cover in a pool process; returns (book_id, bytes or None, error or None)."""
+    book_id, title, author, scheme, quality = task
+    try:
+        return book_id, render_cover(title, author, scheme['bg'], scheme['text'], quality), None
+    except Exception as e:
+        return book_id, None, str(e)
+
+
+class CoverEngine:
+    """Generates covers for the catalog on a process pool."""
+    
+    def generate(self, workers=None, force=False, limit=None, progress=None):
+        """
+        Draw covers for every book that needs one.
+        
+        Args:
+            workers: Pool processes (defaults to COVER_WORKERS; 0 draws in this process)
+            force: Redraw even when the fingerprint is unchanged
+            limit: Stop after this many candidate books
+            progress: Called with the counts after each chunk
+        
+        Returns:
+            dict: scanned, generated, skipped and failed counts, and seconds taken
+        """
+        config = current_app.config
+        if workers is None:
+            workers = config.get('COVER_WORKERS') or os.cpu_count() or 1
+        quality = config.get('COVER_JPEG_QUALITY', 90)
+        counts = {'scanned': 0, 'generated': 0, 'skipped': 0, 'failed': 0}
+        started = time.monotonic()
+        
+        cursor = mongo.db.books.find(
+            CANDIDATE_QUERY, {'title': 1, 'user_id': 1, 'cover_image_url': 1, 'generated_cover': 1},
+            batch_size=CHUNK_SIZE
+        )
+        if limit:
+            cursor = cursor.limit(limit)
+        
+        pool = None
+        if workers:
+            # Spawned rather than forked: safe from the threaded worker and the web process alike
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            chunk = []
+            for book in cursor:
+                chunk.append(book)
+                if len(chunk) == CHUNK_SIZE:
+                    self._process_chunk(chunk, pool, force, quality, counts)
+                    chunk = []
+                    if progress:
+                        progress(dict(counts))
+            if chunk:
+                self._process_chunk(chunk, pool, force, quality, counts)
+                if progress:
+                    progress(dict(counts))
+        finally:
+            if pool:
+                pool.shutdown()
+        
+        if counts['generated']:
+            from app.services.page_cache_service import page_cache_service
+            page_cache_service.invalidate('home')
+        counts['seconds'] = round(time.monotonic() - started, 2)
+        return counts
+    
+    def _process_chunk(self, books, pool, force, quality, counts):
+        """Draw and publish the covers of one chunk of books."""
+        author_ids = {book['user_id'] for book in books if book.get('user_id')}
+        authors = {user['_id']: user.get('full_name') for user in
+                   mongo.db.users.find({'_id': {'$in': list(author_ids)}}, {'full_name': 1})}
+        
+        tasks, pending = [], {}
+        for book in books:
+            counts['scanned'] += 1
+            title = book.get('title') or 'Untitled'
+            author = authors.get(book.get('user_id')) or 'Unknown Author'
+            scheme = scheme_for(book['_id'])
+            fingerprint = cover_fingerprint(title, author, scheme)
+            generated = book.get('generated_cover') or {}
+            if not force and generated.get('hash') == fingerprint and book.get('cover_image_url'):
+                counts['skipped'] += 1
+                continue
+            tasks.append((str(book['_id']), title, author, scheme, quality))
+            pending[str(book['_id'])] = (book, fingerprint)
+        
+        results = pool.map(_render_task, tasks, chunksize=8) if pool else map(_render_task, tasks)
+        for book_id, data, error in results:
+            book, fingerprint = pending[book_id]
+            if error:
+                logger.warning(f'Could not draw a cover for book {book_id}: {error}')
+                counts['failed'] += 1
+                continue
+            try:
+                self._publish(book, fingerprint, data)
+                counts['generated'] += 1
+            except Exception as e:
+                logger.warning(f'Could not store the cover of book {book_id}: {e}')
+                counts['failed'] += 1
+    
+    @staticmethod
+    def _publish(book, fingerprint, data):
+        """Send a drawn cover through the upload pipeline and point the book at it."""
+        from app.services.cache_service import cache
+        from app.services.media_service import media_service
+        
+        book_id = str(book['_id'])
+        upload = FileStorage(stream=io.BytesIO(data), filename=f'cover-{book_id}.jpg', content_type='image/jpeg')
+        staged = media_service.stage(upload, folder='book-covers')
+        old_url = book.get('cover_image_url')
+        # Matches only if nobody changed the cover while it was being drawn
+        result = mongo.db.books.update_one(
+            {'_id': ObjectId(book_id), 'cover_image_url': old_url},
+            {'$set': {
+                'cover_image_url': staged.url,
+                'generated_cover': {'hash': fingerprint, 'asset_id': staged.asset_id,
+                                    'generated_at': datetime.utcnow()}
+            }}
+        )
+        if not result.matched_count:
+            return
+        cache.invalidate_tag(f'books:{book_id}')
+        media_service.attach(staged, 'books', book_id, 'cover_image_url')
+        if old_url and old_url != staged.url:
+            media_service.release(old_url)
+
+
+# Global engine instance
+cover_engine = CoverEngine()
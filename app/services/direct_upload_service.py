@@ -0,0 +1,290 @@
+"""Direct browser uploads to S3 or Cloudinary.
+
+Large files never pass through a Flask worker:
+
+1. ``issue`` checks the file name, type and size and returns an upload
+   ticket with signed form parameters: an S3 presigned POST (type and
+   size enforced by the bucket policy), or a Cloudinary signed upload for
+   covers when Cloudinary is the configured image storage.
+2. The browser posts the file straight to storage.
+3. ``complete`` looks the stored object up on the storage itself (S3
+   HEAD, Cloudinary Admin API) rather than trusting the browser, deletes
+   it if it breaks the ticket's limits, and attaches it: a cover with a
+   book is set on the book right away; other uploads wait for the form
+   that creates their document, which takes them with ``claim``.
+
+Manuscripts are stored privately on S3 only. Without S3 the ticket API
+answers ``None`` and forms fall back to a regular upload. Uploads whose
+ticket was never completed or claimed are removed by ``sweep``, which
+runs with the ``media.cleanup`` sweep.
+"""
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from pymongo import ReturnDocument
+from werkzeug.utils import secure_filename
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_TICKETS_COLLECTION = 'upload_tickets'
+
+# Ticket kind -> accepted extensions, storage folder, size setting and visibility
+KINDS = {
+    'manuscript': {
+        'extensions': {'.pdf': 'application/pdf', '.txt': 'text/plain', '.doc': 'application/msword',
+                       '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'},
+        'folder': 'manuscripts',
+        'max_bytes': 'DIRECT_UPLOAD_MANUSCRIPT_MAX_BYTES',
+        'public': False
+    },
+    'cover': {
+        'extensions': {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png', '.gif': 'image/gif',
+                       '.webp': 'image/webp'},
+        'folder': 'book-covers',
+        'max_bytes': 'DIRECT_UPLOAD_IMAGE_MAX_BYTES',
+        'public': True
+    }
+}
+
+
+class UploadRejected(Exception):
+    """An upload ticket request or completion that breaks the upload rules."""
+
+
+class DirectUploadService:
+    """Issues signed upload tickets and validates what the browser stored."""
+    
+    @staticmethod
+    def _backend(kind):
+        """Return the storage a kind uploads to, or None without direct upload support."""
+        from app.services.cloudinary_service import cloudinary_service
+        from app.services.s3_service import s3_service
+        
+        if not current_app.config.get('DIRECT_UPLOADS_ENABLED', True):
+            return None
+        # Same preference as media_service: Cloudinary for images when configured
+        if kind == 'cover' and cloudinary_service._ensure_config():
+            return 'cloudinary'
+        if s3_service.is_s3_configured():
+            return 's3'
+        return None
+    
+    def enabled(self, kind):
+        """Return whether browsers can upload a kind of file directly."""
+        return self._backend(kind) is not None
+    
+    def issue(self, kind, filename, size, user_id, target_id=None):
+        """
+        Create an upload ticket.
+        
+        Args:
+            kind: 'manuscript' or 'cover'
+            filename: Name of the file the browser is about to send
+            size: Its size in bytes, as reported by the browser
+            user_id: Uploading user
+            target_id: Book id for covers; None for manuscripts
+        
+        Returns:
+            dict: ticket id, backend, expiry and the signed 'upload' form
+            ({'url', 'fields'}), or None if direct uploads are unavailable
+        
+        Raises:
+            UploadRejected: for an unknown kind, file type or a file too large
+        """
+        rules = KINDS.get(kind)
+        if rules is None:
+            raise UploadRejected(f'Unknown upload kind: {kind}')
+        extension = os.path.splitext(secure_filename(filename or ''))[1].lower()
+        if extension not in rules['extensions']:
+            raise UploadRejected(f"Accepted file types: {', '.join(sorted(rules['extensions']))}")
+        max_bytes = current_app.config[rules['max_bytes']]
+        if not size or size > max_bytes:
+            raise UploadRejected(f'Files must be between 1 byte and {max_bytes // (1024 * 1024)} MB')
+        backend = self._backend(kind)
+        if backend is None:
+            return None
+        
+        ticket_id = uuid.uuid4().hex
+        content_type = rules['extensions'][extension]
+        expires = current_app.config.get('S3_PRESIGNED_EXPIRES', 900)
+        key = f"{rules['folder']}/{user_id}/{ticket_id}{extension}"
+        if backend == 's3':
+            upload = self._sign_s3(key, content_type, max_bytes, rules['public'], expires)
+        else:
+            upload = self._sign_cloudinary(rules['folder'], ticket_id)
+        if upload is None:
+            return None
+        
+        now = datetime.utcnow()
+        mongo.db[UPLOAD_TICKETS_COLLECTION].insert_one({
+            '_id': ticket_id,
+            'kind': kind,
+            'user_id': str(user_id),
+            'target_id': str(target_id) if target_id else None,
+            'backend': backend,
+            'key': key if backend == 's3' else f"{rules['folder']}/{ticket_id}",
+            'filename': filename,
+            'content_type': content_type,
+            'max_bytes': max_bytes,
+            'status': 'issued',
+            'url': None,
+            'created_at': now,
+            'expires_at': now + timedelta(seconds=expires)
+        })
+        return {'ticket': ticket_id, 'backend': backend, 'upload': upload,
+                'expires_at': (now + timedelta(seconds=expires)).isoformat() + 'Z'}
+    
+    @staticmethod
+    def _sign_s3(key, content_type, max_bytes, public, expires):
+        """Return a presigned POST for a key."""
+        from app.services.s3_service import s3_service
+        
+        return s3_service.presigned_post(key, content_type, max_bytes, public=public, expires=expires)
+    
+    @staticmethod
+    def _sign_cloudinary(folder, public_id):
+        """Return signed Cloudinary upload form fields."""
+        import cloudinary
+        import cloudinary.utils
+        
+        config = cloudinary.config()
+        params = {'folder': folder, 'public_id': public_id, 'timestamp': int(time.time())}
+        signature = cloudinary.utils.api_sign_request(params, config.api_secret)
+        return {
+            'url': f'https://api.cloudinary.com/v1_1/{config.cloud_name}/image/upload',
+            'fields': {**params, 'api_key': config.api_key, 'signature': signature}
+        }
+    
+    def complete(self, ticket_id, user_id):
+        """
+        Validate an upload the browser finished and attach it.
+        
+        Args:
+            ticket_id: Ticket from issue()
+            user_id: User completing it (must own the ticket)
+        
+        Returns:
+            dict: The completed ticket
+        
+        Raises:
+            UploadRejected: if the ticket is unknown or used, or the stored
+                object is missing or breaks the ticket's limits
+        """
+        # No expiry check: S3 checks the signature when the upload starts,
+        # and a large upload may finish after it expired
+        ticket = mongo.db[UPLOAD_TICKETS_COLLECTION].find_one({'_id': ticket_id, 'user_id': str(user_id)})
+        if not ticket or ticket['status'] != 'issued':
+            raise UploadRejected('Unknown or already used upload ticket')
+        
+        try:
+            if ticket['backend'] == 's3':
+                url = self._verify_s3(ticket)
+            else:
+                url = self._verify_cloudinary(ticket)
+        except UploadRejected:
+            mongo.db[UPLOAD_TICKETS_COLLECTION].update_one({'_id': ticket_id}, {'$set': {'status': 'rejected'}})
+            raise
+        
+        ticket = mongo.db[UPLOAD_TICKETS_COLLECTION].find_one_and_update(
+            {'_id': ticket_id, 'status': 'issued'},
+            {'$set': {'status': 'completed', 'url': url, 'completed_at': datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if ticket is None:
+            raise UploadRejected('Unknown or already used upload ticket')
+        if ticket['kind'] == 'cover' and ticket['target_id']:
+            self._attach_cover(ticket)
+        return ticket
+    
+    @staticmethod
+    def _verify_s3(ticket):
+        """Check the uploaded object against the ticket; delete it if it does not match."""
+        from app.services.s3_service import s3_service
+        
+        head = s3_service.head_object(ticket['key'])
+        if head is None:
+            raise UploadRejected('The upload has not reached storage')
+        if head['size'] > ticket['max_bytes'] or head['content_type'] != ticket['content_type']:
+            s3_service.delete_file(s3_service.object_url(ticket['key']))
+            raise UploadRejected('The stored file does not match the upload ticket')
+        return s3_service.object_url(ticket['key'])
+    
+    @staticmethod
+    def _verify_cloudinary(ticket):
+        """Check the uploaded image against the ticket; delete it if it does not match."""
+        import cloudinary.api
+        import cloudinary.exceptions
+        import cloudinary.uploader
+        
+        try:
+            resource = cloudinary.api.resource(ticket['key'])
+        except cloudinary.exceptions.NotFound:
+            raise UploadRejected('The upload has not reached storage')
+        extension = f".{resource.get('format', '')}"
+        if resource.get('bytes', 0) > ticket['max_bytes'] or extension not in KINDS[ticket['kind']]['extensions']:
+            cloudinary.uploader.destroy(ticket['key'])
+            raise UploadRejected('The stored file does not match the upload ticket')
+        return resource['secure_url']
+    
+    @staticmethod
+    def _attach_cover(ticket):
+        """Set a completed cover on its book if the uploader owns the book."""
+        from app.models import Book
+        from app.services.media_service import media_service
+        
+        book = Book.find_by_id(ticket['target_id'])
+        if not book or str(book['user_id']) != ticket['user_id']:
+            return
+        Book.update(ticket['target_id'], {'cover_image_url': ticket['url'], 'generated_cover': None})
+        mongo.db[UPLOAD_TICKETS_COLLECTION].update_one({'_id': ticket['_id']}, {'$set': {'status': 'claimed'}})
+        old_url = book.get('cover_image_url')
+        if old_url and old_url != ticket['url']:
+            media_service.release(old_url, created_by=ticket['user_id'])
+    
+    def claim(self, ticket_id, user_id, kind):
+        """
+        Take a completed upload for a new document, once.
+        
+        Returns:
+            dict: The claimed ticket (its 'url' is the stored file), or None
+        """
+        return mongo.db[UPLOAD_TICKETS_COLLECTION].find_one_and_update(
+            {'_id': ticket_id, 'user_id': str(user_id), 'kind': kind, 'status': 'completed'},
+            {'$set': {'status': 'claimed', 'claimed_at': datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+    
+    def sweep(self):
+        """
+        Delete uploads whose ticket expired without being claimed.
+        
+        Returns:
+            int: Tickets removed
+        """
+        from app.services.media_service import media_service
+        
+        grace = timedelta(hours=current_app.config.get('MEDIA_STAGING_TTL_HOURS', 24))
+        removed = 0
+        for ticket in mongo.db[UPLOAD_TICKETS_COLLECTION].find(
+                {'status': {'$ne': 'claimed'}, 'expires_at': {'$lt': datetime.utcnow() - grace}}):
+            stored = ticket['url']
+            if stored is None and ticket['backend'] == 's3':
+                from app.services.s3_service import s3_service
+                stored = s3_service.object_url(ticket['key'])
+            if stored:
+                try:
+                    media_service._delete_stored(stored)
+                except Exception as e:
+                    logger.warning(f"Could not delete unclaimed upload {ticket['_id']}: {e}")
+                    continue
+            mongo.db[UPLOAD_TICKETS_COLLECTION].delete_one({'_id': ticket['_id']})
+            removed += 1
+        return removed
+
+
+# Global service instance
+direct_uploads = DirectUploadService()
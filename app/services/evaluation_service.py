@@ -0,0 +1,288 @@
+"""Concurrent AI evaluation of competition submissions.
+
+``evaluation_engine.start`` claims a job document for a competition
+(one per competition, ``_id`` is the competition id) and enqueues a
+``competitions.evaluate`` background job, which evaluates the
+submissions on a bounded thread pool (EVALUATION_CONCURRENCY). Each submission is retried with exponential
+backoff and jitter up to EVALUATION_MAX_ATTEMPTS times. Progress
+(total, done, failed, skipped, recent errors) is written to the job
+document, which the admin page polls.
+
+Runs are resumable: every finished evaluation is stored on its own, and
+a new run skips submissions that already have one. A run whose heartbeat
+is older than EVALUATION_STALE_SECONDS is presumed dead (the worker
+crashed or was restarted), so the job can be claimed again. Each run
+carries a run_id, and a run that has been superseded stops writing.
+The ``competitions.evaluate`` task runs whichever run_id the job holds
+when it starts (``run_current``), since a restart may hand the new run to
+a queue job enqueued for an older one. A run that fails is re-raised so
+the queue retries it.
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask import current_app
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app import mongo
+from app.services.ai_service import evaluate_manuscript
+from app.services.job_service import job_queue
+
+logger = logging.getLogger(__name__)
+
+EVALUATION_JOBS_COLLECTION = 'evaluation_jobs'
+
+ACTIVE_STATUSES = ['queued', 'running']
+
+# Recent failures kept on the job document for the admin page
+MAX_JOB_ERRORS = 50
+
+HEARTBEAT_SECONDS = 15
+
+
+class RunSuperseded(Exception):
+    """Raised inside a run whose job was claimed by a newer run."""
+
+
+class EvaluationEngine:
+    """Runs and tracks competition evaluation jobs."""
+    
+    @staticmethod
+    def _settings():
+        """Read engine settings from the app config."""
+        config = current_app.config
+        return {
+            'concurrency': config.get('EVALUATION_CONCURRENCY', 4),
+            'max_attempts': config.get('EVALUATION_MAX_ATTEMPTS', 3),
+            'backoff': config.get('EVALUATION_RETRY_BACKOFF', 2.0),
+            'stale_seconds': config.get('EVALUATION_STALE_SECONDS', 300)
+        }
+    
+    def status(self, competition_id):
+        """Return the competition's job document, or None if it was never evaluated."""
+        return mongo.db[EVALUATION_JOBS_COLLECTION].find_one({'_id': str(competition_id)})
+    
+    @staticmethod
+    def is_active(job):
+        """Check whether a job document describes a queued or running job."""
+        return bool(job) and job.get('status') in ACTIVE_STATUSES
+    
+    def start(self, competition_id, started_by=None, use_cache=True):
+        """
+        Claim the competition's evaluation job and run it.
+        
+        use_cache=False asks the model again even for submissions whose
+        prompt has a cached response.
+        
+        Returns:
+            tuple: (job document, True if this call started a run; False if
+            a live run already holds the job)
+        """
+        settings = self._settings()
+        now = datetime.utcnow()
+        run_id = uuid.uuid4().hex
+        try:
+            job = mongo.db[EVALUATION_JOBS_COLLECTION].find_one_and_update(
+                {
+                    '_id': str(competition_id),
+                    '$or': [
+                        {'status': {'$nin': ACTIVE_STATUSES}},
+                        {'heartbeat_at': {'$lt': now - timedelta(seconds=settings['stale_seconds'])}}
+                    ]
+                },
+                {
+                    '$set': {
+                        'status': 'queued',
+                        'run_id': run_id,
+                        'started_by': ObjectId(started_by) if started_by else None,
+                        'started_at': now,
+                        'heartbeat_at': now,
+                        'finished_at': None,
+                        'total': 0,
+                        'done': 0,
+                        'failed': 0,
+                        'skipped': 0,
+                        'cache_hits': 0,
+                        'tokens_used': 0,
+                        'use_cache': use_cache,
+                        'errors': []
+                    },
+                    '$setOnInsert': {'competition_id': ObjectId(competition_id), 'created_at': now}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return self.status(competition_id), False
+        
+        job_queue.enqueue('competitions.evaluate', {'competition_id': job['_id'], 'run_id': run_id},
+                          created_by=started_by, unique_key=f"evaluate:{job['_id']}")
+        return self.status(competition_id), True
+    
+    def run_current(self, app, job_id, final_attempt=True):
+        """
+        Run the job's current run, and any run that claims the job meanwhile.
+        
+        Args:
+            final_attempt: False while the queue will retry a failure, which
+                leaves the job queued instead of failed
+        """
+        ran = set()
+        while True:
+            job = self.status(job_id)
+            if not self.is_active(job) or job['run_id'] in ran:
+                return
+            ran.add(job['run_id'])
+            self.run(app, job_id, job['run_id'], final_attempt=final_attempt)
+    
+    def _update(self, job_id, run_id, update):
+        """Update the job if this run still owns it."""
+        update.setdefault('$set', {})['heartbeat_at'] = datetime.utcnow()
+        result = mongo.db[EVALUATION_JOBS_COLLECTION].update_one({'_id': job_id, 'run_id': run_id}, update)
+        if result.matched_count == 0:
+            raise RunSuperseded(job_id)
+    
+    def run(self, app, job_id, run_id, final_attempt=True):
+        """
+        Evaluate every submission of the job's competition that has no evaluation yet.
+        
+        Raises:
+            Exception: whatever stopped the run, after recording it on the
+                job (failed, or queued again unless this is the final attempt)
+        """
+        from app.models import Competition, AIEvaluation, CompetitionSubmission
+        
+        settings = self._settings()
+        settings['use_cache'] = (self.status(job_id) or {}).get('use_cache', True)
+        competition = Competition.find_by_id(job_id)
+        try:
+            if not competition:
+                raise ValueError('Competition not found')
+            
+            competition_id = competition['_id']
+            evaluated = set(mongo.db[AIEvaluation.collection].distinct(
+                'submission_id', {'competition_id': competition_id}
+            ))
+            submissions = list(mongo.db[CompetitionSubmission.collection].find(
+                {'competition_id': competition_id},
+                {'manuscript_title': 1, 'synopsis': 1, 'word_count': 1, 'genre': 1}
+            ))
+            pending = [submission for submission in submissions if submission['_id'] not in evaluated]
+            self._update(job_id, run_id, {'$set': {
+                'status': 'running',
+                'total': len(submissions),
+                'skipped': len(submissions) - len(pending)
+            }})
+            
+            superseded = threading.Event()
+            with ThreadPoolExecutor(max_workers=settings['concurrency']) as pool:
+                futures = {
+                    pool.submit(self._evaluate_in_app, app, job_id, run_id, competition, submission,
+                                settings, superseded)
+                    for submission in pending
+                }
+                while futures:
+                    _, futures = wait(futures, timeout=HEARTBEAT_SECONDS)
+                    if futures and not superseded.is_set():
+                        try:
+                            self._update(job_id, run_id, {})
+                        except RunSuperseded:
+                            superseded.set()
+            if superseded.is_set():
+                raise RunSuperseded(job_id)
+            
+            remaining = len(submissions) - mongo.db[AIEvaluation.collection].count_documents(
+                {'competition_id': competition_id}
+            )
+            if remaining <= 0:
+                Competition.update_status(str(competition_id), 'admin_review')
+            self._update(job_id, run_id, {'$set': {
+                'status': 'completed' if remaining <= 0 else 'completed_with_errors',
+                'finished_at': datetime.utcnow()
+            }})
+        except RunSuperseded:
+            logger.info(f'Evaluation run {run_id} for {job_id} was superseded')
+        except Exception as e:
+            logger.error(f'Evaluation job {job_id} failed: {e}')
+            try:
+                self._update(job_id, run_id, {'$set': {
+                    'status': 'failed' if final_attempt else 'queued',
+                    'finished_at': datetime.utcnow() if final_attempt else None
+                }, '$push': {'errors': {'$each': [{'error': str(e)}], '$slice': -MAX_JOB_ERRORS}}})
+            except RunSuperseded:
+                return
+            raise
+    
+    def _evaluate_in_app(self, app, job_id, run_id, competition, submission, settings, superseded):
+        """Evaluate one submission on a pool thread."""
+        with app.app_context():
+            try:
+                self._evaluate(job_id, run_id, competition, submission, settings, superseded)
+            except RunSuperseded:
+                superseded.set()
+    
+    def _evaluate(self, job_id, run_id, competition, submission, settings, superseded):
+        """Evaluate one submission with retries and record the outcome."""
+        from app.models import AIEvaluation, CompetitionSubmission
+        
+        for attempt in range(1, settings['max_attempts'] + 1):
+            if superseded.is_set():
+                return
+            try:
+                result = evaluate_manuscript(
+                    manuscript_title=submission['manuscript_title'],
+                    synopsis=submission['synopsis'],
+                    word_count=submission['word_count'],
+                    genre=submission['genre'],
+                    criteria=competition['evaluation_criteria'],
+                    use_cache=settings['use_cache'],
+                    lane='batch',
+                    tenant=str(competition['_id'])
+                )
+                break
+            except Exception as e:
+                if attempt == settings['max_attempts']:
+                    logger.warning(f"Giving up on submission {submission['_id']} after {attempt} attempts: {e}")
+                    self._update(job_id, run_id, {
+                        '$inc': {'failed': 1},
+                        '$push': {'errors': {'$each': [{
+                            'submission_id': submission['_id'],
+                            'manuscript_title': submission['manuscript_title'],
+                            'error': str(e)
+                        }], '$slice': -MAX_JOB_ERRORS}}
+                    })
+                    return
+                # Exponential backoff with jitter so retries do not arrive together
+                time.sleep(settings['backoff'] * 2 ** (attempt - 1) * random.uniform(0.5, 1.0))
+        
+        self._update(job_id, run_id, {})  # Raises if a newer run took over meanwhile
+        AIEvaluation.create(
+            submission_id=str(submission['_id']),
+            competition_id=str(competition['_id']),
+            ai_model_version=result['model_version'],
+            criteria_scores=result['criteria_scores'],
+            overall_score=result['overall_score'],
+            strengths_identified=result['strengths'],
+            weaknesses_identified=result['weaknesses'],
+            detailed_feedback=result['detailed_feedback'],
+            confidence_score=result['confidence_score'],
+            processing_time_seconds=result['processing_time'],
+            tokens_used=result['tokens_used'],
+            cache_hit=result['cache_hit'],
+            parse_confidence=result.get('parse_confidence')
+        )
+        CompetitionSubmission.update_status(str(submission['_id']), 'under_review')
+        self._update(job_id, run_id, {'$inc': {
+            'done': 1,
+            'cache_hits': 1 if result['cache_hit'] else 0,
+            'tokens_used': result['tokens_used']
+        }})
+
+
+# Global service instance
+evaluation_engine = EvaluationEngine()
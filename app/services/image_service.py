@@ -0,0 +1,332 @@
+"""Resized image derivatives for covers, avatars and banners.
+
+Pages ask for an image at a named size through the ``media_url``
+template helper, e.g. ``book.cover_image_url|media_url('card')``:
+
+* Cloudinary URLs get a delivery transformation (``c_limit,w_320,...``)
+  and Cloudinary produces and caches the variant itself.
+* Other images (S3, local uploads, allowed external hosts) get variants rendered
+  with Pillow as WebP (or AVIF where Pillow supports it), stored under
+  the content hash of the original in S3, or in UPLOAD_FOLDER when S3
+  is not configured, and recorded on the ``media_assets`` document.
+
+Variants are rendered when media_service pushes an upload, and on first
+request for older images: the helper returns the original URL and
+queues ``media.derivatives``, so later page views get the variant.
+Lookups are cached for IMAGE_DERIVATIVE_LOOKUP_TTL seconds.
+
+Image URLs are set by authors, so only our own storage (local uploads
+and the configured S3 bucket) is rendered by default. Other hosts must be
+listed in IMAGE_DERIVATIVE_EXTERNAL_HOSTS, and are fetched only if every
+address they resolve to is public, without following redirects.
+"""
+import hashlib
+import io
+import ipaddress
+import logging
+import os
+import socket
+from urllib.parse import urlsplit
+from flask import current_app
+from app import mongo
+from app.services.cache_service import cache
+from app.services.media_service import MEDIA_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+# Name -> bounding box (width, height); images are shrunk to fit, never enlarged
+SIZES = {
+    'thumb': (160, 240),
+    'card': (320, 480),
+    'detail': (640, 960)
+}
+
+CONTENT_TYPES = {'webp': 'image/webp', 'avif': 'image/avif'}
+
+# Largest download accepted when rendering variants of external images
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+
+
+class UnsafeImageSource(ValueError):
+    """An image URL the server must not fetch (an unlisted host or a private address)."""
+
+
+def normalize_media_url(url):
+    """Normalize media URLs stored in the database."""
+    if not url:
+        return ''
+    normalized = url.strip()
+    if normalized.startswith('//'):
+        return f"https:{normalized}"
+    if normalized.startswith('http://'):
+        return f"https://{normalized[len('http://'):]}"
+    if normalized.startswith('https://'):
+        return normalized
+    if normalized.startswith('/'):
+        return normalized
+    if normalized.startswith('static/'):
+        return f"/{normalized}"
+    if normalized.startswith('uploads/'):
+        return f"/{normalized}"
+    if normalized.startswith('res.cloudinary.com/') or normalized.startswith('cloudinary.com/'):
+        return f"https://{normalized}"
+    
+    bucket = current_app.config.get('AWS_S3_BUCKET_NAME')
+    if bucket:
+        region = current_app.config.get('AWS_REGION', 'us-east-1')
+        return f"https://{bucket}.s3.{region}.amazonaws.com/{normalized}"
+    
+    return f"/{normalized}"
+
+
+def media_url(url, size=None):
+    """Return the URL to show an image at, picking the variant for a named size ('thumb', 'card', 'detail')."""
+    normalized = normalize_media_url(url)
+    if not normalized or size is None:
+        return normalized
+    return image_derivatives.variant_url(normalized, size)
+
+
+def own_storage(url):
+    """Return whether a normalized image URL is served from our uploads or S3 bucket."""
+    if url.startswith('/uploads/'):
+        return True
+    bucket = current_app.config.get('AWS_S3_BUCKET_NAME')
+    if not bucket:
+        return False
+    host = (urlsplit(url).hostname or '').lower()
+    return url.startswith('https://') and host.startswith(f'{bucket.lower()}.s3.') and host.endswith('.amazonaws.com')
+
+
+def allowed_external(url):
+    """Return whether an image URL's host is listed in IMAGE_DERIVATIVE_EXTERNAL_HOSTS."""
+    hosts = current_app.config.get('IMAGE_DERIVATIVE_EXTERNAL_HOSTS', [])
+    return (urlsplit(url).hostname or '').lower() in hosts
+
+
+def check_public_host(url):
+    """
+    Resolve an http(s) URL's host and reject it unless every address is public.
+    
+    Raises:
+        UnsafeImageSource: for another scheme, an unresolvable host, or a
+            private, loopback, link-local or otherwise reserved address
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise UnsafeImageSource(f'Not an http(s) image URL: {url}')
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parts.hostname, parts.port or 443)}
+    except socket.gaierror as e:
+        raise UnsafeImageSource(f'Cannot resolve {parts.hostname}: {e}')
+    for address in addresses:
+        if not ipaddress.ip_address(address.split('%', 1)[0]).is_global:
+            raise UnsafeImageSource(f'{parts.hostname} resolves to a non-public address ({address})')
+
+
+def cloudinary_variant(url, size):
+    """Insert a resize transformation into a Cloudinary delivery URL."""
+    width, height = SIZES[size]
+    return url.replace('/upload/', f'/upload/c_limit,w_{width},h_{height},f_auto,q_auto/', 1)
+
+
+class ImageDerivativeService:
+    """Renders, stores and looks up sized image variants."""
+    
+    def __init__(self):
+        """Initialize the set of URLs this process has already queued."""
+        self.requested = set()
+    
+    @staticmethod
+    def image_format():
+        """Return the configured variant format, falling back to WebP without AVIF support."""
+        name = current_app.config.get('IMAGE_DERIVATIVE_FORMAT', 'webp')
+        if name == 'avif':
+            from PIL import features
+            if not features.check('avif'):
+                return 'webp'
+        return name
+    
+    def variant_url(self, url, size):
+        """
+        Return the URL of a variant, or the original until the variant exists.
+        
+        Args:
+            url: Normalized image URL
+            size: Key of SIZES
+        """
+        if size not in SIZES:
+            raise ValueError(f'Unknown image size: {size}')
+        if 'res.cloudinary.com/' in url and '/upload/' in url:
+            return cloudinary_variant(url, size)
+        if url.startswith('/static/') or not current_app.config.get('IMAGE_DERIVATIVES_ENABLED', True):
+            return url
+        if not (own_storage(url) or allowed_external(url)):
+            # Rendering would make the server fetch whatever an author linked
+            return url
+        
+        derivatives = self._lookup(url)
+        if derivatives is None:
+            self._request(url)
+            return url
+        return derivatives.get(size, url)
+    
+    def _lookup(self, url):
+        """Return {size: url} for an image, {} if rendering failed, or None if it has no variants yet."""
+        key = f"derivatives:{hashlib.sha1(url.encode('utf-8')).hexdigest()}"
+        entry = cache.get(key)
+        if entry is None:
+            asset = mongo.db[MEDIA_COLLECTION].find_one(
+                {'$or': [{'url': url}, {'placeholder': url}, {'aliases': url}]},
+                {'derivatives': 1, 'derivatives_error': 1}
+            )
+            variants = None
+            if asset and asset.get('derivatives'):
+                variants = asset['derivatives']
+            elif asset and asset.get('derivatives_error'):
+                # Serve the original rather than queueing the same failure on every view
+                variants = {}
+            entry = {'variants': variants}
+            cache.set(key, entry, ttl=current_app.config.get('IMAGE_DERIVATIVE_LOOKUP_TTL', 300),
+                      tags=[f'derivatives:{url}'])
+        return entry['variants']
+    
+    def _request(self, url):
+        """Queue rendering of an image's variants, once per process."""
+        from app.services.job_service import job_queue
+        
+        if not current_app.config.get('IMAGE_DERIVATIVES_ON_REQUEST', True) or url in self.requested:
+            return
+        if len(self.requested) > 10000:
+            self.requested.clear()
+        self.requested.add(url)
+        try:
+            job_queue.enqueue('media.derivatives', {'url': url},
+                              unique_key=f"derivatives:{hashlib.sha1(url.encode('utf-8')).hexdigest()}")
+        except Exception as e:
+            logger.warning(f'Could not queue image variants for {url}: {e}')
+    
+    def generate(self, asset_id=None, url=None, data=None):
+        """
+        Render and store every variant of an image.
+        
+        Args:
+            asset_id: media_assets id (content hash) of a tracked upload
+            url: Image URL, for images uploaded before assets were tracked
+            data: The image bytes, if the caller has them at hand
+        
+        Returns:
+            dict: {size: variant url}
+        """
+        from app.services.media_service import media_service
+        
+        asset = None
+        if asset_id:
+            asset = mongo.db[MEDIA_COLLECTION].find_one({'_id': asset_id})
+            if asset is None:
+                return {}
+        elif url:
+            asset = mongo.db[MEDIA_COLLECTION].find_one({'$or': [{'url': url}, {'placeholder': url}, {'aliases': url}]})
+        if asset and asset.get('derivatives'):
+            return asset['derivatives']
+        
+        source = url or asset['url']
+        if data is None:
+            data = self._fetch(source)
+        if asset is None:
+            asset = media_service.track(source, data)
+        
+        try:
+            fmt = self.image_format()
+            rendered = self.render(data, fmt)
+        except Exception as e:
+            mongo.db[MEDIA_COLLECTION].update_one({'_id': asset['_id']}, {'$set': {'derivatives_error': str(e)}})
+            raise
+        
+        derivatives = {size: self._put(f"{asset['_id']}-{size}.{fmt}", body, CONTENT_TYPES[fmt])
+                       for size, body in rendered.items()}
+        mongo.db[MEDIA_COLLECTION].update_one(
+            {'_id': asset['_id']},
+            {'$set': {'derivatives': derivatives}, '$unset': {'derivatives_error': ''}}
+        )
+        for known in {source, asset.get('url'), asset.get('placeholder')} - {None}:
+            cache.invalidate_tag(f'derivatives:{known}')
+        return derivatives
+    
+    @staticmethod
+    def render(data, fmt='webp', quality=None):
+        """
+        Resize image bytes to every size in SIZES.
+        
+        Returns:
+            dict: {size: encoded bytes}
+        """
+        from PIL import Image, ImageOps
+        
+        if quality is None:
+            quality = current_app.config.get('IMAGE_DERIVATIVE_QUALITY', 80)
+        with Image.open(io.BytesIO(data)) as original:
+            image = ImageOps.exif_transpose(original)
+            image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        
+        rendered = {}
+        # Largest first, so each smaller size is resampled from fewer pixels
+        for size, box in sorted(SIZES.items(), key=lambda item: item[1], reverse=True):
+            image.thumbnail(box, Image.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, format=fmt.upper(), quality=quality)
+            rendered[size] = out.getvalue()
+        return rendered
+    
+    @staticmethod
+    def _fetch(url, any_host=False):
+        """
+        Read an image from the upload folder or over HTTP.
+        
+        Args:
+            any_host: Fetch from any public host (admin-run migrations);
+                otherwise only our storage and IMAGE_DERIVATIVE_EXTERNAL_HOSTS
+        
+        Raises:
+            UnsafeImageSource: for a host that may not be fetched
+        """
+        if url.startswith('/uploads/'):
+            path = os.path.join(os.path.abspath(current_app.config['UPLOAD_FOLDER']), os.path.basename(url))
+            with open(path, 'rb') as source:
+                return source.read()
+        import requests
+        
+        if not own_storage(url):
+            if not (any_host or allowed_external(url)):
+                raise UnsafeImageSource(f'Not our storage or an allowed image host: {url}')
+            check_public_host(url)
+        # Redirects are not followed: they could point anywhere, past the check above
+        response = requests.get(url, timeout=15, stream=True, allow_redirects=False)
+        response.raise_for_status()
+        if response.is_redirect:
+            raise UnsafeImageSource(f'Image URL redirects elsewhere: {url}')
+        data = response.raw.read(MAX_SOURCE_BYTES + 1, decode_content=True)
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ValueError(f'Image larger than {MAX_SOURCE_BYTES} bytes: {url}')
+        return data
+    
+    @staticmethod
+    def _put(name, body, content_type):
+        """Store a variant in S3, or the local upload folder without S3; return its URL."""
+        from app.services.s3_service import s3_service
+        
+        if s3_service.is_s3_configured():
+            url = s3_service.put_object(f'derivatives/{name}', body, content_type)
+            if url:
+                return url
+            raise RuntimeError(f'Could not store image variant {name}')
+        root = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+        os.makedirs(root, exist_ok=True)
+        filename = f'derived_{name}'
+        with open(os.path.join(root, filename), 'wb') as out:
+            out.write(body)
+        return f'/uploads/{filename}'
+
+
+# Global service instance
+image_derivatives = ImageDerivativeService()
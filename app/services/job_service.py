@@ -0,0 +1,459 @@
+"""MongoDB-backed background job queue.
+
+Long-running admin operations are registered as tasks and enqueued as
+documents in the ``jobs`` collection; ``flask worker`` processes claim
+and run them outside the web tier.
+
+* Claiming is one ``find_one_and_update`` that takes the highest-priority
+  due job, so any number of workers can poll the same collection.
+* A claimed job holds a lease (JOBS_LEASE_SECONDS) that the worker renews
+  while the task runs. If the worker dies, the lease expires and another
+  worker picks the job up again, so tasks must be safe to re-run.
+* Failed jobs are retried with exponential backoff until their task's
+  max_attempts is reached, then marked failed with the last error.
+* Finished jobs expire after JOBS_RETENTION_DAYS. A succeeded job's
+  payload is removed.
+* Secret or bulky handler arguments (an imported CSV with passwords) are
+  passed as ``inputs``: they are kept in ``job_inputs``, not on the job,
+  and deleted as soon as the job finishes or is cancelled.
+
+When JOBS_ASYNC is False (tests, or a deployment without workers) jobs
+run inline in ``enqueue``.
+"""
+import logging
+import os
+import signal
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask import current_app
+from pymongo import ReturnDocument
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = 'jobs'
+JOB_INPUTS_COLLECTION = 'job_inputs'
+
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 5
+PRIORITY_HIGH = 10
+
+ACTIVE_STATUSES = ['queued', 'running']
+FINISHED_STATUSES = ['succeeded', 'failed', 'cancelled']
+
+
+class JobCancelled(Exception):
+    """Raised by JobContext.heartbeat when the job was cancelled or taken over."""
+
+
+class Task:
+    """A registered job handler and its retry policy."""
+    
+    def __init__(self, name, func, max_attempts, backoff, priority):
+        """Store the handler and its policy."""
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.priority = priority
+    
+    def retry_delay(self, attempt):
+        """Seconds to wait before the attempt after the given one."""
+        return self.backoff * 2 ** (attempt - 1)
+
+
+class JobContext:
+    """Handed to task handlers so they can report progress and keep their lease."""
+    
+    def __init__(self, queue, job):
+        """Wrap a claimed job document."""
+        self.queue = queue
+        self.job = job
+        self.id = job['_id']
+        self.attempt = job.get('attempts', 1)
+    
+    def progress(self, **fields):
+        """Merge fields into the job's progress and renew the lease."""
+        self.queue._renew(self.job, {f'progress.{key}': value for key, value in fields.items()})
+    
+    def heartbeat(self):
+        """Renew the lease; raises JobCancelled if this worker no longer owns the job."""
+        self.queue._renew(self.job)
+
+
+class JobQueue:
+    """Registers tasks, enqueues jobs and runs them."""
+    
+    def __init__(self):
+        """Initialize an empty task registry."""
+        self.tasks = {}
+    
+    def init_app(self, app):
+        """Load the application's task handlers."""
+        from app import tasks  # noqa: F401  (registers handlers on import)
+        app.extensions['job_queue'] = self
+    
+    def task(self, name, max_attempts=3, backoff=30, priority=PRIORITY_NORMAL):
+        """
+        Register a function as a task.
+        
+        The handler is called as ``func(job, **payload)`` where job is a
+        JobContext; its return value (JSON-serializable) is stored as the
+        job result.
+        """
+        def decorator(func):
+            self.tasks[name] = Task(name, func, max_attempts, backoff, priority)
+            return func
+        return decorator
+    
+    @staticmethod
+    def _settings():
+        """Read queue settings from the app config."""
+        config = current_app.config
+        return {
+            'async': config.get('JOBS_ASYNC', True),
+            'lease_seconds': config.get('JOBS_LEASE_SECONDS', 60),
+            'retention_days': config.get('JOBS_RETENTION_DAYS', 14),
+            'inputs_ttl_hours': config.get('JOBS_INPUTS_TTL_HOURS', 72)
+        }
+    
+    def enqueue(self, name, payload=None, priority=None, delay=0, created_by=None, unique_key=None, inputs=None):
+        """
+        Add a job to the queue.
+        
+        Args:
+            name: Registered task name
+            payload: Keyword arguments for the handler (BSON-serializable)
+            priority: Higher runs first (defaults to the task's priority)
+            delay: Seconds before the job becomes due
+            created_by: User id of the requester, shown in the status API
+            unique_key: If given, return the existing queued or running job
+                with the same key instead of adding another
+            inputs: Handler keyword arguments kept off the job document and
+                deleted once it finishes; such a job cannot be retried
+        
+        Returns:
+            dict: The job document
+        """
+        task = self.tasks.get(name)
+        if task is None:
+            raise ValueError(f'Unknown task: {name}')
+        
+        if unique_key:
+            existing = mongo.db[JOBS_COLLECTION].find_one({'unique_key': unique_key, 'status': {'$in': ACTIVE_STATUSES}})
+            if existing:
+                return existing
+        
+        now = datetime.utcnow()
+        settings = self._settings()
+        job = {
+            '_id': ObjectId(),
+            'name': name,
+            'payload': payload or {},
+            'status': 'queued',
+            'priority': task.priority if priority is None else priority,
+            'attempts': 0,
+            'max_attempts': task.max_attempts,
+            'run_at': now + timedelta(seconds=delay),
+            'lease_expires_at': None,
+            'worker': None,
+            'progress': {},
+            'result': None,
+            'error': None,
+            'unique_key': unique_key,
+            'created_by': ObjectId(created_by) if created_by else None,
+            'created_at': now,
+            'started_at': None,
+            'finished_at': None,
+            'expires_at': None,
+            'has_inputs': bool(inputs)
+        }
+        if inputs:
+            # Stored first, so no worker claims the job before its inputs exist
+            mongo.db[JOB_INPUTS_COLLECTION].insert_one({
+                '_id': job['_id'],
+                'data': inputs,
+                'created_at': now,
+                'expires_at': now + timedelta(hours=settings['inputs_ttl_hours'])
+            })
+        mongo.db[JOBS_COLLECTION].insert_one(job)
+        logger.info(f'Enqueued job {job["_id"]} ({name})')
+        
+        if not settings['async']:
+            claimed = self.claim(worker=f'inline-{os.getpid()}', job_id=job['_id'])
+            if claimed:
+                self.execute(claimed)
+            return self.status(job['_id'])
+        return job
+    
+    def claim(self, worker, job_id=None):
+        """
+        Take the highest-priority due job, or one whose lease has expired.
+        
+        Returns:
+            dict: The claimed job, or None if nothing is due
+        """
+        now = datetime.utcnow()
+        query = {'$or': [
+            {'status': 'queued', 'run_at': {'$lte': now}},
+            {'status': 'running', 'lease_expires_at': {'$lt': now}}
+        ]}
+        if job_id is not None:
+            query['_id'] = job_id
+        return mongo.db[JOBS_COLLECTION].find_one_and_update(
+            query,
+            {
+                '$set': {
+                    'status': 'running',
+                    'worker': worker,
+                    'started_at': now,
+                    'lease_expires_at': now + timedelta(seconds=self._settings()['lease_seconds'])
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('priority', -1), ('run_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+    
+    def _renew(self, job, fields=None):
+        """Extend a running job's lease if its worker still owns it."""
+        update = dict(fields or {})
+        update['lease_expires_at'] = datetime.utcnow() + timedelta(seconds=self._settings()['lease_seconds'])
+        result = mongo.db[JOBS_COLLECTION].update_one(
+            {'_id': job['_id'], 'status': 'running', 'worker': job['worker'], 'attempts': job['attempts']},
+            {'$set': update}
+        )
+        if result.matched_count == 0:
+            raise JobCancelled(job['_id'])
+    
+    def _finish(self, job, update):
+        """Record a job's outcome if its worker still owns it; final outcomes drop the job's inputs."""
+        finished = mongo.db[JOBS_COLLECTION].update_one(
+            {'_id': job['_id'], 'status': 'running', 'worker': job['worker'], 'attempts': job['attempts']},
+            update
+        ).matched_count > 0
+        if finished and update['$set']['status'] in FINISHED_STATUSES and job.get('has_inputs'):
+            mongo.db[JOB_INPUTS_COLLECTION].delete_one({'_id': job['_id']})
+        return finished
+    
+    def execute(self, job):
+        """Run a claimed job's handler and record success, a retry or failure."""
+        task = self.tasks.get(job['name'])
+        now = datetime.utcnow
+        retention = timedelta(days=self._settings()['retention_days'])
+        if task is None:
+            self._finish(job, {'$set': {
+                'status': 'failed', 'error': f"Unknown task: {job['name']}",
+                'finished_at': now(), 'expires_at': now() + retention
+            }})
+            return
+        
+        if job['attempts'] > job['max_attempts']:
+            # Reclaimed after its last attempt's worker died without recording an outcome
+            self._finish(job, {'$set': {
+                'status': 'failed', 'error': job.get('error') or 'Worker lost the job on its last attempt',
+                'lease_expires_at': None, 'finished_at': now(), 'expires_at': now() + retention
+            }})
+            return
+        
+        kwargs = dict(job.get('payload') or {})
+        if job.get('has_inputs'):
+            inputs = mongo.db[JOB_INPUTS_COLLECTION].find_one({'_id': job['_id']})
+            if inputs is None:
+                self._finish(job, {'$set': {
+                    'status': 'failed', 'error': 'The job inputs expired or were removed',
+                    'lease_expires_at': None, 'finished_at': now(), 'expires_at': now() + retention
+                }})
+                return
+            kwargs.update(inputs['data'])
+        
+        context = JobContext(self, job)
+        try:
+            result = task.func(context, **kwargs)
+        except JobCancelled:
+            logger.info(f'Job {job["_id"]} was cancelled or reclaimed while running')
+            return
+        except Exception as e:
+            logger.error(f'Job {job["_id"]} ({job["name"]}) attempt {job["attempts"]} failed: {e}')
+            error = {'attempt': job['attempts'], 'error': str(e), 'traceback': traceback.format_exc(limit=5),
+                     'at': now()}
+            if job['attempts'] < job['max_attempts']:
+                self._finish(job, {
+                    '$set': {'status': 'queued', 'error': str(e), 'lease_expires_at': None, 'worker': None,
+                             'run_at': now() + timedelta(seconds=task.retry_delay(job['attempts']))},
+                    '$push': {'errors': {'$each': [error], '$slice': -10}}
+                })
+            else:
+                self._finish(job, {
+                    '$set': {'status': 'failed', 'error': str(e), 'lease_expires_at': None,
+                             'finished_at': now(), 'expires_at': now() + retention},
+                    '$push': {'errors': {'$each': [error], '$slice': -10}}
+                })
+            return
+        
+        self._finish(job, {
+            '$set': {'status': 'succeeded', 'result': result, 'error': None, 'lease_expires_at': None,
+                     'finished_at': now(), 'expires_at': now() + retention},
+            '$unset': {'payload': ''}
+        })
+    
+    def status(self, job_id):
+        """Return a job document, or None for an unknown or malformed id."""
+        try:
+            return mongo.db[JOBS_COLLECTION].find_one({'_id': ObjectId(job_id)})
+        except Exception:
+            return None
+    
+    def find_recent(self, status=None, name=None, limit=50):
+        """Return the most recently created jobs, optionally filtered."""
+        query = {}
+        if status:
+            query['status'] = status
+        if name:
+            query['name'] = name
+        return list(mongo.db[JOBS_COLLECTION].find(query, {'payload': 0}).sort('created_at', -1).limit(limit))
+    
+    def cancel(self, job_id):
+        """Cancel a queued or running job; a running handler stops at its next heartbeat."""
+        now = datetime.utcnow()
+        result = mongo.db[JOBS_COLLECTION].update_one(
+            {'_id': ObjectId(job_id), 'status': {'$in': ACTIVE_STATUSES}},
+            {'$set': {'status': 'cancelled', 'finished_at': now, 'lease_expires_at': None,
+                      'expires_at': now + timedelta(days=self._settings()['retention_days'])}}
+        )
+        if result.modified_count:
+            mongo.db[JOB_INPUTS_COLLECTION].delete_one({'_id': ObjectId(job_id)})
+        return result.modified_count > 0
+    
+    def retry(self, job_id):
+        """Requeue a failed or cancelled job with a fresh attempt budget; jobs whose inputs were dropped cannot be."""
+        result = mongo.db[JOBS_COLLECTION].update_one(
+            {'_id': ObjectId(job_id), 'status': {'$in': ['failed', 'cancelled']}, 'has_inputs': {'$ne': True}},
+            {'$set': {'status': 'queued', 'attempts': 0, 'run_at': datetime.utcnow(), 'error': None,
+                      'finished_at': None, 'expires_at': None, 'worker': None}}
+        )
+        return result.modified_count > 0
+    
+    def counts(self):
+        """Return the number of jobs in each status."""
+        pipeline = [{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]
+        return {row['_id']: row['count'] for row in mongo.db[JOBS_COLLECTION].aggregate(pipeline)}
+
+
+class Worker:
+    """Polls the queue and runs jobs, several at a time, until stopped."""
+    
+    def __init__(self, queue, app, concurrency=1, poll_interval=2.0, name=None):
+        """Configure a worker for an application."""
+        self.queue = queue
+        self.app = app
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.name = name or f'{socket.gethostname()}-{os.getpid()}'
+        self.stopping = threading.Event()
+        self.slots = threading.Semaphore(concurrency)
+        self.threads = []
+    
+    def stop(self, *_):
+        """Stop claiming jobs; running jobs finish first."""
+        if not self.stopping.is_set():
+            logger.info(f'Worker {self.name} stopping after current jobs')
+        self.stopping.set()
+    
+    def run(self, burst=False):
+        """
+        Process jobs until stopped (SIGINT/SIGTERM).
+        
+        Args:
+            burst: Exit once the queue has nothing due instead of polling
+        
+        Returns:
+            int: Number of jobs processed
+        """
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                handlers[signum] = signal.signal(signum, self.stop)
+        try:
+            return self._loop(burst)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+    
+    def _loop(self, burst):
+        """Claim and start jobs while slots are free; returns the number started."""
+        processed = 0
+        while not self.stopping.is_set():
+            self.slots.acquire()
+            with self.app.app_context():
+                try:
+                    job = self.queue.claim(self.name)
+                except Exception as e:
+                    logger.error(f'Worker {self.name} could not claim a job: {e}')
+                    job = None
+            if job is None:
+                self.slots.release()
+                if burst and not any(thread.is_alive() for thread in self.threads):
+                    break
+                self.stopping.wait(self.poll_interval)
+                continue
+            
+            processed += 1
+            thread = threading.Thread(target=self._process, args=(job,), name=f'job-{job["_id"]}', daemon=True)
+            self.threads = [running for running in self.threads if running.is_alive()] + [thread]
+            thread.start()
+        
+        for thread in self.threads:
+            thread.join()
+        return processed
+    
+    def _process(self, job):
+        """Run one job with a lease-renewing heartbeat alongside it."""
+        done = threading.Event()
+        
+        def keep_lease():
+            interval = max(1, self.app.config.get('JOBS_LEASE_SECONDS', 60) / 3)
+            with self.app.app_context():
+                while not done.wait(interval):
+                    try:
+                        self.queue._renew(job)
+                    except JobCancelled:
+                        return
+                    except Exception as e:
+                        logger.warning(f'Could not renew lease of job {job["_id"]}: {e}')
+        
+        heartbeat = threading.Thread(target=keep_lease, daemon=True)
+        heartbeat.start()
+        try:
+            with self.app.app_context():
+                self.queue.execute(job)
+        finally:
+            done.set()
+            self.slots.release()
+
+
+def serialize_job(job):
+    """Return a job document as JSON-safe data for the status API."""
+    if not job:
+        return None
+    dates = ('run_at', 'created_at', 'started_at', 'finished_at')
+    return {
+        'id': str(job['_id']),
+        'name': job['name'],
+        'status': job['status'],
+        'priority': job.get('priority'),
+        'attempts': job.get('attempts', 0),
+        'max_attempts': job.get('max_attempts'),
+        'progress': job.get('progress') or {},
+        'result': job.get('result'),
+        'error': job.get('error'),
+        'active': job['status'] in ACTIVE_STATUSES,
+        **{field: job[field].isoformat() if job.get(field) else None for field in dates}
+    }
+
+
+# Global service instance
+job_queue = JobQueue()
@@ -0,0 +1,306 @@
+"""Bulk migration of stored images to Cloudinary or S3.
+
+``flask media-migrate`` moves every image URL on a MEDIA_FIELDS field
+that is not yet on the target storage:
+
+* ``--source local`` takes files served from UPLOAD_FOLDER (/uploads/),
+  ``--source external`` re-hosts images linked from other sites.
+* Uploads run on a thread pool. Each file is hashed first; bytes already
+  stored on the target (another URL, an earlier run, a regular upload)
+  are reused instead of uploaded again. S3 keys are the content hash, so
+  a repeated upload overwrites the same object.
+* Every finished URL is written to the ``media_migrations`` manifest
+  before documents are touched, so an interrupted run resumes where it
+  stopped: the next run skips the upload and only rewrites the URLs.
+* Documents are repointed with batched ``bulk_write`` calls that only
+  match fields still holding the old URL, so a newer upload is kept.
+* ``--dry-run`` reports what would move without uploading or writing.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from flask import current_app
+from pymongo import UpdateMany
+from app import mongo
+from app.services.media_service import MEDIA_COLLECTION, MEDIA_FIELDS
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_COLLECTION = 'media_migrations'
+
+TARGETS = ('cloudinary', 's3')
+SOURCES = ('local', 'external')
+
+# Storage folder per field: (collection, field) -> folder
+MEDIA_FOLDERS = {
+    ('books', 'cover_image_url'): 'book-covers',
+    ('users', 'profile_image_url'): 'profile-images',
+    ('users', 'banner_image_url'): 'banner-images'
+}
+
+# Staged uploads are pushed by media.push, not migrated
+SOURCE_PATTERNS = {
+    'local': r'^/?uploads/(?!staged_)',
+    'external': r'^(https?:)?//'
+}
+
+EXTENSIONS = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png', '.gif': 'image/gif',
+              '.webp': 'image/webp'}
+
+
+class MigrationSourceMissing(Exception):
+    """The file behind a local URL no longer exists."""
+
+
+class MediaMigrationService:
+    """Moves images to remote storage concurrently and resumably."""
+    
+    def __init__(self):
+        """Initialize the per-content locks that keep identical files from uploading twice at once."""
+        self._guard = threading.Lock()
+        self._asset_locks = {}
+    
+    @staticmethod
+    def default_target():
+        """Return the storage uploads go to: Cloudinary, else S3, else None."""
+        from app.services.cloudinary_service import cloudinary_service
+        from app.services.s3_service import s3_service
+        
+        if cloudinary_service._ensure_config():
+            return 'cloudinary'
+        if s3_service.is_s3_configured():
+            return 's3'
+        return None
+    
+    @staticmethod
+    def _on_target(url, target):
+        """Return whether a URL is already served by the target storage."""
+        if target == 'cloudinary':
+            return 'res.cloudinary.com/' in url
+        bucket = current_app.config.get('AWS_S3_BUCKET_NAME')
+        return bool(bucket) and f'{bucket}.s3.' in url
+    
+    def scan(self, target, source, limit=None):
+        """
+        Find the URLs to migrate and the documents showing them.
+        
+        Returns:
+            dict: url -> {'folder': str, 'refs': [(collection, field, _id)]}
+        """
+        pending = {}
+        for collection, field in MEDIA_FIELDS:
+            cursor = mongo.db[collection].find({field: {'$regex': SOURCE_PATTERNS[source]}}, {field: 1})
+            for doc in cursor:
+                url = doc[field]
+                if source == 'external' and self._on_target(url, target):
+                    continue
+                if url not in pending:
+                    if limit and len(pending) >= limit:
+                        continue
+                    pending[url] = {'folder': MEDIA_FOLDERS[(collection, field)], 'refs': []}
+                pending[url]['refs'].append((collection, field, doc['_id']))
+        return pending
+    
+    def run(self, target=None, source='local', workers=None, batch_size=None, dry_run=False, limit=None,
+            progress=None):
+        """
+        Migrate images and repoint the documents showing them.
+        
+        Args:
+            target: 'cloudinary' or 's3' (defaults to the configured storage)
+            source: 'local' or 'external'
+            workers: Upload threads (defaults to MEDIA_MIGRATE_WORKERS)
+            batch_size: URLs per bulk_write (defaults to MEDIA_MIGRATE_BATCH)
+            dry_run: Only report what would be migrated
+            limit: Migrate at most this many URLs
+            progress: Called with the counts after each batch
+        
+        Returns:
+            dict: Counts, bytes uploaded and seconds taken
+        
+        Raises:
+            ValueError: for an unknown source or target, or no storage configured
+        """
+        config = current_app.config
+        target = target or self.default_target()
+        if target not in TARGETS:
+            raise ValueError(f'No storage to migrate to (choose from {", ".join(TARGETS)})')
+        if source not in SOURCES:
+            raise ValueError(f'Unknown source: {source}')
+        workers = workers or config.get('MEDIA_MIGRATE_WORKERS', 8)
+        batch_size = batch_size or config.get('MEDIA_MIGRATE_BATCH', 100)
+        started = time.monotonic()
+        
+        pending = self.scan(target, source, limit)
+        manifest_ids = [self._manifest_id(url, target) for url in pending]
+        done = {entry['url']: entry['new_url'] for entry in mongo.db[MIGRATION_COLLECTION].find(
+            {'_id': {'$in': manifest_ids}, 'status': 'done'}, {'url': 1, 'new_url': 1})}
+        counts = {'urls': len(pending), 'documents': sum(len(item['refs']) for item in pending.values()),
+                  'uploaded': 0, 'deduplicated': 0, 'resumed': len(done), 'missing': 0, 'failed': 0,
+                  'updated': 0, 'bytes': 0}
+        
+        if dry_run:
+            for url in pending:
+                if url not in done and source == 'local':
+                    path = self._local_path(url)
+                    if os.path.exists(path):
+                        counts['bytes'] += os.path.getsize(path)
+                    else:
+                        counts['missing'] += 1
+            counts['seconds'] = round(time.monotonic() - started, 2)
+            return counts
+        
+        # Uploaded by an interrupted run: only the documents are left to update
+        batch = list(done.items())
+        self._asset_locks = {}
+        app = current_app._get_current_object()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self._migrate_in_app, app, url, pending[url]['folder'], target)
+                       for url in pending if url not in done]
+            for future in as_completed(futures):
+                url, new_url, outcome, size = future.result()
+                counts[outcome] += 1
+                counts['bytes'] += size
+                if new_url:
+                    batch.append((url, new_url))
+                if len(batch) >= batch_size:
+                    counts['updated'] += self._apply(batch, pending)
+                    batch = []
+                    if progress:
+                        progress(dict(counts))
+        if batch:
+            counts['updated'] += self._apply(batch, pending)
+        if progress:
+            progress(dict(counts))
+        
+        if counts['updated']:
+            from app.services.page_cache_service import page_cache_service
+            page_cache_service.invalidate('home')
+        counts['seconds'] = round(time.monotonic() - started, 2)
+        return counts
+    
+    def _migrate_in_app(self, app, url, folder, target):
+        """Migrate one URL on a pool thread; returns (url, new url or None, outcome, bytes uploaded)."""
+        with app.app_context():
+            try:
+                return self._migrate(url, folder, target)
+            except MigrationSourceMissing:
+                self._record(url, target, {'status': 'missing'})
+                return url, None, 'missing', 0
+            except Exception as e:
+                logger.warning(f'Could not migrate {url} to {target}: {e}')
+                self._record(url, target, {'status': 'failed', 'error': str(e)})
+                return url, None, 'failed', 0
+    
+    def _migrate(self, url, folder, target):
+        """Upload one image unless its bytes are already on the target, and record it in the manifest."""
+        data = self._read(url)
+        asset_id = hashlib.sha256(data).hexdigest()
+        with self._asset_lock(asset_id):
+            asset = mongo.db[MEDIA_COLLECTION].find_one({'_id': asset_id, 'status': 'stored'}, {'url': 1})
+            if asset and asset['url'] and self._on_target(asset['url'], target):
+                new_url, outcome, size = asset['url'], 'deduplicated', 0
+            else:
+                new_url = self._upload(data, asset_id, self._extension(url), folder, target)
+                if not new_url:
+                    raise RuntimeError(f'{target} upload failed')
+                outcome, size = 'uploaded', len(data)
+            
+            now = datetime.utcnow()
+            mongo.db[MEDIA_COLLECTION].update_one(
+                {'_id': asset_id},
+                {
+                    '$set': {'status': 'stored', 'url': new_url, 'service': target},
+                    '$setOnInsert': {'placeholder': url, 'staged_file': None, 'folder': folder, 'filename': None,
+                                     'content_type': EXTENSIONS.get(self._extension(url)), 'size': len(data),
+                                     'targets': [], 'created_at': now, 'stored_at': now},
+                    # Cleanup and lookups still recognise the old URL
+                    '$addToSet': {'aliases': url}
+                },
+                upsert=True
+            )
+        self._record(url, target, {'status': 'done', 'new_url': new_url, 'asset_id': asset_id})
+        return url, new_url, outcome, size
+    
+    def _asset_lock(self, asset_id):
+        """Return the lock for one content hash."""
+        with self._guard:
+            return self._asset_locks.setdefault(asset_id, threading.Lock())
+    
+    @staticmethod
+    def _manifest_id(url, target):
+        """Return the manifest key of a URL migrated to a target."""
+        return f"{target}:{hashlib.sha1(url.encode('utf-8')).hexdigest()}"
+    
+    def _record(self, url, target, fields):
+        """Write a URL's outcome to the manifest."""
+        fields.update(url=url, target=target, updated_at=datetime.utcnow())
+        mongo.db[MIGRATION_COLLECTION].update_one(
+            {'_id': self._manifest_id(url, target)},
+            {'$set': fields, '$inc': {'attempts': 1}},
+            upsert=True
+        )
+    
+    @staticmethod
+    def _local_path(url):
+        """Return the UPLOAD_FOLDER path behind an /uploads/ URL."""
+        return os.path.join(os.path.abspath(current_app.config['UPLOAD_FOLDER']), os.path.basename(url))
+    
+    @staticmethod
+    def _extension(url):
+        """Return the lower-case file extension of a URL, '.jpg' if it has none."""
+        extension = os.path.splitext(url.split('?', 1)[0])[1].lower()
+        return extension if extension in EXTENSIONS else '.jpg'
+    
+    def _read(self, url):
+        """Return the bytes of a local or remote image."""
+        from app.services.image_service import image_derivatives
+        
+        if not url.startswith(('http://', 'https://', '//')):
+            try:
+                with open(self._local_path(url), 'rb') as source:
+                    return source.read()
+            except FileNotFoundError:
+                raise MigrationSourceMissing(url)
+        # Any public host, since re-hosting external links is the point; private addresses are refused
+        return image_derivatives._fetch(f'https:{url}' if url.startswith('//') else url, any_host=True)
+    
+    @staticmethod
+    def _upload(data, asset_id, extension, folder, target):
+        """Upload bytes to the target storage; return the URL or None."""
+        from app.services.cloudinary_service import cloudinary_service
+        from app.services.s3_service import s3_service
+        
+        if target == 'cloudinary':
+            return cloudinary_service.upload_file(io.BytesIO(data), folder=folder)
+        return s3_service.upload_stream(io.BytesIO(data), f'{folder}/{asset_id}{extension}',
+                                        EXTENSIONS.get(extension, 'application/octet-stream'),
+                                        cache_control='public, max-age=31536000, immutable')
+    
+    @staticmethod
+    def _apply(batch, pending):
+        """Repoint documents still showing the migrated URLs; return how many changed."""
+        from app.services.cache_service import cache
+        
+        operations = {}
+        for url, new_url in batch:
+            fields = {(collection, field) for collection, field, _ in pending[url]['refs']}
+            for collection, field in fields:
+                operations.setdefault(collection, []).append(UpdateMany({field: url}, {'$set': {field: new_url}}))
+        
+        modified = 0
+        for collection, updates in operations.items():
+            modified += mongo.db[collection].bulk_write(updates, ordered=False).modified_count
+        for url, _ in batch:
+            for collection, _, doc_id in pending[url]['refs']:
+                cache.invalidate_tag(f'{collection}:{doc_id}')
+        return modified
+
+
+# Global service instance
+media_migration = MediaMigrationService()
@@ -0,0 +1,375 @@
+"""Asynchronous media uploads for covers, avatars and banners.
+
+Routes no longer wait on Cloudinary or S3:
+
+1. ``stage`` writes the upload to UPLOAD_FOLDER under its SHA-256 content
+   hash and returns a placeholder URL served from /uploads/, which the
+   route stores on the document right away.
+2. ``attach`` records the document field showing the placeholder and
+   queues ``media.push``. The worker uploads the file (the job queue
+   retries failures with backoff) and swaps the URL on every attached
+   field that still holds the placeholder, so a newer upload made in the
+   meantime is never overwritten.
+3. Files are deduplicated by hash: staging bytes that were already
+   uploaded returns the stored URL without another upload.
+4. Replaced images are not deleted in the request. ``release`` queues
+   ``media.cleanup``, which deletes an image only once no document refers
+   to it. Run without URLs, the same task sweeps unreferenced assets and
+   staged files nobody attached.
+
+Staged bytes are kept in the ``media_staging`` collection, so the worker
+needs no disk shared with the web process (uploads are capped by
+MAX_CONTENT_LENGTH, well below the document size limit). The web process
+also keeps a copy in UPLOAD_FOLDER to serve the placeholder; /uploads/
+falls back to the staged bytes when another instance staged the file.
+"""
+import hashlib
+import io
+import logging
+import os
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask import current_app
+from pymongo import ReturnDocument
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+MEDIA_COLLECTION = 'media_assets'
+MEDIA_STAGING_COLLECTION = 'media_staging'
+
+# Document fields that hold uploaded images: (collection, field)
+MEDIA_FIELDS = [
+    ('books', 'cover_image_url'),
+    ('users', 'profile_image_url'),
+    ('users', 'banner_image_url')
+]
+
+CHUNK_SIZE = 64 * 1024
+
+StagedMedia = namedtuple('StagedMedia', 'asset_id url pending')
+
+
+class MediaService:
+    """Stages uploads, pushes them to storage in the background and removes orphans."""
+    
+    @staticmethod
+    def _upload_root():
+        """Return the absolute local upload folder, creating it if needed."""
+        root = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+        os.makedirs(root, exist_ok=True)
+        return root
+    
+    def stage(self, file, folder):
+        """
+        Save an uploaded file locally under its content hash.
+        
+        Args:
+            file: FileStorage object from Flask
+            folder: Cloudinary/S3 folder the file is pushed to
+        
+        Returns:
+            StagedMedia: asset_id (content hash), the URL to store now and
+            whether a push is still pending
+        """
+        root = self._upload_root()
+        temp_path = os.path.join(root, f'incoming_{uuid.uuid4().hex}')
+        digest = hashlib.sha256()
+        size = 0
+        with open(temp_path, 'wb') as out:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        asset_id = digest.hexdigest()
+        
+        existing = mongo.db[MEDIA_COLLECTION].find_one({'_id': asset_id, 'status': 'stored'}, {'url': 1})
+        if existing:
+            os.remove(temp_path)
+            logger.info(f'Upload matches stored asset {asset_id}')
+            return StagedMedia(asset_id, existing['url'], False)
+        
+        extension = os.path.splitext(secure_filename(file.filename or ''))[1].lower() or '.jpg'
+        staged_file = f'staged_{asset_id}{extension}'
+        now = datetime.utcnow()
+        with open(temp_path, 'rb') as staged_bytes:
+            mongo.db[MEDIA_STAGING_COLLECTION].update_one(
+                {'_id': asset_id},
+                {'$setOnInsert': {'data': staged_bytes.read(), 'staged_file': staged_file, 'created_at': now}},
+                upsert=True
+            )
+        os.replace(temp_path, os.path.join(root, staged_file))
+        asset = mongo.db[MEDIA_COLLECTION].find_one_and_update(
+            {'_id': asset_id},
+            {'$setOnInsert': {
+                'status': 'staged',
+                'placeholder': f'/uploads/{staged_file}',
+                'staged_file': staged_file,
+                'url': None,
+                'service': None,
+                'folder': folder,
+                'filename': file.filename,
+                'content_type': file.content_type or 'application/octet-stream',
+                'size': size,
+                'targets': [],
+                'created_at': now,
+                'stored_at': None
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if asset['status'] == 'stored':
+            # Pushed by another request between the lookup and the upsert
+            return StagedMedia(asset_id, asset['url'], False)
+        return StagedMedia(asset_id, asset['placeholder'], True)
+    
+    def attach(self, staged, collection, doc_id, field, created_by=None):
+        """
+        Queue the push of a staged file and the URL swap on a document field.
+        
+        Returns:
+            dict: The push job, or None if the file was already stored
+        """
+        from app.services.job_service import job_queue
+        
+        if not staged.pending:
+            return None
+        target = {'collection': collection, 'doc_id': str(doc_id), 'field': field}
+        asset = mongo.db[MEDIA_COLLECTION].find_one_and_update(
+            {'_id': staged.asset_id},
+            {'$addToSet': {'targets': target}},
+            return_document=ReturnDocument.AFTER
+        )
+        if asset and asset['status'] == 'stored':
+            # The push finished before the target was recorded; swap it here
+            self._swap_targets(asset)
+            return None
+        return job_queue.enqueue('media.push', {'asset_id': staged.asset_id}, created_by=created_by,
+                                 unique_key=f'media:{staged.asset_id}')
+    
+    def push(self, asset_id):
+        """
+        Upload a staged file and swap its URL onto the attached documents.
+        
+        Raises:
+            RuntimeError: if the upload failed (the job is retried)
+        """
+        asset = mongo.db[MEDIA_COLLECTION].find_one({'_id': asset_id})
+        if not asset:
+            return {'skipped': 'unknown asset'}
+        
+        if asset['status'] != 'stored':
+            data = self.staged_bytes(asset_id, asset['staged_file'])
+            if data is None:
+                mongo.db[MEDIA_COLLECTION].update_one({'_id': asset_id}, {'$set': {'status': 'missing'}})
+                return {'skipped': 'staged file missing'}
+            url, service = self._store(data, asset)
+            if not url:
+                raise RuntimeError(f'Upload of {asset_id} to {service} failed')
+            # Marked stored before the targets are read, so attach() catches any target added later
+            asset = mongo.db[MEDIA_COLLECTION].find_one_and_update(
+                {'_id': asset_id},
+                {'$set': {'status': 'stored', 'url': url, 'service': service, 'stored_at': datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER
+            )
+            if 'res.cloudinary.com/' not in url:
+                # Cloudinary resizes on delivery; elsewhere render the sized variants now
+                self._render_derivatives(asset_id, data)
+            if url != asset['placeholder']:
+                self._discard_staged(asset)
+        
+        swapped = self._swap_targets(asset)
+        return {'url': asset['url'], 'service': asset['service'], 'swapped': swapped}
+    
+    def staged_bytes(self, asset_id, staged_file):
+        """
+        Return the bytes of a staged upload, or None if they are gone.
+        
+        Reads the ``media_staging`` copy, which every process can see, then
+        the local file (uploads staged before the bytes went to Mongo).
+        """
+        staged = mongo.db[MEDIA_STAGING_COLLECTION].find_one({'_id': asset_id}, {'data': 1})
+        if staged:
+            return staged['data']
+        try:
+            with open(os.path.join(self._upload_root(), staged_file), 'rb') as source:
+                return source.read()
+        except FileNotFoundError:
+            return None
+    
+    def _discard_staged(self, asset):
+        """Delete the staged copies of an asset from Mongo and the local upload folder."""
+        mongo.db[MEDIA_STAGING_COLLECTION].delete_one({'_id': asset['_id']})
+        self._remove_local(asset['staged_file'])
+    
+    @staticmethod
+    def _render_derivatives(asset_id, data):
+        """Render an upload's sized variants; failures leave them to be rendered on first request."""
+        from app.services.image_service import image_derivatives
+        
+        try:
+            image_derivatives.generate(asset_id=asset_id, data=data)
+        except Exception as e:
+            logger.warning(f'Could not render image variants of {asset_id}: {e}')
+    
+    def track(self, url, data):
+        """Record an image stored before uploads were tracked, keyed by its content hash."""
+        now = datetime.utcnow()
+        return mongo.db[MEDIA_COLLECTION].find_one_and_update(
+            {'_id': hashlib.sha256(data).hexdigest()},
+            {
+                '$setOnInsert': {
+                    'status': 'stored',
+                    'placeholder': url,
+                    'staged_file': None,
+                    'url': url,
+                    'service': 'external',
+                    'folder': None,
+                    'filename': None,
+                    'content_type': None,
+                    'size': len(data),
+                    'targets': [],
+                    'created_at': now,
+                    'stored_at': now
+                },
+                # The same bytes may be linked under several URLs
+                '$addToSet': {'aliases': url}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    
+    def _store(self, data, asset):
+        """Upload staged bytes to Cloudinary or S3; return (url or None, service name)."""
+        from app.services.cloudinary_service import cloudinary_service
+        from app.services.s3_service import s3_service
+        
+        if cloudinary_service._ensure_config():
+            return cloudinary_service.upload_file(io.BytesIO(data), folder=asset['folder']), 'cloudinary'
+        if s3_service.is_s3_configured():
+            upload = FileStorage(stream=io.BytesIO(data), filename=asset['staged_file'],
+                                 content_type=asset['content_type'])
+            return s3_service.upload_file(upload, folder=asset['folder']), 's3'
+        # No remote storage configured (development): the staged copy is the final one,
+        # served from UPLOAD_FOLDER or, on another instance, from media_staging
+        logger.warning(f"Keeping {asset['staged_file']} in local storage - images will not persist on Render!")
+        return asset['placeholder'], 'local'
+    
+    def _swap_targets(self, asset):
+        """Point attached fields still showing the placeholder at the stored URL; return how many changed."""
+        from app.services.cache_service import cache
+        from app.services.page_cache_service import page_cache_service
+        
+        swapped = 0
+        for target in asset.get('targets', []):
+            if asset['url'] != asset['placeholder']:
+                result = mongo.db[target['collection']].update_one(
+                    {'_id': ObjectId(target['doc_id']), target['field']: asset['placeholder']},
+                    {'$set': {target['field']: asset['url']}}
+                )
+                if result.modified_count:
+                    swapped += 1
+                    cache.invalidate_tag(f"{target['collection']}:{target['doc_id']}")
+                    if target['collection'] == 'books':
+                        page_cache_service.invalidate('home')
+            mongo.db[MEDIA_COLLECTION].update_one({'_id': asset['_id']}, {'$pull': {'targets': target}})
+        return swapped
+    
+    def release(self, url, created_by=None):
+        """Queue deletion of a replaced image; it is kept while any document still uses it."""
+        from app.services.job_service import job_queue
+        
+        if not url:
+            return None
+        delay = current_app.config.get('MEDIA_CLEANUP_DELAY', 300)
+        return job_queue.enqueue('media.cleanup', {'urls': [url]}, delay=delay, created_by=created_by)
+    
+    @staticmethod
+    def referenced_urls():
+        """Return every image URL stored on a document."""
+        urls = set()
+        for collection, field in MEDIA_FIELDS:
+            urls.update(value for value in mongo.db[collection].distinct(field) if value)
+        return urls
+    
+    def cleanup(self, urls=None):
+        """
+        Delete images no document refers to.
+        
+        Args:
+            urls: Released URLs to check; None sweeps stored assets older than
+                MEDIA_ORPHAN_GRACE_SECONDS and staged files older than
+                MEDIA_STAGING_TTL_HOURS that nothing is waiting on
+        
+        Returns:
+            dict: deleted and kept counts
+        """
+        config = current_app.config
+        referenced = self.referenced_urls()
+        counts = {'deleted': 0, 'kept': 0}
+        
+        if urls is None:
+            now = datetime.utcnow()
+            stored_before = now - timedelta(seconds=config.get('MEDIA_ORPHAN_GRACE_SECONDS', 3600))
+            staged_before = now - timedelta(hours=config.get('MEDIA_STAGING_TTL_HOURS', 24))
+            urls = [asset['url'] for asset in mongo.db[MEDIA_COLLECTION].find(
+                {'status': 'stored', 'stored_at': {'$lt': stored_before}}, {'url': 1})]
+            for asset in mongo.db[MEDIA_COLLECTION].find(
+                    {'status': {'$in': ['staged', 'missing']}, 'targets': [], 'created_at': {'$lt': staged_before}}):
+                if asset['placeholder'] in referenced:
+                    counts['kept'] += 1
+                    continue
+                self._discard_staged(asset)
+                mongo.db[MEDIA_COLLECTION].delete_one({'_id': asset['_id'], 'targets': []})
+                counts['deleted'] += 1
+        
+        for url in urls:
+            asset = mongo.db[MEDIA_COLLECTION].find_one({'$or': [{'url': url}, {'placeholder': url}, {'aliases': url}]})
+            known = {url}
+            if asset:
+                known.update([asset['url'], asset['placeholder']] + asset.get('aliases', []))
+            # Kept while a document shows it, or a push is still waiting to swap it onto one
+            if known & referenced or (asset and asset.get('targets')):
+                counts['kept'] += 1
+                continue
+            for stored in (known - {None}) | set((asset or {}).get('derivatives', {}).values()):
+                self._delete_stored(stored)
+            if asset:
+                if asset.get('staged_file'):
+                    self._discard_staged(asset)
+                mongo.db[MEDIA_COLLECTION].delete_one({'_id': asset['_id']})
+            counts['deleted'] += 1
+        return counts
+    
+    def _delete_stored(self, url):
+        """Delete an image from the storage that serves its URL."""
+        from app.services.cloudinary_service import cloudinary_service
+        from app.services.s3_service import s3_service
+        
+        if 'cloudinary.com' in url:
+            cloudinary_service.delete_file(url)
+        elif 's3.amazonaws.com' in url:
+            s3_service.delete_file(url)
+        elif url.startswith('/uploads/'):
+            filename = os.path.basename(url)
+            if filename.startswith('staged_'):
+                mongo.db[MEDIA_STAGING_COLLECTION].delete_one({'staged_file': filename})
+            self._remove_local(filename)
+    
+    def _remove_local(self, filename):
+        """Delete a file from the local upload folder if it exists."""
+        path = os.path.join(self._upload_root(), filename)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f'Could not remove {path}: {e}')
+
+
+# Global service instance
+media_service = MediaService()
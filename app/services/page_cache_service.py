@@ -0,0 +1,187 @@
+"""Rendered-fragment cache with stale-while-revalidate.
+
+Entries are fresh for a TTL and then stay servable as stale for a grace
+period. When an entry is stale (expired, or invalidated by a write) one
+request claims the refresh and renders it again while every other
+request keeps getting the stale copy, so a refresh never stalls the
+whole audience.
+
+Two stores are available through PAGE_CACHE_BACKEND:
+
+* ``local`` keeps entries in this process (each gunicorn worker has its own).
+* ``mongo`` keeps entries in a shared collection, so one render serves
+  every worker and invalidations reach all of them.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from pymongo import ReturnDocument
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_COLLECTION = 'page_cache'
+
+# A claimed refresh that takes longer than this is assumed to have died
+REFRESH_CLAIM_SECONDS = 30
+
+
+class LocalPageStore:
+    """In-process page cache store."""
+    
+    def __init__(self):
+        """Initialize an empty store."""
+        self.entries = {}  # key -> entry dict
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        """Return the entry for key if it has not fully expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry['stale_until'] <= datetime.utcnow():
+                del self.entries[key]
+                return None
+            return dict(entry) if entry else None
+    
+    def set(self, key, value, tag, fresh_until, stale_until):
+        """Store a freshly rendered value and release any refresh claim."""
+        with self.lock:
+            self.entries[key] = {
+                'value': value,
+                'tag': tag,
+                'fresh_until': fresh_until,
+                'stale_until': stale_until,
+                'refreshing_until': datetime.min
+            }
+    
+    def claim_refresh(self, key):
+        """Return True if the caller should refresh a stale entry."""
+        now = datetime.utcnow()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return True
+            if entry['refreshing_until'] > now:
+                return False
+            entry['refreshing_until'] = now + timedelta(seconds=REFRESH_CLAIM_SECONDS)
+            return True
+    
+    def release(self, key):
+        """Give up a refresh claim after a failed render."""
+        with self.lock:
+            if key in self.entries:
+                self.entries[key]['refreshing_until'] = datetime.min
+    
+    def mark_stale(self, tag):
+        """Make every entry with this tag stale (still servable)."""
+        with self.lock:
+            for entry in self.entries.values():
+                if entry['tag'] == tag:
+                    entry['fresh_until'] = datetime.min
+
+
+class MongoPageStore:
+    """Page cache store shared by all workers through MongoDB."""
+    
+    def get(self, key):
+        """Return the entry for key if it has not fully expired."""
+        entry = mongo.db[PAGE_CACHE_COLLECTION].find_one({'_id': key})
+        if entry and entry['stale_until'] <= datetime.utcnow():
+            return None  # The TTL index removes it shortly
+        return entry
+    
+    def set(self, key, value, tag, fresh_until, stale_until):
+        """Store a freshly rendered value and release any refresh claim."""
+        mongo.db[PAGE_CACHE_COLLECTION].replace_one({'_id': key}, {
+            'value': value,
+            'tag': tag,
+            'fresh_until': fresh_until,
+            'stale_until': stale_until,
+            'refreshing_until': datetime.min
+        }, upsert=True)
+    
+    def claim_refresh(self, key):
+        """Return True if the caller should refresh a stale entry."""
+        now = datetime.utcnow()
+        claimed = mongo.db[PAGE_CACHE_COLLECTION].find_one_and_update(
+            {'_id': key, 'refreshing_until': {'$lte': now}},
+            {'$set': {'refreshing_until': now + timedelta(seconds=REFRESH_CLAIM_SECONDS)}},
+            return_document=ReturnDocument.AFTER
+        )
+        return claimed is not None
+    
+    def release(self, key):
+        """Give up a refresh claim after a failed render."""
+        mongo.db[PAGE_CACHE_COLLECTION].update_one({'_id': key}, {'$set': {'refreshing_until': datetime.min}})
+    
+    def mark_stale(self, tag):
+        """Make every entry with this tag stale (still servable)."""
+        mongo.db[PAGE_CACHE_COLLECTION].update_many({'tag': tag}, {'$set': {'fresh_until': datetime.min}})
+
+
+class PageCacheService:
+    """Caches rendered fragments in the configured store."""
+    
+    def __init__(self):
+        """Initialize page cache service."""
+        self.store = None
+    
+    def _ensure_store(self):
+        """Create the store named by PAGE_CACHE_BACKEND on first use."""
+        if self.store is None:
+            if current_app.config.get('PAGE_CACHE_BACKEND', 'local') == 'mongo':
+                self.store = MongoPageStore()
+            else:
+                self.store = LocalPageStore()
+        return self.store
+    
+    def get_or_render(self, key, render, tag=None, ttl=None):
+        """
+        Return the cached fragment for key, rendering it when needed.
+        
+        Args:
+            key: Cache key, including anything the fragment varies by
+            render: Callable returning the fragment as a string
+            tag: Name used by invalidate() to mark related entries stale
+            ttl: Seconds the fragment stays fresh (default PAGE_CACHE_SECONDS)
+        """
+        if not current_app.config.get('PAGE_CACHE_ENABLED', True):
+            return render()
+        
+        store = self._ensure_store()
+        now = datetime.utcnow()
+        entry = store.get(key)
+        if entry and entry['fresh_until'] > now:
+            return entry['value']
+        
+        # Stale or missing: one caller refreshes, the rest serve the stale copy
+        if entry and not store.claim_refresh(key):
+            return entry['value']
+        
+        try:
+            value = render()
+        except Exception as e:
+            if entry:
+                store.release(key)
+                logger.error(f'Failed to refresh cached fragment {key}, serving stale copy: {e}')
+                return entry['value']
+            raise
+        
+        ttl = current_app.config.get('PAGE_CACHE_SECONDS', 60) if ttl is None else ttl
+        stale_seconds = current_app.config.get('PAGE_CACHE_STALE_SECONDS', 600)
+        store.set(key, value, tag,
+                  fresh_until=now + timedelta(seconds=ttl),
+                  stale_until=now + timedelta(seconds=ttl + stale_seconds))
+        return value
+    
+    def invalidate(self, tag):
+        """Mark every fragment with this tag stale after a write."""
+        try:
+            self._ensure_store().mark_stale(tag)
+        except Exception as e:
+            logger.error(f'Failed to invalidate cached fragments tagged {tag}: {e}')
+
+
+# Global service instance
+page_cache_service = PageCacheService()
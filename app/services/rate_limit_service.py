@@ -0,0 +1,172 @@
+"""Sliding-window rate limiting.
+
+Each key keeps a counter for the current fixed window and the previous
+one. A request is allowed while
+
+    previous_count * (1 - elapsed / window) + current_count < limit
+
+which approximates a true sliding window with two integers per key.
+Denied requests are not counted, so a client that backs off regains
+capacity on schedule.
+
+Backends (RATELIMIT_BACKEND):
+
+* ``mongo`` (default): counters in the ``rate_limits`` collection, shared
+  by all workers and kept across restarts. The allow-and-increment step is
+  one conditional upsert, and a TTL index removes counters once their
+  window has passed.
+* ``memory``: counters in this process, for single-process deployments;
+  with several gunicorn workers each one limits alone.
+"""
+import logging
+import math
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_COLLECTION = 'rate_limits'
+
+RateLimitResult = namedtuple('RateLimitResult', 'allowed limit remaining retry_after')
+
+
+class MemoryRateLimitBackend:
+    """Window counters held in this process."""
+    
+    def __init__(self):
+        """Initialize empty counters."""
+        self.counters = {}  # (key, window index) -> count
+        self.lock = threading.Lock()
+        self.pruned_at = 0
+    
+    def previous(self, key, window_index):
+        """Return the count of a past window."""
+        with self.lock:
+            return self.counters.get((key, window_index), 0)
+    
+    def acquire(self, key, window_index, window, max_count):
+        """Increment the window counter if it is below max_count; return (allowed, count)."""
+        with self.lock:
+            self._prune(window_index)
+            count = self.counters.get((key, window_index), 0)
+            if count >= max_count:
+                return False, count
+            self.counters[(key, window_index)] = count + 1
+            return True, count + 1
+    
+    def _prune(self, window_index):
+        """Drop counters older than the previous window, at most once a second; callers hold the lock."""
+        now = time.monotonic()
+        if now - self.pruned_at < 1:
+            return
+        self.pruned_at = now
+        for counter_key in [counter_key for counter_key in self.counters if counter_key[1] < window_index - 1]:
+            del self.counters[counter_key]
+
+
+class MongoRateLimitBackend:
+    """Window counters in MongoDB, shared by every worker."""
+    
+    @staticmethod
+    def _id(key, window_index):
+        """Return the document id of a window counter."""
+        return f'{key}|{window_index}'
+    
+    def previous(self, key, window_index):
+        """Return the count of a past window."""
+        doc = mongo.db[RATE_LIMIT_COLLECTION].find_one({'_id': self._id(key, window_index)}, {'count': 1})
+        return doc['count'] if doc else 0
+    
+    def acquire(self, key, window_index, window, max_count):
+        """Increment the window counter if it is below max_count; return (allowed, count)."""
+        if max_count <= 0:
+            return False, self.previous(key, window_index)
+        for _ in range(2):
+            try:
+                doc = mongo.db[RATE_LIMIT_COLLECTION].find_one_and_update(
+                    {'_id': self._id(key, window_index), 'count': {'$lt': max_count}},
+                    {
+                        '$inc': {'count': 1},
+                        # Kept through the next window, which reads it as its previous one
+                        '$setOnInsert': {
+                            'key': key,
+                            'expires_at': datetime.utcfromtimestamp((window_index + 2) * window)
+                        }
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                return True, doc['count']
+            except DuplicateKeyError:
+                # Either the counter is at max_count (the filter did not match) or a
+                # concurrent first request created it; one retry tells them apart
+                continue
+        return False, max_count
+
+
+class RateLimiter:
+    """Applies sliding-window limits through the configured backend."""
+    
+    def __init__(self):
+        """Initialize without a backend until init_app runs."""
+        self.backend = None
+    
+    def init_app(self, app):
+        """Create the backend named by RATELIMIT_BACKEND."""
+        if app.config.get('RATELIMIT_BACKEND', 'mongo') == 'memory':
+            self.backend = MemoryRateLimitBackend()
+        else:
+            self.backend = MongoRateLimitBackend()
+        app.extensions['rate_limiter'] = self
+    
+    def hit(self, key, limit, window, now=None):
+        """
+        Count one request against a key if it is within the limit.
+        
+        Args:
+            key: Identifies the client and action, e.g. 'login:203.0.113.7'
+            limit: Requests allowed per window
+            window: Window length in seconds
+            now: Current UNIX time (for tests)
+        
+        Returns:
+            RateLimitResult: allowed, limit, remaining and retry_after (seconds)
+        """
+        if self.backend is None:
+            self.backend = MemoryRateLimitBackend()
+        now = time.time() if now is None else now
+        window_index = int(now // window)
+        elapsed = now - window_index * window
+        weight = 1 - elapsed / window
+        
+        try:
+            previous = self.backend.previous(key, window_index - 1)
+            max_count = math.ceil(limit - previous * weight)
+            allowed, count = self.backend.acquire(key, window_index, window, max_count)
+        except Exception as e:
+            # Never lock users out because the limiter's storage is down
+            logger.error(f'Rate limit check failed for {key}: {e}')
+            return RateLimitResult(True, limit, limit, 0)
+        
+        remaining = max(0, math.floor(limit - previous * weight - count))
+        if allowed:
+            return RateLimitResult(True, limit, remaining, 0)
+        return RateLimitResult(False, limit, 0, self._retry_after(limit, window, previous, count, elapsed))
+    
+    @staticmethod
+    def _retry_after(limit, window, previous, count, elapsed):
+        """Seconds until the weighted count drops enough to admit one more request."""
+        if count + 1 > limit or previous == 0:
+            return max(1, math.ceil(window - elapsed))
+        # previous * (1 - t / window) + count + 1 <= limit  =>  t >= window * (1 - (limit - count - 1) / previous)
+        ready_at = window * (1 - (limit - count - 1) / previous)
+        return max(1, math.ceil(ready_at - elapsed))
+
+
+# Global service instance
+rate_limiter = RateLimiter()
@@ -0,0 +1,221 @@
+"""Precomputed metric rollups for the admin analytics dashboard.
+
+Each tracked event (a registration, a new book, a review, a competition
+submission, an AI evaluation) increments an hourly bucket, a daily bucket
+and an all-time bucket, plus an all-time bucket per dimension value (for
+example submissions per genre). Buckets hold a count and sums of numeric
+values, so averages come out as sum / count.
+
+Model create methods call ``record``; ``rebuild`` recomputes everything
+from the source collections and is exposed as ``flask rollups-rebuild``
+for backfills and scheduled reconciliation. Rollups count events, so a
+deleted document stays counted until the next rebuild.
+"""
+import logging
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = 'metric_rollups'
+
+# metric -> source collection, timestamp field, summed values (name -> dotted field), dimensions
+METRICS = {
+    'registrations': {
+        'collection': 'users',
+        'time_field': 'created_at'
+    },
+    'books_added': {
+        'collection': 'books',
+        'time_field': 'created_at'
+    },
+    'reviews': {
+        'collection': 'reviews',
+        'time_field': 'created_at',
+        'values': {'rating': 'rating'}
+    },
+    'submissions': {
+        'collection': 'competition_submissions',
+        'time_field': 'submission_timestamp',
+        'values': {'word_count': 'word_count'},
+        'dimensions': ['competition_id', 'genre']
+    },
+    'evaluations': {
+        'collection': 'ai_evaluations',
+        'time_field': 'evaluation_timestamp',
+        'values': {
+            'overall_score': 'overall_score',
+            'plot': 'criteria_scores.plot_structure',
+            'character': 'criteria_scores.character_development',
+            'writing': 'criteria_scores.writing_quality',
+            'originality': 'criteria_scores.originality'
+        },
+        'dimensions': ['competition_id']
+    }
+}
+
+
+def _field(doc, path):
+    """Read a dotted field from a document."""
+    for part in path.split('.'):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc
+
+
+def bucket_start(moment, granularity):
+    """Truncate a timestamp to the start of its hour or day."""
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def bucket_id(metric, granularity, bucket=None, dimension=None, key=None):
+    """Return the _id of a rollup bucket."""
+    if granularity == 'total':
+        return f'{metric}|total|{dimension}={key}' if dimension else f'{metric}|total'
+    return f"{metric}|{granularity}|{bucket.strftime('%Y-%m-%dT%H')}"
+
+
+class RollupService:
+    """Maintains and reads metric rollup buckets."""
+    
+    def _event(self, metric, doc):
+        """Return (timestamp, sums, dimension values) describing one source document."""
+        spec = METRICS[metric]
+        moment = doc.get(spec['time_field'])
+        if not isinstance(moment, datetime):
+            moment = datetime.utcnow()
+        sums = {}
+        for name, path in spec.get('values', {}).items():
+            value = _field(doc, path)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                sums[name] = value
+        dimensions = {name: doc.get(name) for name in spec.get('dimensions', []) if doc.get(name) is not None}
+        return moment, sums, dimensions
+    
+    @staticmethod
+    def _buckets(metric, moment, dimensions):
+        """Yield (bucket _id, fields identifying the bucket) touched by one event."""
+        for granularity in ('hour', 'day'):
+            start = bucket_start(moment, granularity)
+            yield bucket_id(metric, granularity, start), {
+                'metric': metric, 'granularity': granularity, 'bucket': start
+            }
+        yield bucket_id(metric, 'total'), {'metric': metric, 'granularity': 'total'}
+        for dimension, key in dimensions.items():
+            yield bucket_id(metric, 'total', dimension=dimension, key=key), {
+                'metric': metric, 'granularity': 'total', 'dimension': dimension, 'key': key
+            }
+    
+    def record(self, metric, doc):
+        """Add one source document to its metric's buckets."""
+        try:
+            moment, sums, dimensions = self._event(metric, doc)
+            increments = {'count': 1}
+            increments.update({f'sums.{name}': value for name, value in sums.items()})
+            operations = [
+                UpdateOne({'_id': _id}, {'$inc': increments, '$setOnInsert': fields}, upsert=True)
+                for _id, fields in self._buckets(metric, moment, dimensions)
+            ]
+            mongo.db[ROLLUP_COLLECTION].bulk_write(operations, ordered=False)
+        except Exception as e:
+            # Rollups are derived data; never fail the write that triggered them
+            logger.error(f'Failed to record {metric} rollup: {e}')
+    
+    def rebuild(self, metric=None, batch_size=1000):
+        """
+        Recompute rollups from the source collections.
+        
+        Returns:
+            dict: metric -> number of source documents counted
+        """
+        counted = {}
+        for name in ([metric] if metric else METRICS):
+            spec = METRICS[name]
+            projection = [spec['time_field']] + list(spec.get('values', {}).values()) + spec.get('dimensions', [])
+            buckets = {}
+            total = 0
+            for doc in mongo.db[spec['collection']].find({}, {field: 1 for field in projection}):
+                moment, sums, dimensions = self._event(name, doc)
+                for _id, fields in self._buckets(name, moment, dimensions):
+                    bucket = buckets.setdefault(_id, dict(fields, _id=_id, count=0, sums={}))
+                    bucket['count'] += 1
+                    for value_name, value in sums.items():
+                        bucket['sums'][value_name] = bucket['sums'].get(value_name, 0) + value
+                total += 1
+            
+            mongo.db[ROLLUP_COLLECTION].delete_many({'metric': name})
+            docs = list(buckets.values())
+            for start in range(0, len(docs), batch_size):
+                mongo.db[ROLLUP_COLLECTION].insert_many(docs[start:start + batch_size], ordered=False)
+            counted[name] = total
+        return counted
+    
+    def series(self, metric, since, granularity='day'):
+        """
+        Return bucket counts from since onwards, oldest first.
+        
+        Returns:
+            list: dicts with '_id' (YYYY-MM-DD, or YYYY-MM-DD HH:00 for hours) and 'count'
+        """
+        label = '%Y-%m-%d' if granularity == 'day' else '%Y-%m-%d %H:00'
+        cursor = mongo.db[ROLLUP_COLLECTION].find({
+            'metric': metric,
+            'granularity': granularity,
+            'bucket': {'$gte': bucket_start(since, granularity)}
+        }).sort('bucket', 1)
+        return [{'_id': doc['bucket'].strftime(label), 'count': doc['count']} for doc in cursor]
+    
+    def count_between(self, metric, start, end=None):
+        """Count events in [start, end), to hour precision; whole days read daily buckets."""
+        end = end or datetime.utcnow()
+        first_day = bucket_start(start, 'day')
+        if first_day < start:
+            first_day += timedelta(days=1)
+        last_day = bucket_start(end, 'day')
+        
+        if first_day >= last_day:
+            ranges = [('hour', bucket_start(start, 'hour'), end)]
+        else:
+            ranges = [
+                ('hour', bucket_start(start, 'hour'), first_day),
+                ('day', first_day, last_day),
+                ('hour', last_day, end)
+            ]
+        clauses = [{'granularity': granularity, 'bucket': {'$gte': low, '$lt': high}}
+                   for granularity, low, high in ranges if low < high]
+        if not clauses:
+            return 0
+        docs = mongo.db[ROLLUP_COLLECTION].find({'metric': metric, '$or': clauses}, {'count': 1})
+        return sum(doc['count'] for doc in docs)
+    
+    def totals(self, metric):
+        """Return the all-time count and sums of a metric."""
+        doc = mongo.db[ROLLUP_COLLECTION].find_one({'_id': bucket_id(metric, 'total')})
+        return {'count': doc['count'], 'sums': doc.get('sums', {})} if doc else {'count': 0, 'sums': {}}
+    
+    def breakdown(self, metric, dimension, limit=0):
+        """
+        Return all-time counts per dimension value, largest first.
+        
+        Returns:
+            list: dicts with '_id' (the dimension value), 'count' and 'avg_<value>' averages
+        """
+        cursor = mongo.db[ROLLUP_COLLECTION].find({
+            'metric': metric,
+            'granularity': 'total',
+            'dimension': dimension
+        }).sort('count', -1).limit(limit)
+        
+        results = []
+        for doc in cursor:
+            item = {'_id': doc['key'], 'count': doc['count']}
+            for name, value in doc.get('sums', {}).items():
+                item[f'avg_{name}'] = value / doc['count'] if doc['count'] else 0
+            results.append(item)
+        return results
+
+
+# Global service instance
+rollup_service = RollupService()
@@ -1,7 +1,19 @@
-"""AWS S3 service for file uploads."""
+"""AWS S3 service for file uploads.
+
+One client per process is shared by every thread (boto3 clients are
+thread-safe) with a connection pool sized by S3_MAX_POOL_CONNECTIONS.
+Uploads stream from file objects through a managed transfer: files above
+S3_MULTIPART_THRESHOLD_MB go up as parallel multipart chunks, so a large
+manuscript is never read into memory whole. Presigned POSTs and URLs let
+browsers upload to and download from the bucket without the bytes
+passing through a Flask worker.
+"""
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import logging
+import threading
 import uuid
 import os
 from werkzeug.utils import secure_filename
@@ -9,6 +21,8 @@ from flask import current_app
 
 logger = logging.getLogger(__name__)
 
+MB = 1024 * 1024
+
 
 class S3Service:
     """Service for handling S3 file operations."""
@@ -18,32 +32,65 @@ class S3Service:
         self.s3_client = None
         self.bucket_name = None
         self.region = None
+        self.transfer_config = None
+        self._lock = threading.Lock()
     
     def _ensure_client(self):
         """Ensure S3 client is initialized."""
         if self.s3_client is None:
-            access_key = current_app.config.get('AWS_ACCESS_KEY_ID')
-            secret_key = current_app.config.get('AWS_SECRET_ACCESS_KEY')
-            self.bucket_name = current_app.config.get('AWS_S3_BUCKET_NAME')
-            self.region = current_app.config.get('AWS_REGION', 'us-east-1')
-            
-            if not access_key or not secret_key or not self.bucket_name:
-                logger.warning("AWS credentials not configured, falling back to local storage")
-                return False
-            
-            try:
-                self.s3_client = boto3.client(
-                    's3',
-                    aws_access_key_id=access_key,
-                    aws_secret_access_key=secret_key,
-                    region_name=self.region
-                )
-                return True
-            except Exception as e:
-                logger.error(f"Failed to initialize S3 client: {e}")
-                return False
+            with self._lock:
+                if self.s3_client is None:
+                    return self._create_client()
         return True
     
+    def _create_client(self):
+        """Build the shared client and transfer settings from the app config."""
+        config = current_app.config
+        access_key = config.get('AWS_ACCESS_KEY_ID')
+        secret_key = config.get('AWS_SECRET_ACCESS_KEY')
+        self.bucket_name = config.get('AWS_S3_BUCKET_NAME')
+        self.region = config.get('AWS_REGION', 'us-east-1')
+        
+        if not access_key or not secret_key or not self.bucket_name:
+            logger.warning("AWS credentials not configured, falling back to local storage")
+            return False
+        
+        concurrency = config.get('S3_TRANSFER_CONCURRENCY', 8)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=config.get('S3_MULTIPART_THRESHOLD_MB', 8) * MB,
+            multipart_chunksize=config.get('S3_MULTIPART_CHUNKSIZE_MB', 8) * MB,
+            max_concurrency=concurrency,
+            use_threads=concurrency > 1
+        )
+        try:
+            self.s3_client = boto3.client(
+                's3',
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                region_name=self.region,
+                config=Config(
+                    # Every part of a multipart upload holds a connection
+                    max_pool_connections=max(config.get('S3_MAX_POOL_CONNECTIONS', 20), concurrency),
+                    retries={'max_attempts': 5, 'mode': 'adaptive'},
+                    signature_version='s3v4'
+                )
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to initialize S3 client: {e}")
+            return False
+    
+    def object_url(self, key):
+        """Return the public URL of a key in the bucket."""
+        return f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{key}"
+    
+    def key_from_url(self, url):
+        """Return the key of a bucket URL, or None for URLs outside the bucket."""
+        prefix = f"{self.bucket_name}.s3.{self.region}.amazonaws.com/"
+        if not self.bucket_name or prefix not in url:
+            return None
+        return url.split(prefix, 1)[1]
+    
     def upload_file(self, file, folder='uploads'):
         """
         Upload a file to S3.
@@ -55,38 +102,154 @@ class S3Service:
         Returns:
             str: Public URL of uploaded file, or None if upload failed
         """
+        # Generate secure filename
+        original_filename = secure_filename(file.filename)
+        file_extension = os.path.splitext(original_filename)[1]
+        unique_filename = f"{uuid.uuid4().hex}{file_extension}"
+        s3_key = f"{folder}/{unique_filename}"
+        
+        url = self.upload_stream(file.stream, s3_key, file.content_type or 'application/octet-stream')
+        if url:
+            logger.info(f"Successfully uploaded file to S3: {url}")
+        return url
+    
+    def upload_stream(self, stream, key, content_type, public=True, cache_control=None):
+        """
+        Stream a file object to S3, in parallel multipart chunks when it is large.
+        
+        Args:
+            stream: Readable binary file object; read in chunks, never whole
+            key: S3 key to store it under
+            content_type: MIME type served with the object
+            public: Make the object publicly readable (manuscripts are not)
+            cache_control: Optional Cache-Control header
+        
+        Returns:
+            str: URL of the object, or None if the upload failed
+        """
         if not self._ensure_client():
             return None
         
+        extra_args = {'ContentType': content_type}
+        if public:
+            extra_args['ACL'] = 'public-read'
+        if cache_control:
+            extra_args['CacheControl'] = cache_control
         try:
-            # Generate secure filename
-            original_filename = secure_filename(file.filename)
-            file_extension = os.path.splitext(original_filename)[1]
-            unique_filename = f"{uuid.uuid4().hex}{file_extension}"
-            s3_key = f"{folder}/{unique_filename}"
-            
-            # Upload file to S3
-            self.s3_client.upload_fileobj(
-                file,
-                self.bucket_name,
-                s3_key,
-                ExtraArgs={
-                    'ACL': 'public-read',
-                    'ContentType': file.content_type or 'application/octet-stream'
-                }
-            )
-            
-            # Generate public URL
-            url = f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{s3_key}"
-            logger.info(f"Successfully uploaded file to S3: {url}")
-            return url
-            
+            self.s3_client.upload_fileobj(stream, self.bucket_name, key, ExtraArgs=extra_args,
+                                          Config=self.transfer_config)
+            return self.object_url(key)
         except ClientError as e:
-            logger.error(f"Failed to upload file to S3: {e}")
+            logger.error(f"Failed to upload {key} to S3: {e}")
             return None
         except Exception as e:
-            logger.error(f"Unexpected error uploading to S3: {e}")
+            logger.error(f"Unexpected error uploading {key} to S3: {e}")
+            return None
+    
+    def put_object(self, key, body, content_type):
+        """
+        Store bytes under a fixed key, replacing any object there.
+        
+        Args:
+            key: S3 key, e.g. 'derivatives/<hash>-card.webp'
+            body: File contents
+            content_type: MIME type served with the object
+        
+        Returns:
+            str: Public URL of the object, or None if the upload failed
+        """
+        if not self._ensure_client():
+            return None
+        
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=key,
+                Body=body,
+                ACL='public-read',
+                ContentType=content_type,
+                # Keys are content hashes, so an object never changes
+                CacheControl='public, max-age=31536000, immutable'
+            )
+            return self.object_url(key)
+        except ClientError as e:
+            logger.error(f"Failed to store {key} in S3: {e}")
+            return None
+    
+    def presigned_post(self, key, content_type, max_bytes, public=True, expires=None):
+        """
+        Sign a browser form upload straight to the bucket.
+        
+        Args:
+            key: S3 key the browser must upload to
+            content_type: The only Content-Type accepted
+            max_bytes: Largest accepted file
+            public: Make the object publicly readable
+            expires: Seconds the signature is valid (defaults to S3_PRESIGNED_EXPIRES)
+        
+        Returns:
+            dict: {'url': form action, 'fields': hidden form fields}, or None
+        """
+        if not self._ensure_client():
+            return None
+        
+        fields = {'Content-Type': content_type}
+        conditions = [{'Content-Type': content_type}, ['content-length-range', 1, max_bytes]]
+        if public:
+            fields['acl'] = 'public-read'
+            conditions.append({'acl': 'public-read'})
+        try:
+            return self.s3_client.generate_presigned_post(
+                self.bucket_name, key, Fields=fields, Conditions=conditions,
+                ExpiresIn=expires or current_app.config.get('S3_PRESIGNED_EXPIRES', 900)
+            )
+        except ClientError as e:
+            logger.error(f"Failed to sign an upload of {key}: {e}")
+            return None
+    
+    def presigned_url(self, key, method='get_object', expires=None, **params):
+        """
+        Sign a URL for one request on a key, e.g. downloading a private manuscript.
+        
+        Args:
+            key: S3 key
+            method: Client method to sign ('get_object' or 'put_object')
+            expires: Seconds the URL is valid (defaults to S3_PRESIGNED_EXPIRES)
+            **params: Extra request parameters, e.g. ContentType for put_object
+        
+        Returns:
+            str: The signed URL, or None
+        """
+        if not self._ensure_client():
+            return None
+        
+        try:
+            return self.s3_client.generate_presigned_url(
+                method, Params={'Bucket': self.bucket_name, 'Key': key, **params},
+                ExpiresIn=expires or current_app.config.get('S3_PRESIGNED_EXPIRES', 900)
+            )
+        except ClientError as e:
+            logger.error(f"Failed to sign {method} for {key}: {e}")
+            return None
+    
+    def head_object(self, key):
+        """
+        Return an object's metadata.
+        
+        Returns:
+            dict: size, content_type and etag, or None if the object does not exist
+        """
+        if not self._ensure_client():
             return None
+        
+        try:
+            head = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+                logger.error(f"Failed to read metadata of {key}: {e}")
+            return None
+        return {'size': head['ContentLength'], 'content_type': head.get('ContentType'),
+                'etag': head.get('ETag', '').strip('"')}
     
     def delete_file(self, url):
         """
@@ -104,13 +267,11 @@ class S3Service:
         try:
             # Extract S3 key from URL
             # URL format: https://bucket-name.s3.region.amazonaws.com/key
-            if self.bucket_name not in url:
+            key = self.key_from_url(url)
+            if not key:
                 logger.warning(f"URL does not match bucket name: {url}")
                 return False
             
-            # Extract the key (path after bucket URL)
-            key = url.split(f"{self.bucket_name}.s3.{self.region}.amazonaws.com/")[1]
-            
             self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
             logger.info(f"Successfully deleted file from S3: {key}")
             return True
@@ -0,0 +1,355 @@
+"""Full-text search backends for books and users.
+
+Models describe what is searchable with two class attributes:
+``search_weights`` (field -> relevance weight) and ``default_sort``.
+Two interchangeable backends implement ranking, prefix matching and
+safe handling of user input:
+
+* ``MongoTextSearchBackend`` uses the weighted MongoDB text index that the
+  model declares, plus an indexed ``search_keywords`` array for prefixes.
+* ``LocalSearchBackend`` keeps an in-process inverted index, for tests and
+  small single-worker deployments.
+
+Both backends require every query term to match. Until the text index
+exists and ``search_keywords`` are backfilled (``flask db-indexes`` and
+``flask search-reindex``), the mongo backend falls back to the local one.
+
+Queries are tokenized before they reach either backend, so input such as
+``a.*`` or ``"-x`` is only ever treated as plain words.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from flask import current_app
+from app import mongo
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens."""
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def split_query(query, prefix=False):
+    """
+    Split a user query into complete terms and an optional prefix term.
+
+    In prefix mode the last word is still being typed, unless the query
+    ends with whitespace.
+    """
+    terms = tokenize(query)
+    if prefix and terms and not query[-1:].isspace():
+        return terms[:-1], terms[-1]
+    return terms, None
+
+
+def document_keywords(model, doc):
+    """Return the sorted unique tokens of a document's searchable fields."""
+    keywords = set()
+    for field in model.search_weights:
+        keywords.update(tokenize(doc.get(field)))
+    return sorted(keywords)
+
+
+class InvertedIndex:
+    """In-memory weighted inverted index with prefix lookups."""
+
+    def __init__(self, weights):
+        """Initialize an empty index for the given field weights."""
+        self.weights = weights
+        self.postings = {}  # token -> {doc_id: weight}
+        self.doc_tokens = {}  # doc_id -> set of tokens
+        self.sorted_tokens = []
+
+    def add(self, doc_id, doc):
+        """Index (or re-index) a document."""
+        self.remove(doc_id)
+        scores = {}
+        for field, weight in self.weights.items():
+            for token in set(tokenize(doc.get(field))):
+                scores[token] = scores.get(token, 0) + weight
+
+        for token, score in scores.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                bisect.insort(self.sorted_tokens, token)
+            self.postings[token][doc_id] = score
+        self.doc_tokens[doc_id] = set(scores)
+
+    def remove(self, doc_id):
+        """Remove a document from the index."""
+        for token in self.doc_tokens.pop(doc_id, ()):
+            postings = self.postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[token]
+                position = bisect.bisect_left(self.sorted_tokens, token)
+                if position < len(self.sorted_tokens) and self.sorted_tokens[position] == token:
+                    del self.sorted_tokens[position]
+
+    def tokens_with_prefix(self, prefix):
+        """Return indexed tokens starting with prefix."""
+        start = bisect.bisect_left(self.sorted_tokens, prefix)
+        end = bisect.bisect_left(self.sorted_tokens, prefix + '\uffff')
+        return self.sorted_tokens[start:end]
+
+    def search(self, terms, prefix_term=None):
+        """
+        Score documents matching every term.
+
+        Returns:
+            list: (doc_id, score) pairs, best match first
+        """
+        matches = []
+        for term in terms:
+            matches.append(dict(self.postings.get(term, {})))
+        if prefix_term:
+            merged = {}
+            for token in self.tokens_with_prefix(prefix_term):
+                for doc_id, score in self.postings[token].items():
+                    # Exact word matches outrank completions
+                    weighted = score if token == prefix_term else score * 0.5
+                    merged[doc_id] = max(merged.get(doc_id, 0), weighted)
+            matches.append(merged)
+        if not matches:
+            return []
+
+        matches.sort(key=len)
+        scores = dict(matches[0])
+        for other in matches[1:]:
+            scores = {doc_id: score + other[doc_id] for doc_id, score in scores.items() if doc_id in other}
+            if not scores:
+                return []
+        return sorted(scores.items(), key=lambda item: (-item[1], str(item[0])))
+
+
+class MongoTextSearchBackend:
+    """Search through the model's weighted MongoDB text index."""
+
+    def _query(self, model, query, filters, prefix):
+        """Build the MongoDB filter; returns (filter, uses_text)."""
+        terms, prefix_term = split_query(query, prefix)
+        mongo_filter = dict(filters or {})
+        if terms:
+            # Tokens are plain words, so nothing in them is a $text operator.
+            # Quoting each one makes $text require all of them, like the local index.
+            mongo_filter['$text'] = {'$search': ' '.join(f'"{term}"' for term in terms)}
+        if prefix_term:
+            mongo_filter['search_keywords'] = {'$regex': f'^{re.escape(prefix_term)}'}
+        return mongo_filter, bool(terms)
+
+    def search(self, model, query, filters=None, skip=0, limit=20, sort=None, prefix=False):
+        """Return a page of documents ranked by text score unless sort is given."""
+        mongo_filter, uses_text = self._query(model, query, filters, prefix)
+        if uses_text:
+            cursor = mongo.db[model.collection].find(
+                mongo_filter, {'search_score': {'$meta': 'textScore'}}
+            )
+            cursor = cursor.sort(sort or [('search_score', {'$meta': 'textScore'})])
+        else:
+            cursor = mongo.db[model.collection].find(mongo_filter).sort(sort or model.default_sort)
+        return list(cursor.skip(skip).limit(limit))
+
+    def count(self, model, query, filters=None, prefix=False):
+        """Count documents matching the query."""
+        mongo_filter, _ = self._query(model, query, filters, prefix)
+        return mongo.db[model.collection].count_documents(mongo_filter)
+
+    def ready(self, model):
+        """Return whether the collection has its text index and backfilled search_keywords."""
+        collection = mongo.db[model.collection]
+        has_text_index = any(
+            'text' in [direction for _, direction in spec['key']]
+            for spec in collection.index_information().values()
+        )
+        if not has_text_index:
+            return False
+        return collection.find_one({'search_keywords': {'$exists': False}}, {'_id': 1}) is None
+
+    def index_document(self, model, doc):
+        """Nothing to do; models store search_keywords and MongoDB maintains the text index."""
+
+    def remove_document(self, model, doc_id):
+        """Nothing to do; the document is already gone from the collection."""
+
+
+class LocalSearchBackend:
+    """Search through per-process inverted indexes built from MongoDB."""
+
+    def __init__(self, refresh_seconds=300):
+        """Initialize without loading anything until the first search."""
+        self.refresh_seconds = refresh_seconds
+        self.indexes = {}  # collection -> (InvertedIndex, built_at)
+        self.lock = threading.RLock()
+
+    def _index(self, model):
+        """Return the collection's index, rebuilding it when stale."""
+        with self.lock:
+            entry = self.indexes.get(model.collection)
+            if entry and time.monotonic() - entry[1] < self.refresh_seconds:
+                return entry[0]
+
+            index = InvertedIndex(model.search_weights)
+            projection = {field: 1 for field in model.search_weights}
+            for doc in mongo.db[model.collection].find({}, projection):
+                index.add(doc['_id'], doc)
+            self.indexes[model.collection] = (index, time.monotonic())
+            return index
+
+    def _ranked_ids(self, model, query, filters, prefix):
+        """Return matching IDs that also pass the MongoDB filters, best first."""
+        terms, prefix_term = split_query(query, prefix)
+        with self.lock:
+            ranked = self._index(model).search(terms, prefix_term)
+        if not ranked:
+            return []
+
+        candidate_ids = [doc_id for doc_id, _ in ranked]
+        allowed = set()
+        for start in range(0, len(candidate_ids), 1000):
+            batch = candidate_ids[start:start + 1000]
+            mongo_filter = dict(filters or {}, _id={'$in': batch})
+            allowed.update(doc['_id'] for doc in mongo.db[model.collection].find(mongo_filter, {'_id': 1}))
+        return [doc_id for doc_id in candidate_ids if doc_id in allowed]
+
+    def search(self, model, query, filters=None, skip=0, limit=20, sort=None, prefix=False):
+        """Return a page of documents ranked by relevance unless sort is given."""
+        ranked_ids = self._ranked_ids(model, query, filters, prefix)
+        if not ranked_ids:
+            return []
+
+        if sort:
+            cursor = mongo.db[model.collection].find({'_id': {'$in': ranked_ids}}).sort(sort)
+            return list(cursor.skip(skip).limit(limit))
+
+        page_ids = ranked_ids[skip:skip + limit]
+        docs = {doc['_id']: doc for doc in mongo.db[model.collection].find({'_id': {'$in': page_ids}})}
+        return [docs[doc_id] for doc_id in page_ids if doc_id in docs]
+
+    def count(self, model, query, filters=None, prefix=False):
+        """Count documents matching the query."""
+        return len(self._ranked_ids(model, query, filters, prefix))
+
+    def index_document(self, model, doc):
+        """Add or refresh a document in this process's index, if loaded."""
+        with self.lock:
+            entry = self.indexes.get(model.collection)
+            if entry:
+                entry[0].add(doc['_id'], doc)
+
+    def remove_document(self, model, doc_id):
+        """Remove a document from this process's index, if loaded."""
+        with self.lock:
+            entry = self.indexes.get(model.collection)
+            if entry:
+                entry[0].remove(doc_id)
+
+
+class SearchService:
+    """Facade that picks the configured search backend."""
+
+    def __init__(self):
+        """Initialize search service."""
+        self.backend = None
+        self.fallback = None
+        self.ready = {}  # collection -> True, or monotonic time of the last failed check
+
+    def _ensure_backend(self):
+        """Create the backend named by SEARCH_BACKEND on first use."""
+        if self.backend is None:
+            name = current_app.config.get('SEARCH_BACKEND', 'mongo')
+            if name == 'local':
+                self.backend = self._local_backend()
+            else:
+                self.backend = MongoTextSearchBackend()
+        return self.backend
+
+    @staticmethod
+    def _local_backend():
+        """Create a local backend with the configured refresh interval."""
+        return LocalSearchBackend(refresh_seconds=current_app.config.get('SEARCH_LOCAL_REFRESH_SECONDS', 300))
+
+    def _backend_for(self, model):
+        """Return the backend for a model, the local one while its text index is not ready."""
+        backend = self._ensure_backend()
+        if not isinstance(backend, MongoTextSearchBackend):
+            return backend
+
+        state = self.ready.get(model.collection)
+        if state is True:
+            return backend
+        refresh = current_app.config.get('SEARCH_LOCAL_REFRESH_SECONDS', 300)
+        if state is None or time.monotonic() - state >= refresh:
+            if backend.ready(model):
+                self.ready[model.collection] = True
+                return backend
+            if state is None:
+                logger.warning(f"No text index or search_keywords on {model.collection}; searching an "
+                               f"in-process index until 'flask db-indexes' and 'flask search-reindex' run")
+            self.ready[model.collection] = time.monotonic()
+        if self.fallback is None:
+            self.fallback = self._local_backend()
+        return self.fallback
+
+    def search(self, model, query, filters=None, skip=0, limit=20, sort=None, prefix=False):
+        """Search a model's collection."""
+        return self._backend_for(model).search(model, query, filters, skip=skip, limit=limit,
+                                               sort=sort, prefix=prefix)
+
+    def count(self, model, query, filters=None, prefix=False):
+        """Count search matches in a model's collection."""
+        return self._backend_for(model).count(model, query, filters, prefix=prefix)
+
+    def _backends(self):
+        """Return every backend holding an index that writes must keep current."""
+        return [backend for backend in (self._ensure_backend(), self.fallback) if backend is not None]
+
+    def index_document(self, model, doc):
+        """Keep the search index current after a create or update."""
+        try:
+            for backend in self._backends():
+                backend.index_document(model, doc)
+        except Exception as e:
+            logger.error(f"Failed to index {model.collection} document {doc.get('_id')}: {e}")
+
+    def remove_document(self, model, doc_id):
+        """Keep the search index current after a delete."""
+        try:
+            for backend in self._backends():
+                backend.remove_document(model, doc_id)
+        except Exception as e:
+            logger.error(f"Failed to remove {model.collection} document {doc_id} from search: {e}")
+
+    def reindex(self, model, batch_size=500):
+        """Rewrite search_keywords for every document of a model; returns the count."""
+        from pymongo import UpdateOne
+
+        projection = {field: 1 for field in model.search_weights}
+        operations = []
+        total = 0
+        for doc in mongo.db[model.collection].find({}, projection):
+            operations.append(UpdateOne(
+                {'_id': doc['_id']},
+                {'$set': {'search_keywords': document_keywords(model, doc)}}
+            ))
+            if len(operations) >= batch_size:
+                mongo.db[model.collection].bulk_write(operations, ordered=False)
+                total += len(operations)
+                operations = []
+        if operations:
+            mongo.db[model.collection].bulk_write(operations, ordered=False)
+            total += len(operations)
+        return total
+
+
+# Global service instance
+search_service = SearchService()
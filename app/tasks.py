@@ -0,0 +1,218 @@
+"""Background job handlers run by ``flask worker``.
+
+Handlers may run more than once (a retry, or a worker that died holding
+the lease), so each one skips work that an earlier attempt finished.
+"""
+import csv
+import io
+from datetime import datetime
+from flask import current_app
+from app import mongo, bcrypt
+from app.services.cache_service import cache
+from app.services.job_service import job_queue, PRIORITY_HIGH, PRIORITY_LOW
+
+# Rows whose errors are kept on the job result
+MAX_REPORTED_ERRORS = 50
+
+WINNER_BADGES = {
+    1: {'name': 'Gold Winner 🥇', 'icon': '🏆', 'type': 'competition_winner'},
+    2: {'name': 'Silver Winner 🥈', 'icon': '🥈', 'type': 'competition_winner'},
+    3: {'name': 'Bronze Winner 🥉', 'icon': '🥉', 'type': 'competition_winner'}
+}
+
+
+@job_queue.task('competitions.evaluate', max_attempts=3, backoff=60, priority=PRIORITY_HIGH)
+def evaluate_competition(job, competition_id, run_id=None):
+    """
+    Evaluate a competition's submissions; reruns skip finished evaluations.
+    
+    The payload's run_id is not trusted: a restart reuses a still-queued job
+    for its new run, so the run the evaluation job holds now is the one run.
+    """
+    from app.services.evaluation_service import evaluation_engine
+    
+    evaluation_engine.run_current(current_app._get_current_object(), competition_id,
+                                  final_attempt=job.attempt >= job.job['max_attempts'])
+
+
+@job_queue.task('competitions.announce_winners', max_attempts=3, priority=PRIORITY_HIGH)
+def announce_winners(job, competition_id, winner_ids):
+    """Record winners, award badges and close the competition."""
+    from app.models import Competition, CompetitionSubmission, CompetitionWinner, AIEvaluation, User
+    
+    competition = Competition.find_by_id(competition_id)
+    if not competition:
+        raise ValueError('Competition not found')
+    
+    prize_keys = ['first_place', 'second_place', 'third_place']
+    announced = 0
+    for idx, submission_id in enumerate(winner_ids[:3]):  # Top 3 winners
+        submission = CompetitionSubmission.find_by_id(submission_id)
+        evaluation = AIEvaluation.find_by_submission(submission_id)
+        
+        if not submission or not evaluation or submission['submission_status'] == 'winner':
+            continue
+        
+        rank = idx + 1
+        CompetitionWinner.create(
+            competition_id=competition_id,
+            submission_id=submission_id,
+            author_id=str(submission['author_id']),
+            rank_position=rank,
+            final_score=evaluation['overall_score'],
+            prize_awarded=competition['prize_structure'].get(prize_keys[idx], 'Recognition'),
+            winner_feedback=evaluation['detailed_feedback']
+        )
+        
+        badge_info = WINNER_BADGES.get(rank)
+        badge = None
+        if badge_info:
+            badge = {
+                'badge_type': badge_info['type'],
+                'badge_name': f"{badge_info['name']} - {competition['title']}",
+                'badge_icon': badge_info['icon'],
+                'competition_id': competition_id
+            }
+        User.record_competition_win(str(submission['author_id']), submission_id, rank, badge)
+        
+        # Marked last; the writes above are keyed by submission, so a retry after a crash skips what already happened
+        CompetitionSubmission.update_status(submission_id, 'winner')
+        announced += 1
+        job.progress(announced=announced)
+    
+    # Update all non-winner submissions to participant status
+    for sub in CompetitionSubmission.find_by_competition(competition_id):
+        if str(sub['_id']) not in winner_ids and sub['submission_status'] != 'winner':
+            CompetitionSubmission.update_status(str(sub['_id']), 'participant')
+    
+    Competition.update_status(competition_id, 'completed')
+    return {'announced': announced}
+
+
+@job_queue.task('users.bulk_import', max_attempts=2, priority=PRIORITY_HIGH)
+def bulk_import_users(job, csv_text):
+    """Create users from CSV rows; existing usernames and emails are reported, not overwritten."""
+    from app.models import User
+    from app.services.counts_service import counts_service
+    from app.services.rollup_service import rollup_service
+    
+    rows = list(csv.DictReader(io.StringIO(csv_text, newline=None)))
+    job.progress(total=len(rows), imported=0, failed=0)
+    
+    success_count = 0
+    errors = []
+    for row_num, row in enumerate(rows, start=2):  # Start at 2 to account for header
+        try:
+            required_fields = ['user_id', 'email', 'Full_name', 'password']
+            missing_fields = [field for field in required_fields if not row.get(field)]
+            
+            if missing_fields:
+                errors.append(f"Row {row_num}: Missing required fields: {', '.join(missing_fields)}")
+            elif User.find_by_username(row['user_id']):
+                errors.append(f"Row {row_num}: Username '{row['user_id']}' already exists")
+            elif User.find_by_email(row['email']):
+                errors.append(f"Row {row_num}: Email '{row['email']}' already exists")
+            else:
+                user_data = {
+                    'username': row['user_id'],
+                    'email': row['email'],
+                    'full_name': row['Full_name'],
+                    'password_hash': bcrypt.generate_password_hash(row['password']).decode('utf-8'),
+                    'role': row.get('role', 'user').lower(),
+                    'status': row.get('status', 'active').lower(),
+                    'bio': row.get('BIO', ''),
+                    'created_at': datetime.utcnow(),
+                    'updated_at': datetime.utcnow(),
+                    'profile_image': None,
+                    'social_links': {},
+                    'preferences': {},
+                    'badges': []
+                }
+                
+                mongo.db.users.insert_one(user_data)
+                counts_service.record_insert(User.collection, user_data)
+                rollup_service.record('registrations', user_data)
+                success_count += 1
+        except Exception as e:
+            errors.append(f"Row {row_num}: {str(e)}")
+        
+        # Password hashing dominates, so report every few rows
+        if (row_num - 1) % 25 == 0:
+            job.progress(imported=success_count, failed=len(errors))
+    
+    job.progress(imported=success_count, failed=len(errors))
+    return {'imported': success_count, 'failed': len(errors), 'errors': errors[:MAX_REPORTED_ERRORS]}
+
+
+@job_queue.task('users.initialize_badges', max_attempts=3, priority=PRIORITY_LOW)
+def initialize_user_badges(job):
+    """Give users created before badges existed the badge and competition tracking fields."""
+    missing = {
+        '$or': [
+            {'badges': {'$exists': False}},
+            {'competition_stats': {'$exists': False}},
+            {'featured_until': {'$exists': False}},
+            {'premium_until': {'$exists': False}}
+        ]
+    }
+    user_ids = [doc['_id'] for doc in mongo.db['users'].find(missing, {'_id': 1})]
+    result = mongo.db['users'].update_many(
+        {'_id': {'$in': user_ids}, **missing},
+        {
+            '$set': {
+                'badges': [],
+                'achievements': [],
+                'competition_stats': {
+                    'total_entered': 0,
+                    'total_wins': 0,
+                    'total_finalist': 0,
+                    'total_submissions': 0,
+                    'best_rank': None
+                },
+                'featured_until': None,
+                'premium_until': None
+            }
+        }
+    )
+    for user_id in user_ids:
+        cache.invalidate_tag(f'users:{user_id}')
+    return {'updated': result.modified_count}
+
+
+@job_queue.task('media.migrate_uploads', max_attempts=3, backoff=120, priority=PRIORITY_LOW)
+def migrate_uploads_to_cloudinary(job):
+    """Upload images still served from the local uploads folder to Cloudinary and repoint their URLs."""
+    from app.services.media_migration_service import media_migration
+    
+    counts = media_migration.run(target='cloudinary', source='local', progress=lambda counts: job.progress(**counts))
+    if counts['failed']:
+        raise RuntimeError(f"{counts['failed']} uploads failed; the next attempt retries them")
+    return counts
+
+
+@job_queue.task('media.push', max_attempts=5, backoff=30, priority=PRIORITY_HIGH)
+def push_media(job, asset_id):
+    """Upload a staged image and swap its URL onto the documents showing the placeholder."""
+    from app.services.media_service import media_service
+    
+    return media_service.push(asset_id)
+
+
+@job_queue.task('media.cleanup', max_attempts=3, backoff=300, priority=PRIORITY_LOW)
+def cleanup_media(job, urls=None):
+    """Delete released or orphaned images that no document refers to."""
+    from app.services.direct_upload_service import direct_uploads
+    from app.services.media_service import media_service
+    
+    counts = media_service.cleanup(urls)
+    if urls is None:
+        counts['unclaimed_uploads'] = direct_uploads.sweep()
+    return counts
+
+
+@job_queue.task('media.derivatives', max_attempts=3, backoff=300, priority=PRIORITY_LOW)
+def render_derivatives(job, url=None, asset_id=None):
+    """Render the thumb/card/detail variants of an image first requested at a size."""
+    from app.services.image_service import image_derivatives
+    
+    return {'derivatives': image_derivatives.generate(asset_id=asset_id, url=url)}
@@ -1,5 +1,6 @@
 """Application configuration."""
 import os
+import tempfile
 from datetime import timedelta
 from dotenv import load_dotenv
 
@@ -27,10 +28,16 @@ class Config:
     LOGIN_ATTEMPTS_WINDOW = int(os.getenv('LOGIN_ATTEMPTS_WINDOW', '900'))  # 15 minutes
     UPLOAD_RATE_LIMIT = int(os.getenv('UPLOAD_RATE_LIMIT', '10'))
     UPLOAD_RATE_WINDOW = int(os.getenv('UPLOAD_RATE_WINDOW', '3600'))  # 1 hour
+    REVIEW_RATE_LIMIT = int(os.getenv('REVIEW_RATE_LIMIT', '20'))
+    REVIEW_RATE_WINDOW = int(os.getenv('REVIEW_RATE_WINDOW', '3600'))
+    VOTE_RATE_LIMIT = int(os.getenv('VOTE_RATE_LIMIT', '60'))
+    VOTE_RATE_WINDOW = int(os.getenv('VOTE_RATE_WINDOW', '3600'))
+    RATELIMIT_BACKEND = os.getenv('RATELIMIT_BACKEND', 'mongo')  # Shared by all workers; 'memory' for one process
     
     # MongoDB
     MONGO_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/inklaunch?serverSelectionTimeoutMS=2000&connectTimeoutMS=2000')
     MONGO_DBNAME = os.getenv('MONGODB_DB_NAME', 'inklaunch')
+    MONGO_ENSURE_INDEXES = os.getenv('MONGO_ENSURE_INDEXES', 'False').lower() == 'true'  # Create indexes on startup
     
     # JWT
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production')
@@ -49,6 +56,14 @@ class Config:
     AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY', '')
     AWS_S3_BUCKET_NAME = os.getenv('AWS_S3_BUCKET_NAME', 'inklaunch-book-covers')
     AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
+    S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', '20'))  # HTTP connections shared by all threads
+    S3_MULTIPART_THRESHOLD_MB = int(os.getenv('S3_MULTIPART_THRESHOLD_MB', '8'))  # Larger uploads go in parallel parts
+    S3_MULTIPART_CHUNKSIZE_MB = int(os.getenv('S3_MULTIPART_CHUNKSIZE_MB', '8'))
+    S3_TRANSFER_CONCURRENCY = int(os.getenv('S3_TRANSFER_CONCURRENCY', '8'))  # Parts uploaded at once per file
+    S3_PRESIGNED_EXPIRES = int(os.getenv('S3_PRESIGNED_EXPIRES', '900'))  # Seconds a direct-upload URL stays valid
+    DIRECT_UPLOADS_ENABLED = os.getenv('DIRECT_UPLOADS_ENABLED', 'True').lower() == 'true'  # Browsers upload to S3/Cloudinary
+    DIRECT_UPLOAD_MANUSCRIPT_MAX_BYTES = int(os.getenv('DIRECT_UPLOAD_MANUSCRIPT_MAX_BYTES', str(100 * 1024 * 1024)))
+    DIRECT_UPLOAD_IMAGE_MAX_BYTES = int(os.getenv('DIRECT_UPLOAD_IMAGE_MAX_BYTES', str(10 * 1024 * 1024)))
     
     # Cloudinary (alternative to S3)
     CLOUDINARY_CLOUD_NAME = os.getenv('CLOUDINARY_CLOUD_NAME', '')
@@ -58,6 +73,14 @@ class Config:
     # OpenAI
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
     AI_MODEL = os.getenv('AI_MODEL', 'gpt-4-turbo')
+    AI_PROVIDER = os.getenv('AI_PROVIDER', 'openai')  # 'openai' or 'stub' (offline, deterministic)
+    AI_REQUEST_TIMEOUT = float(os.getenv('AI_REQUEST_TIMEOUT', '120'))
+    AI_STUB_LATENCY = float(os.getenv('AI_STUB_LATENCY', '0'))  # Seconds added to every stub call
+    AI_STUB_JITTER = float(os.getenv('AI_STUB_JITTER', '0'))  # Up to this many more seconds, at random
+    AI_STUB_FAILURE_RATE = float(os.getenv('AI_STUB_FAILURE_RATE', '0'))  # Share of stub calls that raise
+    AI_STUB_SEED = os.getenv('AI_STUB_SEED')  # Fixes the stub's latency and failure sequence
+    AI_JSON_MODE = os.getenv('AI_JSON_MODE', 'True').lower() == 'true'  # Request JSON replies (needs a JSON-mode model)
+    AI_PARSE_MIN_CONFIDENCE = float(os.getenv('AI_PARSE_MIN_CONFIDENCE', '0.5'))  # Replies parsed below this are retried
     
     # Email
     MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
@@ -69,10 +92,85 @@ class Config:
     
     # Upload (moved MAX_CONTENT_LENGTH to Security section above)
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
+    MEDIA_CLEANUP_DELAY = int(os.getenv('MEDIA_CLEANUP_DELAY', '300'))  # Seconds before a replaced image is deleted
+    MEDIA_ORPHAN_GRACE_SECONDS = int(os.getenv('MEDIA_ORPHAN_GRACE_SECONDS', '3600'))  # Unused assets younger than this are kept
+    MEDIA_STAGING_TTL_HOURS = int(os.getenv('MEDIA_STAGING_TTL_HOURS', '24'))  # Staged files nobody attached are then swept
+    IMAGE_DERIVATIVES_ENABLED = os.getenv('IMAGE_DERIVATIVES_ENABLED', 'True').lower() == 'true'  # Sized variants in media_url
+    IMAGE_DERIVATIVES_ON_REQUEST = os.getenv('IMAGE_DERIVATIVES_ON_REQUEST', 'True').lower() == 'true'  # Queue missing variants when shown
+    IMAGE_DERIVATIVE_FORMAT = os.getenv('IMAGE_DERIVATIVE_FORMAT', 'webp')  # 'webp' or 'avif' (if Pillow supports it)
+    IMAGE_DERIVATIVE_QUALITY = int(os.getenv('IMAGE_DERIVATIVE_QUALITY', '80'))
+    IMAGE_DERIVATIVE_LOOKUP_TTL = int(os.getenv('IMAGE_DERIVATIVE_LOOKUP_TTL', '300'))
+    # Hosts besides our uploads and S3 bucket whose images may be fetched to render variants (comma-separated)
+    IMAGE_DERIVATIVE_EXTERNAL_HOSTS = [host.strip().lower() for host in
+                                       os.getenv('IMAGE_DERIVATIVE_EXTERNAL_HOSTS', '').split(',') if host.strip()]
+    COVER_WORKERS = int(os.getenv('COVER_WORKERS', '0'))  # Processes drawing generated covers (0: one per CPU)
+    COVER_JPEG_QUALITY = int(os.getenv('COVER_JPEG_QUALITY', '90'))
+    MEDIA_MIGRATE_WORKERS = int(os.getenv('MEDIA_MIGRATE_WORKERS', '8'))  # Upload threads for flask media-migrate
+    MEDIA_MIGRATE_BATCH = int(os.getenv('MEDIA_MIGRATE_BATCH', '100'))  # Migrated URLs per bulk_write
     ALLOWED_EXTENSIONS = set(os.getenv('ALLOWED_EXTENSIONS', 'jpg,jpeg,png,gif,webp').split(','))
     
+    # Search ('mongo' uses the weighted text index; 'local' keeps an in-process index)
+    SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'mongo')
+    SEARCH_LOCAL_REFRESH_SECONDS = int(os.getenv('SEARCH_LOCAL_REFRESH_SECONDS', '300'))
+    AUTOCOMPLETE_REFRESH_SECONDS = int(os.getenv('AUTOCOMPLETE_REFRESH_SECONDS', '600'))
+    
     # Pagination
     ITEMS_PER_PAGE = int(os.getenv('ITEMS_PER_PAGE', '20'))
+    COUNT_CACHE_SECONDS = int(os.getenv('COUNT_CACHE_SECONDS', '60'))  # Listing totals are estimates within this window
+    
+    # Page fragment cache ('local' per worker, or 'mongo' shared by all workers)
+    PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', 'True').lower() == 'true'
+    PAGE_CACHE_BACKEND = os.getenv('PAGE_CACHE_BACKEND', 'local')
+    PAGE_CACHE_SECONDS = int(os.getenv('PAGE_CACHE_SECONDS', '60'))
+    PAGE_CACHE_STALE_SECONDS = int(os.getenv('PAGE_CACHE_STALE_SECONDS', '600'))  # Served while refreshing
+    HOMEPAGE_CACHE_SECONDS = int(os.getenv('HOMEPAGE_CACHE_SECONDS', '60'))
+    
+    # Application cache ('memory' per worker, 'redis' shared through CACHE_REDIS_URL, or 'null')
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', '300'))
+    # Memoized finders are only invalidated in the writing worker with 'memory', so keep them briefly
+    CACHE_MEMORY_MEMOIZE_TTL = int(os.getenv('CACHE_MEMORY_MEMOIZE_TTL', '5'))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '2048'))
+    CACHE_SOCKET_TIMEOUT = float(os.getenv('CACHE_SOCKET_TIMEOUT', '0.5'))
+    
+    # Audit log writer (entries are batched by a background thread when AUDIT_ASYNC is on)
+    AUDIT_ASYNC = os.getenv('AUDIT_ASYNC', 'True').lower() == 'true'
+    AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '100'))
+    AUDIT_FLUSH_SECONDS = float(os.getenv('AUDIT_FLUSH_SECONDS', '1.0'))
+    AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', '10000'))
+    AUDIT_OVERFLOW = os.getenv('AUDIT_OVERFLOW', 'spill')  # 'spill' to AUDIT_SPILL_FILE or 'drop'
+    AUDIT_SPILL_FILE = os.getenv('AUDIT_SPILL_FILE', 'audit_spill.jsonl')
+    AUDIT_RETENTION_MONTHS = int(os.getenv('AUDIT_RETENTION_MONTHS', '12'))  # Older monthly partitions are archived
+    AUDIT_ARCHIVE_DIR = os.getenv('AUDIT_ARCHIVE_DIR', 'audit_archive')
+    
+    # Background jobs (run by `flask worker`; inline in the request when JOBS_ASYNC is off)
+    JOBS_ASYNC = os.getenv('JOBS_ASYNC', 'True').lower() == 'true'
+    JOBS_LEASE_SECONDS = int(os.getenv('JOBS_LEASE_SECONDS', '60'))  # Renewed while a job runs
+    JOBS_RETENTION_DAYS = int(os.getenv('JOBS_RETENTION_DAYS', '14'))  # Finished jobs are then deleted
+    JOBS_INPUTS_TTL_HOURS = int(os.getenv('JOBS_INPUTS_TTL_HOURS', '72'))  # Inputs of jobs never run are then deleted
+    WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '2'))
+    WORKER_POLL_SECONDS = float(os.getenv('WORKER_POLL_SECONDS', '2.0'))
+    
+    # AI response cache (completions keyed by a hash of model, prompt and parameters)
+    AI_CACHE_ENABLED = os.getenv('AI_CACHE_ENABLED', 'True').lower() == 'true'
+    AI_CACHE_TTL_DAYS = int(os.getenv('AI_CACHE_TTL_DAYS', '30'))
+    
+    # AI request scheduling: per-minute budgets and interactive/batch lanes (0 disables a limit)
+    AI_SCHEDULER_ENABLED = os.getenv('AI_SCHEDULER_ENABLED', 'True').lower() == 'true'
+    AI_SCHEDULER_BACKEND = os.getenv('AI_SCHEDULER_BACKEND', 'mongo')  # 'memory' gives each process the whole budget
+    AI_RPM_LIMIT = int(os.getenv('AI_RPM_LIMIT', '500'))
+    AI_TPM_LIMIT = int(os.getenv('AI_TPM_LIMIT', '150000'))
+    AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', '8'))  # Requests in flight per process
+    AI_BATCH_SHARE = float(os.getenv('AI_BATCH_SHARE', '0.8'))  # Share of each limit batch work may use
+    AI_INTERACTIVE_QUEUE_TIMEOUT = float(os.getenv('AI_INTERACTIVE_QUEUE_TIMEOUT', '60'))
+    AI_BATCH_QUEUE_TIMEOUT = float(os.getenv('AI_BATCH_QUEUE_TIMEOUT', '600'))
+    
+    # Competition AI evaluation jobs
+    EVALUATION_CONCURRENCY = int(os.getenv('EVALUATION_CONCURRENCY', '4'))
+    EVALUATION_MAX_ATTEMPTS = int(os.getenv('EVALUATION_MAX_ATTEMPTS', '3'))
+    EVALUATION_RETRY_BACKOFF = float(os.getenv('EVALUATION_RETRY_BACKOFF', '2.0'))  # Seconds, doubled per retry
+    EVALUATION_STALE_SECONDS = int(os.getenv('EVALUATION_STALE_SECONDS', '300'))  # Silent runs are presumed dead
     
     # Validation
     REVIEW_MIN_LENGTH = int(os.getenv('REVIEW_MIN_LENGTH', '50'))
@@ -95,6 +193,17 @@ class TestingConfig(Config):
     TESTING = True
     MONGO_URI = 'mongodb://localhost:27017/inklaunch_test'
     MONGO_DBNAME = 'inklaunch_test'
+    SEARCH_BACKEND = 'local'
+    COUNT_CACHE_SECONDS = 0
+    PAGE_CACHE_ENABLED = False
+    CACHE_BACKEND = 'null'
+    AUDIT_ASYNC = False
+    JOBS_ASYNC = False
+    AI_PROVIDER = 'stub'
+    AI_RPM_LIMIT = 0
+    AI_TPM_LIMIT = 0
+    IMAGE_DERIVATIVES_ON_REQUEST = False
+    UPLOAD_FOLDER = os.path.join(tempfile.gettempdir(), 'inklaunch-test-uploads')  # Keeps test files out of uploads/
 
 
 config = {
@@ -1,42 +1,20 @@
 """
 Initialize existing users with badge and competition tracking fields
+
+Queues the users.initialize_badges job for `flask worker`; with
+JOBS_ASYNC=false it runs immediately.
 """
 
-from app import create_app, mongo
+from app import create_app
+from app.services.job_service import job_queue
 
 app = create_app()
 
 with app.app_context():
-    # Update all existing users to have the new fields
-    result = mongo.db['users'].update_many(
-        {
-            '$or': [
-                {'badges': {'$exists': False}},
-                {'competition_stats': {'$exists': False}},
-                {'featured_until': {'$exists': False}},
-                {'premium_until': {'$exists': False}}
-            ]
-        },
-        {
-            '$set': {
-                'badges': [],
-                'achievements': [],
-                'competition_stats': {
-                    'total_entered': 0,
-                    'total_wins': 0,
-                    'total_finalist': 0,
-                    'total_submissions': 0,
-                    'best_rank': None
-                },
-                'featured_until': None,
-                'premium_until': None
-            }
-        }
-    )
+    job = job_queue.enqueue('users.initialize_badges', unique_key='users.initialize_badges')
     
-    print(f"✅ Updated {result.modified_count} users with new badge/achievement fields")
-    print("✅ All users now have:")
-    print("   - Badge tracking system")
-    print("   - Competition statistics")
-    print("   - Featured author status tracking")
-    print("   - Premium membership tracking")
+    if job['status'] == 'succeeded':
+        print(f"✅ Updated {job['result']['updated']} users with new badge/achievement fields")
+    else:
+        print(f"✅ Queued badge initialization as job {job['_id']} ({job['status']})")
+        print("   Run `flask worker` to process it and check /admin/jobs for the result")
@@ -1,5 +1,6 @@
 """Test configuration and fixtures."""
 import pytest
+from bson import ObjectId
 from app import create_app, mongo
 from config import TestingConfig
 
@@ -14,6 +15,7 @@ def app():
         mongo.db.users.delete_many({})
         mongo.db.books.delete_many({})
         mongo.db.reviews.delete_many({})
+        mongo.db.rate_limits.delete_many({})
         
         yield app
         
@@ -23,6 +25,19 @@ def app():
         mongo.db.reviews.delete_many({})
 
 
+@pytest.fixture
+def create_book(app):
+    """Return a function that creates an active book showing a cover URL and returns its id."""
+    from app.models import Book
+    
+    def create(cover_url='', title='Tide', author_id=None):
+        return str(Book.create(author_id or str(ObjectId()), {
+            'title': title, 'description': 'A lighthouse keeper.', 'genre': 'Fiction',
+            'cover_image_url': cover_url, 'status': 'active'
+        }))
+    return create
+
+
 @pytest.fixture
 def client(app):
     """Create test client."""
@@ -0,0 +1,78 @@
+"""Test the AI response cache."""
+from types import SimpleNamespace
+import pytest
+from app import mongo
+from app.services.ai_cache_service import ai_response_cache, fingerprint, AI_CACHE_COLLECTION
+from app.services.ai_provider_service import ai_provider, Completion
+from app.services.ai_service import evaluate_manuscript
+
+RESPONSE = """CRITERION SCORES:
+Prose: 8 - Vivid
+Plot: 6 - Uneven
+
+WEIGHTED OVERALL SCORE: 7.0
+
+CONFIDENCE: 9
+
+STRENGTHS:
+- Voice
+
+WEAKNESSES:
+- Pacing
+
+DETAILED FEEDBACK:
+A promising draft.
+"""
+
+
+@pytest.fixture
+def completions(app, monkeypatch):
+    """Count calls to a fake model provider."""
+    mongo.db[AI_CACHE_COLLECTION].delete_many({})
+    calls = []
+    
+    def complete(model, messages, **params):
+        calls.append(messages)
+        return Completion(RESPONSE, 1200, model)
+    
+    monkeypatch.setattr(ai_provider, 'provider', SimpleNamespace(complete=complete))
+    yield calls
+    mongo.db[AI_CACHE_COLLECTION].delete_many({})
+
+
+def evaluate(**overrides):
+    """Evaluate a fixed manuscript."""
+    arguments = dict(manuscript_title='Tide', synopsis='A lighthouse keeper...', word_count=80000,
+                     genre='Literary', criteria={'prose': 50, 'plot': 50})
+    arguments.update(overrides)
+    return evaluate_manuscript(**arguments)
+
+
+def test_repeated_evaluation_served_from_cache(completions):
+    """Test that an identical request is answered without calling the API."""
+    first = evaluate()
+    second = evaluate()
+    
+    assert len(completions) == 1
+    assert (first['cache_hit'], first['tokens_used']) == (False, 1200)
+    assert (second['cache_hit'], second['tokens_used'], second['tokens_saved']) == (True, 0, 1200)
+    assert second['overall_score'] == first['overall_score'] == 7.0
+    assert ai_response_cache.stats() == {'entries': 1, 'hits': 1, 'tokens_saved': 1200}
+
+
+def test_changed_prompt_or_bypass_calls_api(completions):
+    """Test that different prompts miss and use_cache=False skips the lookup."""
+    evaluate()
+    evaluate(synopsis='A different story')
+    fresh = evaluate(use_cache=False)
+    
+    assert len(completions) == 3
+    assert not fresh['cache_hit']
+
+
+def test_fingerprint_is_order_independent():
+    """Test that parameter order does not change the key but values do."""
+    messages = [{'role': 'user', 'content': 'Hi'}]
+    assert (fingerprint('gpt-4', messages, {'temperature': 0.7, 'max_tokens': 10})
+            == fingerprint('gpt-4', messages, {'max_tokens': 10, 'temperature': 0.7}))
+    assert fingerprint('gpt-4', messages, {}) != fingerprint('gpt-4o', messages, {})
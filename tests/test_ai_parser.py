@@ -0,0 +1,111 @@
+"""Test structured parsing of AI responses."""
+import json
+from types import SimpleNamespace
+import pytest
+from app import mongo
+from app.services.ai_provider_service import ai_provider, Completion
+from app.services.ai_cache_service import AI_CACHE_COLLECTION
+from app.services.ai_parser_service import parse_response
+from app.services.ai_service import BOOK_REVIEW_SCHEMA, AIService, manuscript_schema, evaluate_manuscript
+
+SCHEMA = manuscript_schema(('prose_quality', 'plot'))
+
+
+def test_json_reply_is_validated():
+    """Test that JSON replies are type- and range-checked."""
+    reply = json.dumps({
+        'criteria_scores': {'Prose Quality': 8, 'plot': '7/10'},
+        'overall_score': 7.5,
+        'confidence': 42,
+        'strengths': ['Voice', 'Setting'],
+        'weaknesses': 'Pacing\nEnding',
+        'detailed_feedback': 'Strong draft.'
+    })
+    
+    parsed = parse_response(f'Here you go:\n```json\n{reply}\n```', SCHEMA)
+    assert parsed.method == 'json'
+    assert parsed.data['criteria_scores'] == {'prose_quality': 8.0, 'plot': 7.0}
+    assert parsed.data['weaknesses'] == ['Pacing', 'Ending']
+    assert 'confidence' in parsed.missing  # 42 is outside 1-10
+    assert parsed.confidence == 0.9
+
+
+def test_drifted_text_reply_falls_back_to_sections():
+    """Test that bold, numbered and bulleted text replies are still read."""
+    reply = """**CRITERION SCORES:**
+* **Prose Quality**: [8] - vivid imagery
+* Plot - 6/10, uneven middle
+
+**Weighted Overall Score:** 7.1
+
+### Strengths:
+1. Voice
+2. Atmosphere
+
+Weaknesses:
+• Pacing
+
+Detailed Feedback:
+A promising draft.
+It needs a tighter middle act.
+"""
+
+    parsed = parse_response(reply, SCHEMA)
+    assert parsed.method == 'sections'
+    assert parsed.data['criteria_scores'] == {'prose_quality': 8.0, 'plot': 6.0}
+    assert parsed.data['overall_score'] == 7.1
+    assert parsed.data['strengths'] == ['Voice', 'Atmosphere']
+    assert parsed.data['weaknesses'] == ['Pacing']
+    assert parsed.data['detailed_feedback'] == 'A promising draft. It needs a tighter middle act.'
+    assert parsed.missing == ['confidence']
+
+
+def test_malformed_reply_has_low_confidence():
+    """Test that replies missing most fields are reported, not silently emptied."""
+    parsed = parse_response('I am unable to evaluate this manuscript.', SCHEMA)
+    assert parsed.confidence == 0.0
+    assert parsed.method == 'none'
+    
+    parsed = parse_response('CRITERION SCORES:\nPlot: 7\n', SCHEMA)
+    assert parsed.confidence < 0.2
+    assert 'criteria_scores: missing prose_quality' in parsed.errors
+
+
+def test_book_review_fields_mapped(app):
+    """Test that a parsed review fills the stored review fields and computes the rating."""
+    reply = json.dumps({
+        'scores': {'content_quality': 8, 'writing_style': 8, 'originality': 6,
+                   'market_potential': 6, 'technical_quality': 10},
+        'summary': 'Good.', 'strengths': ['A'], 'weaknesses': ['B']
+    })
+    
+    review = AIService._review_fields(parse_response(reply, BOOK_REVIEW_SCHEMA))
+    assert review['content_quality_score'] == 8.0
+    assert review['overall_rating'] == 7.6
+    assert review['review_summary'] == 'Good.'
+    assert review['parse_confidence'] == 0.5  # None of the optional sections
+
+
+def test_unparseable_reply_is_not_cached(app, monkeypatch):
+    """Test that a rejected reply is evicted so the retry asks the model again."""
+    mongo.db[AI_CACHE_COLLECTION].delete_many({})
+    replies = iter(['Sorry, I cannot help.', json.dumps({
+        'criteria_scores': {'prose_quality': 8, 'plot': 6}, 'strengths': ['A'], 'weaknesses': ['B'],
+        'detailed_feedback': 'Fine.'
+    })])
+    
+    def complete(model, messages, **params):
+        assert params['response_format'] == {'type': 'json_object'}
+        return Completion(next(replies), 100, model)
+    
+    monkeypatch.setattr(ai_provider, 'provider', SimpleNamespace(complete=complete))
+    arguments = dict(manuscript_title='Tide', synopsis='...', word_count=1000, genre='Literary',
+                     criteria={'prose_quality': 50, 'plot': 50})
+    
+    with pytest.raises(Exception, match='Could not parse AI response'):
+        evaluate_manuscript(**arguments)
+    result = evaluate_manuscript(**arguments)
+    assert result['overall_score'] == 7.0
+    assert result['parse_confidence'] == 0.8
+    assert not result['cache_hit']
+    mongo.db[AI_CACHE_COLLECTION].delete_many({})
@@ -0,0 +1,61 @@
+"""Test the offline AI provider."""
+import pytest
+from app import mongo
+from app.models import AIEvaluation
+from app.services.ai_parser_service import parse_response
+from app.services.ai_provider_service import StubProvider, ProviderError, ai_provider
+from app.services.ai_service import evaluate_manuscript, manuscript_schema
+
+SCHEMA = manuscript_schema(('prose_quality', 'plot'))
+MESSAGES = [{'role': 'user', 'content': 'Evaluate this.\n\n' + SCHEMA.instructions()}]
+
+
+def test_stub_replies_are_deterministic_and_well_formed():
+    """Test that the stub answers schema prompts with valid, repeatable JSON."""
+    first = StubProvider().complete('gpt-4-turbo', MESSAGES)
+    second = StubProvider().complete('gpt-4-turbo', MESSAGES)
+    
+    assert first == second
+    assert first.tokens_used > 0
+    parsed = parse_response(first.content, SCHEMA)
+    assert (parsed.method, parsed.confidence) == ('json', 1.0)
+    assert all(1 <= score <= 10 for score in parsed.data['criteria_scores'].values())
+    
+    other = StubProvider().complete('gpt-4-turbo', [{'role': 'user', 'content': 'Something else'}])
+    assert other.content.startswith('Stub response:')
+
+
+def test_stub_failure_injection():
+    """Test that the configured share of calls fails."""
+    provider = StubProvider(failure_rate=0.5, seed=7)
+    failures = 0
+    for _ in range(200):
+        try:
+            provider.complete('gpt-4-turbo', MESSAGES)
+        except ProviderError:
+            failures += 1
+    
+    assert 70 < failures < 130
+    assert provider.calls == 200
+    with pytest.raises(ProviderError):
+        StubProvider(failure_rate=1.0).complete('gpt-4-turbo', MESSAGES)
+
+
+def test_testing_config_uses_stub(app):
+    """Test that evaluations run offline end to end under the testing config."""
+    assert ai_provider.provider.name == 'stub'
+    
+    result = evaluate_manuscript('Tide', 'A lighthouse keeper...', 80000, 'Literary',
+                                 {'prose_quality': 50, 'plot': 50}, use_cache=False)
+    assert result['parse_confidence'] == 1.0
+    assert 1 <= result['overall_score'] <= 10
+
+
+def test_evaluation_benchmark_cleans_up(app, runner):
+    """Test that the benchmark command evaluates synthetic submissions and removes them."""
+    result = runner.invoke(args=['evaluation-benchmark', '--submissions', '6', '--concurrency', '3',
+                                 '--latency', '0', '--jitter', '0'])
+    
+    assert 'Evaluated 6 of 6 submissions' in result.output
+    assert mongo.db[AIEvaluation.collection].count_documents({}) == 0
+    assert app.config['AI_CACHE_ENABLED'] is True
@@ -0,0 +1,108 @@
+"""Test the AI request scheduler."""
+import threading
+import time
+import pytest
+from app import mongo
+from app.services import ai_service
+from app.services.ai_service import (AIScheduler, MemoryUsageBackend, MongoUsageBackend, SchedulerTimeout,
+                                     AI_USAGE_COLLECTION)
+
+
+@pytest.fixture
+def scheduler(app):
+    """Create a scheduler with its own usage counters."""
+    scheduler = AIScheduler()
+    scheduler.backend = MemoryUsageBackend()
+    return scheduler
+
+
+def configure(app, **limits):
+    """Set the scheduler limits, unlimited unless given."""
+    app.config.update(AI_RPM_LIMIT=0, AI_TPM_LIMIT=0, AI_MAX_CONCURRENCY=0, AI_BATCH_SHARE=1.0)
+    app.config.update({f'AI_{name.upper()}': value for name, value in limits.items()})
+
+
+def test_request_budget_and_batch_share(app, scheduler):
+    """Test that batch work stops at its share of the budget while interactive requests continue."""
+    configure(app, rpm_limit=4, batch_share=0.5)
+    for _ in range(2):
+        scheduler.release(scheduler.acquire('batch', 'spring', 100))
+    
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire('batch', 'spring', 100, timeout=0.1)
+    scheduler.release(scheduler.acquire('interactive', None, 100))
+    scheduler.release(scheduler.acquire('interactive', None, 100))
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire('interactive', None, 100, timeout=0.1)
+    
+    metrics = scheduler.metrics()
+    assert metrics['requests_per_minute'] == 4
+    assert metrics['lanes']['batch']['timed_out'] == 1
+    assert metrics['lanes']['batch']['queued'] == 0
+
+
+def test_estimates_are_replaced_by_actual_usage(app, scheduler):
+    """Test that the token budget is charged what a call actually used."""
+    configure(app, tpm_limit=1000)
+    ticket = scheduler.acquire('interactive', None, 900)
+    ticket.tokens_used = 150
+    scheduler.release(ticket)
+    
+    scheduler.release(scheduler.acquire('interactive', None, 800))
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire('interactive', None, 100, timeout=0.1)
+    assert scheduler.metrics()['tokens_per_minute'] == 950
+
+
+def test_interactive_first_then_tenants_take_turns(app, scheduler):
+    """Test lane precedence and round-robin order between tenants."""
+    configure(app, max_concurrency=1)
+    blocker = scheduler.acquire('batch', 'spring', 10)
+    order = []
+    
+    def request(lane, tenant, label):
+        with app.app_context():
+            ticket = scheduler.acquire(lane, tenant, 10, timeout=5)
+            order.append(label)
+            scheduler.release(ticket)
+    
+    threads = []
+    for lane, tenant, label in [('batch', 'spring', 'spring-1'), ('batch', 'spring', 'spring-2'),
+                                ('batch', 'spring', 'spring-3'), ('batch', 'autumn', 'autumn-1'),
+                                ('interactive', None, 'review')]:
+        thread = threading.Thread(target=request, args=(lane, tenant, label))
+        thread.start()
+        threads.append(thread)
+        # Queue the requests one at a time so their order is known
+        while sum(stats['queued'] for stats in scheduler.metrics()['lanes'].values()) < len(threads):
+            time.sleep(0.01)
+    
+    scheduler.release(blocker)
+    for thread in threads:
+        thread.join()
+    
+    assert order == ['review', 'spring-1', 'autumn-1', 'spring-2', 'spring-3']
+    lanes = scheduler.metrics()['lanes']
+    assert lanes['batch']['completed'] == 5
+    assert lanes['interactive']['wait_p95'] > 0
+
+
+def test_batch_waits_for_interactive_requests_of_other_processes(app, monkeypatch):
+    """Test that, with the shared backend, one process's queued interactive request holds back another's batch."""
+    configure(app, max_concurrency=1)
+    monkeypatch.setattr(ai_service, 'WAITING_SIGNAL_SECONDS', 0.5)
+    mongo.db[AI_USAGE_COLLECTION].delete_many({})
+    web, worker = AIScheduler(), AIScheduler()
+    web.backend, worker.backend = MongoUsageBackend(), MongoUsageBackend()
+    
+    blocker = web.acquire('interactive', None, 10)
+    with pytest.raises(SchedulerTimeout):
+        web.acquire('interactive', None, 10, timeout=0.1)  # Queued long enough to signal
+    with pytest.raises(SchedulerTimeout):
+        worker.acquire('batch', 'spring', 10, timeout=0.1)
+    web.release(blocker)
+    
+    time.sleep(0.5)
+    worker.release(worker.acquire('batch', 'spring', 10, timeout=1))
+    assert worker.metrics()['requests_per_minute'] == 2
+    mongo.db[AI_USAGE_COLLECTION].delete_many({})
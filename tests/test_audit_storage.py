@@ -0,0 +1,90 @@
+"""Test monthly audit log partitions and archival."""
+import gzip
+from datetime import datetime
+import pytest
+from bson import ObjectId, json_util
+from app import mongo
+from app.models_audit import AuditLog
+from app.services.audit_storage_service import audit_storage, partition_name, add_months
+
+
+@pytest.fixture
+def audit_db(app):
+    """Start and finish with no audit collections."""
+    for name in AuditLog.partitions():
+        mongo.db.drop_collection(name)
+    yield
+    for name in AuditLog.partitions():
+        mongo.db.drop_collection(name)
+
+
+def entry(moment, user_id=None, category=AuditLog.CATEGORY_BOOK, success=True):
+    """Build an audit entry at a given time."""
+    return {
+        '_id': ObjectId(),
+        'category': category,
+        'action': AuditLog.ACTION_CREATE,
+        'user_id': user_id,
+        'success': success,
+        'timestamp': moment
+    }
+
+
+def test_entries_routed_to_monthly_partitions(audit_db):
+    """Test partition routing and window-limited partition lists."""
+    user_id = ObjectId()
+    audit_storage.insert_many([
+        entry(datetime(2024, 1, 15), user_id),
+        entry(datetime(2024, 2, 10), user_id),
+        entry(datetime(2024, 3, 5), user_id)
+    ])
+    
+    assert AuditLog.partitions() == ['audit_logs_2024_03', 'audit_logs_2024_02', 'audit_logs_2024_01']
+    assert AuditLog.partitions(since=datetime(2024, 2, 20)) == ['audit_logs_2024_03', 'audit_logs_2024_02']
+    assert AuditLog.partitions(until=datetime(2024, 1, 31)) == ['audit_logs_2024_01']
+    
+    logs = AuditLog.find_by_user(user_id, limit=2)
+    assert [log['timestamp'].month for log in logs] == [3, 2]
+    logs = AuditLog.find_by_user(user_id, since=datetime(2024, 2, 1), until=datetime(2024, 2, 28))
+    assert [log['timestamp'].month for log in logs] == [2]
+
+
+def test_stats_merge_partitions_and_legacy(audit_db):
+    """Test that aggregates combine every overlapping collection."""
+    now = datetime.utcnow()
+    user_id = ObjectId()
+    mongo.db.audit_logs.insert_one(entry(now, user_id, success=False))  # Written before partitioning
+    audit_storage.insert_many([entry(now, user_id), entry(now, user_id)])
+    
+    stats = AuditLog.get_system_stats(days=1)
+    assert stats[0]['count'] == 3
+    assert stats[0]['failure_count'] == 1
+    assert AuditLog.get_user_stats(user_id)[0]['count'] == 3
+    assert AuditLog.partitions()[-1] == 'audit_logs'
+
+
+def test_split_legacy(audit_db):
+    """Test moving unpartitioned entries into their months."""
+    mongo.db.audit_logs.insert_many([entry(datetime(2023, 5, 1)), entry(datetime(2023, 6, 1))])
+    
+    assert audit_storage.split_legacy(batch_size=1) == 2
+    assert mongo.db.audit_logs.count_documents({}) == 0
+    assert mongo.db['audit_logs_2023_05'].count_documents({}) == 1
+    assert mongo.db['audit_logs_2023_06'].count_documents({}) == 1
+
+
+def test_archive_expired_partitions(audit_db, tmp_path):
+    """Test that expired months are exported to gzip JSONL and dropped."""
+    now = datetime.utcnow()
+    old = add_months(now, -14)
+    audit_storage.insert_many([entry(old), entry(old), entry(now)])
+    
+    expired = audit_storage.expired_partitions(retention_months=12, now=now)
+    assert expired == [partition_name(old)]
+    
+    path, archived = audit_storage.archive(expired[0], str(tmp_path))
+    assert archived == 2
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        docs = [json_util.loads(line) for line in archive]
+    assert [doc['timestamp'] for doc in docs] == [old, old]
+    assert AuditLog.partitions() == [partition_name(now)]
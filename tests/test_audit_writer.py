@@ -0,0 +1,70 @@
+"""Test the background audit log writer."""
+import os
+import queue
+import threading
+from datetime import datetime
+from app import mongo
+from app.models_audit import AuditLog
+from app.services.audit_storage_service import partition_name
+from app.services.audit_writer_service import AuditWriter
+
+
+def writer_settings(tmp_path, **overrides):
+    """Writer settings for a test, spilling into tmp_path."""
+    settings = {
+        'async': True,
+        'batch_size': 3,
+        'flush_seconds': 0.05,
+        'queue_size': 100,
+        'overflow': 'spill',
+        'spill_file': str(tmp_path / 'spill.jsonl')
+    }
+    settings.update(overrides)
+    return settings
+
+
+def current_partition():
+    """The audit partition entries written now land in."""
+    return mongo.db[partition_name(datetime.utcnow())]
+
+
+def test_entries_written_in_batches(app, tmp_path):
+    """Test that queued entries reach the database and drain on shutdown."""
+    current_partition().delete_many({})
+    writer = AuditWriter()
+    writer.settings = writer_settings(tmp_path)
+    
+    for number in range(7):
+        writer.enqueue({'category': AuditLog.CATEGORY_SYSTEM, 'action': 'test', 'number': number})
+    writer.drain()
+    
+    assert current_partition().count_documents({'action': 'test'}) == 7
+    stats = writer.stats()
+    assert stats['written'] == 7
+    assert stats['queued'] == 0
+    assert not writer.thread.is_alive()
+
+
+def test_overflow_spills_and_replays(app, tmp_path):
+    """Test that a full queue spills to disk and the spill file loads back."""
+    current_partition().delete_many({})
+    writer = AuditWriter()
+    writer.settings = writer_settings(tmp_path)
+    # Pretend the writer thread is running but stalled on a full queue
+    writer.thread, writer.pid = threading.current_thread(), os.getpid()
+    writer.queue = queue.Queue(maxsize=1)
+    
+    for number in range(3):
+        writer.enqueue({'category': AuditLog.CATEGORY_SYSTEM, 'action': 'spilled', 'number': number})
+    
+    assert writer.stats()['spilled'] == 2
+    assert writer.replay_spill() == 2
+    assert current_partition().count_documents({'action': 'spilled'}) == 2
+    assert not os.path.exists(writer.settings['spill_file'])
+
+
+def test_log_returns_id_when_synchronous(app):
+    """Test that AuditLog.log still returns the entry id."""
+    entry_id = AuditLog.log(AuditLog.CATEGORY_SYSTEM, AuditLog.ACTION_VIEW)
+    
+    assert current_partition().find_one({'_id': entry_id})['action'] == AuditLog.ACTION_VIEW
@@ -0,0 +1,139 @@
+"""Test autocomplete suggestions."""
+from app.models import User, Book
+from app.services.autocomplete_service import PrefixIndex, autocomplete_service
+
+
+def test_prefix_index_matches_word_starts():
+    """Test whole-label and inner-word prefix matches."""
+    index = PrefixIndex()
+    index.add('book', '1', ['The Dragon Winter'], {'label': 'The Dragon Winter'})
+    index.add('book', '2', ['Dragonfly'], {'label': 'Dragonfly'})
+    index.add('book', '3', ['Quiet Harbor'], {'label': 'Quiet Harbor'})
+    
+    labels = [item['label'] for item in index.lookup('drag')['book']]
+    
+    assert labels == ['Dragonfly', 'The Dragon Winter']
+    assert index.lookup('agon') == {}
+    assert index.lookup('  ') == {}
+
+
+def test_prefix_index_replace_and_remove():
+    """Test that re-adding an item replaces its keys."""
+    index = PrefixIndex()
+    index.add('book', '1', ['Old Title'], {'label': 'Old Title'})
+    index.add('book', '1', ['New Title'], {'label': 'New Title'})
+    
+    assert index.lookup('old') == {}
+    assert index.lookup('new')['book'] == [{'label': 'New Title'}]
+    
+    index.remove('book', '1')
+    assert index.lookup('title') == {}
+    assert not any(index.keys.values())
+
+
+def test_prefix_index_build_matches_incremental_adds():
+    """Test that a bulk build finds the same items as adding them one by one."""
+    entries = [('book', str(i), [f'Title {i:05d}'], {'label': f'Title {i:05d}'}) for i in range(2000)]
+    entries.append(('genre', 'Thriller', ['Thriller'], {'label': 'Thriller'}))
+    built = PrefixIndex.build(entries)
+    added = PrefixIndex()
+    for entry in entries:
+        added.add(*entry)
+    
+    assert built.keys == added.keys
+    labels = [item['label'] for item in built.lookup('t', limit=3)['book']]
+    assert labels == ['Title 00000', 'Title 00001', 'Title 00002']
+    assert built.lookup('t', limit=3)['genre'] == [{'label': 'Thriller'}]
+    assert built.lookup('00019')['book'] == [{'label': 'Title 00019'}]
+
+
+def test_autocomplete_endpoint(client, app):
+    """Test the autocomplete API stays current as books change."""
+    autocomplete_service.index = None
+    user_id = User.create('author@example.com', 'Test123!@#', 'Dana Writer')
+    book_id = Book.create(str(user_id), {
+        'title': 'Dragon Winter', 'genre': 'Fantasy', 'status': 'active'
+    })
+    
+    response = client.get('/api/autocomplete?q=dra')
+    data = response.get_json()
+    
+    assert response.status_code == 200
+    assert [book['label'] for book in data['books']] == ['Dragon Winter']
+    
+    data = client.get('/api/autocomplete?q=fan').get_json()
+    assert data['genres'] == [{'label': 'Fantasy'}]
+    
+    data = client.get('/api/autocomplete?q=wri').get_json()
+    assert data['books'] == []
+    assert data['authors'][0]['label'] == 'Dana Writer'
+    
+    # Incremental updates once the index is loaded
+    Book.create(str(user_id), {'title': 'Drawn Lines', 'genre': 'Poetry', 'status': 'active'})
+    Book.update(str(book_id), {'status': 'draft'})
+    data = client.get('/api/autocomplete?q=dra').get_json()
+    assert [book['label'] for book in data['books']] == ['Drawn Lines']
+    
+    User.update(str(user_id), {'full_name': 'Dana Author'})
+    data = client.get('/api/autocomplete?q=auth').get_json()
+    assert data['authors'][0]['label'] == 'Dana Author'
+
+
+def test_only_authors_with_books_are_suggested(client, app):
+    """Test that users without active books are left out of author suggestions."""
+    autocomplete_service.index = None
+    author_id = User.create('author@example.com', 'Test123!@#', 'Dana Writer')
+    User.create('reader@example.com', 'Test123!@#', 'Dana Reader')
+    book_id = Book.create(str(author_id), {'title': 'Harbor', 'genre': 'Fiction', 'status': 'active'})
+    
+    assert [author['label'] for author in autocomplete_service.suggest('dana')['author']] == ['Dana Writer']
+    
+    Book.delete(str(book_id))
+    assert 'author' not in autocomplete_service.suggest('dana')
+    Book.create(str(author_id), {'title': 'Tide', 'genre': 'Fiction', 'status': 'active'})
+    assert [author['label'] for author in autocomplete_service.suggest('dana')['author']] == ['Dana Writer']
+
+
+def test_stale_index_rebuilds_in_the_background(client, app):
+    """Test that a stale index keeps serving while a rebuild runs, and changes made meanwhile survive."""
+    autocomplete_service.index = None
+    user_id = User.create('author@example.com', 'Test123!@#', 'Dana Writer')
+    Book.create(str(user_id), {'title': 'Dragon Winter', 'genre': 'Fantasy', 'status': 'active'})
+    old_index = autocomplete_service._ensure_index()
+    
+    app.config['AUTOCOMPLETE_REFRESH_SECONDS'] = 0
+    autocomplete_service.build_lock.acquire()  # Hold the rebuild until a change has been made
+    try:
+        # Served from the old index while the rebuild waits
+        assert [book['label'] for book in autocomplete_service.suggest('dra')['book']] == ['Dragon Winter']
+        assert autocomplete_service.rebuilding
+        Book.create(str(user_id), {'title': 'Drawn Lines', 'genre': 'Poetry', 'status': 'active'})
+    finally:
+        app.config['AUTOCOMPLETE_REFRESH_SECONDS'] = 600
+        autocomplete_service.build_lock.release()
+    autocomplete_service.rebuild_thread.join(5)
+    
+    assert autocomplete_service.index is not old_index
+    assert [book['label'] for book in autocomplete_service.suggest('dra')['book']] == ['Dragon Winter', 'Drawn Lines']
+
+
+def test_failed_first_build_answers_empty(client, app, monkeypatch):
+    """Test that a failed first build serves no suggestions instead of errors, and is retried soon."""
+    autocomplete_service.index = None
+    user_id = User.create('author@example.com', 'Test123!@#', 'Dana Writer')
+    Book.create(str(user_id), {'title': 'Dragon Winter', 'genre': 'Fantasy', 'status': 'active'})
+    build = autocomplete_service._build
+    
+    def unavailable():
+        raise RuntimeError('Mongo is unavailable')
+    
+    monkeypatch.setattr(autocomplete_service, '_build', unavailable)
+    response = client.get('/api/autocomplete?q=dra')
+    assert response.status_code == 200
+    assert response.get_json()['books'] == []
+    
+    monkeypatch.setattr(autocomplete_service, '_build', build)
+    autocomplete_service.built_at -= 30  # The retry delay has passed
+    autocomplete_service.suggest('dra')
+    autocomplete_service.rebuild_thread.join(5)
+    assert [book['label'] for book in autocomplete_service.suggest('dra')['book']] == ['Dragon Winter']
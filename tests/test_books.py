@@ -1,6 +1,6 @@
 """Test book routes."""
 import pytest
-from app.models import User, Book
+from app.models import User, Book, Review
 import io
 
 
@@ -168,3 +168,29 @@ def test_delete_book(client):
     with client.application.app_context():
         book = Book.find_by_id(book_id_str)
         assert book is None
+
+
+def test_enrich_many_books(client):
+    """Test batched author and rating enrichment."""
+    user = create_test_user(client)
+    
+    with client.application.app_context():
+        reviewer_id = User.create('reviewer@example.com', 'Test123!@#', 'Reviewer')
+        book_ids = [
+            Book.create(str(user['_id']), {
+                'title': f'Test Book {i}',
+                'description': 'Test description',
+                'genre': 'Fiction',
+                'status': 'published'
+            })
+            for i in range(3)
+        ]
+        review_id = Review.create(str(book_ids[0]), str(reviewer_id), 4,
+                                  'A thoughtful book that rewards a careful reader.')
+        Review.update_status(str(review_id), 'approved')
+        
+        books = Book.enrich_many([Book.find_by_id(str(book_id)) for book_id in book_ids])
+        
+        assert all(book['author']['_id'] == user['_id'] for book in books)
+        assert books[0]['rating_info'] == {'average': 4.0, 'count': 1}
+        assert books[1]['rating_info'] == {'average': 0, 'count': 0}
@@ -0,0 +1,171 @@
+"""Test the application cache."""
+import socket
+import socketserver
+import threading
+import pytest
+from app.models import User, Book
+from app.services.cache_service import cache, CacheService, MemoryBackend, RedisBackend
+
+
+class StandInHandler(socketserver.StreamRequestHandler):
+    """Serves GET/SET/DEL of the Redis protocol from a dict."""
+    
+    def handle(self):
+        store = self.server.store
+        while True:
+            header = self.rfile.readline()
+            if not header:
+                return
+            parts = []
+            for _ in range(int(header[1:])):
+                length = int(self.rfile.readline()[1:])
+                parts.append(self.rfile.read(length + 2)[:-2])
+            command = parts[0].upper()
+            if command == b'GET':
+                value = store.get(parts[1])
+                self.wfile.write(b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value))
+            elif command == b'SET':
+                store[parts[1]] = parts[2]
+                self.wfile.write(b'+OK\r\n')
+            elif command == b'DEL':
+                self.wfile.write(b':%d\r\n' % (store.pop(parts[1], None) is not None))
+            else:
+                self.wfile.write(b'-ERR unknown command\r\n')
+
+
+@pytest.fixture
+def memory_cache():
+    """Enable the global cache with an in-process backend."""
+    cache.backend = MemoryBackend(max_entries=100)
+    yield cache
+    cache.backend = None
+
+
+@pytest.fixture
+def stand_in_server():
+    """A local stand-in for a Redis server."""
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    server.store = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_memory_backend_evicts_least_recently_used():
+    """Test LRU eviction and the eviction counter."""
+    backend = MemoryBackend(max_entries=2)
+    backend.set('a', b'1')
+    backend.set('b', b'2')
+    backend.get('a')
+    backend.set('c', b'3')
+    
+    assert backend.get('b') is None
+    assert backend.get('a') == b'1'
+    assert backend.stats()['evictions'] == 1
+
+
+def test_tag_invalidation_and_copies():
+    """Test tagged entries, returned copies and hit/miss counters."""
+    service = CacheService()
+    service.backend = MemoryBackend()
+    service.set('book', {'title': 'Old'}, tags=['books:1'])
+    
+    service.get('book')['title'] = 'Mutated'
+    assert service.get('book') == {'title': 'Old'}
+    
+    service.invalidate_tag('books:1')
+    assert service.get('book', 'missing') == 'missing'
+    stats = service.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+
+
+def test_memoized_finders_invalidated_by_writes(app, memory_cache):
+    """Test that model writes invalidate memoized finders."""
+    author_id = str(User.create('cached@example.com', 'Test123!@#', 'Author'))
+    book_id = str(Book.create(author_id, {'title': 'Cached Book', 'genre': 'Fiction', 'status': 'active'}))
+    
+    assert Book.find_by_id(book_id)['title'] == 'Cached Book'
+    hits = cache.stats()['hits']
+    assert Book.find_by_id(book_id)['title'] == 'Cached Book'
+    assert cache.stats()['hits'] == hits + 1
+    
+    Book.update(book_id, {'title': 'Renamed Book'})
+    assert Book.find_by_id(book_id)['title'] == 'Renamed Book'
+    
+    Book.delete(book_id)
+    assert Book.find_by_id(book_id) is None
+    
+    assert User.find_by_id(author_id)['full_name'] == 'Author'
+    User.update(author_id, {'full_name': 'Renamed Author'})
+    assert User.find_by_id(author_id)['full_name'] == 'Renamed Author'
+
+
+def test_redis_backend_against_stand_in(stand_in_server):
+    """Test the network backend against a local stand-in server."""
+    host, port = stand_in_server.server_address
+    service = CacheService()
+    service.backend = RedisBackend(f'redis://{host}:{port}/0')
+    
+    service.set('article', {'slug': 'hello'}, tags=['articles:hello'])
+    assert service.get('article') == {'slug': 'hello'}
+    
+    service.invalidate_tag('articles:hello')
+    assert service.get('article') is None
+    service.delete('article')
+    assert b'article' not in stand_in_server.store
+
+
+def test_unreachable_backend_is_a_miss():
+    """Test that a dead cache server degrades to misses."""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    service = CacheService()
+    service.backend = RedisBackend(f'redis://127.0.0.1:{port}/0')
+    
+    calls = []
+    
+    @service.memoize(ttl=60)
+    def lookup(value):
+        calls.append(value)
+        return value * 2
+    
+    assert lookup(2) == 4
+    assert lookup(2) == 4
+    assert len(calls) == 2
+    assert service.stats()['errors'] >= 2
+
+
+def test_memoize_drops_results_invalidated_while_computing():
+    """Test that an invalidation during the function call wins over its result."""
+    service = CacheService()
+    service.backend = MemoryBackend()
+    calls = []
+    
+    @service.memoize(tags=['books:1'])
+    def find():
+        calls.append(1)
+        if len(calls) == 1:
+            service.invalidate_tag('books:1')  # A write lands while the first call reads
+        return len(calls)
+    
+    assert find() == 1
+    assert find() == 2  # The first result was stored under the replaced token
+    assert find() == 2
+
+
+def test_memory_backend_caps_memoized_ttl(app):
+    """Test that per-process caches keep memoized results only briefly."""
+    service = CacheService()
+    app.config.update(CACHE_BACKEND='memory', CACHE_MEMORY_MEMOIZE_TTL=5)
+    service.init_app(app)
+    stored = []
+    original_set = service.backend.set
+    service.backend.set = lambda key, value, ttl=None: stored.append(ttl) or original_set(key, value, ttl)
+    
+    service.memoize(ttl=300)(lambda: 'value')()
+    
+    assert stored[-1] == 5
@@ -0,0 +1,46 @@
+"""Test cached counts."""
+from datetime import datetime, timedelta
+from app.models import User, Book, Review
+from app.services.counts_service import counts_service, matches
+
+
+def test_filter_matching():
+    """Test the filter subset used to bump cached counts."""
+    now = datetime.utcnow()
+    doc = {'status': 'pending', 'created_at': now}
+    
+    assert matches({'status': 'pending'}, doc) is True
+    assert matches({'status': 'approved'}, doc) is False
+    assert matches({'created_at': {'$gte': now - timedelta(days=1)}}, doc) is True
+    assert matches({'created_at': {'$lt': now - timedelta(days=1)}}, doc) is False
+    assert matches({'last_login': {'$gte': now}}, doc) is False
+    assert matches({'$or': [{'status': 'pending'}]}, doc) is None
+
+
+def test_counts_follow_model_writes(app):
+    """Test that cached counts are bumped by creates, status changes and deletes."""
+    app.config['COUNT_CACHE_SECONDS'] = 3600
+    counts_service.clear()
+    
+    author_id = User.create('author@example.com', 'Test123!@#', 'Author')
+    reviewer_id = User.create('reviewer@example.com', 'Test123!@#', 'Reviewer')
+    book_id = Book.create(str(author_id), {'title': 'Counted', 'genre': 'Fiction', 'status': 'active'})
+    
+    assert counts_service.total('books') == 1
+    assert counts_service.count('reviews', {'status': 'pending'}) == 0
+    
+    review_id = Review.create(str(book_id), str(reviewer_id), 4, 'A fine read. ' * 5)
+    assert counts_service.count('reviews', {'status': 'pending'}) == 1
+    
+    Review.update_status(str(review_id), 'approved')
+    assert counts_service.count('reviews', {'status': 'pending'}) == 0
+    assert counts_service.count('reviews', {'status': 'approved'}) == 1
+    
+    Book.create(str(author_id), {'title': 'Second', 'genre': 'Fiction', 'status': 'active'})
+    Book.delete(str(book_id))
+    Review.delete(str(review_id))
+    
+    assert counts_service.total('books') == 1
+    assert counts_service.total('reviews') == 0
+    assert counts_service.count('reviews', {'status': 'approved'}) == 0
+    counts_service.clear()
@@ -0,0 +1,87 @@
+"""Test bulk generation of book covers."""
+import io
+import pytest
+from app import mongo
+from app.models import Book
+from app.services import cover_service
+from app.services.cover_service import cover_engine
+from app.services.job_service import JOBS_COLLECTION
+from app.services.media_service import media_service, MEDIA_COLLECTION
+
+
+@pytest.fixture
+def covers(app, tmp_path, monkeypatch):
+    """Draw placeholder bytes inline and record pushes instead of calling a CDN."""
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    mongo.db[MEDIA_COLLECTION].delete_many({})
+    mongo.db[JOBS_COLLECTION].delete_many({})
+    drawn = []
+    
+    def render(title, author, bg_color, text_color, quality=90):
+        drawn.append(title)
+        return f'{title} by {author} {bg_color}'.encode('utf-8')
+    
+    monkeypatch.setattr(cover_service, 'render_cover', render)
+    monkeypatch.setattr(media_service, '_store',
+                        lambda data, asset: (f"https://res.cloudinary.com/demo/image/upload/{asset['_id']}.jpg",
+                                             'cloudinary'))
+    monkeypatch.setattr(media_service, '_delete_stored', lambda url: None)
+    yield drawn
+    mongo.db[MEDIA_COLLECTION].delete_many({})
+    mongo.db[JOBS_COLLECTION].delete_many({})
+
+
+def test_rerun_only_redraws_changed_books(app, covers, create_book):
+    """Test that covers are uploaded once and only redrawn when title or author change."""
+    author_id = str(mongo.db.users.insert_one({'full_name': 'Mara Quill'}).inserted_id)
+    tide = create_book(title='Tide', author_id=author_id)
+    ember = create_book('https://via.placeholder.com/400x600', title='Ember', author_id=author_id)
+    own = create_book('https://example.com/own.jpg', title='Own Cover', author_id=author_id)
+    
+    counts = cover_engine.generate(workers=0)
+    assert (counts['scanned'], counts['generated'], counts['skipped']) == (2, 2, 0)
+    assert sorted(covers) == ['Ember', 'Tide']
+    book = Book.find_by_id(tide)
+    assert book['cover_image_url'].startswith('https://res.cloudinary.com/')  # Pushed inline in tests
+    assert book['generated_cover']['hash'] == cover_service.cover_fingerprint(
+        'Tide', 'Mara Quill', cover_service.scheme_for(tide))
+    assert Book.find_by_id(own)['cover_image_url'] == 'https://example.com/own.jpg'
+    
+    counts = cover_engine.generate(workers=0)
+    assert (counts['generated'], counts['skipped']) == (0, 2)
+    
+    Book.update(ember, {'title': 'Embers'})
+    counts = cover_engine.generate(workers=0)
+    assert (counts['generated'], counts['skipped']) == (1, 1)
+    assert covers[-1] == 'Embers'
+
+
+def test_uploaded_cover_replaces_generated_one(app, covers, client, create_book):
+    """Test that a cover the author uploads is left alone by later runs."""
+    author_id = str(mongo.db.users.insert_one({'full_name': 'Mara Quill', 'email': 'mara@example.com'}).inserted_id)
+    book_id = create_book(title='Tide', author_id=author_id)
+    cover_engine.generate(workers=0)
+    
+    with client.session_transaction() as session:
+        session['user_id'] = author_id
+    client.post(f'/books/{book_id}/edit', data={'cover_image_url': 'https://example.com/own.jpg'})
+    
+    book = Book.find_by_id(book_id)
+    assert book['cover_image_url'] == 'https://example.com/own.jpg'
+    assert book['generated_cover'] is None
+    assert cover_engine.generate(workers=0)['scanned'] == 0
+
+
+def test_render_wraps_long_titles():
+    """Test that titles wrap within the cover and a JPEG of the cover size is produced."""
+    Image = pytest.importorskip('PIL.Image')
+    
+    lines = cover_service.wrap_text('The Remarkably Long Title of an Unfinished Manuscript', 'bold', 48,
+                                    cover_service.TITLE_MAX_WIDTH)
+    assert len(lines) > 1
+    assert all(cover_service.text_width('bold', 48, line) <= cover_service.TITLE_MAX_WIDTH
+               or ' ' not in line for line in lines)
+    
+    data = cover_service.render_cover('Tide', 'Mara Quill', '#2C1810', '#D4AF37')
+    with Image.open(io.BytesIO(data)) as image:
+        assert (image.format, image.size) == ('JPEG', cover_service.COVER_SIZE)
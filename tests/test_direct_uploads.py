@@ -0,0 +1,102 @@
+"""Test signed direct-to-storage uploads."""
+from datetime import datetime, timedelta
+import pytest
+from app import mongo
+from app.models import Book
+from app.services.direct_upload_service import direct_uploads, UPLOAD_TICKETS_COLLECTION
+from app.services.s3_service import s3_service
+
+USER_ID = '6560f0a0c0ffee0000000001'
+
+
+@pytest.fixture
+def storage(app, client, monkeypatch):
+    """Sign against a fake bucket and serve object metadata from a dict."""
+    app.config.update(AWS_ACCESS_KEY_ID='AKIAEXAMPLE', AWS_SECRET_ACCESS_KEY='secret',
+                      AWS_S3_BUCKET_NAME='inklaunch-test', AWS_REGION='eu-west-1')
+    s3_service.s3_client = None
+    mongo.db[UPLOAD_TICKETS_COLLECTION].delete_many({})
+    objects, deleted = {}, []
+    monkeypatch.setattr(s3_service, 'head_object', lambda key: objects.get(key))
+    monkeypatch.setattr(s3_service, 'delete_file', lambda url: deleted.append(url) or True)
+    with client.session_transaction() as session:
+        session['user_id'] = USER_ID
+    yield objects, deleted
+    s3_service.s3_client = None
+    mongo.db[UPLOAD_TICKETS_COLLECTION].delete_many({})
+
+
+def test_ticket_rules(app, client, storage):
+    """Test that tickets check the type and size and sign a private manuscript upload."""
+    response = client.post('/api/uploads/tickets', json={'kind': 'manuscript', 'filename': 'novel.exe', 'size': 10})
+    assert response.status_code == 400
+    response = client.post('/api/uploads/tickets', json={'kind': 'manuscript', 'filename': 'novel.pdf',
+                                                         'size': app.config['DIRECT_UPLOAD_MANUSCRIPT_MAX_BYTES'] + 1})
+    assert response.status_code == 400
+    
+    response = client.post('/api/uploads/tickets', json={'kind': 'manuscript', 'filename': 'novel.pdf', 'size': 10})
+    assert response.status_code == 201
+    fields = response.get_json()['upload']['fields']
+    assert fields['key'].startswith(f'manuscripts/{USER_ID}/')
+    assert fields['Content-Type'] == 'application/pdf'
+    assert 'acl' not in fields  # Manuscripts stay private
+    
+    app.config['DIRECT_UPLOADS_ENABLED'] = False
+    response = client.post('/api/uploads/tickets', json={'kind': 'manuscript', 'filename': 'novel.pdf', 'size': 10})
+    assert response.status_code == 503
+
+
+def test_manuscript_is_claimed_once(app, client, storage):
+    """Test that a completed manuscript upload can be taken by one submission only."""
+    objects, _ = storage
+    ticket = direct_uploads.issue('manuscript', 'novel.pdf', 10, USER_ID)
+    assert client.post(f"/api/uploads/{ticket['ticket']}/complete").status_code == 400  # Not uploaded yet
+    ticket = direct_uploads.issue('manuscript', 'novel.pdf', 10, USER_ID)
+    key = mongo.db[UPLOAD_TICKETS_COLLECTION].find_one({'_id': ticket['ticket']})['key']
+    objects[key] = {'size': 10, 'content_type': 'application/pdf', 'etag': 'x'}
+    
+    response = client.post(f"/api/uploads/{ticket['ticket']}/complete")
+    assert response.get_json() == {'ticket': ticket['ticket'], 'status': 'completed', 'url': None}
+    assert direct_uploads.claim(ticket['ticket'], 'someone-else', 'manuscript') is None
+    claimed = direct_uploads.claim(ticket['ticket'], USER_ID, 'manuscript')
+    assert claimed['url'] == s3_service.object_url(key)
+    assert direct_uploads.claim(ticket['ticket'], USER_ID, 'manuscript') is None
+
+
+def test_cover_completion_sets_book_cover(app, client, storage):
+    """Test that a verified cover is set on the book and a mismatched object is deleted."""
+    objects, deleted = storage
+    book_id = str(Book.create(USER_ID, {'title': 'Tide', 'description': 'A lighthouse keeper.', 'genre': 'Fiction',
+                                        'cover_image_url': ''}))
+    
+    response = client.post('/api/uploads/tickets', json={'kind': 'cover', 'filename': 'c.png', 'size': 10,
+                                                         'book_id': book_id})
+    ticket_id = response.get_json()['ticket']
+    key = mongo.db[UPLOAD_TICKETS_COLLECTION].find_one({'_id': ticket_id})['key']
+    objects[key] = {'size': 10, 'content_type': 'image/png', 'etag': 'x'}
+    response = client.post(f'/api/uploads/{ticket_id}/complete')
+    assert response.get_json()['url'] == s3_service.object_url(key)
+    assert Book.find_by_id(book_id)['cover_image_url'] == s3_service.object_url(key)
+    
+    ticket_id = direct_uploads.issue('cover', 'c.png', 10, USER_ID, target_id=book_id)['ticket']
+    key = mongo.db[UPLOAD_TICKETS_COLLECTION].find_one({'_id': ticket_id})['key']
+    objects[key] = {'size': 10, 'content_type': 'text/html', 'etag': 'x'}
+    assert client.post(f'/api/uploads/{ticket_id}/complete').status_code == 400
+    assert deleted == [s3_service.object_url(key)]
+    assert mongo.db[UPLOAD_TICKETS_COLLECTION].find_one({'_id': ticket_id})['status'] == 'rejected'
+
+
+def test_sweep_removes_unclaimed_uploads(app, storage, monkeypatch):
+    """Test that expired, unclaimed uploads are deleted from storage."""
+    from app.services.media_service import media_service
+    
+    removed = []
+    monkeypatch.setattr(media_service, '_delete_stored', removed.append)
+    ticket_id = direct_uploads.issue('manuscript', 'novel.pdf', 10, USER_ID)['ticket']
+    kept_id = direct_uploads.issue('manuscript', 'novel.pdf', 10, USER_ID)['ticket']
+    mongo.db[UPLOAD_TICKETS_COLLECTION].update_one(
+        {'_id': ticket_id}, {'$set': {'expires_at': datetime.utcnow() - timedelta(days=2)}})
+    
+    assert direct_uploads.sweep() == 1
+    assert len(removed) == 1 and ticket_id in removed[0]
+    assert mongo.db[UPLOAD_TICKETS_COLLECTION].find_one({'_id': kept_id})
@@ -0,0 +1,140 @@
+"""Test the competition evaluation engine."""
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from app import mongo
+from app.models import Competition, CompetitionSubmission, AIEvaluation
+from app.services import evaluation_service
+from app.services.evaluation_service import evaluation_engine
+
+
+@pytest.fixture
+def competition(app):
+    """Closed competition with three submissions and fast retries."""
+    app.config['EVALUATION_RETRY_BACKOFF'] = 0
+    for collection in (Competition.collection, CompetitionSubmission.collection,
+                       AIEvaluation.collection, evaluation_service.EVALUATION_JOBS_COLLECTION):
+        mongo.db[collection].delete_many({})
+    
+    now = datetime.utcnow()
+    competition_id = Competition.create(
+        'Spring Prize', 'Short fiction', ['Fantasy'], now - timedelta(days=30), now - timedelta(days=1),
+        {'prose': 50, 'plot': 50}, 1, 0, {}, str(ObjectId())
+    )
+    Competition.update_status(str(competition_id), 'evaluating')
+    for number in range(3):
+        CompetitionSubmission.create(competition_id, str(ObjectId()), f'Manuscript {number}',
+                                     'https://example.com/m.pdf', 50000, 'Fantasy', 'A synopsis')
+    yield competition_id
+    for collection in (Competition.collection, CompetitionSubmission.collection,
+                       AIEvaluation.collection, evaluation_service.EVALUATION_JOBS_COLLECTION):
+        mongo.db[collection].delete_many({})
+
+
+def fake_evaluator(fail_titles, failures_each):
+    """Build an evaluate_manuscript stand-in that fails some titles a number of times."""
+    calls = {}
+    
+    def evaluate(manuscript_title, synopsis, word_count, genre, criteria, use_cache=True,
+                 lane='interactive', tenant=None):
+        assert lane == 'batch'
+        calls[manuscript_title] = calls.get(manuscript_title, 0) + 1
+        if manuscript_title in fail_titles and calls[manuscript_title] <= failures_each:
+            raise RuntimeError('API timeout')
+        return {
+            'model_version': 'test',
+            'criteria_scores': {'prose': 80, 'plot': 70},
+            'overall_score': 75,
+            'strengths': ['Voice'],
+            'weaknesses': ['Pacing'],
+            'detailed_feedback': 'Solid.',
+            'confidence_score': 0.9,
+            'processing_time': 0.1,
+            'tokens_used': 900,
+            'cache_hit': False
+        }
+    
+    evaluate.calls = calls
+    return evaluate
+
+
+def test_evaluation_retries_and_completes(competition, monkeypatch):
+    """Test that transient failures are retried and the competition advances."""
+    evaluate = fake_evaluator({'Manuscript 1'}, failures_each=1)
+    monkeypatch.setattr(evaluation_service, 'evaluate_manuscript', evaluate)
+    
+    job, started = evaluation_engine.start(competition)
+    assert started
+    
+    job = evaluation_engine.status(competition)
+    assert job['status'] == 'completed'
+    assert (job['total'], job['done'], job['failed'], job['skipped']) == (3, 3, 0, 0)
+    assert evaluate.calls['Manuscript 1'] == 2
+    assert len(AIEvaluation.find_by_competition(competition)) == 3
+    assert Competition.find_by_id(competition)['status'] == 'admin_review'
+
+
+def test_failed_submissions_can_be_resumed(competition, monkeypatch):
+    """Test that permanent failures leave the job resumable without redoing finished work."""
+    monkeypatch.setattr(evaluation_service, 'evaluate_manuscript',
+                        fake_evaluator({'Manuscript 2'}, failures_each=3))
+    evaluation_engine.start(competition)
+    
+    job = evaluation_engine.status(competition)
+    assert job['status'] == 'completed_with_errors'
+    assert (job['done'], job['failed']) == (2, 1)
+    assert job['errors'][0]['manuscript_title'] == 'Manuscript 2'
+    assert Competition.find_by_id(competition)['status'] == 'evaluating'
+    
+    evaluate = fake_evaluator(set(), failures_each=0)
+    monkeypatch.setattr(evaluation_service, 'evaluate_manuscript', evaluate)
+    evaluation_engine.start(competition)
+    
+    job = evaluation_engine.status(competition)
+    assert job['status'] == 'completed'
+    assert (job['done'], job['skipped']) == (1, 2)
+    assert list(evaluate.calls) == ['Manuscript 2']
+    assert Competition.find_by_id(competition)['status'] == 'admin_review'
+
+
+def test_running_job_is_not_started_twice(competition):
+    """Test that a live job holds its claim until its heartbeat goes stale."""
+    mongo.db[evaluation_service.EVALUATION_JOBS_COLLECTION].insert_one({
+        '_id': str(competition), 'status': 'running', 'run_id': 'other', 'heartbeat_at': datetime.utcnow()
+    })
+    
+    job, started = evaluation_engine.start(competition)
+    assert not started
+    assert job['run_id'] == 'other'
+
+
+def test_restart_of_stale_run_reuses_queued_job(app, competition, monkeypatch):
+    """Test that a queued job left by a stale run runs the restarted run, and run failures are retried."""
+    from app.services.job_service import job_queue, JOBS_COLLECTION
+    
+    app.config['JOBS_ASYNC'] = True
+    mongo.db[JOBS_COLLECTION].delete_many({})
+    monkeypatch.setattr(evaluation_service, 'evaluate_manuscript', fake_evaluator(set(), failures_each=0))
+    evaluation_engine.start(competition)
+    mongo.db[evaluation_service.EVALUATION_JOBS_COLLECTION].update_one(
+        {'_id': str(competition)}, {'$set': {'heartbeat_at': datetime.utcnow() - timedelta(hours=1)}})
+    job, started = evaluation_engine.start(competition)
+    assert started and mongo.db[JOBS_COLLECTION].count_documents({}) == 1
+    
+    pool = evaluation_service.ThreadPoolExecutor
+    
+    def broken_pool(*args, **kwargs):
+        monkeypatch.setattr(evaluation_service, 'ThreadPoolExecutor', pool)
+        raise RuntimeError('worker out of threads')
+    
+    monkeypatch.setattr(evaluation_service, 'ThreadPoolExecutor', broken_pool)
+    job_queue.execute(job_queue.claim('test-worker'))
+    assert mongo.db[JOBS_COLLECTION].find_one()['status'] == 'queued'  # Left to the queue's retry
+    assert evaluation_engine.status(competition)['status'] == 'queued'
+    
+    mongo.db[JOBS_COLLECTION].update_one({}, {'$set': {'run_at': datetime.utcnow()}})
+    job_queue.execute(job_queue.claim('test-worker'))
+    assert evaluation_engine.status(competition)['status'] == 'completed'
+    assert evaluation_engine.status(competition)['run_id'] == job['run_id']
+    assert mongo.db[JOBS_COLLECTION].find_one()['status'] == 'succeeded'
+    mongo.db[JOBS_COLLECTION].delete_many({})
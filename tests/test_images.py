@@ -0,0 +1,92 @@
+"""Test sized image variants and the media_url helper."""
+import io
+import pytest
+from flask import render_template_string
+from app import mongo
+from app.services import image_service
+from app.services.image_service import ImageDerivativeService, UnsafeImageSource, media_url, SIZES
+from app.services.job_service import JOBS_COLLECTION
+from app.services.media_service import MEDIA_COLLECTION
+
+COVER = '/uploads/staged_abc.jpg'
+
+
+@pytest.fixture
+def assets(app):
+    """Start with no assets or jobs."""
+    mongo.db[MEDIA_COLLECTION].delete_many({})
+    mongo.db[JOBS_COLLECTION].delete_many({})
+    yield mongo.db[MEDIA_COLLECTION]
+    mongo.db[MEDIA_COLLECTION].delete_many({})
+    mongo.db[JOBS_COLLECTION].delete_many({})
+
+
+def test_media_url_normalizes_and_resizes_cloudinary(app):
+    """Test that stored URLs are normalized and Cloudinary URLs get a resize transformation."""
+    assert media_url('uploads/cover.jpg') == '/uploads/cover.jpg'
+    assert media_url('http://example.com/a.jpg') == 'https://example.com/a.jpg'
+    assert media_url(None, 'card') == ''
+    assert media_url('res.cloudinary.com/demo/image/upload/v1/covers/a.jpg', 'thumb') == (
+        'https://res.cloudinary.com/demo/image/upload/c_limit,w_160,h_240,f_auto,q_auto/v1/covers/a.jpg')
+    assert media_url('/static/images/default-book-cover.png', 'card') == '/static/images/default-book-cover.png'
+    with pytest.raises(ValueError):
+        media_url(COVER, 'poster')
+
+
+def test_variant_served_once_rendered(app, assets):
+    """Test that the helper picks a stored variant, in templates too."""
+    assets.insert_one({'_id': 'abc', 'url': COVER, 'placeholder': COVER, 'aliases': [],
+                       'derivatives': {size: f'/uploads/derived_abc-{size}.webp' for size in SIZES}})
+    
+    assert media_url(COVER, 'card') == '/uploads/derived_abc-card.webp'
+    html = render_template_string("{{ url|media_url('thumb') }} {{ media_url(url) }}", url=COVER)
+    assert html == '/uploads/derived_abc-thumb.webp /uploads/staged_abc.jpg'
+
+
+def test_missing_variants_queued_once(app, assets):
+    """Test that an image without variants is shown as is and queued for rendering once."""
+    app.config.update(JOBS_ASYNC=True, IMAGE_DERIVATIVES_ON_REQUEST=True)
+    service = ImageDerivativeService()
+    
+    assert service.variant_url('/uploads/legacy.jpg', 'card') == '/uploads/legacy.jpg'
+    service.variant_url('/uploads/legacy.jpg', 'thumb')
+    jobs = list(mongo.db[JOBS_COLLECTION].find({'name': 'media.derivatives'}))
+    assert [job['payload'] for job in jobs] == [{'url': '/uploads/legacy.jpg'}]
+    
+    # A failed render is not queued again
+    assets.insert_one({'_id': 'bad', 'url': COVER, 'placeholder': COVER, 'derivatives_error': 'cannot identify image'})
+    assert service.variant_url(COVER, 'card') == COVER
+    assert mongo.db[JOBS_COLLECTION].count_documents({}) == 1
+
+
+def test_render_fits_sizes(app):
+    """Test that variants fit their boxes without being enlarged."""
+    Image = pytest.importorskip('PIL.Image')
+    source = io.BytesIO()
+    Image.new('RGB', (1200, 1800), 'navy').save(source, format='JPEG')
+    
+    rendered = ImageDerivativeService.render(source.getvalue(), 'webp')
+    
+    sizes = {size: Image.open(io.BytesIO(body)).size for size, body in rendered.items()}
+    assert sizes == {'thumb': (160, 240), 'card': (320, 480), 'detail': (640, 960)}
+
+
+def test_only_own_or_allowed_hosts_are_fetched(app, assets, monkeypatch):
+    """Test that author-set links to other hosts are not rendered, and allowed hosts must resolve publicly."""
+    app.config.update(JOBS_ASYNC=True, IMAGE_DERIVATIVES_ON_REQUEST=True, AWS_S3_BUCKET_NAME='inklaunch-test',
+                      IMAGE_DERIVATIVE_EXTERNAL_HOSTS=['images.example.com'])
+    service = ImageDerivativeService()
+    
+    for url in ('http://169.254.169.254/latest/meta-data/', 'https://inklaunch-test.s3.evil.com/a.jpg'):
+        assert service.variant_url(url, 'card') == url
+    service.variant_url('https://inklaunch-test.s3.eu-west-1.amazonaws.com/covers/a.jpg', 'card')
+    service.variant_url('https://images.example.com/a.jpg', 'card')
+    assert mongo.db[JOBS_COLLECTION].count_documents({}) == 2
+    
+    with pytest.raises(UnsafeImageSource):
+        service._fetch('http://169.254.169.254/latest/meta-data/')
+    monkeypatch.setattr(image_service.socket, 'getaddrinfo', lambda host, port: [(2, 1, 6, '', ('10.0.0.7', port))])
+    with pytest.raises(UnsafeImageSource, match='non-public'):
+        service._fetch('https://images.example.com/a.jpg')
+    with pytest.raises(UnsafeImageSource, match='non-public'):
+        service._fetch('https://anywhere.example.org/a.jpg', any_host=True)
@@ -0,0 +1,52 @@
+"""Test index registry."""
+from app import mongo
+from app.indexes import sync_indexes, registered_models
+
+
+def test_registry_covers_core_collections(app):
+    """Test that the core collections declare indexes."""
+    collections = {model.collection for model in registered_models()}
+    for name in ['users', 'books', 'reviews', 'audit_logs', 'competition_submissions', 'rate_limits']:
+        assert name in collections
+
+
+def test_sync_indexes_is_idempotent(app):
+    """Test that a second sync creates nothing."""
+    first = sync_indexes()
+    second = sync_indexes()
+    
+    assert 'users.email_1' in first['created'] + first['unchanged']
+    assert second['created'] == []
+    assert second['drifted'] == []
+    assert 'email_1' in mongo.db.users.index_information()
+
+
+def test_sync_indexes_reports_drift(app):
+    """Test drift and extra index detection."""
+    sync_indexes()
+    mongo.db.books.drop_index('genre_1')
+    mongo.db.books.create_index([('genre', 1)], name='genre_1', sparse=True)
+    mongo.db.books.create_index([('isbn', 1)])
+    
+    report = sync_indexes(apply=False)
+    
+    assert 'books.genre_1' in report['drifted']
+    assert 'books.isbn_1' in report['extra']
+    
+    mongo.db.books.drop_index('isbn_1')
+    sync_indexes(rebuild_drifted=True)
+    assert 'sparse' not in mongo.db.books.index_information()['genre_1']
+
+
+def test_sync_indexes_continues_past_failures(app):
+    """Test that an index that cannot be built is reported and the rest still sync."""
+    mongo.db.users.drop_indexes()
+    mongo.db.books.drop_indexes()
+    mongo.db.users.insert_many([{'email': 'same@example.com'}, {'email': 'same@example.com'}])
+    
+    report = sync_indexes()
+    
+    assert [failure.split(':')[0] for failure in report['failed']] == ['users.email_1']
+    assert 'books.genre_1' in report['created']
+    assert 'users.created_at_-1' in report['created']
+    assert 'email_1' not in mongo.db.users.index_information()
@@ -0,0 +1,194 @@
+"""Test the background job queue and worker."""
+import io
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from app import mongo
+from app.services.job_service import JobQueue, Worker, JOBS_COLLECTION, JOB_INPUTS_COLLECTION, PRIORITY_HIGH
+
+
+@pytest.fixture
+def queue(app):
+    """Queue with test tasks, running jobs through claim/execute rather than inline."""
+    app.config['JOBS_ASYNC'] = True
+    mongo.db[JOBS_COLLECTION].delete_many({})
+    queue = JobQueue()
+    queue.ran = []
+    
+    @queue.task('record')
+    def record(job, value):
+        queue.ran.append(value)
+        return {'value': value}
+    
+    @queue.task('flaky', max_attempts=2, backoff=0)
+    def flaky(job):
+        if job.attempt == 1:
+            raise RuntimeError('first attempt fails')
+        job.progress(step='done')
+        return 'ok'
+    
+    @queue.task('broken', max_attempts=2, backoff=0)
+    def broken(job, secret=None):
+        raise RuntimeError('always fails')
+    
+    yield queue
+    mongo.db[JOBS_COLLECTION].delete_many({})
+    mongo.db[JOB_INPUTS_COLLECTION].delete_many({})
+
+
+def run_next(queue):
+    """Claim and execute one due job."""
+    job = queue.claim('test-worker')
+    if job:
+        queue.execute(job)
+    return job
+
+
+def test_jobs_claimed_by_priority(queue):
+    """Test that higher-priority jobs run first and results are stored."""
+    low = queue.enqueue('record', {'value': 'low'})
+    high = queue.enqueue('record', {'value': 'high'}, priority=PRIORITY_HIGH)
+    
+    run_next(queue)
+    run_next(queue)
+    assert queue.ran == ['high', 'low']
+    assert queue.status(high['_id'])['result'] == {'value': 'high'}
+    assert queue.status(low['_id'])['status'] == 'succeeded'
+    assert queue.status(low['_id'])['expires_at'] > datetime.utcnow()
+
+
+def test_failed_jobs_retried_then_failed(queue):
+    """Test that failures are retried within the task's attempt budget."""
+    flaky = queue.enqueue('flaky')
+    broken = queue.enqueue('broken')
+    
+    for _ in range(4):
+        run_next(queue)
+    
+    flaky = queue.status(flaky['_id'])
+    assert (flaky['status'], flaky['attempts'], flaky['result']) == ('succeeded', 2, 'ok')
+    assert flaky['progress'] == {'step': 'done'}
+    broken = queue.status(broken['_id'])
+    assert (broken['status'], broken['attempts']) == ('failed', 2)
+    assert broken['error'] == 'always fails'
+    assert len(broken['errors']) == 2
+    
+    assert queue.retry(broken['_id'])
+    assert queue.status(broken['_id'])['status'] == 'queued'
+
+
+def test_expired_lease_is_reclaimed(queue):
+    """Test that a job whose worker stopped renewing its lease runs again elsewhere."""
+    job = queue.enqueue('record', {'value': 'again'})
+    queue.claim('dead-worker')
+    assert queue.claim('other-worker') is None
+    
+    mongo.db[JOBS_COLLECTION].update_one({'_id': job['_id']},
+                                         {'$set': {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}})
+    reclaimed = queue.claim('other-worker')
+    assert (reclaimed['worker'], reclaimed['attempts']) == ('other-worker', 2)
+    queue.execute(reclaimed)
+    assert queue.ran == ['again']
+
+
+def test_cancelled_job_is_not_run(queue):
+    """Test that cancelling a queued job keeps workers from claiming it."""
+    job = queue.enqueue('record', {'value': 'never'})
+    
+    assert queue.cancel(job['_id'])
+    assert run_next(queue) is None
+    assert queue.status(job['_id'])['status'] == 'cancelled'
+
+
+def test_inputs_are_kept_off_the_job_and_dropped_when_it_ends(queue):
+    """Test that inputs reach the handler but not the job, and are deleted once it succeeds or fails."""
+    job = queue.enqueue('record', inputs={'value': 'hunter2'})
+    assert 'hunter2' not in str(mongo.db[JOBS_COLLECTION].find_one({'_id': job['_id']}))
+    run_next(queue)
+    assert queue.ran == ['hunter2']
+    assert 'payload' not in mongo.db[JOBS_COLLECTION].find_one({'_id': job['_id']})
+    
+    failing = queue.enqueue('broken', inputs={'secret': 'hunter2'})
+    run_next(queue)
+    assert mongo.db[JOB_INPUTS_COLLECTION].find_one({'_id': failing['_id']})  # Kept for the retry
+    run_next(queue)
+    assert queue.status(failing['_id'])['status'] == 'failed'
+    assert mongo.db[JOB_INPUTS_COLLECTION].count_documents({}) == 0
+    assert not queue.retry(failing['_id'])
+    
+    cancelled = queue.enqueue('record', inputs={'value': 'hunter2'})
+    assert queue.cancel(cancelled['_id'])
+    assert mongo.db[JOB_INPUTS_COLLECTION].count_documents({}) == 0
+
+
+def test_worker_burst_drains_queue(app, queue):
+    """Test that a burst worker runs every due job and exits."""
+    for value in range(5):
+        queue.enqueue('record', {'value': value})
+    
+    processed = Worker(queue, app, concurrency=2, poll_interval=0.01).run(burst=True)
+    assert processed == 5
+    assert sorted(queue.ran) == [0, 1, 2, 3, 4]
+    assert queue.counts() == {'succeeded': 5}
+
+
+def test_bulk_import_runs_as_job(app, client):
+    """Test that the CSV import is handed to a job and reported by the status API."""
+    mongo.db[JOBS_COLLECTION].delete_many({})
+    with client.session_transaction() as session:
+        session['user_id'] = str(ObjectId())
+        session['user_role'] = 'admin'
+    csv_text = ('user_id,email,Full_name,password\n'
+                'new_author,new@example.com,New Author,Secret123\n'
+                'broken_row,,No Email,Secret123\n')
+    
+    response = client.post('/admin/users/bulk-import',
+                           data={'csv_file': (io.BytesIO(csv_text.encode()), 'users.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    
+    response = client.get(response.headers['Location'], headers={'Accept': 'application/json'})
+    job = response.get_json()
+    assert job['status'] == 'succeeded'
+    assert (job['result']['imported'], job['result']['failed']) == (1, 1)
+    assert mongo.db.users.find_one({'username': 'new_author'})
+    assert 'Secret123' not in str(mongo.db[JOBS_COLLECTION].find_one({'_id': ObjectId(job['id'])}))
+    assert mongo.db[JOB_INPUTS_COLLECTION].count_documents({}) == 0
+    
+    response = client.get('/admin/jobs')
+    assert response.status_code == 200
+    assert b'users.bulk_import' in response.data
+    mongo.db[JOBS_COLLECTION].delete_many({})
+
+
+def test_retried_announcement_awards_once(app, monkeypatch):
+    """Test that a retry after a crash before the submission is marked does not repeat the award."""
+    from app.models import CompetitionSubmission, CompetitionWinner, User
+    from app.tasks import announce_winners
+    
+    author_id = mongo.db.users.insert_one({'username': 'mara', 'badges': [],
+                                           'competition_stats': {'total_wins': 0, 'best_rank': None}}).inserted_id
+    competition_id = mongo.db.competitions.insert_one({'title': 'Spring', 'prize_structure': {},
+                                                       'status': 'judging'}).inserted_id
+    submission_id = mongo.db.competition_submissions.insert_one({
+        'competition_id': competition_id, 'author_id': author_id, 'submission_status': 'submitted'}).inserted_id
+    mongo.db.ai_evaluations.insert_one({'submission_id': submission_id, 'overall_score': 91,
+                                        'detailed_feedback': 'Strong voice.'})
+    job = type('Job', (), {'progress': lambda self, **fields: None})()
+    
+    def crash(submission_id, status):
+        raise RuntimeError('worker died')
+    
+    mark = CompetitionSubmission.update_status
+    monkeypatch.setattr(CompetitionSubmission, 'update_status', crash)
+    with pytest.raises(RuntimeError):
+        announce_winners(job, str(competition_id), [str(submission_id)])
+    monkeypatch.setattr(CompetitionSubmission, 'update_status', mark)
+    assert announce_winners(job, str(competition_id), [str(submission_id)]) == {'announced': 1}
+    
+    user = User.find_by_id(str(author_id))
+    assert len(user['badges']) == 1
+    assert (user['competition_stats']['total_wins'], user['competition_stats']['best_rank']) == (1, 1)
+    assert len(CompetitionWinner.find_by_competition(str(competition_id))) == 1
+    for collection in ('competitions', 'competition_submissions', 'ai_evaluations', 'competition_winners'):
+        mongo.db[collection].delete_many({})
@@ -0,0 +1,112 @@
+"""Test the asynchronous media upload pipeline."""
+import io
+import os
+import pytest
+from werkzeug.datastructures import FileStorage
+from app import mongo
+from app.models import Book
+from app.services.job_service import JOBS_COLLECTION
+from app.services.media_service import media_service, MEDIA_COLLECTION, MEDIA_STAGING_COLLECTION
+
+CDN_URL = 'https://res.cloudinary.com/demo/image/upload/book-covers/abc.jpg'
+
+
+@pytest.fixture
+def media(app, tmp_path, monkeypatch):
+    """Stage into a temporary folder and record pushes instead of calling a CDN."""
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    mongo.db[MEDIA_COLLECTION].delete_many({})
+    mongo.db[MEDIA_STAGING_COLLECTION].delete_many({})
+    mongo.db[JOBS_COLLECTION].delete_many({})
+    pushed = []
+    
+    def store(data, asset):
+        pushed.append(asset['_id'])
+        return CDN_URL, 'cloudinary'
+    
+    monkeypatch.setattr(media_service, '_store', store)
+    monkeypatch.setattr(media_service, '_delete_stored', lambda url: pushed.append(f'deleted {url}'))
+    yield pushed
+    mongo.db[MEDIA_COLLECTION].delete_many({})
+    mongo.db[MEDIA_STAGING_COLLECTION].delete_many({})
+    mongo.db[JOBS_COLLECTION].delete_many({})
+
+
+def upload(data=b'cover bytes'):
+    """Build an uploaded file."""
+    return FileStorage(stream=io.BytesIO(data), filename='cover.jpg', content_type='image/jpeg')
+
+
+def test_push_swaps_placeholder_and_dedupes(app, media, tmp_path, create_book):
+    """Test that the stored URL replaces the placeholder and identical bytes are not uploaded again."""
+    staged = media_service.stage(upload(), folder='book-covers')
+    assert staged.pending and staged.url.startswith('/uploads/staged_')
+    assert os.path.exists(tmp_path / os.path.basename(staged.url))
+    
+    book_id = create_book(staged.url)
+    media_service.attach(staged, Book.collection, book_id, 'cover_image_url')  # Runs inline in tests
+    
+    assert Book.find_by_id(str(book_id))['cover_image_url'] == CDN_URL
+    assert not os.path.exists(tmp_path / os.path.basename(staged.url))
+    again = media_service.stage(upload(), folder='book-covers')
+    assert (again.url, again.pending) == (CDN_URL, False)
+    assert media == [staged.asset_id]
+
+
+def test_worker_pushes_without_the_web_disk(app, client, media, tmp_path, monkeypatch, create_book):
+    """Test that a push and the placeholder work from the Mongo copy when the local file is elsewhere."""
+    app.config['JOBS_ASYNC'] = True
+    staged = media_service.stage(upload(b'worker bytes'), folder='book-covers')
+    book_id = create_book(staged.url)
+    media_service.attach(staged, Book.collection, book_id, 'cover_image_url')
+    os.remove(tmp_path / os.path.basename(staged.url))  # A worker or web instance with its own disk
+    
+    assert client.get(staged.url).data == b'worker bytes'
+    received = []
+    monkeypatch.setattr(media_service, '_store', lambda data, asset: received.append(data) or (CDN_URL, 'cloudinary'))
+    media_service.push(staged.asset_id)
+    
+    assert received == [b'worker bytes']
+    assert Book.find_by_id(str(book_id))['cover_image_url'] == CDN_URL
+    assert mongo.db[MEDIA_STAGING_COLLECTION].find_one({'_id': staged.asset_id}) is None
+
+
+def test_newer_upload_is_not_overwritten(app, media, create_book):
+    """Test that a push only swaps fields still showing its placeholder."""
+    app.config['JOBS_ASYNC'] = True
+    staged = media_service.stage(upload(), folder='book-covers')
+    book_id = create_book(staged.url)
+    job = media_service.attach(staged, Book.collection, book_id, 'cover_image_url')
+    assert job['name'] == 'media.push'
+    
+    Book.update(str(book_id), {'cover_image_url': 'https://example.com/newer.jpg'})
+    result = media_service.push(staged.asset_id)
+    
+    assert result['swapped'] == 0
+    assert Book.find_by_id(str(book_id))['cover_image_url'] == 'https://example.com/newer.jpg'
+    assert mongo.db[MEDIA_COLLECTION].find_one({'_id': staged.asset_id})['targets'] == []
+
+
+def test_failed_push_is_retried(app, media, monkeypatch, create_book):
+    """Test that a failed upload raises for the job queue and leaves the placeholder in place."""
+    app.config['JOBS_ASYNC'] = True
+    monkeypatch.setattr(media_service, '_store', lambda data, asset: (None, 's3'))
+    staged = media_service.stage(upload(), folder='book-covers')
+    book_id = create_book(staged.url)
+    media_service.attach(staged, Book.collection, book_id, 'cover_image_url')
+    
+    with pytest.raises(RuntimeError, match='Upload of'):
+        media_service.push(staged.asset_id)
+    assert mongo.db[MEDIA_COLLECTION].find_one({'_id': staged.asset_id})['status'] == 'staged'
+    assert Book.find_by_id(str(book_id))['cover_image_url'] == staged.url
+
+
+def test_cleanup_keeps_referenced_images(app, media, create_book):
+    """Test that released images are deleted only once no document uses them."""
+    create_book('https://res.cloudinary.com/demo/image/upload/book-covers/shared.jpg')
+    
+    counts = media_service.cleanup(['https://res.cloudinary.com/demo/image/upload/book-covers/shared.jpg',
+                                    'https://res.cloudinary.com/demo/image/upload/book-covers/old.jpg'])
+    
+    assert counts == {'deleted': 1, 'kept': 1}
+    assert media == ['deleted https://res.cloudinary.com/demo/image/upload/book-covers/old.jpg']
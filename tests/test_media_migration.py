@@ -0,0 +1,80 @@
+"""Test the resumable media migration."""
+import pytest
+from app import mongo
+from app.models import Book
+from app.services.media_service import MEDIA_COLLECTION
+from app.services.media_migration_service import media_migration, MIGRATION_COLLECTION
+
+
+@pytest.fixture
+def migration(app, tmp_path, monkeypatch):
+    """Serve local files from a temporary folder and record uploads instead of calling Cloudinary."""
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    mongo.db[MEDIA_COLLECTION].delete_many({})
+    mongo.db[MIGRATION_COLLECTION].delete_many({})
+    uploads = []
+    
+    def upload(data, asset_id, extension, folder, target):
+        if data == b'broken':
+            return None
+        uploads.append(asset_id)
+        return f'https://res.cloudinary.com/demo/image/upload/{folder}/{asset_id}{extension}'
+    
+    monkeypatch.setattr(media_migration, '_upload', upload)
+    yield uploads
+    mongo.db[MEDIA_COLLECTION].delete_many({})
+    mongo.db[MIGRATION_COLLECTION].delete_many({})
+
+
+def local_image(tmp_path, name, data):
+    """Write a file into the upload folder and return its URL."""
+    (tmp_path / name).write_bytes(data)
+    return f'/uploads/{name}'
+
+
+def test_migration_dedupes_and_batches_updates(app, migration, tmp_path, create_book):
+    """Test that identical files upload once and every document is repointed."""
+    first = create_book(local_image(tmp_path, 'a.jpg', b'same bytes'))
+    second = create_book(local_image(tmp_path, 'b.jpg', b'same bytes'))
+    third = create_book(local_image(tmp_path, 'c.png', b'other bytes'))
+    user_id = mongo.db.users.insert_one({'full_name': 'Mara', 'profile_image_url': 'uploads/c.png'}).inserted_id
+    create_book('/uploads/gone.jpg')
+    
+    counts = media_migration.run(target='cloudinary', workers=4, batch_size=2)
+    assert (counts['urls'], counts['documents']) == (5, 5)
+    assert (counts['uploaded'], counts['deduplicated'], counts['missing']) == (2, 2, 1)
+    assert counts['updated'] == 4
+    assert len(migration) == 2
+    
+    urls = {Book.find_by_id(book_id)['cover_image_url'] for book_id in (first, second)}
+    assert len(urls) == 1 and urls.pop().startswith('https://res.cloudinary.com/')
+    assert mongo.db.users.find_one({'_id': user_id})['profile_image_url'] == Book.find_by_id(third)['cover_image_url']
+    
+    again = media_migration.run(target='cloudinary')
+    assert (again['urls'], again['uploaded']) == (1, 0)  # Only the missing file is left
+
+
+def test_interrupted_run_resumes_without_uploading(app, migration, tmp_path, create_book):
+    """Test that URLs in the manifest are only rewritten on the next run."""
+    book_id = create_book(local_image(tmp_path, 'a.jpg', b'cover'))
+    media_migration._migrate('/uploads/a.jpg', 'book-covers', 'cloudinary')  # Uploaded, then interrupted
+    assert Book.find_by_id(book_id)['cover_image_url'] == '/uploads/a.jpg'
+    
+    counts = media_migration.run(target='cloudinary')
+    assert (counts['resumed'], counts['uploaded'], counts['updated']) == (1, 0, 1)
+    assert len(migration) == 1
+    assert Book.find_by_id(book_id)['cover_image_url'].startswith('https://res.cloudinary.com/')
+
+
+def test_dry_run_and_failures_change_nothing(app, migration, tmp_path, create_book):
+    """Test that a dry run only reports and a failed upload keeps the old URL."""
+    book_id = create_book(local_image(tmp_path, 'a.jpg', b'broken'))
+    
+    preview = media_migration.run(target='cloudinary', dry_run=True)
+    assert (preview['urls'], preview['bytes']) == (1, len(b'broken'))
+    assert mongo.db[MIGRATION_COLLECTION].count_documents({}) == 0
+    
+    counts = media_migration.run(target='cloudinary')
+    assert (counts['failed'], counts['updated']) == (1, 0)
+    assert Book.find_by_id(book_id)['cover_image_url'] == '/uploads/a.jpg'
+    assert mongo.db[MIGRATION_COLLECTION].find_one()['status'] == 'failed'
@@ -0,0 +1,67 @@
+"""Test the homepage fragment cache."""
+import pytest
+from app import mongo
+from app.models import User, Book
+from app.services.page_cache_service import PageCacheService, LocalPageStore, MongoPageStore
+
+
+@pytest.fixture(params=['local', 'mongo'])
+def page_cache(app, request):
+    """Page cache over each store, enabled for the test."""
+    app.config['PAGE_CACHE_ENABLED'] = True
+    service = PageCacheService()
+    service.store = LocalPageStore() if request.param == 'local' else MongoPageStore()
+    mongo.db.page_cache.delete_many({})
+    yield service
+    mongo.db.page_cache.delete_many({})
+
+
+def test_fragment_is_cached_until_invalidated(page_cache):
+    """Test hits, invalidation and re-rendering."""
+    renders = []
+    
+    def render():
+        renders.append(1)
+        return f'render {len(renders)}'
+    
+    assert page_cache.get_or_render('home:guest', render, tag='home') == 'render 1'
+    assert page_cache.get_or_render('home:guest', render, tag='home') == 'render 1'
+    
+    page_cache.invalidate('home')
+    assert page_cache.get_or_render('home:guest', render, tag='home') == 'render 2'
+    assert len(renders) == 2
+
+
+def test_stale_copy_served_while_refreshing(page_cache):
+    """Test that only the refresh claimant renders; others get the stale copy."""
+    page_cache.get_or_render('home:guest', lambda: 'old', tag='home')
+    page_cache.invalidate('home')
+    
+    assert page_cache.store.claim_refresh('home:guest')  # Another worker is refreshing
+    assert page_cache.get_or_render('home:guest', lambda: 'new', tag='home') == 'old'
+    
+    page_cache.store.release('home:guest')
+    assert page_cache.get_or_render('home:guest', lambda: 'new', tag='home') == 'new'
+
+
+def test_failed_refresh_serves_stale_copy(page_cache):
+    """Test that a render error falls back to the stale copy."""
+    page_cache.get_or_render('home:guest', lambda: 'old', tag='home')
+    page_cache.invalidate('home')
+    
+    def broken():
+        raise RuntimeError('database down')
+    
+    assert page_cache.get_or_render('home:guest', broken, tag='home') == 'old'
+
+
+def test_homepage_invalidated_by_new_book(client, app):
+    """Test that creating a book refreshes the cached homepage."""
+    app.config['PAGE_CACHE_ENABLED'] = True
+    user_id = User.create('author@example.com', 'Test123!@#', 'Author')
+    
+    client.get('/')
+    Book.create(str(user_id), {'title': 'Freshly Cached Title', 'genre': 'Fiction', 'status': 'active',
+                               'description': 'x' * 120})
+    
+    assert b'Freshly Cached Title' in client.get('/').data
@@ -0,0 +1,92 @@
+"""Test keyset pagination."""
+import pytest
+from datetime import datetime
+from app import mongo
+from app.models import User, Book, keyset_page, collection_finder, encode_cursor
+
+
+def walk(page):
+    """Helper to follow next cursors; page(cursor) returns (docs, next_cursor)."""
+    seen, cursor = [], None
+    while True:
+        docs, cursor = page(cursor)
+        seen.extend(docs)
+        if not cursor:
+            return seen
+
+
+def test_keyset_pages_cover_ties_and_nulls(app):
+    """Test that pages neither skip nor repeat documents sharing a sort value."""
+    same_time = datetime(2024, 1, 1)
+    for index in range(7):
+        mongo.db.books.insert_one({'title': f'Book {index}', 'status': 'active',
+                                   'created_at': same_time, 'views_count': index % 3 or None})
+    
+    for sort in ([('created_at', -1)], [('views_count', -1)], [('views_count', 1)]):
+        books = walk(lambda cursor: keyset_page(collection_finder('books'), {'status': 'active'},
+                                                sort, cursor=cursor, limit=3))
+        assert len(books) == 7
+        assert len({book['_id'] for book in books}) == 7
+
+
+def test_inserts_do_not_shift_later_pages(app):
+    """Test that a new document does not repeat results on the next page."""
+    user_id = User.create('author@example.com', 'Test123!@#', 'Author')
+    for index in range(4):
+        Book.create(str(user_id), {'title': f'Book {index}', 'genre': 'Fiction', 'status': 'active'})
+    
+    first, cursor = Book.search_page(filters={'status': 'active'}, limit=2)
+    Book.create(str(user_id), {'title': 'Newest', 'genre': 'Fiction', 'status': 'active'})
+    second, cursor = Book.search_page(filters={'status': 'active'}, cursor=cursor, limit=2)
+    
+    assert not {book['_id'] for book in first} & {book['_id'] for book in second}
+    assert len(second) == 2
+    assert cursor is None
+
+
+def test_relevance_pages_and_invalid_cursors(app):
+    """Test offset cursors for relevance ranking and cursor validation."""
+    user_id = User.create('author@example.com', 'Test123!@#', 'Author')
+    for index in range(5):
+        Book.create(str(user_id), {'title': f'Dragon {index}', 'genre': 'Fantasy', 'status': 'active'})
+    
+    books = walk(lambda cursor: Book.search_page('dragon', cursor=cursor, limit=2))
+    assert len({book['_id'] for book in books}) == 5
+    
+    with pytest.raises(ValueError):
+        Book.search_page(cursor='not-a-cursor')
+    with pytest.raises(ValueError):
+        mismatched = encode_cursor({'sort': [['title', 1], ['_id', 1]], 'after': ['a', None]})
+        Book.search_page(cursor=mismatched)
+
+
+def test_book_list_json_returns_next_cursor(client, app):
+    """Test that the books JSON API exposes next_cursor."""
+    user_id = User.create('author@example.com', 'Test123!@#', 'Author')
+    per_page = app.config['ITEMS_PER_PAGE']
+    for index in range(per_page + 1):
+        Book.create(str(user_id), {'title': f'Book {index}', 'genre': 'Fiction', 'status': 'active'})
+    
+    data = client.get('/books/', headers={'Content-Type': 'application/json'}).get_json()
+    assert len(data['books']) == per_page
+    assert data['total'] == per_page + 1
+    
+    data = client.get(f"/books/?cursor={data['next_cursor']}",
+                      headers={'Content-Type': 'application/json'}).get_json()
+    assert len(data['books']) == 1
+    assert data['next_cursor'] is None
+    
+    response = client.get('/books/?cursor=bogus', headers={'Content-Type': 'application/json'})
+    assert response.status_code == 400
+
+
+def test_invalid_cursor_redirects_html_requests(client, app):
+    """Test that a malformed cursor sends browsers back to the first page."""
+    response = client.get('/books/?cursor=bogus&genre=Fiction&page=3')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/books/?genre=Fiction')
+    
+    for url in ('/users/?cursor=bogus', '/articles/?cursor=bogus'):
+        response = client.get(url)
+        assert response.status_code == 302
+        assert 'cursor' not in response.headers['Location']
@@ -0,0 +1,89 @@
+"""Test sliding-window rate limiting."""
+import time
+import pytest
+from app import mongo
+from app.security import rate_limit
+from app.services.rate_limit_service import RateLimiter, MemoryRateLimitBackend, MongoRateLimitBackend
+
+# Start of an upcoming minute, so stored counters are not already past their TTL
+BASE = (int(time.time()) // 60 + 10) * 60
+
+
+@pytest.fixture(params=['memory', 'mongo'])
+def limiter(app, request):
+    """Rate limiter over each backend."""
+    mongo.db.rate_limits.delete_many({})
+    limiter = RateLimiter()
+    limiter.backend = MemoryRateLimitBackend() if request.param == 'memory' else MongoRateLimitBackend()
+    yield limiter
+    mongo.db.rate_limits.delete_many({})
+
+
+def test_limit_within_window(limiter):
+    """Test that requests beyond the limit are denied with a retry time."""
+    results = [limiter.hit('login:1.2.3.4', limit=3, window=60, now=BASE + second) for second in range(4)]
+    
+    assert [result.allowed for result in results] == [True, True, True, False]
+    assert [result.remaining for result in results[:3]] == [2, 1, 0]
+    assert results[3].retry_after == 57
+
+
+def test_previous_window_is_weighted(limiter):
+    """Test that the previous window's count decays across the current one."""
+    for _ in range(4):
+        assert limiter.hit('upload:user', limit=4, window=60, now=BASE + 30).allowed
+    
+    # A quarter into the next window, 3 of the previous 4 still count
+    assert limiter.hit('upload:user', limit=4, window=60, now=BASE + 75).allowed
+    denied = limiter.hit('upload:user', limit=4, window=60, now=BASE + 75)
+    assert not denied.allowed
+    assert denied.retry_after == 15
+    # Halfway through, only 2 count
+    assert limiter.hit('upload:user', limit=4, window=60, now=BASE + 90).allowed
+
+
+def test_decorator_returns_retry_after(app, client):
+    """Test that a limited route answers 429 with Retry-After."""
+    @app.route('/limited', methods=['POST'])
+    @rate_limit(2, 60, action='limited')
+    def limited():
+        return 'ok'
+    
+    assert client.post('/limited', json={}).status_code == 200
+    assert client.post('/limited', json={}).status_code == 200
+    response = client.post('/limited', json={})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert client.get('/limited').status_code == 405  # Other methods are not counted or routed
+
+
+def test_login_attempts_limited(app, client):
+    """Test that repeated logins from one address are rejected."""
+    app.config['LOGIN_ATTEMPTS_LIMIT'] = 2
+    for _ in range(2):
+        response = client.post('/auth/login', json={'email': 'nobody@example.com', 'password': 'wrong'})
+        assert response.status_code == 401
+    
+    response = client.post('/auth/login', json={'email': 'nobody@example.com', 'password': 'wrong'})
+    assert response.status_code == 429
+    assert 'Retry-After' in response.headers
+
+
+def test_upload_limit_counts_only_requests_with_files(app, client):
+    """Test that form posts without a file are not counted as uploads."""
+    import io
+    from app.security import has_file_upload
+    
+    @app.route('/upload-form', methods=['POST'])
+    @rate_limit(1, 60, action='upload-form', when=has_file_upload)
+    def upload_form():
+        return 'ok'
+    
+    mongo.db.rate_limits.delete_many({})
+    for _ in range(3):
+        assert client.post('/upload-form', data={'title': 'Text only'}).status_code == 200
+    assert client.post('/upload-form', data={'cover': (io.BytesIO(b''), '')}).status_code == 200
+    
+    assert client.post('/upload-form', data={'cover': (io.BytesIO(b'img'), 'a.png')}).status_code == 200
+    limited = client.post('/upload-form', data={'cover': (io.BytesIO(b'img'), 'a.png')})
+    assert limited.status_code == 302
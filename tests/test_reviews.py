@@ -1,6 +1,7 @@
 """Test review functionality."""
 import pytest
 from app.models import User, Book, Review
+from bson import ObjectId
 
 
 def create_test_user_and_book(client, email='test@example.com'):
@@ -149,3 +150,76 @@ def test_review_average_rating(client):
         rating_info = Review.get_average_rating(book_id)
         assert rating_info['average'] == 4.5
         assert rating_info['count'] == 2
+
+
+def test_rating_aggregates_follow_review_status(client):
+    """Test stored rating aggregates on approve, reject and delete."""
+    user1, book_id = create_test_user_and_book(client, 'owner@example.com')
+    
+    with client.application.app_context():
+        reviewer_id = User.create('reviewer1@example.com', 'Test123!@#', 'Reviewer 1')
+        review_id = str(Review.create(book_id, str(reviewer_id), 4,
+                                      'Very good book, enjoyed reading it thoroughly.'))
+        
+        Review.update_status(review_id, 'approved')
+        book = Book.find_by_id(book_id)
+        assert Book.get_rating_info(book) == {'average': 4.0, 'count': 1}
+        assert book['rating_histogram']['4'] == 1
+        
+        # Approving twice must not double count
+        Review.update_status(review_id, 'approved')
+        assert Book.find_by_id(book_id)['rating_count'] == 1
+        
+        Review.update_status(review_id, 'rejected')
+        assert Book.get_rating_info(Book.find_by_id(book_id)) == {'average': 0, 'count': 0}
+        
+        Review.update_status(review_id, 'approved')
+        Review.delete(review_id)
+        book = Book.find_by_id(book_id)
+        assert book['rating_count'] == 0
+        assert book['rating_histogram']['4'] == 0
+
+
+def test_rebuild_rating_aggregates(client):
+    """Test rebuilding rating aggregates from the reviews collection."""
+    from app import mongo
+    user1, book_id = create_test_user_and_book(client, 'owner@example.com')
+    
+    with client.application.app_context():
+        reviewer_id = User.create('reviewer1@example.com', 'Test123!@#', 'Reviewer 1')
+        review_id = Review.create(book_id, str(reviewer_id), 5,
+                                  'Excellent book with great content and writing style.')
+        Review.update_status(str(review_id), 'approved')
+        
+        # Simulate drift, then rebuild
+        mongo.db.books.update_one({'_id': ObjectId(book_id)}, {'$set': {'rating_count': 7}})
+        Review.rebuild_rating_aggregates()
+        
+        book = Book.find_by_id(book_id)
+        assert Book.get_rating_info(book) == {'average': 5.0, 'count': 1}
+        assert book['rating_histogram'] == {'1': 0, '2': 0, '3': 0, '4': 0, '5': 1}
+
+
+def test_books_without_aggregates_are_backfilled(client):
+    """Test that books from before rating aggregates get them on first read or review change."""
+    from app import mongo
+    user1, book_id = create_test_user_and_book(client, 'owner@example.com')
+    
+    with client.application.app_context():
+        reviewer_id = User.create('reviewer1@example.com', 'Test123!@#', 'Reviewer 1')
+        first = str(Review.create(book_id, str(reviewer_id), 5, 'A gripping story that I could not put down.'))
+        second = str(Review.create(book_id, str(reviewer_id), 3, 'Solid middle section, but a slow opening.'))
+        Review.update_status(first, 'approved')
+        legacy = {'$unset': {'rating_sum': '', 'rating_count': '', 'rating_histogram': ''}}
+        mongo.db.books.update_one({'_id': ObjectId(book_id)}, legacy)
+        
+        books = Book.enrich_many([mongo.db.books.find_one({'_id': ObjectId(book_id)})])
+        assert books[0]['rating_info'] == {'average': 5.0, 'count': 1}
+        assert mongo.db.books.find_one({'_id': ObjectId(book_id)})['rating_count'] == 1
+        
+        # Approving on a legacy book counts existing reviews once
+        mongo.db.books.update_one({'_id': ObjectId(book_id)}, legacy)
+        Review.update_status(second, 'approved')
+        book = mongo.db.books.find_one({'_id': ObjectId(book_id)})
+        assert Book.get_rating_info(book) == {'average': 4.0, 'count': 2}
+        assert book['rating_histogram']['3'] == 1
@@ -0,0 +1,59 @@
+"""Test analytics rollups."""
+import pytest
+from datetime import datetime, timedelta
+from app import mongo
+from app.models import User, Book, Review
+from app.services.rollup_service import rollup_service, ROLLUP_COLLECTION
+
+
+@pytest.fixture
+def rollups(app):
+    """Start each test with empty rollups."""
+    mongo.db[ROLLUP_COLLECTION].delete_many({})
+    yield rollup_service
+    mongo.db[ROLLUP_COLLECTION].delete_many({})
+
+
+def test_model_writes_update_rollups(rollups):
+    """Test that creates are counted in hourly, daily and all-time buckets."""
+    author_id = User.create('author@example.com', 'Test123!@#', 'Author')
+    reviewer_id = User.create('reviewer@example.com', 'Test123!@#', 'Reviewer')
+    book_id = Book.create(str(author_id), {'title': 'Rolled Up', 'genre': 'Fiction', 'status': 'active'})
+    Review.create(str(book_id), str(reviewer_id), 4, 'Good. ' * 20)
+    Review.create(str(book_id), str(author_id), 2, 'Meh. ' * 20)
+    
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    assert rollups.count_between('registrations', today) == 2
+    assert rollups.count_between('books_added', today - timedelta(days=3)) == 1
+    assert rollups.count_between('reviews', today - timedelta(days=14), today) == 0
+    assert rollups.series('reviews', today) == [{'_id': today.strftime('%Y-%m-%d'), 'count': 2}]
+    
+    totals = rollups.totals('reviews')
+    assert totals['count'] == 2
+    assert totals['sums']['rating'] == 6
+
+
+def test_rebuild_matches_source_data(rollups):
+    """Test backfilling rollups, including dimension breakdowns."""
+    competition_id = mongo.db.competitions.insert_one({'title': 'Spring'}).inserted_id
+    two_days_ago = datetime.utcnow() - timedelta(days=2)
+    mongo.db.competition_submissions.delete_many({})
+    mongo.db.competition_submissions.insert_many([
+        {'competition_id': competition_id, 'genre': 'Fantasy', 'word_count': 1000, 'submission_timestamp': two_days_ago},
+        {'competition_id': competition_id, 'genre': 'Fantasy', 'word_count': 3000, 'submission_timestamp': two_days_ago},
+        {'competition_id': competition_id, 'genre': 'Horror', 'word_count': 2000, 'submission_timestamp': datetime.utcnow()}
+    ])
+    
+    counted = rollups.rebuild('submissions')
+    
+    assert counted == {'submissions': 3}
+    assert rollups.count_between('submissions', two_days_ago - timedelta(hours=1)) == 3
+    assert rollups.count_between('submissions', datetime.utcnow() - timedelta(days=1)) == 1
+    assert rollups.breakdown('submissions', 'genre') == [
+        {'_id': 'Fantasy', 'count': 2, 'avg_word_count': 2000},
+        {'_id': 'Horror', 'count': 1, 'avg_word_count': 2000}
+    ]
+    assert rollups.breakdown('submissions', 'competition_id')[0]['count'] == 3
+    
+    mongo.db.competition_submissions.delete_many({})
+    mongo.db.competitions.delete_many({})
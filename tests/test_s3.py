@@ -0,0 +1,61 @@
+"""Test the S3 client, transfer settings and presigned uploads."""
+import base64
+import io
+import json
+import pytest
+from botocore.stub import Stubber
+from app.services.s3_service import s3_service, MB
+
+
+@pytest.fixture
+def s3(app):
+    """Configure fake credentials and a fresh shared client."""
+    app.config.update(AWS_ACCESS_KEY_ID='AKIAEXAMPLE', AWS_SECRET_ACCESS_KEY='secret',
+                      AWS_S3_BUCKET_NAME='inklaunch-test', AWS_REGION='eu-west-1',
+                      S3_MAX_POOL_CONNECTIONS=4, S3_TRANSFER_CONCURRENCY=6, S3_MULTIPART_THRESHOLD_MB=16)
+    s3_service.s3_client = None
+    assert s3_service.is_s3_configured()
+    yield s3_service
+    s3_service.s3_client = None
+
+
+def test_client_and_transfer_settings_follow_config(s3):
+    """Test that the pool covers every multipart thread and large files go multipart."""
+    assert s3.s3_client.meta.config.max_pool_connections == 6
+    assert s3.transfer_config.multipart_threshold == 16 * MB
+    assert s3.transfer_config.max_request_concurrency == 6
+    assert s3.key_from_url(s3.object_url('manuscripts/a.pdf')) == 'manuscripts/a.pdf'
+    assert s3.key_from_url('https://other.s3.eu-west-1.amazonaws.com/a.pdf') is None
+
+
+def test_upload_stream_uses_managed_transfer(s3, monkeypatch):
+    """Test that streams are handed to the transfer manager, private unless asked otherwise."""
+    calls = []
+    monkeypatch.setattr(s3.s3_client, 'upload_fileobj',
+                        lambda stream, bucket, key, ExtraArgs, Config: calls.append((key, ExtraArgs, Config)))
+    
+    url = s3.upload_stream(io.BytesIO(b'%PDF'), 'manuscripts/a.pdf', 'application/pdf', public=False)
+    assert url == 'https://inklaunch-test.s3.eu-west-1.amazonaws.com/manuscripts/a.pdf'
+    assert calls == [('manuscripts/a.pdf', {'ContentType': 'application/pdf'}, s3.transfer_config)]
+
+
+def test_presigned_post_limits_type_and_size(s3):
+    """Test that the signed form only accepts the declared type and size."""
+    post = s3.presigned_post('book-covers/a.jpg', 'image/jpeg', 5 * MB)
+    assert post['url'] == 'https://inklaunch-test.s3.amazonaws.com/'
+    assert post['fields']['key'] == 'book-covers/a.jpg'
+    assert post['fields']['acl'] == 'public-read'
+    policy = json.loads(base64.b64decode(post['fields']['policy']))
+    assert ['content-length-range', 1, 5 * MB] in policy['conditions']
+    assert {'Content-Type': 'image/jpeg'} in policy['conditions']
+    
+    assert 'X-Amz-Signature=' in s3.presigned_url('manuscripts/a.pdf')
+
+
+def test_head_object_of_missing_key(s3):
+    """Test that a missing object reads as None."""
+    with Stubber(s3.s3_client) as stub:
+        stub.add_client_error('head_object', service_error_code='404', http_status_code=404)
+        stub.add_response('head_object', {'ContentLength': 12, 'ContentType': 'image/png', 'ETag': '"abc"'})
+        assert s3.head_object('missing.png') is None
+        assert s3.head_object('there.png') == {'size': 12, 'content_type': 'image/png', 'etag': 'abc'}
@@ -0,0 +1,134 @@
+"""Test search backends."""
+from app.models import User, Book
+from app.services.search_service import InvertedIndex, MongoTextSearchBackend, split_query, tokenize
+
+
+WEIGHTS = {'title': 10, 'subtitle': 5, 'genre': 3, 'description': 1}
+
+
+def build_index(docs):
+    """Helper to index a dict of documents."""
+    index = InvertedIndex(WEIGHTS)
+    for doc_id, doc in docs.items():
+        index.add(doc_id, doc)
+    return index
+
+
+def test_title_matches_outrank_description_matches():
+    """Test weighted relevance ranking."""
+    index = build_index({
+        'a': {'title': 'Quiet Harbor', 'description': 'A dragon story'},
+        'b': {'title': 'Dragon Winter', 'description': 'Snow and ice'},
+        'c': {'title': 'Dragon Dragon', 'genre': 'Dragon', 'description': 'dragon'}
+    })
+    
+    ranked = [doc_id for doc_id, _ in index.search(['dragon'])]
+    
+    assert ranked == ['c', 'b', 'a']
+
+
+def test_all_terms_must_match():
+    """Test that multi-word queries intersect."""
+    index = build_index({
+        'a': {'title': 'Dragon Winter'},
+        'b': {'title': 'Dragon Summer'}
+    })
+    
+    assert [doc_id for doc_id, _ in index.search(['dragon', 'winter'])] == ['a']
+
+
+def test_prefix_matching_for_type_ahead():
+    """Test that the last term matches as a prefix."""
+    index = build_index({
+        'a': {'title': 'Dragon Winter'},
+        'b': {'title': 'Drama Club'},
+        'c': {'title': 'Harbor'}
+    })
+    
+    terms, prefix = split_query('dra', prefix=True)
+    assert sorted(doc_id for doc_id, _ in index.search(terms, prefix)) == ['a', 'b']
+    
+    terms, prefix = split_query('dragon wi', prefix=True)
+    assert [doc_id for doc_id, _ in index.search(terms, prefix)] == ['a']
+
+
+def test_query_is_not_treated_as_a_pattern():
+    """Test that regex metacharacters are plain text."""
+    index = build_index({
+        'a': {'title': 'Alpha'},
+        'b': {'title': 'a'}
+    })
+    
+    assert tokenize('a.*') == ['a']
+    assert [doc_id for doc_id, _ in index.search(tokenize('a.*'))] == ['b']
+
+
+def test_reindex_and_remove():
+    """Test incremental updates."""
+    index = build_index({'a': {'title': 'Dragon Winter'}})
+    
+    index.add('a', {'title': 'Summer'})
+    assert index.search(['dragon']) == []
+    assert index.tokens_with_prefix('dra') == []
+    
+    index.remove('a')
+    assert index.search(['summer']) == []
+
+
+def test_book_search_ranks_by_relevance(app):
+    """Test Book.search through the configured backend."""
+    user_id = User.create('author@example.com', 'Test123!@#', 'Author')
+    desc_match = Book.create(str(user_id), {
+        'title': 'Quiet Harbor', 'genre': 'Fiction', 'status': 'active',
+        'description': 'A story with a dragon in it'
+    })
+    title_match = Book.create(str(user_id), {
+        'title': 'Dragon Winter', 'genre': 'Fantasy', 'status': 'active',
+        'description': 'Snow and ice'
+    })
+    Book.create(str(user_id), {
+        'title': 'Unrelated', 'genre': 'Fiction', 'status': 'active',
+        'description': 'Nothing to see'
+    })
+    
+    results = Book.search('dragon', filters={'status': 'active'})
+    
+    assert [book['_id'] for book in results] == [title_match, desc_match]
+    assert Book.count_search('dragon', filters={'status': 'active'}) == 2
+    assert Book.search('dr.*') == []  # Not a regex, so 'dragon' must not match
+    
+    Book.update(str(title_match), {'title': 'Winter'})
+    assert [book['_id'] for book in Book.search('dragon')] == [desc_match]
+
+
+def test_mongo_backend_requires_every_term():
+    """Test that $text queries quote each term so all of them must match."""
+    backend = MongoTextSearchBackend()
+    
+    mongo_filter, uses_text = backend._query(Book, 'dragon winter', {'status': 'active'}, prefix=False)
+    
+    assert uses_text
+    assert mongo_filter == {'status': 'active', '$text': {'$search': '"dragon" "winter"'}}
+
+
+def test_mongo_backend_falls_back_until_indexed(app, monkeypatch):
+    """Test that searches use the local index until the text index and keywords exist."""
+    from app import mongo
+    from app.indexes import sync_indexes
+    from app.services.search_service import search_service
+    
+    monkeypatch.setattr(search_service, 'backend', MongoTextSearchBackend())
+    monkeypatch.setattr(search_service, 'fallback', None)
+    monkeypatch.setattr(search_service, 'ready', {})
+    mongo.db.books.drop_indexes()
+    user_id = User.create('author@example.com', 'Test123!@#', 'Author')
+    book_id = Book.create(str(user_id), {'title': 'Dragon Winter', 'genre': 'Fantasy', 'description': 'Snow'})
+    mongo.db.books.update_one({'_id': book_id}, {'$unset': {'search_keywords': ''}})
+    
+    assert [book['_id'] for book in Book.search('dragon')] == [book_id]
+    assert search_service._backend_for(Book) is search_service.fallback
+    
+    sync_indexes()
+    search_service.reindex(Book)
+    search_service.ready = {}
+    assert search_service._backend_for(Book) is search_service.backend